@@ -0,0 +1,82 @@
+"""
+Servicio HTTP local de generación de avatares.
+
+Mantiene cargados el detector facial y el removedor de fondo, y agrupa las
+peticiones concurrentes en micro-lotes.
+
+Uso:
+    python avatar_server.py --port 8080
+    curl --data-binary @foto.png "http://127.0.0.1:8080/avatars?filename=foto.png" -o avatares.zip
+    curl -F image=@foto.png "http://127.0.0.1:8080/avatars?format=multipart"
+    curl http://127.0.0.1:8080/metrics
+
+Con --renditions-dir (masters generados con resize_images.py --on-demand):
+    curl http://127.0.0.1:8080/avatars/equipo/ana/86x86.png -o ana_86.png
+"""
+
+import argparse
+
+import cv2
+
+from bg_remover_config import BackgroundRemoverConfig
+from config import Config
+from src.avatar_renditions import AvatarRenderer
+from src.avatar_service import AvatarService
+from src.face_detector import FaceDetector
+from src.image_processor import ImageProcessor
+from src.proportional_image_resizer import ProportionalImageResizer
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP local de generación de avatares")
+    parser.add_argument('--host', default='127.0.0.1', help="Dirección de escucha (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8080, help="Puerto (default: 8080)")
+    parser.add_argument('--max-batch', type=int, default=8,
+                        help="Peticiones máximas agrupadas en un lote (default: 8)")
+    parser.add_argument('--batch-wait-ms', type=float, default=5.0,
+                        help="Espera máxima para completar un lote en milisegundos (default: 5)")
+    parser.add_argument('--no-warmup', action='store_true',
+                        help="No ejecutar la inferencia de calentamiento al arrancar")
+    parser.add_argument('--renditions-dir',
+                        help="Directorio de masters (resize_images.py --on-demand) para servir tamaños bajo demanda")
+    parser.add_argument('--rendition-memory-mb', type=int, default=64,
+                        help="Límite de la caché de renderizados en memoria en MB (default: 64)")
+    parser.add_argument('--rendition-disk-cache',
+                        help="Directorio de la caché de renderizados en disco (default: sin caché en disco)")
+    parser.add_argument('--rendition-disk-mb', type=int, default=512,
+                        help="Límite de la caché de renderizados en disco en MB (default: 512)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    face_detector = FaceDetector(cv2.data.haarcascades + Config.HAAR_CASCADE_PATH)
+    bg_remover = BackgroundRemoverConfig.create_remover(api_key=Config.get_remove_bg_api_key())
+    processor = ImageProcessor(ProportionalImageResizer(), face_detector, bg_remover=bg_remover)
+    face_detector.load_model()
+    if not args.no_warmup:
+        processor.warm_up()
+
+    renderer = None
+    if args.renditions_dir:
+        renderer = AvatarRenderer(
+            args.renditions_dir,
+            memory_max_bytes=args.rendition_memory_mb * 1024 * 1024,
+            disk_cache_dir=args.rendition_disk_cache,
+            disk_max_bytes=args.rendition_disk_mb * 1024 * 1024
+        )
+
+    service = AvatarService(
+        processor,
+        host=args.host,
+        port=args.port,
+        max_batch_size=args.max_batch,
+        max_wait_ms=args.batch_wait_ms,
+        renderer=renderer
+    )
+    service.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark del pipeline por etapas sobre avatares sintéticos deterministas.
+
+Genera un conjunto de avatares (varios tamaños, con y sin canal alfa, con y sin
+cara) a partir de una semilla y mide cada etapa: decodificación, escalados,
+detección facial, recorte y codificación, cada backend de remoción de fondo y
+el pipeline completo. Las etapas que no se pueden medir en esta máquina
+(modelo ausente, backend no instalado) aparecen como omitidas con el motivo.
+
+Uso:
+    python benchmark.py
+    python benchmark.py --count 32 --repeat 5 --json benchmark.json
+    python benchmark.py --stages decode crop_encode remover --backends stand-in bgremover
+    python benchmark.py --history                  # añade el resultado a benchmark_history.jsonl
+    python benchmark_compare.py                     # compara la última ejecución con las anteriores
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from src.benchmark import STAGES, default_backends, run_benchmark
+from src.benchmark_history import DEFAULT_HISTORY_PATH, append_history, make_record
+from src.synthetic_avatars import avatar_specs, write_dataset
+
+
+def print_report(results: dict) -> None:
+    print("\n" + "=" * 78)
+    print("📊 BENCHMARK DEL PIPELINE")
+    print("=" * 78)
+    print(f"{'Etapa':<24}{'media ms':>10}{'mediana':>10}{'p95 ms':>10}{'desv.':>9}{'img/s':>10}")
+    print("-" * 78)
+    for stage, result in results['stages'].items():
+        if 'skipped' in result:
+            print(f"{stage:<24}⏭️ omitida: {result['skipped'].splitlines()[0]}")
+            continue
+        print(f"{stage:<24}{result['mean_ms']:>10.2f}{result['median_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+              f"{result['stdev_ms']:>9.2f}{result['images_per_second']:>10.1f}")
+        if 'faces_found' in result:
+            print(f"{'':<24}caras detectadas: {result['faces_found']} (esperadas {result['faces_expected']})")
+    print("=" * 78)
+    print(f"⏱️ Duración total: {results['duration_seconds']:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide cada etapa del pipeline con avatares sintéticos")
+    parser.add_argument('--count', type=int, default=16, help="Número de avatares sintéticos")
+    parser.add_argument('--seed', type=int, default=0, help="Semilla del conjunto de avatares")
+    parser.add_argument('--repeat', type=int, default=3, help="Mediciones por imagen y etapa")
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), choices=STAGES)
+    parser.add_argument('--backends', nargs='+', help="Backends de remoción de fondo a medir (por defecto todos)")
+    parser.add_argument('--api-key', help="Medir también la API de remove.bg (consume créditos)")
+    parser.add_argument('--work-dir', help="Directorio de trabajo (por defecto uno temporal que se borra al acabar)")
+    parser.add_argument('--json', dest='json_path', help="Guardar los resultados en un archivo JSON")
+    parser.add_argument('--history', nargs='?', const=DEFAULT_HISTORY_PATH,
+                        help=f"Añadir el resultado al historial (default: {DEFAULT_HISTORY_PATH})")
+    parser.add_argument('--label', help="Etiqueta de la ejecución en el historial")
+    args = parser.parse_args()
+
+    backends = default_backends(api_key=args.api_key)
+    if args.backends:
+        unknown = sorted(set(args.backends) - set(backends))
+        if unknown:
+            print(f"❌ Backends desconocidos: {', '.join(unknown)} (disponibles: {', '.join(backends)})")
+            return 1
+        backends = {name: backends[name] for name in args.backends}
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='avatar-benchmark-')
+    try:
+        specs = avatar_specs(args.count, seed=args.seed)
+        print(f"🎨 Generando {len(specs)} avatares sintéticos (semilla {args.seed}) en {work_dir}")
+        paths = write_dataset(os.path.join(work_dir, 'dataset'), specs)
+        results = run_benchmark(specs, paths, work_dir, repeat=args.repeat, stages=args.stages,
+                                backends=backends, seed=args.seed)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(results)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Resultados guardados en {args.json_path}")
+
+    if args.history:
+        record = make_record(results, label=args.label)
+        append_history(args.history, record)
+        commit = (record['commit'] or 'sin commit')[:10] + (' (con cambios)' if record['dirty'] else '')
+        print(f"🗂️ Añadido al historial {args.history}: {commit}, máquina {record['fingerprint']}, "
+              f"configuración {record['config_key']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
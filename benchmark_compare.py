@@ -0,0 +1,134 @@
+"""
+Compara una ejecución de benchmark con su línea base del historial y con los presupuestos.
+
+La candidata es la última entrada del historial (o un JSON de benchmark.py --json)
+y la línea base las últimas ejecuciones anteriores con la misma máquina y
+configuración. Sale con código 1 si se supera algún presupuesto, o si hay
+regresiones y se pasó --fail-on-regression.
+
+Uso:
+    python benchmark_compare.py
+    python benchmark_compare.py --window 10 --threshold 5 --fail-on-regression
+    python benchmark_compare.py --budget pipeline.p95_ms=900 --budget pipeline.images_per_second=2
+    python benchmark_compare.py --budgets benchmark_budgets.json --candidate resultados.json
+    python benchmark_compare.py --list
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from src.benchmark_history import (DEFAULT_HISTORY_PATH, LATENCY_METRICS, THROUGHPUT_METRIC, compare,
+                                   load_history, make_record, select_baseline)
+
+STATUS_ICONS = {'regression': '🔴', 'improvement': '🟢', 'ok': '✅', 'new': '🆕', 'skipped': '⏭️'}
+
+
+def parse_budget(text: str):
+    """'etapa.métrica=límite' -> (etapa, métrica, límite)."""
+    try:
+        key, value = text.split('=', 1)
+        stage, metric = key.rsplit('.', 1)
+        limit = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"presupuesto inválido {text!r} (formato: etapa.métrica=límite)")
+    if metric not in LATENCY_METRICS + (THROUGHPUT_METRIC,):
+        raise argparse.ArgumentTypeError(f"métrica desconocida {metric!r}")
+    return stage, metric, limit
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Detecta regresiones de rendimiento entre ejecuciones de benchmark")
+    parser.add_argument('--history', default=DEFAULT_HISTORY_PATH, help="Historial de benchmark.py --history")
+    parser.add_argument('--candidate', help="JSON de benchmark.py --json (default: última entrada del historial)")
+    parser.add_argument('--baseline-commit', help="Usar como línea base solo las ejecuciones de este commit")
+    parser.add_argument('--window', type=int, default=5, help="Ejecuciones anteriores en la línea base")
+    parser.add_argument('--threshold', type=float, default=10.0, help="Cambio relativo mínimo (%%) para marcar")
+    parser.add_argument('--z', type=float, default=3.0, help="Cambio mínimo en múltiplos del ruido estimado")
+    parser.add_argument('--budgets', help="JSON {etapa: {métrica: límite}} (máximo en ms, mínimo en img/s)")
+    parser.add_argument('--budget', action='append', type=parse_budget, default=[],
+                        help="Presupuesto etapa.métrica=límite (se puede repetir)")
+    parser.add_argument('--fail-on-regression', action='store_true', help="Salir con código 1 si hay regresiones")
+    parser.add_argument('--json', action='store_true', help="Imprimir el informe en JSON")
+    parser.add_argument('--list', action='store_true', help="Listar las entradas del historial y salir")
+    return parser.parse_args(argv)
+
+
+def load_budgets(args) -> dict:
+    budgets = {}
+    if args.budgets:
+        with open(args.budgets, encoding='utf-8') as f:
+            budgets = json.load(f)
+    for stage, metric, limit in args.budget:
+        budgets.setdefault(stage, {})[metric] = limit
+    return budgets
+
+
+def print_history(history: list) -> None:
+    print(f"{'Fecha':<20}{'Commit':<12}{'Máquina':<14}{'Config':<14}{'Etiqueta'}")
+    for record in history:
+        recorded = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record['recorded_at']))
+        commit = (record.get('commit') or '-')[:10] + ('*' if record.get('dirty') else '')
+        print(f"{recorded:<20}{commit:<12}{record['fingerprint']:<14}{record['config_key']:<14}"
+              f"{record.get('label') or ''}")
+
+
+def print_report(report: dict) -> None:
+    print("\n" + "=" * 86)
+    print(f"📊 COMPARACIÓN CON LA LÍNEA BASE ({report['baseline_runs']} ejecuciones)")
+    print("=" * 86)
+    print(f"{'Etapa':<22}{'Métrica':<19}{'Base':>11}{'Actual':>11}{'Cambio':>9}{'Ruido':>9}  Estado")
+    print("-" * 86)
+    for stage, comparisons in report['stages'].items():
+        if 'status' in comparisons:
+            detail = f" ({comparisons['reason'].splitlines()[0]})" if 'reason' in comparisons else ""
+            print(f"{stage:<22}{STATUS_ICONS[comparisons['status']]} {comparisons['status']}{detail}")
+            continue
+        for metric, c in comparisons.items():
+            print(f"{stage:<22}{metric:<19}{c['baseline']:>11.2f}{c['candidate']:>11.2f}{c['change']:>+9.1%}"
+                  f"{c['noise']:>9.2f}  {STATUS_ICONS[c['status']]} {c['status']}")
+            stage = ''
+    print("=" * 86)
+    for violation in report['budget_violations']:
+        value = 'sin medir' if violation['value'] is None else f"{violation['value']:.2f}"
+        print(f"💸 Presupuesto superado: {violation['stage']}.{violation['metric']} = {value} "
+              f"(límite {violation['limit']})")
+    print(f"🔴 Regresiones: {len(report['regressions'])}  💸 Presupuestos superados: "
+          f"{len(report['budget_violations'])}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    history = load_history(args.history)
+
+    if args.list:
+        print_history(history)
+        return 0
+
+    if args.candidate:
+        with open(args.candidate, encoding='utf-8') as f:
+            candidate = make_record(json.load(f), label=args.candidate)
+    elif history:
+        candidate = history[-1]
+    else:
+        print(f"❌ El historial {args.history} está vacío (ejecuta python benchmark.py --history)")
+        return 1
+
+    baseline = select_baseline(history, candidate, window=args.window, commit=args.baseline_commit)
+    report = compare(baseline, candidate, threshold=args.threshold / 100, z=args.z, budgets=load_budgets(args))
+    report['candidate'] = {key: candidate.get(key) for key in ('commit', 'dirty', 'label', 'fingerprint', 'config_key')}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        if not baseline:
+            print("⚠️ No hay ejecuciones anteriores con la misma máquina y configuración: solo se comprueban presupuestos")
+        print_report(report)
+
+    failed = bool(report['budget_violations']) or (args.fail_on_regression and bool(report['regressions']))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,7 +10,7 @@ class BackgroundRemoverConfig:
     # CONFIGURACIÓN PRINCIPAL
     # ========================================
     
-    # Tipo de removedor a usar: 'tutanchacon' o 'api'
+    # Tipo de removedor a usar: 'tutanchacon', 'api' o 'hybrid'
     REMOVER_TYPE = 'tutanchacon'
     
     # ========================================
@@ -33,6 +33,89 @@ class BackgroundRemoverConfig:
     # Suavizar bordes
     TUTANCHACON_SMOOTH_EDGES = True
     
+    # Variante del modelo: 'fp32' (original), 'int8' (cuantizado) u 'optimized' (grafo optimizado)
+    # Las variantes se generan una sola vez y se guardan junto al modelo de rembg.
+    # Comparar velocidad y calidad con: python model_report.py
+    TUTANCHACON_MODEL_VARIANT = 'fp32'
+    
+    # Opciones de ONNX Runtime de la sesión de segmentación (cualquier variante y modo)
+    # intra_op_num_threads='auto' reparte los núcleos entre los workers
+    # para que varios workers no sobresuscriban la CPU.
+    TUTANCHACON_SESSION_OPTIONS = {
+        'intra_op_num_threads': 'auto',
+        'inter_op_num_threads': 'auto',
+        'graph_optimization_level': 'all',   # 'disable', 'basic', 'extended', 'all'
+        'execution_mode': 'sequential',      # 'sequential' o 'parallel'
+        'enable_cpu_mem_arena': True,
+        'enable_mem_pattern': True,
+        'execution_providers': ['CPUExecutionProvider']  # p. ej. 'OpenVINOExecutionProvider', 'DnnlExecutionProvider'
+    }
+    
+    # Número de workers que procesan imágenes en paralelo en esta máquina
+    # (resize_images.py usa el valor de --workers en su lugar)
+    TUTANCHACON_WORKERS = 1
+    
+    # Segmentación por teselas para imágenes enormes (p. ej. arte tamaño póster)
+    # Se activa por encima de este número de píxeles (None para deshabilitar)
+    # Acota la memoria de la inferencia, no la de la imagen: la fuente, la máscara y
+    # el resultado RGBA completos siguen en memoria (~8 bytes por píxel).
+    TUTANCHACON_TILED_MIN_PIXELS = 16_000_000  # ~4000x4000
+    TUTANCHACON_TILE_SIZE = 1024
+    TUTANCHACON_TILE_OVERLAP = 128
+    TUTANCHACON_TILE_WORKERS = 1  # Teselas de una fila segmentadas en paralelo
+    
+    # ========================================
+    # CONFIGURACIÓN API REMOVE.BG
+    # ========================================
+    
+    # Límite de peticiones por minuto del plan contratado
+    API_REQUESTS_PER_MINUTE = 500
+    
+    # Peticiones simultáneas (también es el tamaño del pool de conexiones)
+    API_MAX_WORKERS = 4
+    
+    # Reintentos ante errores 429/5xx (con backoff exponencial y jitter)
+    API_MAX_RETRIES = 3
+    
+    # Timeout por petición en segundos
+    API_TIMEOUT = 60
+    
+    # Caché local de respuestas por hash de la imagen (None para deshabilitar)
+    API_CACHE_DIR = '.removebg_cache'
+    
+    # Tamaño máximo de la caché en MB (se expulsan las entradas menos usadas)
+    API_CACHE_MAX_MB = 1024
+    
+    # ========================================
+    # CONFIGURACIÓN HÍBRIDA (LOCAL + API)
+    # ========================================
+    
+    # Imágenes simultáneas en el modelo local antes de desbordar a la API
+    # (resize_images.py segmenta por adelantado tantas imágenes como admiten ambos backends)
+    HYBRID_LOCAL_CONCURRENCY = 1
+    
+    # Máximo de imágenes a enviar a la API por ejecución (None = sin límite)
+    HYBRID_API_CREDIT_BUDGET = 100
+    
+    # ========================================
+    # CADENA DE FALLBACK
+    # ========================================
+    
+    # Usar la cadena de fallback en lugar de un único removedor (resize_images.py --fallback)
+    USE_FALLBACK_CHAIN = False
+    
+    # Backends a probar en orden cuando uno falla
+    FALLBACK_CHAIN = ['tutanchacon', 'api']
+    
+    # Segundos máximos por llamada a un backend
+    FALLBACK_CALL_TIMEOUT = 60
+    
+    # Fallos consecutivos que abren el circuito de un backend
+    FALLBACK_FAILURE_THRESHOLD = 3
+    
+    # Segundos que un circuito abierto espera antes de volver a probar
+    FALLBACK_RECOVERY_TIMEOUT = 30
+    
     # ========================================
     # PRESETS PREDEFINIDOS
     # ========================================
@@ -59,6 +142,22 @@ class BackgroundRemoverConfig:
             'smooth_edges': False
         },
         
+        'procesamiento_rapido_int8': {
+            'model_name': 'u2net',
+            'min_alpha_threshold': 50,
+            'preserve_elements': False,
+            'smooth_edges': False,
+            'model_variant': 'int8'
+        },
+        
+        'avatar_equilibrado_optimizado': {
+            'model_name': 'isnet-general-use',
+            'min_alpha_threshold': 20,
+            'preserve_elements': True,
+            'smooth_edges': True,
+            'model_variant': 'optimized'
+        },
+        
         'avatar_complejo': {
             'model_name': 'isnet-general-use',
             'min_alpha_threshold': 10,
@@ -71,17 +170,106 @@ class BackgroundRemoverConfig:
     ACTIVE_PRESET = 'avatar_equilibrado'  # None, 'avatar_calidad_maxima', 'avatar_equilibrado', etc.
     
     @classmethod
-    def get_tutanchacon_config(cls):
-        """Obtiene la configuración para TutanchaconBgRemover."""
-        if cls.ACTIVE_PRESET and cls.ACTIVE_PRESET in cls.PRESETS:
-            return cls.PRESETS[cls.ACTIVE_PRESET]
+    def get_tutanchacon_config(cls, preset=None):
+        """
+        Obtiene la configuración para TutanchaconBgRemover.
+
+        Args:
+            preset: Preset a usar en lugar de ACTIVE_PRESET
+        """
+        preset = preset or cls.ACTIVE_PRESET
+        if preset and preset in cls.PRESETS:
+            config = dict(cls.PRESETS[preset])
         else:
-            return {
+            config = {
                 'model_name': cls.TUTANCHACON_MODEL,
                 'min_alpha_threshold': cls.TUTANCHACON_ALPHA_THRESHOLD,
                 'preserve_elements': cls.TUTANCHACON_PRESERVE_ELEMENTS,
-                'smooth_edges': cls.TUTANCHACON_SMOOTH_EDGES
+                'smooth_edges': cls.TUTANCHACON_SMOOTH_EDGES,
+                'model_variant': cls.TUTANCHACON_MODEL_VARIANT
             }
+        
+        # Las opciones de ONNX Runtime se aplican igual con cualquier preset
+        config['session_options'] = dict(cls.TUTANCHACON_SESSION_OPTIONS)
+        config['workers'] = cls.TUTANCHACON_WORKERS
+        config['tiled_min_pixels'] = cls.TUTANCHACON_TILED_MIN_PIXELS
+        config['tile_size'] = cls.TUTANCHACON_TILE_SIZE
+        config['tile_overlap'] = cls.TUTANCHACON_TILE_OVERLAP
+        config['tile_workers'] = cls.TUTANCHACON_TILE_WORKERS
+        return config
+    
+    @classmethod
+    def _local_config(cls, workers=1, forked=False, preset=None):
+        """Configuración de TutanchaconBgRemover para `workers` procesos, con o sin fork."""
+        config = cls.get_tutanchacon_config(preset)
+        config['workers'] = workers
+        if forked:
+            config['session_options'].update(intra_op_num_threads=1, inter_op_num_threads=1)
+        return config
+    
+    @classmethod
+    def create_remover(cls, workers=1, forked=False, preset=None, api_key=None, fallback=None,
+                       remover_type=None):
+        """
+        Crea el removedor configurado: preset, variante del modelo, teselas y opciones de ONNX Runtime.
+        Con la cadena de fallback activa crea FALLBACK_CHAIN con sus circuit breakers.
+
+        Args:
+            workers: Procesos que segmentan a la vez; reparten los núcleos
+                     cuando intra_op_num_threads='auto'
+            forked: Si el removedor se crea en el padre de un pool con fork; sus sesiones
+                    usan un solo hilo, porque los hilos de ONNX Runtime no sobreviven al fork
+            preset: Preset a usar en lugar de ACTIVE_PRESET
+            api_key: API key de remove.bg ('api', 'hybrid' y los backends 'api' de la cadena)
+            fallback: Usar la cadena de fallback (default: USE_FALLBACK_CHAIN)
+            remover_type: 'tutanchacon', 'api' o 'hybrid' (default: REMOVER_TYPE)
+        """
+        from src.background_remover_factory import BackgroundRemoverFactory
+        remover_type = remover_type or cls.REMOVER_TYPE
+        config = cls._local_config(workers, forked, preset)
+        if cls.USE_FALLBACK_CHAIN if fallback is None else fallback:
+            return BackgroundRemoverFactory.create_fallback_chain(
+                api_key=api_key, **{**cls.get_fallback_config(), **config})
+        if remover_type == 'api':
+            return BackgroundRemoverFactory.create_remover('api', api_key=api_key, **cls.get_api_config())
+        if remover_type == 'hybrid':
+            return BackgroundRemoverFactory.create_remover('hybrid', api_key=api_key,
+                                                           **{**cls.get_hybrid_config(), **config})
+        return BackgroundRemoverFactory.create_remover(remover_type, **config)
+    
+    @classmethod
+    def get_api_config(cls):
+        """Obtiene la configuración para RemoveBgService (sin la API key)."""
+        return {
+            'requests_per_minute': cls.API_REQUESTS_PER_MINUTE,
+            'max_workers': cls.API_MAX_WORKERS,
+            'max_retries': cls.API_MAX_RETRIES,
+            'timeout': cls.API_TIMEOUT,
+            'cache_dir': cls.API_CACHE_DIR,
+            'cache_max_bytes': cls.API_CACHE_MAX_MB * 1024 * 1024
+        }
+    
+    @classmethod
+    def get_hybrid_config(cls):
+        """Obtiene la configuración para HybridBackgroundRemover (sin la API key)."""
+        return {
+            **cls.get_tutanchacon_config(),
+            'local_concurrency': cls.HYBRID_LOCAL_CONCURRENCY,
+            'api_credit_budget': cls.HYBRID_API_CREDIT_BUDGET,
+            'api_config': cls.get_api_config()
+        }
+    
+    @classmethod
+    def get_fallback_config(cls):
+        """Obtiene la configuración para la cadena de fallback (sin la API key)."""
+        return {
+            'remover_types': list(cls.FALLBACK_CHAIN),
+            'call_timeout': cls.FALLBACK_CALL_TIMEOUT,
+            'failure_threshold': cls.FALLBACK_FAILURE_THRESHOLD,
+            'recovery_timeout': cls.FALLBACK_RECOVERY_TIMEOUT,
+            'api_config': cls.get_api_config(),
+            **cls.get_tutanchacon_config()
+        }
     
     @classmethod
     def get_available_presets(cls):
@@ -109,5 +297,15 @@ class BackgroundRemoverConfig:
             print(f"Configuración TutanchaconBgRemover{preset_info}:")
             for key, value in config.items():
                 print(f"  {key}: {value}")
+        elif cls.REMOVER_TYPE == 'hybrid':
+            print("Configuración HybridBackgroundRemover:")
+            for key, value in cls.get_hybrid_config().items():
+                print(f"  {key}: {value}")
+        elif cls.REMOVER_TYPE == 'api':
+            print("Configuración RemoveBgService:")
+            for key, value in cls.get_api_config().items():
+                print(f"  {key}: {value}")
+        if cls.USE_FALLBACK_CHAIN:
+            print(f"Cadena de fallback: {' -> '.join(cls.FALLBACK_CHAIN)}")
         
         print("=" * 50)
@@ -0,0 +1,124 @@
+"""
+Cola de trabajos persistente para procesar el directorio de aprobadas con varios workers.
+
+La cola es un archivo SQLite; con el archivo en un montaje compartido, cualquier
+número de workers en cualquier host con ese montaje puede consumirla.
+
+Uso:
+    python job_worker.py enqueue                 # encola las imágenes de APPROVED_IMAGES_DIR
+    python job_worker.py enqueue --shard 0/4     # encola solo el shard 0 de 4 (una cola por nodo)
+    python job_worker.py work                    # procesa hasta vaciar la cola
+    python job_worker.py work --follow           # sigue esperando trabajos nuevos
+    python job_worker.py status                  # trabajos por estado y dead-letters
+    python job_worker.py retry-dead              # reintenta los trabajos en dead-letter
+"""
+
+import argparse
+import os
+
+from config import Config
+from src.image_scanner import scan_images
+from src.job_queue import JobQueue, JobWorker, default_worker_id
+from src.sharding import filter_shard, parse_shard
+
+DEFAULT_DB_NAME = '.jobs.sqlite3'
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cola de trabajos persistente de procesamiento de avatares")
+    parser.add_argument('--db', help=f"Archivo SQLite de la cola (default: CROPPED_IMAGES_DIR/{DEFAULT_DB_NAME})")
+    parser.add_argument('--lease-seconds', type=float, default=300,
+                        help="Duración del lease sin heartbeat (default: 300)")
+    parser.add_argument('--max-attempts', type=int, default=3,
+                        help="Intentos antes de mover un trabajo a dead-letter (default: 3)")
+    parser.add_argument('--wal', action='store_true',
+                        help="journal_mode=WAL (más rápido; solo si todos los workers están en el mismo host)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    enqueue = subparsers.add_parser('enqueue', help="Encola las imágenes del directorio de aprobadas")
+    enqueue.add_argument('--shard', type=parse_shard, default=None, metavar='i/N',
+                         help="Encolar solo las imágenes del shard i de N (i desde 0)")
+
+    work = subparsers.add_parser('work', help="Procesa trabajos de la cola")
+    work.add_argument('--worker-id', default=None, help="Identificador del worker (default: host:pid)")
+    work.add_argument('--batch', type=int, default=1, help="Trabajos reservados por lease (default: 1)")
+    work.add_argument('--follow', action='store_true', help="Esperar trabajos nuevos al vaciarse la cola")
+    work.add_argument('--idle-sleep', type=float, default=5.0,
+                      help="Espera entre consultas con la cola vacía en modo --follow (default: 5)")
+    work.add_argument('--on-demand', action='store_true', help="Guardar solo el master de cada imagen")
+    work.add_argument('--no-warmup', action='store_true', help="No ejecutar la inferencia de calentamiento")
+    work.add_argument('--fallback', action='store_true', default=None,
+                      help="Usar la cadena de fallback de bg_remover_config (default: USE_FALLBACK_CHAIN)")
+
+    subparsers.add_parser('status', help="Muestra los trabajos por estado")
+    subparsers.add_parser('retry-dead', help="Devuelve los trabajos de dead-letter a pendientes")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    input_directory = Config.APPROVED_IMAGES_DIR
+    output_directory = Config.CROPPED_IMAGES_DIR
+    queue = JobQueue(
+        args.db or os.path.join(output_directory, DEFAULT_DB_NAME),
+        lease_seconds=args.lease_seconds,
+        max_attempts=args.max_attempts,
+        wal=args.wal
+    )
+
+    if args.command == 'enqueue':
+        entries = scan_images(input_directory)
+        if args.shard is not None:
+            entries = filter_shard(entries, *args.shard)
+        added = queue.enqueue(
+            (entry.path, os.path.join(output_directory, entry.relative_dir), output_directory)
+            for entry in entries
+        )
+        print(f"📥 {added} trabajos nuevos ({len(entries) - added} ya estaban en la cola)")
+
+    elif args.command == 'work':
+        # importación diferida: status/enqueue no necesitan cargar los modelos
+        import cv2
+        from bg_remover_config import BackgroundRemoverConfig
+        from src.face_detector import FaceDetector
+        from src.image_processor import ImageProcessor
+        from src.proportional_image_resizer import ProportionalImageResizer
+
+        # el mismo removedor que resize_images.py: las imágenes diferidas al carril lento
+        # se procesan con el modelo configurado, no con el rápido ni con el de bgremover
+        processor = ImageProcessor(
+            ProportionalImageResizer(),
+            FaceDetector(cv2.data.haarcascades + Config.HAAR_CASCADE_PATH),
+            bg_remover=BackgroundRemoverConfig.create_remover(api_key=Config.get_remove_bg_api_key(),
+                                                              fallback=args.fallback)
+        )
+        if not args.no_warmup:
+            processor.warm_up()
+        worker = JobWorker(
+            queue, processor,
+            worker_id=args.worker_id or default_worker_id(),
+            task_method='create_master' if args.on_demand else 'process_image'
+        )
+        print(f"👷 Worker {worker.worker_id} consumiendo {queue.db_path}")
+        try:
+            result = worker.run(follow=args.follow, idle_sleep=args.idle_sleep, batch_size=args.batch)
+        except KeyboardInterrupt:
+            # los trabajos con lease se recuperan cuando caduque
+            result = {'completed': worker.completed, 'failed': worker.failed}
+        print(f"📈 Worker {worker.worker_id}: {result['completed']} completados, {result['failed']} fallidos")
+
+    elif args.command == 'status':
+        stats = queue.get_stats()
+        print("📊 Estado de la cola:")
+        for status in ('pending', 'leased', 'done', 'dead'):
+            print(f"   {status}: {stats[status]}")
+        print(f"   total: {stats['total']}")
+        for job in queue.dead_letters():
+            print(f"☠️ {job['image_path']} ({job['attempts']} intentos): {job['last_error']}")
+
+    elif args.command == 'retry-dead':
+        print(f"🔁 {queue.retry_dead()} trabajos devueltos a pendientes")
+
+
+if __name__ == "__main__":
+    main()
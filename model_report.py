@@ -0,0 +1,169 @@
+"""
+Informe de velocidad y precisión de las variantes de los modelos de segmentación.
+
+Para cada modelo compara las variantes 'fp32', 'int8' y 'optimized' sobre un
+conjunto local de imágenes: milisegundos por imagen y IoU de la máscara frente
+a la salida del modelo original (fp32).
+
+Uso:
+    python model_report.py
+    python model_report.py --models u2net isnet-general-use --samples p2_approvedimages --limit 10
+    python model_report.py --json model_report.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from bg_remover_config import BackgroundRemoverConfig
+from src.model_optimizer import MODEL_VARIANTS
+from src.segmentation_session import create_segmentation_session, predict_mask
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+def load_samples(samples_dir: str, limit: int) -> list:
+    """Carga hasta `limit` imágenes de muestra en memoria."""
+    paths = []
+    for root, _, files in os.walk(samples_dir):
+        for filename in sorted(files):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, filename))
+    paths = sorted(paths)[:limit]
+
+    samples = []
+    for path in paths:
+        with Image.open(path) as image:
+            samples.append((path, image.convert('RGB')))
+    return samples
+
+
+def mask_iou(mask_a: Image.Image, mask_b: Image.Image, threshold: int = 128) -> float:
+    """IoU entre dos máscaras binarizadas."""
+    a = np.asarray(mask_a) >= threshold
+    b = np.asarray(mask_b) >= threshold
+    union = np.logical_or(a, b).sum()
+    if union == 0:
+        return 1.0
+    return float(np.logical_and(a, b).sum() / union)
+
+
+def evaluate_variant(model_name: str, variant: str, samples: list, reference_masks: dict) -> dict:
+    """
+    Mide ms/imagen e IoU de una variante frente a las máscaras de referencia.
+
+    Sin máscaras de referencia (falló la ejecución fp32) el IoU de las otras variantes es None.
+    """
+    session = create_segmentation_session(model_name, variant)
+
+    # Inferencia de calentamiento (no se mide)
+    predict_mask(session, samples[0][1])
+
+    timings = []
+    ious = []
+    masks = {}
+    for path, image in samples:
+        start = time.perf_counter()
+        mask = predict_mask(session, image)
+        timings.append((time.perf_counter() - start) * 1000)
+        masks[path] = mask
+        if path in reference_masks:
+            ious.append(mask_iou(mask, reference_masks[path]))
+
+    if variant == 'fp32':
+        # fp32 es la referencia
+        mean_iou = min_iou = 1.0
+    else:
+        mean_iou = float(np.mean(ious)) if ious else None
+        min_iou = float(np.min(ious)) if ious else None
+    return {
+        'model': model_name,
+        'variant': variant,
+        'images': len(samples),
+        'ms_per_image': float(np.mean(timings)),
+        'ms_p95': float(np.percentile(timings, 95)),
+        'mean_iou': mean_iou,
+        'min_iou': min_iou,
+        'masks': masks
+    }
+
+
+def run_report(models: list, variants: list, samples_dir: str, limit: int) -> list:
+    samples = load_samples(samples_dir, limit)
+    if not samples:
+        raise FileNotFoundError(f"No hay imágenes de muestra en {samples_dir}")
+
+    print(f"📸 {len(samples)} imágenes de muestra en {samples_dir}")
+    results = []
+    for model_name in models:
+        # fp32 siempre primero: es la referencia para el IoU
+        ordered = ['fp32'] + [v for v in variants if v != 'fp32']
+        reference_masks = {}
+        for variant in ordered:
+            print(f"⏱️ Evaluando {model_name} ({variant})...")
+            try:
+                result = evaluate_variant(model_name, variant, samples, reference_masks)
+            except Exception as e:
+                print(f"❌ {model_name} ({variant}): {e}")
+                if variant == 'fp32':
+                    print(f"⚠️ Sin referencia fp32: no se calcula el IoU de las variantes de {model_name}")
+                continue
+            masks = result.pop('masks')
+            if variant == 'fp32':
+                reference_masks = masks
+            if variant in variants:
+                results.append(result)
+    return results
+
+
+def print_report(results: list) -> None:
+    print("\n" + "=" * 72)
+    print("📊 INFORME DE VARIANTES DE MODELO")
+    print("=" * 72)
+    print(f"{'Modelo':<22}{'Variante':<12}{'ms/img':>10}{'p95 ms':>10}{'IoU medio':>11}{'IoU mín':>9}")
+    print("-" * 72)
+    baselines = {r['model']: r['ms_per_image'] for r in results if r['variant'] == 'fp32'}
+    for r in results:
+        speedup = ""
+        if r['model'] in baselines and r['variant'] != 'fp32':
+            speedup = f"  x{baselines[r['model']] / r['ms_per_image']:.2f}"
+        mean_iou = f"{r['mean_iou']:.4f}" if r['mean_iou'] is not None else "n/d"
+        min_iou = f"{r['min_iou']:.4f}" if r['min_iou'] is not None else "n/d"
+        print(f"{r['model']:<22}{r['variant']:<12}{r['ms_per_image']:>10.1f}{r['ms_p95']:>10.1f}"
+              f"{mean_iou:>11}{min_iou:>9}{speedup}")
+    print("=" * 72)
+
+
+def main():
+    default_models = sorted({preset['model_name'] for preset in BackgroundRemoverConfig.PRESETS.values()})
+
+    parser = argparse.ArgumentParser(description="Compara variantes fp32/int8/optimized de los modelos de segmentación")
+    parser.add_argument('--models', nargs='+', default=default_models, help="Modelos de rembg a evaluar")
+    parser.add_argument('--variants', nargs='+', default=list(MODEL_VARIANTS), choices=MODEL_VARIANTS)
+    parser.add_argument('--samples', default='p2_approvedimages', help="Directorio con imágenes de muestra")
+    parser.add_argument('--limit', type=int, default=20, help="Máximo de imágenes a evaluar")
+    parser.add_argument('--json', dest='json_path', help="Guardar los resultados en un archivo JSON")
+    args = parser.parse_args()
+
+    try:
+        results = run_report(args.models, args.variants, args.samples, args.limit)
+    except (FileNotFoundError, ImportError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    print_report(results)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Resultados guardados en {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,39 +1,308 @@
 from src.proportional_image_resizer import ProportionalImageResizer
 from src.face_detector import FaceDetector
 from src.image_processor import ImageProcessor
+from src.worker_pool import PreloadedWorkerPool
+from src.staged_pipeline import StagedPipeline
+from src.image_scanner import scan_images
+from src.watch_daemon import WatchDaemon
+from src.sharding import filter_shard, parse_shard, write_manifest
+from src.tracing import get_tracer, span
+from src.profiling import get_profiler, summarize
+from src.memory_monitor import MemoryReport, MemoryTracker
+from src.progress import ProgressReporter, result_status
+from src.time_budget import BudgetLog, TimeBudget
+from src.job_queue import JobQueue
+from src.quarantine import Quarantine
+from bg_remover_config import BackgroundRemoverConfig
 from config import Config
+import argparse
 import cv2
 import os
 import time
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Remueve fondos y genera los recortes de avatar")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Procesos worker con modelos precargados y compartidos (default: 1)")
+    parser.add_argument('--no-warmup', action='store_true',
+                        help="No ejecutar la inferencia de calentamiento (en el padre antes del fork o en el daemon)")
+    parser.add_argument('--render-workers', type=int, default=0,
+                        help="Procesos de renderizado separados de la segmentación; las imágenes "
+                             "pasan entre etapas por memoria compartida (default: 0, sin separar)")
+    parser.add_argument('--ring-mb', type=float, default=None,
+                        help="Memoria compartida total entre etapas con --render-workers, en MB (default: la mitad "
+                             "del espacio libre de /dev/shm, hasta 1024); "
+                             "las imágenes que no caben en un slot viajan serializadas")
+    parser.add_argument('--prefetch', type=int, default=4,
+                        help="Imágenes leídas por adelantado mientras se procesa la actual (default: 4)")
+    parser.add_argument('--watch', action='store_true',
+                        help="Modo daemon: vigila el directorio de aprobadas y procesa las imágenes al llegar")
+    parser.add_argument('--debounce', type=float, default=2.0,
+                        help="Segundos sin cambios antes de procesar una imagen en modo --watch (default: 2)")
+    parser.add_argument('--poll-interval', type=float, default=1.0,
+                        help="Intervalo de sondeo si inotify no está disponible (default: 1)")
+    parser.add_argument('--on-demand', action='store_true',
+                        help="Guardar solo el master recortado y la posición de la cara; los tamaños "
+                             "se renderizan al pedirlos (avatar_server.py --renditions-dir)")
+    parser.add_argument('--shard', default=None, metavar='i/N',
+                        help="Procesar solo el shard i de N (i desde 0) y escribir su manifiesto; "
+                             "varios hosts con el mismo N se reparten el árbol sin coordinarse")
+    parser.add_argument('--metrics', default=None, metavar='ARCHIVO',
+                        help="Guardar los tiempos por etapa y contadores al terminar "
+                             "(formato Prometheus si termina en .prom, JSON en otro caso)")
+    parser.add_argument('--trace', default=None, metavar='ARCHIVO',
+                        help="Guardar spans por imagen y por etapa en formato Chrome trace "
+                             "(abrir en chrome://tracing o ui.perfetto.dev)")
+    parser.add_argument('--profile', action='store_true',
+                        help="Perfilar con cProfile (y tracemalloc cada 100 imágenes) en el padre y en "
+                             "cada worker; los .prof y el resumen quedan en CROPPED_IMAGES_DIR/.profile")
+    parser.add_argument('--profile-every', type=int, default=1, metavar='N',
+                        help="Perfilar una de cada N imágenes (default: 1)")
+    parser.add_argument('--profile-stages', default=None, metavar='ETAPAS',
+                        help="Perfilar solo estas etapas, separadas por comas (p. ej. segmentation,encode)")
+    parser.add_argument('--tracemalloc-every', type=int, default=None, metavar='N',
+                        help="Snapshot de tracemalloc cada N imágenes (default: 100 con --profile; 0 lo desactiva)")
+    parser.add_argument('--profile-dir', default=None, help="Directorio de los perfiles")
+    parser.add_argument('--long-run', action='store_true',
+                        help="Lotes largos: muestrear la memoria de cada proceso y contar objetos vivos "
+                             "por tipo para detectar los que no dejan de crecer")
+    parser.add_argument('--memory-every', type=int, default=100, metavar='N',
+                        help="Muestra de memoria cada N imágenes por proceso (default: 100)")
+    parser.add_argument('--max-worker-rss', type=float, default=None, metavar='MB',
+                        help="Reciclar el worker que supere este RSS; el reemplazo se crea con fork "
+                             "desde el padre con los modelos ya cargados (requiere --workers > 1 o --isolate)")
+    parser.add_argument('--memory-report', default=None, metavar='ARCHIVO',
+                        help="Guardar las muestras de memoria, reciclados y objetos en crecimiento en JSON")
+    parser.add_argument('--no-progress', action='store_true',
+                        help="No mostrar la barra de progreso (ni líneas periódicas si la salida no es una terminal)")
+    parser.add_argument('--status-file', default=None, metavar='ARCHIVO',
+                        help="Reescribir periódicamente el progreso en JSON (contadores, img/s, ETA, medias por etapa)")
+    parser.add_argument('--progress-interval', type=float, default=1.0, metavar='SEG',
+                        help="Segundos entre refrescos de la barra y del archivo de estado (default: 1)")
+    parser.add_argument('--image-budget', type=float, default=None, metavar='SEG',
+                        help="Presupuesto por imagen: las que se estiman más lentas se segmentan con el preset "
+                             "rápido (o se difieren) y, si ya lo superaron, se omite la búsqueda de cara en la "
+                             "imagen completa")
+    parser.add_argument('--batch-budget', type=float, default=None, metavar='SEG',
+                        help="Presupuesto del lote: desde el 80%% se usa el preset rápido y, agotado, "
+                             "las imágenes restantes se difieren al carril lento")
+    parser.add_argument('--fallback', action='store_true', default=None,
+                        help="Usar la cadena de fallback de bg_remover_config (FALLBACK_CHAIN) con circuit "
+                             "breakers en lugar de un único removedor (default: USE_FALLBACK_CHAIN)")
+    parser.add_argument('--fast-preset', default='procesamiento_rapido',
+                        choices=sorted(BackgroundRemoverConfig.PRESETS) + ['none'],
+                        help="Preset del removedor rápido para degradar (default: procesamiento_rapido; "
+                             "none = no degradar)")
+    parser.add_argument('--slow-lane', default=None, metavar='DB',
+                        help="Cola SQLite de las imágenes diferidas (default: CROPPED_IMAGES_DIR/.slow_lane.sqlite3; "
+                             "none = no diferir); se procesa con job_worker.py --db DB work")
+    parser.add_argument('--budget-log', default=None, metavar='ARCHIVO',
+                        help="Guardar las decisiones de presupuesto (imagen, decisión, motivo) en JSON Lines")
+    parser.add_argument('--isolate', action='store_true',
+                        help="Procesar cada imagen en un worker aislado aunque --workers sea 1: un crash "
+                             "nativo (OpenCV, ONNX) solo cuesta esa imagen y el worker se reemplaza")
+    parser.add_argument('--image-timeout', type=float, default=None, metavar='SEG',
+                        help="Tiempo máximo por imagen: el worker que lo supera se mata y se reemplaza "
+                             "con los modelos precargados (implica --isolate)")
+    parser.add_argument('--quarantine-dir', default=None, metavar='DIR',
+                        help="Copia de las imágenes que fallan y su registro quarantine.jsonl "
+                             "(default: CROPPED_IMAGES_DIR/.quarantine)")
+    parser.add_argument('--retry-quarantined', action='store_true',
+                        help="Procesar también las imágenes en cuarentena (por defecto se omiten mientras no cambien)")
+    args = parser.parse_args(argv)
+    if args.image_timeout is not None:
+        args.isolate = True
+    if args.on_demand and args.render_workers > 0:
+        parser.error("--on-demand no admite --render-workers")
+    if args.max_worker_rss is not None and ((args.workers < 2 and not args.isolate) or args.render_workers > 0):
+        parser.error("--max-worker-rss requiere --workers > 1 o --isolate, sin --render-workers")
+    if (args.long_run or args.memory_report) and args.render_workers > 0:
+        parser.error("--long-run y --memory-report no admiten --render-workers")
+    if (args.image_budget is not None or args.batch_budget is not None) and (args.render_workers > 0 or args.watch):
+        parser.error("--image-budget y --batch-budget no admiten --render-workers ni --watch")
+    if args.isolate and args.render_workers > 0:
+        parser.error("--isolate e --image-timeout no admiten --render-workers")
+    if args.shard is not None:
+        if args.watch:
+            parser.error("--shard no admite --watch")
+        try:
+            args.shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+    return args
+
+def create_progress(args, total_images, metrics):
+    """Progreso del lote (None con --no-progress y sin --status-file)."""
+    if args.no_progress and not args.status_file:
+        return None
+    return ProgressReporter(total_images, status_path=args.status_file, refresh_seconds=args.progress_interval,
+                            metrics=metrics, display=not args.no_progress)
+
+def create_time_budget(args, output_directory, forked=False):
+    """Presupuestos de tiempo del lote (None sin --image-budget ni --batch-budget)."""
+    if args.image_budget is None and args.batch_budget is None:
+        return None
+    fast_remover = None
+    if args.fast_preset != 'none':
+        # se crea en el padre antes del fork: los workers heredan el modelo rápido cargado;
+        # es siempre el modelo local, sea cual sea REMOVER_TYPE
+        try:
+            fast_remover = BackgroundRemoverConfig.create_remover(args.workers, forked=forked,
+                                                                  preset=args.fast_preset,
+                                                                  remover_type='tutanchacon', fallback=False)
+        except ImportError as e:
+            print(f"⚠️ Sin removedor rápido ({e}): las imágenes fuera de presupuesto se difieren")
+    slow_lane = None
+    if args.slow_lane != 'none':
+        slow_lane_path = args.slow_lane or os.path.join(output_directory, '.slow_lane.sqlite3')
+        slow_lane = JobQueue(slow_lane_path)
+        print(f"🐢 Carril lento: {slow_lane_path} (python job_worker.py --db {slow_lane_path} work)")
+    return TimeBudget(image_seconds=args.image_budget, batch_seconds=args.batch_budget,
+                      fast_remover=fast_remover, slow_lane=slow_lane)
+
+def main(argv=None):
+    args = parse_args(argv)
     input_directory = Config.APPROVED_IMAGES_DIR
     output_directory = Config.CROPPED_IMAGES_DIR
 
     os.makedirs(output_directory, exist_ok=True)
 
-    print("🔧 Usando bgremover directamente")
+    print(f"🔧 Removedor de fondos según bg_remover_config ({BackgroundRemoverConfig.REMOVER_TYPE}: "
+          f"preset, variante del modelo y teselas)")
     print("=" * 50)
     
-    # Contar imágenes de entrada
-    total_images = 0
-    for root, _, files in os.walk(input_directory):
-        for filename in files:
-            if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                total_images += 1
+    if args.watch:
+        # modo daemon: los modelos quedan cargados y calientes entre imágenes
+        image_resizer = ProportionalImageResizer()
+        face_detector = FaceDetector(cv2.data.haarcascades + Config.HAAR_CASCADE_PATH)
+        daemon = WatchDaemon(
+            ImageProcessor(image_resizer, face_detector, bg_remover=BackgroundRemoverConfig.create_remover(
+                api_key=Config.get_remove_bg_api_key(), fallback=args.fallback)),
+            input_directory,
+            output_directory,
+            debounce_seconds=args.debounce,
+            poll_interval=args.poll_interval,
+            on_demand=args.on_demand
+        )
+        daemon.run(warm_up=not args.no_warmup)
+        return
+    
+    # Descubrir las imágenes de entrada en un solo recorrido
+    entries = scan_images(input_directory)
+    if args.shard is not None:
+        shard_index, num_shards = args.shard
+        print(f"🧩 Shard {shard_index}/{num_shards}: {len(entries)} imágenes en el árbol")
+        entries = filter_shard(entries, shard_index, num_shards)
+    quarantine = Quarantine(args.quarantine_dir or os.path.join(output_directory, '.quarantine'), input_directory)
+    if not args.retry_quarantined:
+        entries, quarantined = quarantine.filter(entries)
+        if quarantined:
+            print(f"🚫 {len(quarantined)} imágenes en cuarentena omitidas ({quarantine.log_path}; "
+                  f"--retry-quarantined para reintentarlas)")
+    total_images = len(entries)
     
     print(f"📊 Total de imágenes a procesar: {total_images}")
     print("⏱️ Iniciando procesamiento...")
     
     # Iniciar timer
     start_time = time.time()
+    if args.trace:
+        get_tracer().enable(process_name='main')
+    tracemalloc_every = args.tracemalloc_every
+    if tracemalloc_every is None:
+        tracemalloc_every = 100 if args.profile else 0
+    profile_dir = args.profile_dir or os.path.join(output_directory, '.profile')
+    if args.profile or tracemalloc_every:
+        get_profiler().configure(
+            profile_dir,
+            cprofile=args.profile,
+            sample_every=args.profile_every,
+            stages=args.profile_stages.split(',') if args.profile_stages else None,
+            tracemalloc_every=tracemalloc_every
+        )
+    
+    memory = None
+    if args.long_run or args.max_worker_rss is not None or args.memory_report:
+        memory = MemoryTracker(
+            every=args.memory_every,
+            max_rss_bytes=int(args.max_worker_rss * 1024 * 1024) if args.max_worker_rss else 0,
+            track_objects=args.long_run
+        )
+    memory_report = MemoryReport()
+    # con workers los removedores se crean en el padre y se heredan con fork
+    forked = args.workers > 1 or args.render_workers > 0 or args.isolate
+    time_budget = create_time_budget(args, output_directory, forked=forked)
+    budget_log = BudgetLog()
     
     image_resizer = ProportionalImageResizer()
     face_detector = FaceDetector(cv2.data.haarcascades + Config.HAAR_CASCADE_PATH)
+    bg_remover = BackgroundRemoverConfig.create_remover(args.workers, forked=forked,
+                                                        api_key=Config.get_remove_bg_api_key(),
+                                                        fallback=args.fallback)
 
-    # proceso las imágenes directamente con bgremover integrado
-    processor = ImageProcessor(image_resizer, face_detector)
-    processor.process_images_with_bgremover(input_directory, output_directory)
+    if forked:
+        # proceso las imágenes en paralelo con los modelos precargados en el padre
+        tasks = [
+            (entry.path, os.path.join(output_directory, entry.relative_dir), output_directory)
+            for entry in entries
+        ]
+        
+        if args.render_workers > 0:
+            pool = StagedPipeline(
+                lambda: ImageProcessor(image_resizer, face_detector, bg_remover=bg_remover),
+                segment_workers=args.workers,
+                render_workers=args.render_workers,
+                warm_up=not args.no_warmup,
+                ring_bytes=int(args.ring_mb * 1024 * 1024) if args.ring_mb else None
+            )
+        else:
+            pool = PreloadedWorkerPool(
+                lambda: ImageProcessor(image_resizer, face_detector, bg_remover=bg_remover,
+                                       time_budget=time_budget),
+                workers=args.workers,
+                warm_up=not args.no_warmup,
+                task_method='create_master' if args.on_demand else 'process_image',
+                memory=memory,
+                image_timeout=args.image_timeout,
+                quarantine=quarantine
+            )
+            memory_report = pool.memory_report
+            budget_log = pool.budget_log
+        results = {}
+        progress = create_progress(args, total_images, pool.metrics)
+        with span('batch', images=total_images), pool:
+            pool.print_report()
+            for result in pool.map(tasks):
+                results[result['image_path']] = result['final_path']
+                if result['error']:
+                    print(f"❌ {result['image_path']}: {result['error']}")
+                if progress is not None:
+                    progress.update(result['image_path'], result_status(result['final_path'], result['error'],
+                                                                        result.get('deferred', False)))
+            if args.render_workers > 0:
+                pool.print_transport_report()
+        metrics = pool.metrics
+    else:
+        # proceso las imágenes directamente con bgremover integrado
+        processor = ImageProcessor(image_resizer, face_detector, bg_remover=bg_remover, time_budget=time_budget)
+        progress = create_progress(args, total_images, processor.metrics)
+        with span('batch', images=total_images):
+            results = processor.process_images_with_bgremover(input_directory, output_directory,
+                                                              entries=entries, prefetch=args.prefetch,
+                                                              on_demand=args.on_demand, memory=memory,
+                                                              progress=progress, quarantine=quarantine)
+        metrics = processor.metrics
+        for sample in memory.samples if memory is not None else ():
+            memory_report.add('main', sample)
+        if time_budget is not None:
+            budget_log.merge(time_budget.drain())
+    
+    if progress is not None:
+        progress.close()
+    
+    if args.shard is not None:
+        manifest = write_manifest(output_directory, shard_index, num_shards, entries, results, start_time)
+        print(f"🧾 Manifiesto del shard: {manifest}")
     
     # Calcular tiempo total
     end_time = time.time()
@@ -49,7 +318,29 @@ def main():
         avg_time = total_time / total_images
         print(f"⚡ Tiempo promedio por imagen: {avg_time:.2f} segundos")
         print(f"🚀 Velocidad: {total_images/total_time:.2f} imágenes/segundo")
+    metrics.print_report()
+    memory_report.print_report()
+    budget_log.print_report()
+    if quarantine.records:
+        print(f"🚫 Imágenes en cuarentena: {len(quarantine.records)} (registro: {quarantine.log_path})")
     print("=" * 50)
+    if args.metrics:
+        metrics.write(args.metrics)
+        print(f"📝 Métricas guardadas en {args.metrics}")
+    if args.memory_report:
+        memory_report.write(args.memory_report)
+        print(f"🧠 Informe de memoria guardado en {args.memory_report}")
+    if args.budget_log:
+        budget_log.write(args.budget_log)
+        print(f"⏳ Decisiones de presupuesto guardadas en {args.budget_log}")
+    if args.trace:
+        events = get_tracer().write(args.trace)
+        print(f"🧵 Traza guardada en {args.trace} ({events} eventos)")
+    if get_profiler().enabled:
+        get_profiler().dump()
+        summary = summarize(profile_dir)
+        if summary:
+            print(f"🔬 Perfiles en {profile_dir}, resumen: {summary}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
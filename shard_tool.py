@@ -0,0 +1,76 @@
+"""
+Herramientas para repartir el procesamiento entre varios nodos con resize_images.py --shard.
+
+Uso:
+    python shard_tool.py plan --shards 4      # imágenes asignadas a cada shard
+    python shard_tool.py verify --shards 4    # comprueba que los 4 shards forman un árbol completo
+"""
+
+import argparse
+import json
+import sys
+from collections import Counter
+
+from config import Config
+from src.image_scanner import scan_images
+from src.sharding import relative_image_path, shard_of, verify_shards
+
+PROBLEMS = (
+    ('missing_manifests', "Shards sin manifiesto"),
+    ('unassigned_inputs', "Imágenes que ningún shard procesó"),
+    ('duplicated_inputs', "Imágenes procesadas por más de un shard"),
+    ('misassigned_inputs', "Imágenes procesadas por un shard que no les corresponde"),
+    ('missing_outputs', "Imágenes sin carpeta de salida"),
+    ('shared_outputs', "Carpetas de salida compartidas por varias imágenes"),
+    ('orphan_outputs', "Carpetas de salida sin imagen de entrada"),
+)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Reparto de imágenes entre nodos por hash de la ruta")
+    parser.add_argument('--input-dir', default=None, help="Directorio de aprobadas (default: APPROVED_IMAGES_DIR)")
+    parser.add_argument('--output-dir', default=None, help="Directorio de recortes (default: CROPPED_IMAGES_DIR)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('plan', "Muestra cuántas imágenes corresponden a cada shard"),
+                            ('verify', "Verifica los manifiestos y el árbol de salida combinado")):
+        command = subparsers.add_parser(name, help=help_text)
+        command.add_argument('--shards', type=int, required=True, help="Número total de shards")
+    subparsers.choices['verify'].add_argument('--json', action='store_true', help="Imprimir el informe en JSON")
+    args = parser.parse_args(argv)
+    if args.shards < 1:
+        parser.error("--shards debe ser al menos 1")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    input_directory = args.input_dir or Config.APPROVED_IMAGES_DIR
+    output_directory = args.output_dir or Config.CROPPED_IMAGES_DIR
+
+    if args.command == 'plan':
+        entries = scan_images(input_directory)
+        counts = Counter(shard_of(relative_image_path(entry), args.shards) for entry in entries)
+        print(f"🧩 {len(entries)} imágenes en {args.shards} shards:")
+        for shard_index in range(args.shards):
+            print(f"   {shard_index}/{args.shards}: {counts.get(shard_index, 0)}")
+        return True
+
+    report = verify_shards(input_directory, output_directory, args.shards)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return report['ok']
+
+    print(f"🔎 {report['inputs']} imágenes de entrada, {args.shards} shards")
+    for key, label in PROBLEMS:
+        if report[key]:
+            print(f"❌ {label}: {len(report[key])}")
+            for item in report[key][:20]:
+                print(f"   {item}")
+    if report['failed_inputs']:
+        print(f"⚠️ Imágenes con error de remoción de fondo: {len(report['failed_inputs'])}")
+    print("✅ Los shards forman un árbol de salida completo" if report['ok'] else "❌ Verificación fallida")
+    return report['ok']
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -6,33 +6,63 @@ Este paquete proporciona herramientas para:
 - Detección facial
 - Redimensionado proporcional de imágenes
 - Procesamiento por lotes
+
+Los módulos se importan de forma diferida: `import src` no carga cv2, numpy,
+PIL ni requests hasta que se usa la clase que los necesita.
 """
 
+import importlib
+
 __version__ = "1.0.0"
 __author__ = "Avatar Image Processor Team"
 
-from .image_processor import ImageProcessor
-from .face_detector import FaceDetector
-from .remove_bg_service import RemoveBgService
-from .tutanchacon_bg_remover import TutanchaconBgRemover
-from .background_remover_factory import (
-    BackgroundRemoverFactory, 
-    create_best_available_remover,
-    create_tutanchacon_remover,
-    create_api_remover
-)
-from .proportional_image_resizer import ProportionalImageResizer
-from .avatar_size import AvatarSize
-
-__all__ = [
-    'ImageProcessor',
-    'FaceDetector', 
-    'RemoveBgService',
-    'TutanchaconBgRemover',
-    'BackgroundRemoverFactory',
-    'create_best_available_remover',
-    'create_tutanchacon_remover', 
-    'create_api_remover',
-    'ProportionalImageResizer',
-    'AvatarSize'
-]
+# Nombre exportado -> módulo que lo define
+_LAZY_IMPORTS = {
+    'ImageProcessor': '.image_processor',
+    'FaceDetector': '.face_detector',
+    'RemoveBgService': '.remove_bg_service',
+    'TutanchaconBgRemover': '.tutanchacon_bg_remover',
+    'HybridBackgroundRemover': '.hybrid_background_remover',
+    'FallbackBackgroundRemover': '.fallback_background_remover',
+    'BackgroundRemovalError': '.fallback_background_remover',
+    'BackgroundRemoverFactory': '.background_remover_factory',
+    'create_best_available_remover': '.background_remover_factory',
+    'create_tutanchacon_remover': '.background_remover_factory',
+    'create_api_remover': '.background_remover_factory',
+    'create_hybrid_remover': '.background_remover_factory',
+    'create_fallback_remover': '.background_remover_factory',
+    'scan_images': '.image_scanner',
+    'PrefetchingReader': '.image_scanner',
+    'FolderWatcher': '.folder_watcher',
+    'WatchDaemon': '.watch_daemon',
+    'AvatarService': '.avatar_service',
+    'AvatarRenderer': '.avatar_renditions',
+    'JobQueue': '.job_queue',
+    'JobWorker': '.job_queue',
+    'filter_shard': '.sharding',
+    'verify_shards': '.sharding',
+    'SharedFrameRing': '.shared_memory_transport',
+    'StagedPipeline': '.staged_pipeline',
+    'PipelineMetrics': '.metrics',
+    'get_tracer': '.tracing',
+    'get_profiler': '.profiling',
+    'run_benchmark': '.benchmark',
+    'generate_avatar': '.synthetic_avatars',
+    'ProportionalImageResizer': '.proportional_image_resizer',
+    'AvatarSize': '.avatar_size'
+}
+
+__all__ = list(_LAZY_IMPORTS)
+
+
+def __getattr__(name):
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
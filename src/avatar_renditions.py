@@ -0,0 +1,250 @@
+"""
+Renderizado bajo demanda de los tamaños de avatar a partir de un master.
+
+En lugar de generar los seis archivos por avatar, solo se guarda el master
+(imagen sin fondo recortada a su contenido), el centro de la cara y la posición
+del recorte dentro de la imagen original. Cada AvatarSize se renderiza al pedirlo
+sobre la geometría original, como en el modo completo, y se guarda en una caché
+LRU en memoria y en disco (ResponseCache), ambas acotadas en bytes.
+"""
+
+import io
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from PIL import Image
+
+from .avatar_size import AvatarSize
+from .response_cache import ResponseCache
+
+MASTER_FILENAME = 'master.png'
+METADATA_FILENAME = 'master.json'
+
+# Tamaño de cuerpo -> escalado del master del que se recorta
+BODY_SCALES = {
+    AvatarSize.S_204x350: AvatarSize.S_204x350,
+    AvatarSize.S_204x175: AvatarSize.S_204x350,
+    AvatarSize.S_136x234: AvatarSize.S_136x234,
+}
+# Tamaño de cara -> escalado sobre el que se centra en la cara (igual que el modo completo)
+FACE_SCALES = {
+    AvatarSize.S_86x86: AvatarSize.S_204x350,
+    AvatarSize.S_38x38: AvatarSize.S_136x234,
+}
+
+
+def content_box(image: Image.Image) -> Tuple[int, int, int, int]:
+    """Caja de los píxeles no transparentes (toda la imagen si no tiene alfa o está vacía)."""
+    bbox = image.getchannel('A').getbbox() if image.mode == 'RGBA' else None
+    return bbox or (0, 0) + image.size
+
+
+def trim_to_content(image: Image.Image) -> Image.Image:
+    """Recorta la imagen RGBA a la caja de los píxeles no transparentes."""
+    image = image if image.mode == 'RGBA' else image.convert('RGBA')
+    return image.crop(content_box(image))
+
+
+def restore_canvas(master: Image.Image, canvas_size: Optional[Tuple[int, int]],
+                   offset: Optional[Tuple[int, int]]) -> Image.Image:
+    """
+    Vuelve a colocar el master en un lienzo transparente del tamaño original, para
+    que los escalados tengan las mismas proporciones que en el modo completo.
+    Los masters sin esos metadatos se usan tal cual.
+    """
+    if canvas_size is None or tuple(canvas_size) == master.size:
+        return master
+    canvas = Image.new('RGBA', tuple(canvas_size), (0, 0, 0, 0))
+    canvas.paste(master, tuple(offset or (0, 0)))
+    return canvas
+
+
+def face_center_from_rect(face_rect, scale: AvatarSize) -> Tuple[float, float]:
+    """Centro normalizado (0-1) de un rectángulo de cara detectado sobre un escalado."""
+    x, y, w, h = face_rect
+    return ((x + w // 2) / scale.value[2], (y + h // 2) / scale.value[3])
+
+
+def save_master(folder: str, master: Image.Image, face_center: Optional[Tuple[float, float]],
+                canvas_size: Optional[Tuple[int, int]] = None, offset: Tuple[int, int] = (0, 0)) -> None:
+    """
+    Guarda el master y sus metadatos (el JSON se escribe al final y de forma atómica).
+
+    Args:
+        folder: Carpeta del avatar
+        master: Imagen recortada a su contenido
+        face_center: Centro normalizado de la cara sobre la imagen original, o None
+        canvas_size: Tamaño de la imagen original antes del recorte (default: el del master)
+        offset: Esquina superior izquierda del recorte dentro de la imagen original
+    """
+    os.makedirs(folder, exist_ok=True)
+    master.save(os.path.join(folder, MASTER_FILENAME))
+    metadata = {'size': list(master.size), 'face_center': list(face_center) if face_center else None,
+                'canvas_size': list(canvas_size or master.size), 'offset': list(offset)}
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(metadata, f)
+    os.replace(tmp_path, os.path.join(folder, METADATA_FILENAME))
+
+
+def render_rendition(master: Image.Image, face_center: Optional[Tuple[float, float]],
+                     size: AvatarSize) -> Optional[Image.Image]:
+    """
+    Renderiza un AvatarSize desde la imagen original (el master colocado con restore_canvas).
+
+    Returns:
+        Image.Image: El recorte, o None si es un tamaño de cara y no se detectó cara
+    """
+    if size in FACE_SCALES:
+        if face_center is None:
+            return None
+        scale = FACE_SCALES[size].value
+        scaled = master.resize((scale[2], scale[3]), Image.LANCZOS)
+        width, height = size.value[2], size.value[3]
+        # Centro el área en la cara y la mantengo dentro de la imagen
+        x = round(face_center[0] * scale[2]) - width // 2
+        y = round(face_center[1] * scale[3]) - height // 2
+        x = max(0, min(x, scale[2] - width))
+        y = max(0, min(y, scale[3] - height))
+        return scaled.crop((x, y, x + width, y + height))
+
+    scale = BODY_SCALES[size].value
+    scaled = master.resize((scale[2], scale[3]), Image.LANCZOS)
+    x, y, w, h = size.value
+    return scaled.crop((x, y, x + w, y + h))
+
+
+class MemoryCache:
+    """LRU en memoria acotada por el tamaño total de los valores en bytes."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[bytes]:
+        with self._lock:
+            content = self._entries.get(key)
+            if content is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return content
+
+    def put(self, key, content: bytes) -> None:
+        if len(content) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= len(previous)
+            self._entries[key] = content
+            self._total_bytes += len(content)
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted)
+                self.evictions += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'total_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+class AvatarRenderer:
+    """
+    Sirve los tamaños de avatar desde los masters de un directorio.
+
+    Un avatar se identifica por la ruta de su carpeta relativa a masters_dir
+    (p. ej. "equipo/ana"). Las claves de caché incluyen el mtime del master,
+    así que regenerarlo invalida sus renderizados anteriores.
+    """
+
+    def __init__(self, masters_dir: str, memory_max_bytes: int = 64 * 1024 * 1024,
+                 disk_cache_dir: Optional[str] = None, disk_max_bytes: int = 512 * 1024 * 1024):
+        """
+        Args:
+            masters_dir: Directorio con una carpeta por avatar (master.png + master.json)
+            memory_max_bytes: Límite de la caché en memoria
+            disk_cache_dir: Directorio de la caché en disco (None para desactivarla)
+            disk_max_bytes: Límite de la caché en disco
+        """
+        self.masters_dir = os.path.abspath(masters_dir)
+        self.memory_cache = MemoryCache(memory_max_bytes)
+        self.disk_cache = ResponseCache(disk_cache_dir, disk_max_bytes) if disk_cache_dir else None
+        self.renders = 0
+
+    def _master_folder(self, avatar_id: str) -> Optional[str]:
+        folder = os.path.abspath(os.path.join(self.masters_dir, avatar_id))
+        # No se permite salir de masters_dir con ".." o rutas absolutas
+        if os.path.commonpath([folder, self.masters_dir]) != self.masters_dir:
+            return None
+        return folder
+
+    def render(self, avatar_id: str, size: AvatarSize) -> Optional[bytes]:
+        """
+        Devuelve el PNG del tamaño pedido, renderizándolo si no está en caché.
+
+        Returns:
+            bytes: PNG del recorte, o None si el avatar no existe o no tiene cara
+        """
+        folder = self._master_folder(avatar_id)
+        if folder is None:
+            return None
+        master_path = os.path.join(folder, MASTER_FILENAME)
+        try:
+            version = os.stat(os.path.join(folder, METADATA_FILENAME)).st_mtime_ns
+        except OSError:
+            return None
+
+        memory_key = (avatar_id, size.name, version)
+        content = self.memory_cache.get(memory_key)
+        if content is not None:
+            return content
+
+        disk_key = ResponseCache.make_key(avatar_id.encode('utf-8'), {'size': size.name, 'version': version})
+        if self.disk_cache is not None:
+            content = self.disk_cache.get(disk_key)
+            if content is not None:
+                self.memory_cache.put(memory_key, content)
+                return content
+
+        with open(os.path.join(folder, METADATA_FILENAME)) as f:
+            metadata = json.load(f)
+        with Image.open(master_path) as master:
+            canvas = restore_canvas(master, metadata.get('canvas_size'), metadata.get('offset'))
+            rendition = render_rendition(canvas, metadata['face_center'], size)
+            canvas.close()
+        if rendition is None:
+            return None
+        buffer = io.BytesIO()
+        rendition.save(buffer, format='PNG')
+        content = buffer.getvalue()
+        self.renders += 1
+
+        self.memory_cache.put(memory_key, content)
+        if self.disk_cache is not None:
+            self.disk_cache.put(disk_key, content)
+        return content
+
+    def get_stats(self) -> dict:
+        return {
+            'renders': self.renders,
+            'memory': self.memory_cache.get_stats(),
+            'disk': self.disk_cache.get_stats() if self.disk_cache is not None else None
+        }
@@ -0,0 +1,436 @@
+"""
+Servicio HTTP local que genera el juego de avatares con los modelos residentes.
+
+POST /avatars recibe una imagen (cuerpo binario o multipart/form-data con el
+campo "image") y devuelve los recortes en un zip o en una respuesta
+multipart/mixed. Las peticiones que llegan con pocos milisegundos de diferencia
+se agrupan en un lote (MicroBatcher) para hacer una sola pasada de detección
+facial. GET /metrics devuelve latencias p50/p99, el tamaño medio de lote y los
+tiempos por etapa del procesador (en JSON, o en formato Prometheus con
+?format=prometheus).
+
+Con un AvatarRenderer, GET /avatars/<id>/<ancho>x<alto>.png renderiza un
+tamaño desde el master guardado en modo bajo demanda.
+"""
+
+import email
+import email.policy
+import io
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from .avatar_size import AvatarSize
+from .image_scanner import IMAGE_EXTENSIONS
+
+MAX_UPLOAD_BYTES = 32 * 1024 * 1024
+
+
+class LatencyStats:
+    """Latencias recientes (ventana acotada) con percentiles, segura entre hilos."""
+
+    def __init__(self, window: int = 10000):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def percentile(self, percent: float) -> float:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, int(round(percent / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            samples = list(self._samples)
+        return {
+            'count': self.count,
+            'mean_ms': round(1000 * sum(samples) / len(samples), 2) if samples else 0.0,
+            'p50_ms': round(1000 * self.percentile(50), 2),
+            'p99_ms': round(1000 * self.percentile(99), 2)
+        }
+
+
+class MicroBatcher:
+    """
+    Agrupa elementos enviados desde varios hilos y los procesa en lotes en un único hilo.
+
+    El lote se cierra al alcanzar max_batch_size o cuando pasan max_wait_ms desde
+    que llegó su primer elemento; así una petición aislada solo espera max_wait_ms.
+    """
+
+    def __init__(self, process_batch: Callable[[list], list], max_batch_size: int = 8, max_wait_ms: float = 5.0):
+        """
+        Args:
+            process_batch: Función que recibe una lista de elementos y devuelve un resultado por elemento
+            max_batch_size: Tamaño máximo de lote
+            max_wait_ms: Espera máxima para completar un lote
+        """
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item) -> Future:
+        """Encola un elemento y devuelve un Future con su resultado."""
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is None:
+                # Se reencola el aviso de cierre para salir tras este lote
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+            self.batches += 1
+            self.items += len(batch)
+            try:
+                results = self.process_batch([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    @property
+    def average_batch_size(self) -> float:
+        return self.items / self.batches if self.batches else 0.0
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+
+class AvatarService:
+    """
+    Envuelve un ImageProcessor en un servidor HTTP con los modelos cargados en memoria.
+    """
+
+    def __init__(self, processor, host: str = '127.0.0.1', port: int = 8080,
+                 max_batch_size: int = 8, max_wait_ms: float = 5.0, work_dir: Optional[str] = None,
+                 renderer=None):
+        """
+        Args:
+            processor: ImageProcessor (segment_image y render_avatars_batch)
+            host: Dirección de escucha
+            port: Puerto (0 elige uno libre)
+            max_batch_size: Peticiones máximas por lote
+            max_wait_ms: Espera máxima para agrupar peticiones
+            work_dir: Directorio para los temporales de cada petición
+            renderer: AvatarRenderer para servir tamaños desde masters (opcional)
+        """
+        self.processor = processor
+        self.work_dir = work_dir
+        self.renderer = renderer
+        self.latency = LatencyStats()
+        self.errors = 0
+        # los manejadores de ThreadingHTTPServer cuentan errores desde hilos distintos
+        self._errors_lock = threading.Lock()
+        self.batcher = MicroBatcher(self._process_batch, max_batch_size, max_wait_ms)
+        self.server = ThreadingHTTPServer((host, port), _AvatarRequestHandler)
+        self.server.daemon_threads = True
+        self.server.service = self
+        self._thread = None
+
+    @property
+    def server_address(self):
+        return self.server.server_address
+
+    def _process_batch(self, jobs: List[dict]) -> List[dict]:
+        """Segmenta cada imagen y renderiza las válidas con detección facial por lotes."""
+        results = [None] * len(jobs)
+        segmented = []
+        try:
+            for index, job in enumerate(jobs):
+                try:
+                    image = self.processor.segment_image(job['image_path'])
+                except Exception as e:
+                    results[index] = {'error': f"{type(e).__name__}: {e}"}
+                    continue
+                if image is None:
+                    results[index] = {'error': "error removiendo el fondo"}
+                else:
+                    segmented.append((index, (image, job['image_path'], job['output_subdir'], job['log_dir'])))
+
+            if segmented:
+                final_paths = self.processor.render_avatars_batch([item for _, item in segmented])
+                for (index, _), final_path in zip(segmented, final_paths):
+                    results[index] = {'final_path': final_path, 'error': None}
+        finally:
+            # el servicio vive mucho: las imágenes segmentadas no esperan al GC, aunque el lote falle
+            for _, (image, *_) in segmented:
+                image.close()
+        return results
+
+    def record_error(self) -> None:
+        with self._errors_lock:
+            self.errors += 1
+
+    def render(self, image_bytes: bytes, filename: str) -> dict:
+        """
+        Procesa una imagen subida y devuelve sus recortes en memoria.
+
+        Returns:
+            dict: face_detected, files ({nombre: bytes}) o error
+        """
+        request_dir = tempfile.mkdtemp(prefix='avatar_', dir=self.work_dir)
+        try:
+            image_path = os.path.join(request_dir, filename)
+            with open(image_path, 'wb') as f:
+                f.write(image_bytes)
+            job = {
+                'image_path': image_path,
+                'output_subdir': os.path.join(request_dir, 'out'),
+                'log_dir': request_dir
+            }
+            result = self.batcher.submit(job).result()
+            if result['error']:
+                return result
+            final_path = result['final_path']
+            files = {}
+            for name in sorted(os.listdir(final_path)):
+                with open(os.path.join(final_path, name), 'rb') as f:
+                    files[name] = f.read()
+            return {
+                'error': None,
+                'face_detected': not os.path.basename(final_path).startswith('error_'),
+                'files': files
+            }
+        finally:
+            shutil.rmtree(request_dir, ignore_errors=True)
+
+    def metrics(self) -> dict:
+        metrics = {
+            'requests': self.latency.to_dict(),
+            'errors': self.errors,
+            'batches': self.batcher.batches,
+            'average_batch_size': round(self.batcher.average_batch_size, 2)
+        }
+        if self.renderer is not None:
+            metrics['renditions'] = self.renderer.get_stats()
+        if getattr(self.processor, 'metrics', None) is not None:
+            metrics['pipeline'] = self.processor.metrics.to_dict()
+        return metrics
+
+    def prometheus_metrics(self) -> str:
+        """Métricas del servicio y del pipeline en el formato de texto de Prometheus."""
+        requests = self.latency.to_dict()
+        lines = [
+            "# TYPE avatar_service_requests_total counter",
+            f"avatar_service_requests_total {requests['count']}",
+            "# TYPE avatar_service_errors_total counter",
+            f"avatar_service_errors_total {self.errors}",
+            "# TYPE avatar_service_batches_total counter",
+            f"avatar_service_batches_total {self.batcher.batches}",
+        ]
+        text = "\n".join(lines) + "\n"
+        if getattr(self.processor, 'metrics', None) is not None:
+            text += self.processor.metrics.to_prometheus()
+        return text
+
+    def start(self) -> 'AvatarService':
+        """Atiende peticiones en un hilo en segundo plano."""
+        self._thread = threading.Thread(target=self.server.serve_forever, name="avatar-service", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        host, port = self.server_address[:2]
+        print(f"🌐 Servicio de avatares en http://{host}:{port}/avatars")
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            print("\n🛑 Servicio detenido")
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self.server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server.server_close()
+        self.batcher.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _safe_filename(name: Optional[str]) -> str:
+    name = os.path.basename(name or '') or 'upload.png'
+    if not name.lower().endswith(IMAGE_EXTENSIONS):
+        name = os.path.splitext(name)[0] + '.png'
+    return name
+
+
+def _parse_multipart(content_type: str, body: bytes):
+    """Devuelve (bytes, filename) del campo "image" (o de la primera parte con archivo)."""
+    message = email.message_from_bytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body, policy=email.policy.HTTP
+    )
+    fallback = None
+    for part in message.iter_parts():
+        if part.get_param('name', header='content-disposition') == 'image':
+            return part.get_payload(decode=True), part.get_filename()
+        if fallback is None and part.get_filename():
+            fallback = (part.get_payload(decode=True), part.get_filename())
+    return fallback or (None, None)
+
+
+class _AvatarRequestHandler(BaseHTTPRequestHandler):
+    server_version = "AvatarService/1.0"
+
+    def log_message(self, format, *args):
+        # Sin log por petición: con carga concurrente solo añade ruido
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[dict] = None) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        self._send(status, json.dumps(payload).encode(), 'application/json')
+
+    def do_GET(self):
+        service = self.server.service
+        url = urlparse(self.path)
+        path = url.path
+        if path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif path == '/metrics':
+            if parse_qs(url.query).get('format', ['json'])[0] == 'prometheus':
+                self._send(200, service.prometheus_metrics().encode(), 'text/plain; version=0.0.4')
+            else:
+                self._send_json(200, service.metrics())
+        elif path.startswith('/avatars/') and service.renderer is not None:
+            self._send_rendition(service, path[len('/avatars/'):])
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def _send_rendition(self, service, resource: str) -> None:
+        # /avatars/equipo/ana/86x86.png -> avatar "equipo/ana", tamaño S_86x86
+        avatar_id, _, name = resource.rpartition('/')
+        try:
+            size = AvatarSize[f"S_{name[:-len('.png')]}"] if name.endswith('.png') else None
+        except KeyError:
+            size = None
+        content = service.renderer.render(avatar_id, size) if avatar_id and size else None
+        if content is None:
+            self._send_json(404, {'error': 'avatar o tamaño no disponible'})
+            return
+        self._send(200, content, 'image/png', {'Cache-Control': 'public, max-age=3600'})
+
+    def do_POST(self):
+        service = self.server.service
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        if url.path != '/avatars':
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0 or length > MAX_UPLOAD_BYTES:
+            self._send_json(413 if length else 400, {'error': 'tamaño de imagen no válido'})
+            return
+        body = self.rfile.read(length)
+
+        query = parse_qs(url.query)
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('multipart/form-data'):
+            image_bytes, filename = _parse_multipart(content_type, body)
+            if image_bytes is None:
+                self._send_json(400, {'error': 'falta el campo "image"'})
+                return
+        else:
+            image_bytes, filename = body, query.get('filename', [None])[0]
+
+        try:
+            result = service.render(image_bytes, _safe_filename(filename))
+        except Exception as e:
+            result = {'error': f"{type(e).__name__}: {e}"}
+        if result['error']:
+            service.record_error()
+            self._send_json(422, {'error': result['error']})
+            return
+
+        headers = {
+            'X-Face-Detected': 'true' if result['face_detected'] else 'false',
+            'X-Processing-Ms': f"{1000 * (time.perf_counter() - start):.1f}"
+        }
+        if query.get('format', ['zip'])[0] == 'multipart':
+            body, content_type = _multipart_body(result['files'])
+        else:
+            body, content_type = _zip_body(result['files']), 'application/zip'
+        service.latency.record(time.perf_counter() - start)
+        self._send(200, body, content_type, headers)
+
+
+def _zip_body(files: dict) -> bytes:
+    buffer = io.BytesIO()
+    # Los PNG ya están comprimidos: se guardan sin recomprimir
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _multipart_body(files: dict):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, data in files.items():
+        parts.append(
+            f"--{boundary}\r\nContent-Type: image/png\r\n"
+            f"Content-Disposition: attachment; filename=\"{name}\"\r\n\r\n".encode() + data + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b''.join(parts), f"multipart/mixed; boundary={boundary}"
@@ -1,6 +1,35 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Tuple
 
 class BackgroundRemover(ABC):
     @abstractmethod
     def remove_background(self, input_path: str, output_path: str) -> None:
-        pass
\ No newline at end of file
+        pass
+
+    def remove_background_many(self, jobs: Iterable[Tuple[str, str]], max_workers: int = 1) -> List[bool]:
+        """
+        Procesa varias imágenes con concurrencia acotada.
+
+        Args:
+            jobs: Pares (input_path, output_path)
+            max_workers: Máximo de imágenes procesándose a la vez
+
+        Returns:
+            list: Un booleano por trabajo, en el mismo orden (True si tuvo éxito)
+        """
+        jobs = list(jobs)
+
+        def run(job):
+            input_path, output_path = job
+            try:
+                return self.remove_background(input_path, output_path) is not False
+            except Exception as e:
+                print(f"❌ Error procesando {input_path}: {e}")
+                return False
+
+        if max_workers <= 1 or len(jobs) <= 1:
+            return [run(job) for job in jobs]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(run, jobs))
@@ -6,6 +6,8 @@ Permite cambiar fácilmente entre diferentes implementaciones.
 from typing import Union, Optional
 from .background_remover import BackgroundRemover
 from .remove_bg_service import RemoveBgService
+from .hybrid_background_remover import HybridBackgroundRemover
+from .fallback_background_remover import FallbackBackgroundRemover
 
 # Importar TutanchaconBgRemover solo si está disponible
 try:
@@ -22,6 +24,7 @@ class BackgroundRemoverFactory:
     Soporta:
     - 'api': RemoveBgService (requiere API key)
     - 'tutanchacon': TutanchaconBgRemover (requiere bgremover instalado)
+    - 'hybrid': HybridBackgroundRemover (local + API, requiere ambos)
     """
     
     @staticmethod
@@ -34,8 +37,8 @@ class BackgroundRemoverFactory:
         Crea una instancia del removedor de fondo especificado.
         
         Args:
-            remover_type: Tipo de removedor ('api' o 'tutanchacon')
-            api_key: API key para RemoveBgService (requerida para type='api')
+            remover_type: Tipo de removedor ('api', 'tutanchacon' o 'hybrid')
+            api_key: API key para RemoveBgService (requerida para type='api' y 'hybrid')
             **kwargs: Argumentos adicionales para el removedor
             
         Returns:
@@ -49,7 +52,7 @@ class BackgroundRemoverFactory:
         if remover_type == 'api':
             if api_key is None:
                 raise ValueError("API key es requerida para RemoveBgService")
-            return RemoveBgService(api_key=api_key)
+            return RemoveBgService(api_key=api_key, **kwargs)
             
         elif remover_type == 'tutanchacon':
             if not TUTANCHACON_AVAILABLE:
@@ -70,22 +73,83 @@ class BackgroundRemoverFactory:
             config = {**default_config, **kwargs}
             return TutanchaconBgRemover(**config)
             
+        elif remover_type == 'hybrid':
+            if api_key is None:
+                raise ValueError("API key es requerida para HybridBackgroundRemover")
+            
+            # Separar los parámetros del enrutado de los de cada backend
+            hybrid_keys = ('local_concurrency', 'api_concurrency', 'api_credit_budget',
+                           'initial_local_latency', 'initial_api_latency', 'latency_smoothing')
+            hybrid_config = {key: kwargs.pop(key) for key in hybrid_keys if key in kwargs}
+            api_config = kwargs.pop('api_config', {})
+            
+            local_remover = BackgroundRemoverFactory.create_remover('tutanchacon', **kwargs)
+            api_remover = BackgroundRemoverFactory.create_remover('api', api_key=api_key, **api_config)
+            hybrid_config.setdefault('api_concurrency', api_remover.max_workers)
+            return HybridBackgroundRemover(local_remover, api_remover, **hybrid_config)
+            
         else:
-            available_types = ['api']
-            if TUTANCHACON_AVAILABLE:
-                available_types.append('tutanchacon')
+            available_types = BackgroundRemoverFactory.get_available_types()
                 
             raise ValueError(
                 f"Tipo de removedor no válido: {remover_type}. "
                 f"Tipos disponibles: {available_types}"
             )
     
+    @staticmethod
+    def create_fallback_chain(
+        remover_types: list,
+        api_key: Optional[str] = None,
+        call_timeout: Optional[float] = 60.0,
+        failure_threshold: int = 3,
+        recovery_timeout: float = 30.0,
+        api_config: Optional[dict] = None,
+        **kwargs
+    ) -> FallbackBackgroundRemover:
+        """
+        Crea una cadena de fallback con los tipos indicados, en orden de preferencia.
+        
+        Los tipos que no se pueden crear (no instalados o sin API key) se omiten.
+        
+        Args:
+            remover_types: Tipos de removedor en orden, p. ej. ['tutanchacon', 'api']
+            api_key: API key para los tipos que la requieren
+            call_timeout: Segundos máximos por llamada a cada backend
+            failure_threshold: Fallos consecutivos que abren el circuito de un backend
+            recovery_timeout: Segundos antes de volver a probar un backend abierto
+            api_config: Argumentos adicionales para RemoveBgService
+            **kwargs: Argumentos adicionales para TutanchaconBgRemover
+            
+        Raises:
+            ValueError: Si no se pudo crear ningún removedor de la cadena
+        """
+        removers = []
+        for remover_type in remover_types:
+            try:
+                if remover_type == 'api':
+                    remover = BackgroundRemoverFactory.create_remover('api', api_key=api_key, **(api_config or {}))
+                else:
+                    remover = BackgroundRemoverFactory.create_remover(remover_type, api_key=api_key, **kwargs)
+                removers.append((remover_type, remover))
+            except (ImportError, ValueError) as e:
+                print(f"⚠️ Se omite '{remover_type}' en la cadena de fallback: {e}")
+        
+        if not removers:
+            raise ValueError(f"No se pudo crear ningún removedor de la cadena: {remover_types}")
+        
+        return FallbackBackgroundRemover(
+            removers,
+            call_timeout=call_timeout,
+            failure_threshold=failure_threshold,
+            recovery_timeout=recovery_timeout
+        )
+    
     @staticmethod
     def get_available_types() -> list:
         """Retorna los tipos de removedores disponibles."""
         types = ['api']
         if TUTANCHACON_AVAILABLE:
-            types.append('tutanchacon')
+            types.extend(['tutanchacon', 'hybrid'])
         return types
     
     @staticmethod
@@ -94,9 +158,9 @@ class BackgroundRemoverFactory:
         return TUTANCHACON_AVAILABLE
 
 # Funciones de conveniencia
-def create_api_remover(api_key: str) -> RemoveBgService:
+def create_api_remover(api_key: str, **kwargs) -> RemoveBgService:
     """Crea un removedor usando la API de remove.bg"""
-    return BackgroundRemoverFactory.create_remover('api', api_key=api_key)
+    return BackgroundRemoverFactory.create_remover('api', api_key=api_key, **kwargs)
 
 def create_tutanchacon_remover(**kwargs):
     """Crea un removedor usando bgremover de tutanchacon"""
@@ -105,6 +169,14 @@ def create_tutanchacon_remover(**kwargs):
     except ImportError:
         return None
 
+def create_hybrid_remover(api_key: str, **kwargs) -> HybridBackgroundRemover:
+    """Crea un removedor híbrido que desborda a la API cuando el modelo local se satura"""
+    return BackgroundRemoverFactory.create_remover('hybrid', api_key=api_key, **kwargs)
+
+def create_fallback_remover(remover_types: list, api_key: Optional[str] = None, **kwargs) -> FallbackBackgroundRemover:
+    """Crea una cadena de fallback con circuit breakers a partir de tipos del factory"""
+    return BackgroundRemoverFactory.create_fallback_chain(remover_types, api_key=api_key, **kwargs)
+
 def create_best_available_remover(api_key: Optional[str] = None, **kwargs) -> BackgroundRemover:
     """
     Crea el mejor removedor disponible.
@@ -0,0 +1,289 @@
+"""
+Benchmarks por etapa del pipeline sobre avatares sintéticos.
+
+Mide, imagen a imagen y con repeticiones, la decodificación, los escalados,
+la detección facial, el recorte y codificación de los avatares, cada backend
+de BackgroundRemover y el pipeline completo. Si ISNet no está instalado, el
+pipeline usa StandInRemover, un sustituto rápido que recorta la figura por
+distancia al color del fondo. Los resultados son un dict serializable en JSON
+para comparar ejecuciones entre commits.
+"""
+
+import contextlib
+import io
+import os
+import platform
+import statistics
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from .avatar_size import AvatarSize
+from .background_remover import BackgroundRemover
+from .synthetic_avatars import AvatarSpec
+
+SCHEMA_VERSION = 1
+STAGES = ('decode', 'resize_proportional', 'resize_avatar', 'face_detection', 'crop_encode', 'remover', 'pipeline')
+
+# Rectángulos de cara fijos para medir el recorte sin depender del detector
+_FACE_RECT_86 = (59, 20, 86, 86)
+_FACE_RECT_38 = (49, 13, 38, 38)
+
+
+class StandInRemover(BackgroundRemover):
+    """
+    Sustituto rápido del modelo de segmentación: la figura es todo lo que se aleja
+    del color de fondo de su fila (mediana de los bordes izquierdo y derecho, que
+    sigue los degradados verticales). Las imágenes que ya tienen transparencia se conservan.
+    """
+
+    def __init__(self, threshold: int = 40):
+        self.threshold = threshold
+
+    def remove_background(self, input_path: str, output_path: str) -> bool:
+        with Image.open(input_path) as image:
+            rgba = np.array(image.convert('RGBA'))
+        if rgba[:, :, 3].min() == 255:
+            rgb = rgba[:, :, :3].astype(np.int16)
+            border = np.concatenate([rgb[:, :2], rgb[:, -2:]], axis=1)
+            background = np.median(border, axis=1)[:, None, :]
+            distance = np.abs(rgb - background).sum(axis=2)
+            rgba[:, :, 3] = np.where(distance > self.threshold, 255, 0)
+        Image.fromarray(rgba, 'RGBA').save(output_path, format='PNG')
+        return True
+
+
+class SkipStage(Exception):
+    """La etapa no se puede medir en esta máquina (modelo o dependencia ausente)."""
+
+
+def summarize_timings(seconds: List[float]) -> dict:
+    """Estadísticas de una lista de duraciones en segundos."""
+    ms = [1000 * value for value in seconds]
+    mean = statistics.fmean(ms)
+    return {
+        'samples': len(ms),
+        'mean_ms': round(mean, 4),
+        'median_ms': round(statistics.median(ms), 4),
+        'p95_ms': round(float(np.percentile(ms, 95)), 4),
+        'min_ms': round(min(ms), 4),
+        'max_ms': round(max(ms), 4),
+        'stdev_ms': round(statistics.stdev(ms), 4) if len(ms) > 1 else 0.0,
+        'images_per_second': round(1000 / mean, 3) if mean else 0.0
+    }
+
+
+def environment_info() -> dict:
+    """Versión de Python, plataforma y bibliotecas que afectan al rendimiento."""
+    import cv2
+    import PIL
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pillow': PIL.__version__,
+        'opencv': cv2.__version__
+    }
+
+
+def default_backends(api_key: Optional[str] = None) -> Dict[str, Callable[[], BackgroundRemover]]:
+    """
+    Backends de remoción de fondo a medir. La API de remove.bg solo se incluye con
+    api_key, porque cada imagen consume créditos.
+    """
+    def bgremover():
+        from bgremover_package import BackgroundRemover as BgRemoverPackage
+        return BgRemoverPackage()
+
+    def tutanchacon():
+        from .background_remover_factory import BackgroundRemoverFactory
+        return BackgroundRemoverFactory.create_remover('tutanchacon')
+
+    backends = {'stand-in': StandInRemover, 'bgremover': bgremover, 'tutanchacon': tutanchacon}
+    if api_key:
+        from .remove_bg_service import RemoveBgService
+        backends['api'] = lambda: RemoveBgService(api_key=api_key)
+    return backends
+
+
+class PipelineBenchmark:
+    """Ejecuta las etapas seleccionadas sobre un conjunto de avatares sintéticos ya escritos en disco."""
+
+    def __init__(self, specs: List[AvatarSpec], paths: List[str], work_dir: str, repeat: int = 3,
+                 face_detector=None, backends: Optional[Dict[str, Callable[[], BackgroundRemover]]] = None):
+        """
+        Args:
+            specs: Especificaciones de los avatares
+            paths: Ruta de cada avatar (mismo orden que specs)
+            work_dir: Directorio para las salidas temporales
+            repeat: Mediciones por imagen y etapa (tras una ejecución de calentamiento)
+            face_detector: FaceDetector a usar (por defecto uno con los modelos de ./model)
+            backends: Nombre -> fábrica de cada BackgroundRemover a medir
+        """
+        self.specs = specs
+        self.paths = paths
+        self.work_dir = work_dir
+        self.repeat = max(1, repeat)
+        self.face_detector = face_detector
+        self.backends = backends if backends is not None else default_backends()
+        self._images = None
+
+    def run(self, stages=STAGES) -> dict:
+        """
+        Returns:
+            dict: Resultados por etapa ('remover:<backend>' para cada backend); las etapas
+                que no se pueden medir llevan {'skipped': motivo}
+        """
+        results = {}
+        for stage in stages:
+            if stage == 'remover':
+                for name, factory in self.backends.items():
+                    results[f'remover:{name}'] = self._guarded(lambda: self._bench_remover(name, factory))
+            else:
+                results[stage] = self._guarded(getattr(self, f'_bench_{stage}'))
+        return results
+
+    def _guarded(self, bench: Callable[[], dict]) -> dict:
+        try:
+            return bench()
+        except SkipStage as e:
+            return {'skipped': str(e)}
+
+    def _measure(self, function: Callable[[int], object]) -> dict:
+        """Mide function(índice) para cada imagen, `repeat` veces, con un calentamiento previo."""
+        function(0)
+        timings = []
+        by_size: Dict[str, List[float]] = {}
+        for index, spec in enumerate(self.specs):
+            for _ in range(self.repeat):
+                start = time.perf_counter()
+                function(index)
+                elapsed = time.perf_counter() - start
+                timings.append(elapsed)
+                by_size.setdefault(f"{spec.width}x{spec.height}", []).append(elapsed)
+        result = summarize_timings(timings)
+        result['by_size_median_ms'] = {size: round(1000 * statistics.median(values), 4)
+                                       for size, values in by_size.items()}
+        return result
+
+    def _loaded_images(self) -> List[Image.Image]:
+        if self._images is None:
+            self._images = []
+            for path in self.paths:
+                with Image.open(path) as image:
+                    self._images.append(image.convert('RGBA'))
+        return self._images
+
+    def _detector(self):
+        if self.face_detector is None:
+            import cv2
+            from .face_detector import FaceDetector
+            self.face_detector = FaceDetector(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        try:
+            self.face_detector.load_model()
+        except Exception as e:
+            raise SkipStage(f"modelo res10 no disponible: {e}")
+        return self.face_detector
+
+    def _processor(self, bg_remover: BackgroundRemover, face_detector=None):
+        from .image_processor import ImageProcessor
+        from .proportional_image_resizer import ProportionalImageResizer
+        if face_detector is None:
+            import cv2
+            from .face_detector import FaceDetector
+            face_detector = FaceDetector(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        return ImageProcessor(ProportionalImageResizer(), face_detector, bg_remover=bg_remover)
+
+    def _bench_decode(self) -> dict:
+        def decode(index):
+            with Image.open(self.paths[index]) as image:
+                image.load()
+        return self._measure(decode)
+
+    def _bench_resize_proportional(self) -> dict:
+        from .proportional_image_resizer import ProportionalImageResizer
+        resizer = ProportionalImageResizer()
+        size = AvatarSize.S_204x350.value
+        images = self._loaded_images()
+        return self._measure(lambda index: resizer.resize(images[index], size[2], size[3]))
+
+    def _bench_resize_avatar(self) -> dict:
+        # los dos escalados fijos que hace render_avatars
+        images = self._loaded_images()
+        sizes = (AvatarSize.S_204x350.value, AvatarSize.S_136x234.value)
+
+        def resize(index):
+            for size in sizes:
+                images[index].resize((size[2], size[3]), Image.LANCZOS)
+        return self._measure(resize)
+
+    def _bench_face_detection(self) -> dict:
+        detector = self._detector()
+        size = AvatarSize.S_204x350.value
+        resized = [image.convert('RGB').resize((size[2], size[3]), Image.LANCZOS) for image in self._loaded_images()]
+        found = [detector.detect_face_center_rect_optimized(image, (86, 86)) is not None for image in resized]
+        result = self._measure(lambda index: detector.detect_face_center_rect_optimized(resized[index], (86, 86)))
+        result['faces_found'] = sum(found)
+        result['faces_expected'] = sum(spec.face for spec in self.specs)
+        return result
+
+    def _bench_crop_encode(self) -> dict:
+        processor = self._processor(StandInRemover())
+        images = self._loaded_images()
+        size_1, size_2 = AvatarSize.S_204x350.value, AvatarSize.S_136x234.value
+        resized = [(image.resize((size_1[2], size_1[3]), Image.LANCZOS),
+                    image.resize((size_2[2], size_2[3]), Image.LANCZOS)) for image in images]
+        output_dir = os.path.join(self.work_dir, 'crop_encode')
+
+        def crop_encode(index):
+            processor._save_avatars(images[index], self.paths[index], output_dir, self.work_dir,
+                                    resized[index][0], resized[index][1], _FACE_RECT_86, _FACE_RECT_38)
+        return self._measure(crop_encode)
+
+    def _bench_remover(self, name: str, factory: Callable[[], BackgroundRemover]) -> dict:
+        try:
+            remover = factory()
+        except Exception as e:
+            raise SkipStage(f"{type(e).__name__}: {e}")
+        output_dir = os.path.join(self.work_dir, f'remover_{name}')
+        os.makedirs(output_dir, exist_ok=True)
+
+        def remove(index):
+            output_path = os.path.join(output_dir, os.path.basename(self.paths[index]))
+            if remover.remove_background(self.paths[index], output_path) is False:
+                raise SkipStage(f"el backend falló con {self.paths[index]}")
+        return self._measure(remove)
+
+    def _bench_pipeline(self) -> dict:
+        processor = self._processor(StandInRemover(), self._detector())
+        output_dir = os.path.join(self.work_dir, 'pipeline')
+
+        def process(index):
+            processor.process_image(self.paths[index], output_dir, self.work_dir)
+
+        # process_image informa de cada imagen: se silencia para no mezclarlo con el informe
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self._measure(process)
+
+
+def run_benchmark(specs: List[AvatarSpec], paths: List[str], work_dir: str, repeat: int = 3,
+                  stages=STAGES, face_detector=None, backends=None, seed: int = 0) -> dict:
+    """Ejecuta el benchmark y devuelve el documento de resultados (serializable en JSON)."""
+    benchmark = PipelineBenchmark(specs, paths, work_dir, repeat=repeat,
+                                  face_detector=face_detector, backends=backends)
+    started = time.time()
+    stage_results = benchmark.run(stages)
+    return {
+        'schema': SCHEMA_VERSION,
+        'created_at': started,
+        'duration_seconds': round(time.time() - started, 3),
+        'environment': environment_info(),
+        'config': {'repeat': benchmark.repeat, 'stages': list(stages), 'backends': list(benchmark.backends)},
+        'dataset': {'seed': seed, 'images': [spec._asdict() for spec in specs]},
+        'stages': stage_results
+    }
@@ -0,0 +1,235 @@
+"""
+Historial de benchmarks y detección de regresiones.
+
+Cada ejecución de benchmark.py --history se añade como una línea JSON con el
+commit, una huella del hardware y una clave de la configuración medida. Solo se
+comparan ejecuciones con la misma huella y la misma configuración: la línea
+base son las últimas `window` ejecuciones compatibles y, para cada etapa, se
+marca regresión si la mediana (o el throughput) empeora más del umbral relativo
+y además más de `z` veces el ruido estimado (MAD de la línea base combinado
+con el error estándar de la ejecución candidata). Los presupuestos son límites
+absolutos por etapa: máximos para las métricas en ms y mínimo para img/s.
+"""
+
+import hashlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from typing import Dict, List, Optional
+
+DEFAULT_HISTORY_PATH = 'benchmark_history.jsonl'
+LATENCY_METRICS = ('mean_ms', 'median_ms', 'p95_ms', 'min_ms', 'max_ms')
+THROUGHPUT_METRIC = 'images_per_second'
+# factor para estimar la desviación típica a partir de la MAD
+_MAD_TO_SIGMA = 1.4826
+
+
+def _cpu_model() -> str:
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def hardware_fingerprint(environment: dict) -> str:
+    """Huella corta de la máquina y las bibliotecas: solo son comparables ejecuciones con la misma."""
+    parts = [
+        _cpu_model(), str(environment.get('cpu_count')), environment.get('machine', ''), platform.system(),
+        environment.get('python', ''), environment.get('numpy', ''), environment.get('pillow', ''),
+        environment.get('opencv', '')
+    ]
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()[:12]
+
+
+def config_key(results: dict) -> str:
+    """Clave de lo medido: repeticiones, etapas, backends y conjunto de avatares."""
+    dataset = results.get('dataset', {})
+    payload = {
+        'schema': results.get('schema'),
+        'config': results.get('config'),
+        'seed': dataset.get('seed'),
+        'images': [image['name'] for image in dataset.get('images', [])]
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def git_commit(cwd: Optional[str] = None) -> Dict[str, Optional[object]]:
+    """
+    Commit actual y si hay cambios sin confirmar (None si no es un repositorio git).
+    Por defecto se consulta el repositorio del proyecto, no el directorio actual.
+    """
+    cwd = cwd or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=cwd, capture_output=True,
+                                text=True, check=True, timeout=10).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=cwd,
+                                capture_output=True, text=True, check=True, timeout=30).stdout
+    except (OSError, subprocess.SubprocessError):
+        return {'commit': None, 'dirty': None}
+    return {'commit': commit, 'dirty': bool(status.strip())}
+
+
+def make_record(results: dict, label: Optional[str] = None, commit: Optional[dict] = None) -> dict:
+    """Entrada del historial para los resultados de run_benchmark."""
+    commit = commit if commit is not None else git_commit()
+    return {
+        'recorded_at': time.time(),
+        'commit': commit.get('commit'),
+        'dirty': commit.get('dirty'),
+        'label': label,
+        'fingerprint': hardware_fingerprint(results.get('environment', {})),
+        'config_key': config_key(results),
+        'results': results
+    }
+
+
+def append_history(path: str, record: dict) -> None:
+    """Añade una entrada al historial (una línea JSON por ejecución)."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+def load_history(path: str) -> List[dict]:
+    """Entradas del historial en orden; las líneas corruptas (p. ej. una escritura cortada) se ignoran."""
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def select_baseline(history: List[dict], candidate: dict, window: int = 5,
+                    commit: Optional[str] = None) -> List[dict]:
+    """
+    Últimas `window` entradas comparables con la candidata (misma huella y configuración).
+
+    Args:
+        commit: Usar solo entradas de este commit (prefijo) como línea base
+    """
+    compatible = [
+        record for record in history
+        if record is not candidate
+        and record.get('fingerprint') == candidate.get('fingerprint')
+        and record.get('config_key') == candidate.get('config_key')
+        and record.get('recorded_at') != candidate.get('recorded_at')
+        and (commit is None or (record.get('commit') or '').startswith(commit))
+    ]
+    return compatible[-window:] if window else compatible
+
+
+def _standard_error(result: dict, metric: str) -> float:
+    samples = result.get('samples', 1)
+    if samples < 2:
+        return 0.0
+    error_ms = result.get('stdev_ms', 0.0) / samples ** 0.5
+    if metric == THROUGHPUT_METRIC:
+        # propagación del error de la media a 1000 / media
+        mean = result.get('mean_ms') or 1.0
+        return result[THROUGHPUT_METRIC] * error_ms / mean
+    return error_ms
+
+
+def _noise(baseline_results: List[dict], candidate: dict, metric: str) -> float:
+    values = [result[metric] for result in baseline_results]
+    if len(values) >= 2:
+        center = statistics.median(values)
+        spread = _MAD_TO_SIGMA * statistics.median(abs(value - center) for value in values)
+    else:
+        spread = _standard_error(baseline_results[0], metric)
+    return (spread ** 2 + _standard_error(candidate, metric) ** 2) ** 0.5
+
+
+def compare_stage(baseline_results: List[dict], candidate: dict, metric: str,
+                  threshold: float = 0.10, z: float = 3.0) -> dict:
+    """
+    Compara una métrica de una etapa con su línea base.
+
+    Returns:
+        dict: baseline, candidate, change (relativo), noise y status
+            ('regression', 'improvement' o 'ok')
+    """
+    baseline = statistics.median(result[metric] for result in baseline_results)
+    value = candidate[metric]
+    noise = _noise(baseline_results, candidate, metric)
+    change = (value - baseline) / baseline if baseline else 0.0
+    # más ms es peor; menos img/s es peor
+    worse = change if metric != THROUGHPUT_METRIC else -change
+    significant = abs(value - baseline) > z * noise
+    if worse > threshold and significant:
+        status = 'regression'
+    elif worse < -threshold and significant:
+        status = 'improvement'
+    else:
+        status = 'ok'
+    return {
+        'baseline': round(baseline, 4),
+        'candidate': round(value, 4),
+        'change': round(change, 4),
+        'noise': round(noise, 4),
+        'status': status
+    }
+
+
+def check_budgets(stages: dict, budgets: Dict[str, Dict[str, float]]) -> List[dict]:
+    """
+    Presupuestos superados. budgets es {etapa: {métrica: límite}}: máximo para las
+    métricas en ms y mínimo para images_per_second. Una etapa con presupuesto que
+    no se midió también cuenta como incumplida.
+    """
+    violations = []
+    for stage, limits in budgets.items():
+        result = stages.get(stage)
+        for metric, limit in limits.items():
+            if result is None or 'skipped' in result:
+                violations.append({'stage': stage, 'metric': metric, 'limit': limit, 'value': None})
+                continue
+            value = result[metric]
+            exceeded = value < limit if metric == THROUGHPUT_METRIC else value > limit
+            if exceeded:
+                violations.append({'stage': stage, 'metric': metric, 'limit': limit, 'value': value})
+    return violations
+
+
+def compare(baseline: List[dict], candidate: dict, metrics=('median_ms', 'p95_ms', THROUGHPUT_METRIC),
+            threshold: float = 0.10, z: float = 3.0,
+            budgets: Optional[Dict[str, Dict[str, float]]] = None) -> dict:
+    """
+    Compara la entrada candidata con su línea base y con los presupuestos.
+
+    Returns:
+        dict: Por etapa y métrica el resultado de compare_stage ('new' si la etapa no
+            tiene línea base), la lista de regresiones y la de presupuestos superados
+    """
+    stages = candidate['results']['stages']
+    report = {'baseline_runs': len(baseline), 'baseline_commits': [record.get('commit') for record in baseline],
+              'stages': {}, 'regressions': [], 'budget_violations': check_budgets(stages, budgets or {})}
+    for stage, result in stages.items():
+        if 'skipped' in result:
+            report['stages'][stage] = {'status': 'skipped', 'reason': result['skipped']}
+            continue
+        previous = [record['results']['stages'].get(stage) for record in baseline]
+        previous = [item for item in previous if item and 'skipped' not in item]
+        if not previous:
+            report['stages'][stage] = {'status': 'new'}
+            continue
+        comparisons = {metric: compare_stage(previous, result, metric, threshold, z) for metric in metrics}
+        report['stages'][stage] = comparisons
+        for metric, comparison in comparisons.items():
+            if comparison['status'] == 'regression':
+                report['regressions'].append(dict(comparison, stage=stage, metric=metric))
+    return report
@@ -0,0 +1,93 @@
+"""
+Circuit breaker para dejar de llamar a un backend que está fallando.
+"""
+
+import threading
+import time
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker clásico de tres estados:
+
+    - closed: las llamadas pasan; se cuentan los fallos consecutivos
+    - open: tras `failure_threshold` fallos se rechazan las llamadas durante
+      `recovery_timeout` segundos
+    - half_open: pasado ese tiempo se dejan pasar `half_open_max_calls` llamadas
+      de prueba; si una tiene éxito se cierra, si falla se vuelve a abrir
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 3, recovery_timeout: float = 30.0, half_open_max_calls: int = 1):
+        """
+        Args:
+            failure_threshold: Fallos consecutivos necesarios para abrir el circuito
+            recovery_timeout: Segundos que el circuito permanece abierto antes de probar de nuevo
+            half_open_max_calls: Llamadas de prueba simultáneas permitidas en half_open
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self.rejected_calls = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._update_state()
+            return self._state
+
+    def _update_state(self) -> None:
+        """Pasa de open a half_open cuando vence el tiempo de recuperación. Requiere el lock."""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._probes_in_flight = 0
+
+    def _open(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self.times_opened += 1
+
+    def allow_request(self) -> bool:
+        """Indica si se puede llamar al backend ahora. Reserva una prueba si está en half_open."""
+        with self._lock:
+            self._update_state()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._probes_in_flight < self.half_open_max_calls:
+                self._probes_in_flight += 1
+                return True
+            self.rejected_calls += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.consecutive_failures = 0
+            self._probes_in_flight = 0
+            self._state = self.CLOSED
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            if self._state == self.HALF_OPEN:
+                self._open()
+            elif self._state == self.CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self._open()
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            self._update_state()
+            return {
+                'state': self._state,
+                'consecutive_failures': self.consecutive_failures,
+                'times_opened': self.times_opened,
+                'rejected_calls': self.rejected_calls
+            }
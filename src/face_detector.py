@@ -1,15 +1,37 @@
 import cv2
 from PIL import Image
 import numpy as np
-import matplotlib.pyplot as plt
+import time
+
+from .metrics import PipelineMetrics
 
 class FaceDetector:
-    def __init__(self, classifier_path: str):
+    def __init__(self, classifier_path: str,
+                 prototxt_path: str = "./model/deploy.prototxt",
+                 model_path: str = "./model/res10_300x300_ssd_iter_140000_fp16.caffemodel"):
         self.face_cascade = cv2.CascadeClassifier(classifier_path)
+        self.prototxt_path = prototxt_path
+        self.model_path = model_path
+        self._net = None
+        # tiempos de detección en la zona superior y en la imagen completa, y uso del fallback
+        self.metrics = PipelineMetrics()
+
+    def load_model(self):
+        """
+        Carga la red res10 una sola vez. Llamarlo en el proceso padre antes de crear
+        workers con fork hace que todos compartan los pesos (copy-on-write).
+        """
+        if self._net is None:
+            self._net = cv2.dnn.readNetFromCaffe(self.prototxt_path, self.model_path)
+        return self._net
 
     def detect_face_center_rect(self, cv_image: Image.Image, area_size, search_top_only=True):
-        # Cargo el modelo de detección de rostros MobileNet-SSD
-        net = cv2.dnn.readNetFromCaffe("./model/deploy.prototxt", "./model/res10_300x300_ssd_iter_140000_fp16.caffemodel")
+        with self.metrics.time('detection_top' if search_top_only else 'detection_full'):
+            return self._detect_face_center_rect(cv_image, area_size, search_top_only)
+
+    def _detect_face_center_rect(self, cv_image: Image.Image, area_size, search_top_only):
+        # Modelo de detección de rostros MobileNet-SSD (cargado una sola vez)
+        net = self.load_model()
         
         image = np.array(cv_image)
         image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
@@ -32,17 +54,86 @@ class FaceDetector:
         net.setInput(blob)
         detections = net.forward()
 
+        return self._first_face_rect(detections[0, 0], (w, h), search_h, area_size, search_top_only)
+
+    def detect_face_center_rects_batch(self, cv_images, area_size, search_top_only=True):
+        """
+        Detecta la cara de varias imágenes en una sola pasada de la red.
+
+        Las regiones se redimensionan a 300x300 igualmente, así que se apilan con
+        cv2.dnn.blobFromImages y cada detección indica en su columna 0 a qué
+        imagen del lote pertenece.
+
+        Returns:
+            list: Un rectángulo (o None) por imagen, en el mismo orden
+        """
+        if not cv_images:
+            return []
+        # el lote se mide completo y se reparte por igual entre sus imágenes
+        start = time.perf_counter()
+        net = self.load_model()
+
+        search_images = []
+        geometry = []
+        for cv_image in cv_images:
+            image = cv2.cvtColor(np.array(cv_image), cv2.COLOR_RGB2BGR)
+            (h, w) = image.shape[:2]
+            search_h = int(h * 0.4) if search_top_only else h
+            search_images.append(image[:search_h, :])
+            geometry.append(((w, h), search_h))
+
+        blob = cv2.dnn.blobFromImages(search_images, 1.0, (300, 300), (104.0, 177.0, 123.0))
+        net.setInput(blob)
+        detections = net.forward()[0, 0]
+
+        rects = []
+        for index, (size, search_h) in enumerate(geometry):
+            rows = detections[detections[:, 0] == index]
+            rects.append(self._first_face_rect(rows, size, search_h, area_size, search_top_only))
+        per_image = (time.perf_counter() - start) / len(cv_images)
+        for _ in cv_images:
+            self.metrics.observe('detection_top' if search_top_only else 'detection_full', per_image)
+        return rects
+
+    def detect_face_center_rects_optimized_batch(self, cv_images, area_size):
+        """
+        Versión por lotes de detect_face_center_rect_optimized: un lote sobre la zona
+        superior y otro, solo con las imágenes sin rostro, sobre la imagen completa.
+        """
+        rects = self.detect_face_center_rects_batch(cv_images, area_size, search_top_only=True)
+        missing = [index for index, rect in enumerate(rects) if rect is None]
+        self.metrics.increment('face_top_hits', len(rects) - len(missing))
+        if missing:
+            print(f"No se encontró rostro en zona superior en {len(missing)} imágenes, buscando en toda la imagen...")
+            full_rects = self.detect_face_center_rects_batch(
+                [cv_images[index] for index in missing], area_size, search_top_only=False
+            )
+            for index, rect in zip(missing, full_rects):
+                rects[index] = rect
+            self._count_fallback(full_rects)
+        return rects
+
+    def _count_fallback(self, full_rects) -> None:
+        found = sum(rect is not None for rect in full_rects)
+        self.metrics.increment('face_full_fallbacks', len(full_rects))
+        self.metrics.increment('face_full_hits', found)
+        self.metrics.increment('face_not_found', len(full_rects) - found)
+
+    def _first_face_rect(self, detections, image_size, search_h, area_size, search_top_only):
+        """Rectángulo de area_size centrado en la primera detección que supera el umbral."""
+        (w, h) = image_size
+
         # Dimensiones del área deseada
         width, height = area_size
 
         # Itero las detecciones
-        for i in range(0, detections.shape[2]):
-            confidence = detections[0, 0, i, 2]
+        for i in range(0, detections.shape[0]):
+            confidence = detections[i, 2]
             # Uso umbral más alto para búsqueda optimizada, más bajo para búsqueda completa
             confidence_threshold = 0.3 if search_top_only else 0.2
             
             if confidence > confidence_threshold:
-                box = detections[0, 0, i, 3:7] * np.array([w, search_h, w, search_h])
+                box = detections[i, 3:7] * np.array([w, search_h, w, search_h])
                 (startX, startY, endX, endY) = box.astype("int")
 
                 wSizeHalf = width // 2
@@ -70,17 +161,24 @@ class FaceDetector:
 
         return None
     
-    def detect_face_center_rect_optimized(self, cv_image: Image.Image, area_size):
+    def detect_face_center_rect_optimized(self, cv_image: Image.Image, area_size, allow_full_search=True):
         """
         Versión optimizada para avatares de cuerpo completo.
-        Busca primero en la zona superior, luego en toda la imagen si es necesario.
+        Busca primero en la zona superior, luego en toda la imagen si es necesario
+        (solo si allow_full_search; la imagen sin presupuesto de tiempo se queda sin ella).
         """
         # Primer intento: buscar solo en el 40% superior (más rápido y preciso para avatares)
         face_rect = self.detect_face_center_rect(cv_image, area_size, search_top_only=True)
         
         if face_rect is not None:
+            self.metrics.increment('face_top_hits')
             return face_rect
+        if not allow_full_search:
+            self.metrics.increment('face_full_skipped')
+            return None
         
         # Segundo intento: buscar en toda la imagen con umbral más bajo
         print("No se encontró rostro en zona superior, buscando en toda la imagen...")
-        return self.detect_face_center_rect(cv_image, area_size, search_top_only=False)
\ No newline at end of file
+        face_rect = self.detect_face_center_rect(cv_image, area_size, search_top_only=False)
+        self._count_fallback([face_rect])
+        return face_rect
\ No newline at end of file
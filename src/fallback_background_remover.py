@@ -0,0 +1,149 @@
+"""
+Cadena de removedores de fondo con fallback, circuit breakers y timeouts por llamada.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Optional, Tuple
+from .background_remover import BackgroundRemover
+from .circuit_breaker import CircuitBreaker
+
+
+class BackgroundRemovalError(Exception):
+    """Ningún backend de la cadena pudo remover el fondo de la imagen."""
+
+    def __init__(self, input_path: str, errors: List[Tuple[str, str]]):
+        self.input_path = input_path
+        self.errors = errors
+        detail = "; ".join(f"{name}: {error}" for name, error in errors) or "todos los backends con circuito abierto"
+        super().__init__(f"No se pudo remover el fondo de {input_path} ({detail})")
+
+
+class FallbackBackgroundRemover(BackgroundRemover):
+    """
+    Prueba los backends en orden hasta que uno tiene éxito.
+
+    Cada backend tiene su propio circuit breaker: tras `failure_threshold` fallos
+    seguidos se deja de llamar durante `recovery_timeout` segundos, así un backend
+    roto deja de sumar latencia a cada imagen del lote.
+    Cada llamada tiene un timeout; el resultado se escribe en un archivo temporal
+    y solo se mueve a `output_path` si el backend termina a tiempo.
+    """
+
+    def __init__(self,
+                 removers: List[Tuple[str, BackgroundRemover]],
+                 call_timeout: Optional[float] = 60.0,
+                 failure_threshold: int = 3,
+                 recovery_timeout: float = 30.0,
+                 max_concurrent_calls: int = 4):
+        """
+        Args:
+            removers: Lista ordenada de (nombre, removedor)
+            call_timeout: Segundos máximos por llamada a un backend (None = sin límite)
+            failure_threshold: Fallos consecutivos que abren el circuito de un backend
+            recovery_timeout: Segundos hasta volver a probar un backend con circuito abierto
+            max_concurrent_calls: Hilos disponibles por backend para ejecutar llamadas con timeout
+        """
+        if not removers:
+            raise ValueError("La cadena de fallback necesita al menos un removedor")
+
+        self.removers = list(removers)
+        self.call_timeout = call_timeout
+        self.max_concurrent_calls = max_concurrent_calls
+        self.breakers = {
+            name: CircuitBreaker(failure_threshold, recovery_timeout) for name, _ in self.removers
+        }
+        self._create_executors()
+        self._counters = {name: {'success': 0, 'failure': 0, 'timeout': 0} for name, _ in self.removers}
+        self._lock = threading.Lock()
+
+    def _create_executors(self) -> None:
+        self._pid = os.getpid()
+        self._executors = {
+            name: ThreadPoolExecutor(max_workers=self.max_concurrent_calls, thread_name_prefix=f"bg-{name}")
+            for name, _ in self.removers
+        }
+
+    def _executor(self, name: str) -> ThreadPoolExecutor:
+        # Los hilos del padre no existen en un worker creado con fork (el calentamiento
+        # los arranca antes): el executor heredado no atendería las llamadas
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._create_executors()
+        return self._executors[name]
+
+    def _count(self, name: str, outcome: str) -> None:
+        with self._lock:
+            self._counters[name][outcome] += 1
+
+    @staticmethod
+    def _temp_path_for(output_path: str, name: str) -> str:
+        root, ext = os.path.splitext(output_path)
+        return f"{root}.{name}.tmp{ext}"
+
+    def remove_background(self, input_path: str, output_path: str) -> bool:
+        errors = []
+
+        for name, remover in self.removers:
+            breaker = self.breakers[name]
+            if not breaker.allow_request():
+                continue
+
+            temp_path = self._temp_path_for(output_path, name)
+            future = self._executor(name).submit(remover.remove_background, input_path, temp_path)
+            try:
+                result = future.result(timeout=self.call_timeout)
+            except FutureTimeoutError:
+                # La llamada sigue en su hilo; cuando termine se descarta su salida
+                future.add_done_callback(lambda _, path=temp_path: self._discard(path))
+                breaker.record_failure()
+                self._count(name, 'timeout')
+                errors.append((name, f"timeout tras {self.call_timeout}s"))
+                continue
+            except Exception as e:
+                self._discard(temp_path)
+                breaker.record_failure()
+                self._count(name, 'failure')
+                errors.append((name, str(e)))
+                continue
+
+            if result is False or not os.path.exists(temp_path):
+                self._discard(temp_path)
+                breaker.record_failure()
+                self._count(name, 'failure')
+                errors.append((name, "el backend no generó la imagen"))
+                continue
+
+            os.replace(temp_path, output_path)
+            breaker.record_success()
+            self._count(name, 'success')
+            return True
+
+        raise BackgroundRemovalError(input_path, errors)
+
+    @staticmethod
+    def _discard(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def get_metrics(self) -> dict:
+        """Retorna el estado de cada circuito y los resultados por backend."""
+        with self._lock:
+            counters = {name: dict(values) for name, values in self._counters.items()}
+        return {
+            name: {**counters[name], 'breaker': self.breakers[name].to_dict()}
+            for name, _ in self.removers
+        }
+
+    def close(self) -> None:
+        """Libera los hilos de los backends sin esperar llamadas colgadas."""
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+
+    def __str__(self):
+        chain = " -> ".join(f"{name}[{self.breakers[name].state}]" for name, _ in self.removers)
+        return f"FallbackBackgroundRemover({chain})"
@@ -0,0 +1,228 @@
+"""
+Vigilancia de un directorio de imágenes con inotify (Linux) o sondeo periódico.
+
+Los backends informan de rutas que han cambiado; FolderWatcher aplica un
+debounce: una imagen solo se entrega cuando lleva `debounce_seconds` sin
+cambios y su tamaño es estable, para no procesar archivos a medio copiar.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .image_scanner import IMAGE_EXTENSIONS, scan_images
+
+# Constantes de <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _is_image(path: str) -> bool:
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+class PollingBackend:
+    """Detecta cambios comparando tamaño y mtime entre recorridos sucesivos."""
+
+    name = 'polling'
+
+    def __init__(self, directory: str, interval: float = 1.0):
+        self.directory = directory
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, float]]:
+        return {entry.path: (entry.size, entry.mtime) for entry in scan_images(self.directory)}
+
+    def read(self, timeout: float) -> List[str]:
+        """Espera hasta `timeout` segundos (como mucho un intervalo) y devuelve las rutas cambiadas."""
+        time.sleep(max(0.0, min(timeout, self.interval)))
+        snapshot = self._scan()
+        changed = [path for path, state in snapshot.items() if self._snapshot.get(path) != state]
+        self._snapshot = snapshot
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyBackend:
+    """
+    Eventos de inotify leídos mediante ctypes, con un watch por subdirectorio.
+
+    Si la cola del kernel se desborda (IN_Q_OVERFLOW) se recorre el árbol entero
+    y se informan todas las imágenes, para no perder ninguna.
+    """
+
+    name = 'inotify'
+
+    def __init__(self, directory: str):
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify solo está disponible en Linux")
+        self.directory = directory
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1: {os.strerror(errno)}")
+        self._watches: Dict[int, str] = {}
+        self._add_tree(directory)
+
+    def _add_watch(self, path: str) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            print(f"⚠️ No se pudo vigilar {path}: {os.strerror(errno)}")
+            return
+        self._watches[wd] = path
+
+    def _add_tree(self, root: str) -> None:
+        self._add_watch(root)
+        for current, dirs, _ in os.walk(root):
+            for name in dirs:
+                self._add_watch(os.path.join(current, name))
+
+    def read(self, timeout: float) -> List[str]:
+        """Espera eventos hasta `timeout` segundos y devuelve las imágenes afectadas."""
+        ready, _, _ = select.select([self._fd], [], [], max(0.0, timeout))
+        if not ready:
+            return []
+        try:
+            buffer = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        changed = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buffer):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                changed.extend(entry.path for entry in scan_images(self.directory))
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            parent = self._watches.get(wd)
+            if parent is None or not name:
+                continue
+            path = os.path.join(parent, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Directorio nuevo: se vigila y se informan las imágenes que ya contenga
+                    self._add_tree(path)
+                    changed.extend(entry.path for entry in scan_images(path))
+            elif _is_image(path):
+                changed.append(path)
+        return changed
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def create_backend(directory: str, use_inotify: bool = True, poll_interval: float = 1.0):
+    """Crea el backend de inotify si es posible; si no, el de sondeo."""
+    if use_inotify:
+        try:
+            return InotifyBackend(directory)
+        except (OSError, AttributeError) as e:
+            print(f"⚠️ inotify no disponible ({e}); usando sondeo cada {poll_interval}s")
+    return PollingBackend(directory, poll_interval)
+
+
+class FolderWatcher:
+    """
+    Entrega las imágenes nuevas o modificadas de un directorio, con debounce.
+    """
+
+    def __init__(self, directory: str, debounce_seconds: float = 2.0, poll_interval: float = 1.0,
+                 use_inotify: bool = True, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            directory: Directorio a vigilar (recursivamente)
+            debounce_seconds: Tiempo sin cambios antes de considerar completa una imagen
+            poll_interval: Intervalo del backend de sondeo
+            use_inotify: Si se intenta usar inotify antes que el sondeo
+            clock: Reloj monotónico (inyectable en pruebas)
+        """
+        self.directory = directory
+        self.debounce_seconds = debounce_seconds
+        self.clock = clock
+        self.backend = create_backend(directory, use_inotify, poll_interval)
+        # ruta -> (instante del último cambio, tamaño observado)
+        self._pending: Dict[str, Tuple[float, Optional[int]]] = {}
+
+    @property
+    def backend_name(self) -> str:
+        return self.backend.name
+
+    def _size(self, path: str) -> Optional[int]:
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return None
+
+    def poll(self, timeout: float = 1.0) -> List[str]:
+        """
+        Espera cambios hasta `timeout` segundos y devuelve las imágenes ya estables.
+
+        Returns:
+            List[str]: Rutas listas para procesar (ordenadas)
+        """
+        now = self.clock()
+        if self._pending:
+            next_deadline = min(changed_at for changed_at, _ in self._pending.values()) + self.debounce_seconds
+            timeout = min(timeout, max(0.0, next_deadline - now))
+
+        for path in self.backend.read(timeout):
+            self._pending[path] = (self.clock(), self._size(path))
+
+        now = self.clock()
+        ready = []
+        for path, (changed_at, size) in list(self._pending.items()):
+            if now - changed_at < self.debounce_seconds:
+                continue
+            current_size = self._size(path)
+            if current_size is None:
+                # El archivo desapareció antes de estabilizarse
+                del self._pending[path]
+            elif current_size != size:
+                # Sigue creciendo aunque no haya eventos (p. ej. copia por red)
+                self._pending[path] = (now, current_size)
+            else:
+                del self._pending[path]
+                ready.append(path)
+        return sorted(ready)
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def close(self) -> None:
+        self.backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
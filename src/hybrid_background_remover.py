@@ -0,0 +1,181 @@
+"""
+Removedor de fondos híbrido que reparte el trabajo entre el modelo local y la API.
+"""
+
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+from .background_remover import BackgroundRemover
+
+LOCAL = 'local'
+API = 'api'
+
+
+class BackendStats:
+    """Estadísticas en vivo de un backend: cola, latencia y throughput."""
+
+    def __init__(self, initial_latency: float, smoothing: float):
+        self.smoothing = smoothing
+        self.ewma_latency = initial_latency
+        self.queued = 0        # Asignadas y esperando turno
+        self.in_flight = 0     # Procesándose ahora mismo
+        self.completed = 0
+        self.failed = 0
+        self.total_time = 0.0
+        self.first_start = None
+        self.last_end = None
+
+    @property
+    def depth(self) -> int:
+        return self.queued + self.in_flight
+
+    def record(self, latency: float, success: bool) -> None:
+        self.ewma_latency = self.smoothing * latency + (1 - self.smoothing) * self.ewma_latency
+        self.total_time += latency
+        self.last_end = time.monotonic()
+        if success:
+            self.completed += 1
+        else:
+            self.failed += 1
+
+    def to_dict(self) -> dict:
+        processed = self.completed + self.failed
+        elapsed = (self.last_end - self.first_start) if self.first_start and self.last_end else 0.0
+        return {
+            'queued': self.queued,
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'failed': self.failed,
+            'avg_latency': self.total_time / processed if processed else None,
+            'ewma_latency': self.ewma_latency,
+            'throughput': self.completed / elapsed if elapsed > 0 else 0.0
+        }
+
+
+class HybridBackgroundRemover(BackgroundRemover):
+    """
+    Mantiene disponibles el modelo local y la API de remove.bg y decide, imagen
+    por imagen, cuál usar:
+
+    - Mientras el modelo local tenga capacidad libre, se usa el modelo local.
+    - Si está saturado, se estima cuánto tardaría la imagen en la cola local
+      (profundidad de cola x latencia observada) y se desborda a la API si
+      ésta terminaría antes y queda presupuesto de créditos.
+    """
+
+    def __init__(self,
+                 local_remover: BackgroundRemover,
+                 api_remover: Optional[BackgroundRemover] = None,
+                 local_concurrency: int = 1,
+                 api_concurrency: int = 4,
+                 api_credit_budget: Optional[int] = None,
+                 initial_local_latency: float = 2.0,
+                 initial_api_latency: float = 3.0,
+                 latency_smoothing: float = 0.3):
+        """
+        Args:
+            local_remover: Removedor local (p. ej. TutanchaconBgRemover)
+            api_remover: Removedor remoto (p. ej. RemoveBgService); None = solo local
+            local_concurrency: Imágenes simultáneas que admite el modelo local
+            api_concurrency: Peticiones simultáneas a la API
+            api_credit_budget: Máximo de imágenes a enviar a la API (None = sin límite)
+            initial_local_latency: Latencia local estimada antes de tener mediciones (s)
+            initial_api_latency: Latencia de la API estimada antes de tener mediciones (s)
+            latency_smoothing: Factor de suavizado de la media móvil exponencial (0-1)
+        """
+        self.local_remover = local_remover
+        self.api_remover = api_remover
+        self.local_concurrency = max(1, local_concurrency)
+        self.api_concurrency = max(1, api_concurrency)
+        self.api_credit_budget = api_credit_budget
+        self.api_credits_used = 0
+
+        self._stats = {
+            LOCAL: BackendStats(initial_local_latency, latency_smoothing),
+            API: BackendStats(initial_api_latency, latency_smoothing)
+        }
+        self._slots = {
+            LOCAL: threading.BoundedSemaphore(self.local_concurrency),
+            API: threading.BoundedSemaphore(self.api_concurrency)
+        }
+        self._decisions = {LOCAL: 0, API: 0}
+        self._lock = threading.Lock()
+
+    def _api_has_credits(self) -> bool:
+        return self.api_credit_budget is None or self.api_credits_used < self.api_credit_budget
+
+    def _estimated_wait(self, backend: str, concurrency: int) -> float:
+        """Tiempo estimado hasta terminar una imagen nueva en ese backend."""
+        stats = self._stats[backend]
+        waves = stats.depth // concurrency + 1
+        return waves * stats.ewma_latency
+
+    def choose_backend(self) -> str:
+        """Decide el backend para la próxima imagen y la encola en él."""
+        with self._lock:
+            local = self._stats[LOCAL]
+            backend = LOCAL
+
+            if self.api_remover is not None and self._api_has_credits() \
+                    and local.depth >= self.local_concurrency:
+                local_wait = self._estimated_wait(LOCAL, self.local_concurrency)
+                api_wait = self._estimated_wait(API, self.api_concurrency)
+                if api_wait < local_wait:
+                    backend = API
+
+            if backend == API:
+                # Se reserva el crédito ahora para no sobrepasar el presupuesto con llamadas concurrentes
+                self.api_credits_used += 1
+            self._decisions[backend] += 1
+            self._stats[backend].queued += 1
+            return backend
+
+    def remove_background(self, input_path: str, output_path: str) -> bool:
+        backend = self.choose_backend()
+        remover = self.local_remover if backend == LOCAL else self.api_remover
+        stats = self._stats[backend]
+
+        with self._slots[backend]:
+            with self._lock:
+                stats.queued -= 1
+                stats.in_flight += 1
+                if stats.first_start is None:
+                    stats.first_start = time.monotonic()
+
+            start = time.monotonic()
+            success = False
+            try:
+                success = remover.remove_background(input_path, output_path) is not False
+            finally:
+                with self._lock:
+                    stats.in_flight -= 1
+                    stats.record(time.monotonic() - start, success)
+                    if backend == API and not success:
+                        # La API no cobra las peticiones fallidas
+                        self.api_credits_used -= 1
+
+        return success
+
+    @property
+    def concurrency(self) -> int:
+        """Imágenes simultáneas necesarias para saturar ambos backends."""
+        return self.local_concurrency + (self.api_concurrency if self.api_remover is not None else 0)
+
+    def remove_background_many(self, jobs: Iterable[Tuple[str, str]], max_workers: Optional[int] = None) -> List[bool]:
+        """Procesa un lote con suficiente concurrencia para saturar ambos backends."""
+        return super().remove_background_many(jobs, max_workers or self.concurrency)
+
+    def get_metrics(self) -> dict:
+        """Retorna las decisiones de enrutado y las métricas por backend."""
+        with self._lock:
+            return {
+                'decisions': dict(self._decisions),
+                'backends': {name: stats.to_dict() for name, stats in self._stats.items()},
+                'api_credits_used': self.api_credits_used,
+                'api_credits_remaining': (self.api_credit_budget - self.api_credits_used
+                                          if self.api_credit_budget is not None else None)
+            }
+
+    def __str__(self):
+        return (f"HybridBackgroundRemover(local={self.local_remover}, api={type(self.api_remover).__name__}, "
+                f"budget={self.api_credit_budget})")
@@ -1,17 +1,46 @@
 from src.avatar_size import AvatarSize
 from src.image_resizer import ImageResizer
 from src.face_detector import FaceDetector
+from src.image_scanner import ImageEntry, PrefetchingReader, scan_images
+from src.memory_monitor import MemoryTracker
+from src.progress import ProgressReporter, result_status
+from src.quarantine import Quarantine
+from src.time_budget import TimeBudget, image_megapixels
+from src.avatar_renditions import content_box, face_center_from_rect, save_master
+from src.profiling import profile_image
+from src.tracing import span
 import os
 import tempfile
+import threading
 import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 from PIL import Image
-from bgremover_package import BackgroundRemover
 
 class ImageProcessor:
-    def __init__(self, image_resizer: ImageResizer, face_detector: FaceDetector):
+    def __init__(self, image_resizer: ImageResizer, face_detector: FaceDetector, bg_remover=None,
+                 time_budget: Optional[TimeBudget] = None):
+        """
+        Args:
+            image_resizer: Redimensionador de imágenes
+            face_detector: Detector facial
+            bg_remover: Removedor de fondo con remove_background(input_path, output_path)
+                (por defecto el de bgremover_package)
+            time_budget: Presupuestos de tiempo por imagen y por lote (None = sin límite)
+        """
+        if bg_remover is None:
+            # bgremover_package carga rembg/onnxruntime: se importa solo al crear el procesador
+            from bgremover_package import BackgroundRemover
+            bg_remover = BackgroundRemover()
+        
         self.image_resizer = image_resizer
         self.face_detector = face_detector
-        self.bg_remover = BackgroundRemover()
+        self.bg_remover = bg_remover
+        self.time_budget = time_budget
+        # un solo registro por procesador: la detección facial mide sus etapas en el mismo
+        self.metrics = face_detector.metrics
 
     def remove_background_batch(self, input_dir: str, output_dir: str) -> None:
         for root, _, files in os.walk(input_dir):
@@ -38,134 +67,449 @@ class ImageProcessor:
                     os.makedirs(output_subdir, exist_ok=True)
                     
                     image_path = os.path.join(root, filename)
-                    image = Image.open(image_path)
-                    
-                    # calculo el directorio destino
-                    filename_wo_ext = os.path.splitext(filename)[0]
-                    final_path = os.path.join(output_subdir, filename_wo_ext)
+                    # cada imagen y sus escalados se cierran al terminar la iteración:
+                    # en lotes largos no se acumulan buffers a la espera del GC
+                    with Image.open(image_path) as image:
+                        # calculo el directorio destino
+                        filename_wo_ext = os.path.splitext(filename)[0]
+                        final_path = os.path.join(output_subdir, filename_wo_ext)
 
-                    # redimensiono la imagen al tamaño máximo de 204x350
-                    size = AvatarSize.S_204x350.value
-                    resized_image_1 = self._resize_image(image, size[2], size[3])
+                        # redimensiono la imagen al tamaño máximo de 204x350
+                        size = AvatarSize.S_204x350.value
+                        resized_image_1 = self._resize_image(image, size[2], size[3])
                     
-                    # redimesiono la imagen al tamaño máximo de 136x234
-                    size = AvatarSize.S_136x234.value
-                    resized_image_2 = self._resize_image(image, size[2], size[3])
-
-                   
-                    # genero los recortes para 86x86 y 38x38 partiendo de la posición de la cara
-                    # pero si no es capaz de detectar la cara, no se generan los recortes y se loguea
-                    # Uso el método optimizado para avatares de cuerpo completo
-                    faceRect = self.face_detector.detect_face_center_rect_optimized(resized_image_1, (86, 86))
-                    if faceRect is not None:
-                        self._process_face(faceRect, resized_image_1, final_path)
-                    else:
-                        with open(os.path.join(output_dir, "log.txt"), "a") as log_file:
-                                log_file.write(f"no se pudo procesar: {filename}\n")
-                        # agrego el prefijo "error_" a output_dir y continúo el proceso+
-                        final_path = os.path.join(output_subdir, f"error_{filename_wo_ext}")
+                        # redimesiono la imagen al tamaño máximo de 136x234
+                        size = AvatarSize.S_136x234.value
+                        resized_image_2 = self._resize_image(image, size[2], size[3])
+
+                        # genero los recortes para 86x86 y 38x38 partiendo de la posición de la cara
+                        # pero si no es capaz de detectar la cara, no se generan los recortes y se loguea
+                        # Uso el método optimizado para avatares de cuerpo completo
+                        faceRect = self.face_detector.detect_face_center_rect_optimized(resized_image_1, (86, 86))
+                        if faceRect is not None:
+                            self._process_face(faceRect, resized_image_1, final_path)
+                        else:
+                            with open(os.path.join(output_dir, "log.txt"), "a") as log_file:
+                                    log_file.write(f"no se pudo procesar: {filename}\n")
+                            # agrego el prefijo "error_" a output_dir y continúo el proceso+
+                            final_path = os.path.join(output_subdir, f"error_{filename_wo_ext}")
                         
                                                     
-                    # proceso las áreas del primer escalado
-                    self._process_rect(AvatarSize.S_204x350, resized_image_1, final_path)
-                    self._process_rect(AvatarSize.S_204x175, resized_image_1, final_path)
-                    # proceso las áreas del segundo escalado
-                    self._process_rect(AvatarSize.S_136x234, resized_image_2, final_path)
+                        # proceso las áreas del primer escalado
+                        self._process_rect(AvatarSize.S_204x350, resized_image_1, final_path)
+                        self._process_rect(AvatarSize.S_204x175, resized_image_1, final_path)
+                        # proceso las áreas del segundo escalado
+                        self._process_rect(AvatarSize.S_136x234, resized_image_2, final_path)
                         
-                    faceRect = self.face_detector.detect_face_center_rect_optimized(resized_image_2, (38, 38))
-                    if faceRect is not None:
-                        self._process_face(faceRect, resized_image_2, final_path)
+                        faceRect = self.face_detector.detect_face_center_rect_optimized(resized_image_2, (38, 38))
+                        if faceRect is not None:
+                            self._process_face(faceRect, resized_image_2, final_path)
                         
-                    # guardo una copia de la imagen original
-                    original_copy_path = os.path.join(final_path, f"original.png")
-                    image.save(original_copy_path)
+                        # guardo una copia de la imagen original
+                        original_copy_path = os.path.join(final_path, f"original.png")
+                        image.save(original_copy_path)
+                        resized_image_1.close()
+                        resized_image_2.close()
     
-    def process_images_with_bgremover(self, input_dir: str, output_dir: str) -> None:
-        """Procesa imágenes removiendo fondo con bgremover y redimensionando."""
-        for root, _, files in os.walk(input_dir):
-            for filename in files:
-                if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    relative_path = os.path.relpath(root, input_dir)
-                    output_subdir = os.path.join(output_dir, relative_path)
-                    os.makedirs(output_subdir, exist_ok=True)
-                    
-                    image_path = os.path.join(root, filename)
-                    print(f"📸 Procesando: {image_path}")
-                    
-                    # Iniciar timer para esta imagen
-                    img_start_time = time.time()
-                    
-                    # Remover fondo con bgremover usando archivo temporal
-                    temp_dir = os.path.join(os.getcwd(), 'temp_bg_removal')
-                    os.makedirs(temp_dir, exist_ok=True)
-                    temp_path = os.path.join(temp_dir, f"temp_{filename}")
-                        
-                    success = self.bg_remover.remove_background(image_path, temp_path)
-                    if success:
-                        image_with_bg_removed = Image.open(temp_path)
-                        # Crear una copia en memoria 
-                        image_copy = image_with_bg_removed.copy()
-                        image_with_bg_removed.close()
-                        image_with_bg_removed = image_copy
-                        # Limpiar archivo temporal
-                        try:
-                            os.remove(temp_path)
-                        except:
-                            pass
-                    else:
-                        print(f"❌ Error removiendo fondo de {image_path}")
-                        continue
-                    
-                    # calculo el directorio destino  
-                    filename_wo_ext = os.path.splitext(filename)[0]
-                    final_path = os.path.join(output_subdir, filename_wo_ext)
+    def process_images_with_bgremover(self, input_dir: str, output_dir: str,
+                                      entries: Optional[List[ImageEntry]] = None, prefetch: int = 4,
+                                      on_demand: bool = False,
+                                      memory: Optional[MemoryTracker] = None,
+                                      progress: Optional[ProgressReporter] = None,
+                                      quarantine: Optional[Quarantine] = None) -> Dict[str, Optional[str]]:
+        """
+        Procesa imágenes removiendo fondo con bgremover y redimensionando.
+
+        Args:
+            input_dir: Directorio de imágenes aprobadas
+            output_dir: Directorio de recortes
+            entries: Imágenes ya descubiertas con scan_images (si no, se recorre input_dir)
+            prefetch: Archivos leídos por adelantado mientras se procesa la imagen actual
+            on_demand: Guardar solo el master de cada imagen (ver create_master)
+            memory: Muestreo de memoria cada N imágenes (modo --long-run)
+            progress: Progreso del lote, actualizado tras cada imagen
+            quarantine: Cuarentena de las imágenes que lanzan una excepción (el lote continúa igual)
+
+        Returns:
+            dict: image_path -> carpeta de salida (None si falló la imagen)
+        """
+        if entries is None:
+            entries = scan_images(input_dir)
+        process = self.create_master if on_demand else self.process_image
+        results = {}
+
+        def finish(entry, image_bytes, segmented=None):
+            output_subdir = os.path.join(output_dir, entry.relative_dir)
+            try:
+                if segmented is None:
+                    results[entry.path] = process(entry.path, output_subdir, output_dir, image_bytes)
+                else:
+                    image = segmented.result()
+                    results[entry.path] = (process(entry.path, output_subdir, output_dir, segmented=image)
+                                           if image is not None else None)
+            except Exception as e:
+                # una imagen corrupta no detiene el lote (los crashes nativos los aísla PreloadedWorkerPool)
+                results[entry.path] = None
+                self.metrics.increment('image_errors')
+                print(f"❌ {entry.path}: {type(e).__name__}: {e}")
+                if quarantine is not None:
+                    quarantine.add(entry.path, 'error', f"{type(e).__name__}: {e}",
+                                   traceback=traceback.format_exc())
+            if memory is not None:
+                memory.image_done()
+            if progress is not None:
+                deferred = self.time_budget is not None and entry.path in self.time_budget.deferred
+                progress.update(entry.path, result_status(results[entry.path], deferred=deferred))
+
+        concurrency = self.segment_concurrency()
+        if concurrency <= 1:
+            for entry, image_bytes in PrefetchingReader(entries, prefetch=prefetch):
+                finish(entry, image_bytes)
+                # el contenido leído no debe seguir vivo mientras se procesa la siguiente imagen
+                image_bytes = None
+            return results
+
+        # el removedor admite varias imágenes a la vez (p. ej. HybridBackgroundRemover desborda
+        # a la API): se segmentan por adelantado en hilos y el resto sigue en este hilo, en orden
+        window = deque()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="segment") as executor:
+            for entry, image_bytes in PrefetchingReader(entries, prefetch=prefetch):
+                window.append((entry, executor.submit(self.segment_image, entry.path, image_bytes)))
+                image_bytes = None
+                # una imagen más en vuelo que hilos: se segmenta mientras se renderiza la primera
+                if len(window) > concurrency:
+                    entry, segmented = window.popleft()
+                    finish(entry, None, segmented)
+            while window:
+                entry, segmented = window.popleft()
+                finish(entry, None, segmented)
+        return results
+
+    def segment_concurrency(self) -> int:
+        """
+        Imágenes que process_images_with_bgremover segmenta a la vez: las que admite el
+        removedor (atributo `concurrency`) o una. Con presupuesto de tiempo siempre una,
+        porque el presupuesto mide cada imagen desde que empieza su segmentación.
+        """
+        if self.time_budget is not None:
+            return 1
+        return max(1, getattr(self.bg_remover, 'concurrency', 1))
+
+    def process_image(self, image_path: str, output_subdir: str, log_dir: str,
+                      image_bytes: Optional[bytes] = None,
+                      segmented: Optional[Image.Image] = None) -> Optional[str]:
+        """
+        Procesa una imagen: remueve el fondo, redimensiona y genera los recortes.
+
+        Args:
+            image_path: Ruta de la imagen de entrada
+            output_subdir: Directorio donde crear la carpeta de recortes de la imagen
+            log_dir: Directorio del log.txt de imágenes sin rostro detectado
+            image_bytes: Contenido ya leído de la imagen (evita volver a leer image_path)
+            segmented: Imagen ya sin fondo (segmentada por adelantado); se cierra al terminar
+
+        Returns:
+            str: Carpeta con los recortes generados, o None si falló la remoción de fondo
+                o la imagen se difirió al carril lento
+        """
+        filename = os.path.basename(image_path)
+        os.makedirs(output_subdir, exist_ok=True)
+        print(f"📸 Procesando: {image_path}")
+        
+        # Iniciar timer para esta imagen
+        img_start_time = time.time()
+        
+        with span('image', file=image_path), profile_image():
+            image_with_bg_removed = segmented if segmented is not None else self._segment_within_budget(
+                image_path, output_subdir, log_dir, image_bytes)
+            if image_with_bg_removed is None:
+                return None
+            try:
+                final_path = self.render_avatars(image_with_bg_removed, image_path, output_subdir, log_dir)
+            finally:
+                image_with_bg_removed.close()
+        
+        # Calcular tiempo de procesamiento de esta imagen
+        img_end_time = time.time()
+        img_time = img_end_time - img_start_time
+        self.metrics.observe('total', img_time)
+        if self.time_budget is not None:
+            self.time_budget.finish_image(image_path)
+        
+        print(f"✅ Procesado: {final_path} (⏱️ {img_time:.2f}s)")
+        return final_path
+
+    def _segment_within_budget(self, image_path: str, output_subdir: str, log_dir: str,
+                               image_bytes: Optional[bytes] = None) -> Optional[Image.Image]:
+        """segment_image bajo el presupuesto de tiempo: elige el removedor o difiere la imagen."""
+        budget = self.time_budget
+        if budget is None:
+            return self.segment_image(image_path, image_bytes)
+        budget.start_image()
+        try:
+            megapixels = image_megapixels(image_path, image_bytes)
+        except OSError:
+            # la imagen ilegible falla igual en la segmentación; sin tamaño no hay estimación
+            megapixels = 0.0
+        plan = budget.plan_segmentation(image_path, megapixels)
+        if plan == 'defer':
+            budget.defer(image_path, output_subdir, log_dir)
+            self.metrics.increment('budget_deferred')
+            print(f"⏳ Diferida al carril lento: {image_path}")
+            return None
+        if plan == 'fast':
+            self.metrics.increment('budget_fast_preset')
+        start = time.perf_counter()
+        image = self.segment_image(image_path, image_bytes,
+                                   bg_remover=budget.fast_remover if plan == 'fast' else None)
+        if image is not None:
+            budget.observe_segmentation(plan, megapixels, time.perf_counter() - start)
+        return image
+
+    def _allow_full_fallback(self) -> bool:
+        return self.time_budget is None or self.time_budget.allow_full_fallback()
+
+    def _record_skipped_fallback(self, image_path: str, allow_full_search: bool, *face_rects) -> None:
+        if not allow_full_search and any(rect is None for rect in face_rects):
+            self.time_budget.record(image_path, 'skip_full_fallback',
+                                    "imagen fuera de presupuesto antes de la detección facial")
+
+    def segment_image(self, image_path: str, image_bytes: Optional[bytes] = None,
+                      bg_remover=None) -> Optional[Image.Image]:
+        """
+        Primera etapa: remueve el fondo y devuelve la imagen RGBA en memoria.
+
+        Args:
+            image_path: Ruta de la imagen de entrada
+            image_bytes: Contenido ya leído; se vuelca a un temporal local para que
+                bgremover no lea del almacenamiento de origen
+            bg_remover: Removedor para esta imagen (default: el del procesador)
+
+        Returns:
+            Image.Image: Imagen con el fondo removido, o None si falló la remoción
+        """
+        filename = os.path.basename(image_path)
+        
+        # Remover fondo con bgremover usando archivo temporal
+        temp_dir = os.path.join(os.getcwd(), 'temp_bg_removal')
+        os.makedirs(temp_dir, exist_ok=True)
+        # el hilo forma parte del nombre: process_images_with_bgremover puede segmentar
+        # a la vez dos imágenes con el mismo nombre en carpetas distintas
+        worker = f"{os.getpid()}_{threading.get_ident()}"
+        temp_path = os.path.join(temp_dir, f"temp_{worker}_{filename}")
+        
+        input_path = image_path
+        if image_bytes is not None:
+            input_path = os.path.join(temp_dir, f"input_{worker}_{filename}")
+            with span('spill'), open(input_path, 'wb') as f:
+                f.write(image_bytes)
+            
+        try:
+            with self.metrics.time('segmentation'):
+                # los removedores que devuelven None (TutanchaconBgRemover) señalan el error con una excepción
+                success = (bg_remover or self.bg_remover).remove_background(input_path, temp_path) is not False
+        finally:
+            if input_path != image_path:
+                os.remove(input_path)
+        if success and os.path.exists(temp_path):
+            with self.metrics.time('decode'):
+                image_with_bg_removed = Image.open(temp_path)
+                # Crear una copia en memoria 
+                image_copy = image_with_bg_removed.copy()
+                image_with_bg_removed.close()
+                image_with_bg_removed = image_copy
+            # Limpiar archivo temporal
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        else:
+            print(f"❌ Error removiendo fondo de {image_path}")
+            self.metrics.increment('segmentation_failures')
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return None
+        return image_with_bg_removed
+
+    def render_avatars(self, image_with_bg_removed: Image.Image, image_path: str,
+                       output_subdir: str, log_dir: str) -> str:
+        """
+        Segunda etapa: redimensiona, detecta la cara y guarda los recortes.
+
+        Returns:
+            str: Carpeta con los recortes generados
+        """
+        with self.metrics.time('resize'):
+            # redimensiono la imagen al tamaño máximo de 204x350
+            size = AvatarSize.S_204x350.value
+            resized_image_1 = self._resize_image(image_with_bg_removed, size[2], size[3])
+            
+            # redimesiono la imagen al tamaño máximo de 136x234
+            size = AvatarSize.S_136x234.value
+            resized_image_2 = self._resize_image(image_with_bg_removed, size[2], size[3])
+
+        # genero los recortes para 86x86 y 38x38 partiendo de la posición de la cara
+        # Uso el método optimizado para avatares de cuerpo completo
+        allow_full_search = self._allow_full_fallback()
+        face_rect_86 = self.face_detector.detect_face_center_rect_optimized(resized_image_1, (86, 86),
+                                                                            allow_full_search)
+        face_rect_38 = self.face_detector.detect_face_center_rect_optimized(resized_image_2, (38, 38),
+                                                                            allow_full_search)
+        self._record_skipped_fallback(image_path, allow_full_search, face_rect_86, face_rect_38)
+        try:
+            return self._save_avatars(image_with_bg_removed, image_path, output_subdir, log_dir,
+                                      resized_image_1, resized_image_2, face_rect_86, face_rect_38)
+        finally:
+            # los escalados son propios de esta etapa; la imagen de entrada la cierra quien la creó
+            resized_image_1.close()
+            resized_image_2.close()
+
+    def render_avatars_batch(self, items) -> List[str]:
+        """
+        Segunda etapa para varias imágenes: la detección facial se hace por lotes
+        (una pasada de la red por tamaño de recorte en lugar de dos por imagen).
+
+        Args:
+            items: Lista de (image_with_bg_removed, image_path, output_subdir, log_dir)
+
+        Returns:
+            List[str]: Carpeta de recortes de cada imagen, en el mismo orden
+        """
+        size_1 = AvatarSize.S_204x350.value
+        size_2 = AvatarSize.S_136x234.value
+        resized_1 = []
+        resized_2 = []
+        for item in items:
+            with self.metrics.time('resize'):
+                resized_1.append(self._resize_image(item[0], size_1[2], size_1[3]))
+                resized_2.append(self._resize_image(item[0], size_2[2], size_2[3]))
+
+        face_rects_86 = self.face_detector.detect_face_center_rects_optimized_batch(resized_1, (86, 86))
+        face_rects_38 = self.face_detector.detect_face_center_rects_optimized_batch(resized_2, (38, 38))
+        try:
+            return [
+                self._save_avatars(image, image_path, output_subdir, log_dir,
+                                   resized_1[index], resized_2[index], face_rects_86[index], face_rects_38[index])
+                for index, (image, image_path, output_subdir, log_dir) in enumerate(items)
+            ]
+        finally:
+            for resized in resized_1 + resized_2:
+                resized.close()
+
+    def _save_avatars(self, image_with_bg_removed: Image.Image, image_path: str, output_subdir: str,
+                      log_dir: str, resized_image_1: Image.Image, resized_image_2: Image.Image,
+                      face_rect_86, face_rect_38) -> str:
+        """Guarda los recortes de una imagen a partir de sus escalados y rectángulos de cara."""
+        filename = os.path.basename(image_path)
+        os.makedirs(output_subdir, exist_ok=True)
+        
+        # calculo el directorio destino  
+        filename_wo_ext = os.path.splitext(filename)[0]
+        final_path = os.path.join(output_subdir, filename_wo_ext)
+
+        # si no es capaz de detectar la cara, no se generan los recortes y se loguea
+        if face_rect_86 is not None:
+            self._process_face(face_rect_86, resized_image_1, final_path)
+        else:
+            self.metrics.increment('no_face')
+            with open(os.path.join(log_dir, "log.txt"), "a") as log_file:
+                    log_file.write(f"no se pudo procesar: {filename}\n")
+            # agrego el prefijo "error_" a output_dir y continúo el proceso+
+            final_path = os.path.join(output_subdir, f"error_{filename_wo_ext}")
+            
+                                        
+        # proceso las áreas del primer escalado
+        self._process_rect(AvatarSize.S_204x350, resized_image_1, final_path)
+        self._process_rect(AvatarSize.S_204x175, resized_image_1, final_path)
+        # proceso las áreas del segundo escalado
+        self._process_rect(AvatarSize.S_136x234, resized_image_2, final_path)
+            
+        if face_rect_38 is not None:
+            self._process_face(face_rect_38, resized_image_2, final_path)
+            
+        # guardo una copia de la imagen original con fondo removido
+        original_copy_path = os.path.join(final_path, f"original.png")
+        with self.metrics.time('encode'):
+            image_with_bg_removed.save(original_copy_path)
+        return final_path
+
+    def create_master(self, image_path: str, output_subdir: str, log_dir: str,
+                      image_bytes: Optional[bytes] = None,
+                      segmented: Optional[Image.Image] = None) -> Optional[str]:
+        """
+        Modo bajo demanda: guarda solo el master recortado, su posición en la imagen
+        original y el centro de la cara. Los tamaños se renderizan después con AvatarRenderer.
+        Los argumentos son los de process_image.
+
+        Returns:
+            str: Carpeta del master, o None si falló la remoción de fondo
+        """
+        with span('image', file=image_path), profile_image():
+            start = time.time()
+            image_with_bg_removed = segmented if segmented is not None else self._segment_within_budget(
+                image_path, output_subdir, log_dir, image_bytes)
+            if image_with_bg_removed is None:
+                return None
+            with self.metrics.time('crop'):
+                box = content_box(image_with_bg_removed)
+                master = (image_with_bg_removed if image_with_bg_removed.mode == 'RGBA'
+                          else image_with_bg_removed.convert('RGBA')).crop(box)
+
+            filename = os.path.basename(image_path)
+            filename_wo_ext = os.path.splitext(filename)[0]
+            final_path = os.path.join(output_subdir, filename_wo_ext)
+
+            # la cara se busca sobre el mismo escalado sin recortar que usa el modo completo
+            scale = AvatarSize.S_204x350
+            with self.metrics.time('resize'):
+                resized_image = self._resize_image(image_with_bg_removed, scale.value[2], scale.value[3])
+            allow_full_search = self._allow_full_fallback()
+            face_rect = self.face_detector.detect_face_center_rect_optimized(resized_image, (86, 86),
+                                                                             allow_full_search)
+            self._record_skipped_fallback(image_path, allow_full_search, face_rect)
+            if face_rect is None:
+                self.metrics.increment('no_face')
+                with open(os.path.join(log_dir, "log.txt"), "a") as log_file:
+                    log_file.write(f"no se pudo procesar: {filename}\n")
+                final_path = os.path.join(output_subdir, f"error_{filename_wo_ext}")
+                face_center = None
+            else:
+                face_center = face_center_from_rect(face_rect, scale)
+
+            with self.metrics.time('encode'):
+                save_master(final_path, master, face_center, image_with_bg_removed.size, box[:2])
+            for image in (resized_image, master, image_with_bg_removed):
+                image.close()
+            self.metrics.observe('total', time.time() - start)
+            if self.time_budget is not None:
+                self.time_budget.finish_image(image_path)
+            print(f"✅ Master guardado: {final_path}")
+            return final_path
+
+    def warm_up(self) -> None:
+        """
+        Ejecuta una inferencia de calentamiento de ambos modelos sobre una imagen sintética,
+        para que la primera imagen real no pague la inicialización perezosa.
+        """
+        size = AvatarSize.S_204x350.value
+        synthetic = Image.new('RGB', (size[2], size[3]), (240, 240, 240))
+        synthetic.paste((200, 160, 140), (62, 30, 142, 130))
+
+        self.face_detector.detect_face_center_rect(synthetic, (86, 86))
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_path = os.path.join(temp_dir, 'warmup.png')
+            synthetic.save(input_path)
+            self.bg_remover.remove_background(input_path, os.path.join(temp_dir, 'warmup_out.png'))
+        # el calentamiento no cuenta en las métricas
+        self.metrics.drain()
 
-                    # redimensiono la imagen al tamaño máximo de 204x350
-                    size = AvatarSize.S_204x350.value
-                    resized_image_1 = self._resize_image(image_with_bg_removed, size[2], size[3])
-                    
-                    # redimesiono la imagen al tamaño máximo de 136x234
-                    size = AvatarSize.S_136x234.value
-                    resized_image_2 = self._resize_image(image_with_bg_removed, size[2], size[3])
-
-                   
-                    # genero los recortes para 86x86 y 38x38 partiendo de la posición de la cara
-                    # pero si no es capaz de detectar la cara, no se generan los recortes y se loguea
-                    # Uso el método optimizado para avatares de cuerpo completo
-                    faceRect = self.face_detector.detect_face_center_rect_optimized(resized_image_1, (86, 86))
-                    if faceRect is not None:
-                        self._process_face(faceRect, resized_image_1, final_path)
-                    else:
-                        with open(os.path.join(output_dir, "log.txt"), "a") as log_file:
-                                log_file.write(f"no se pudo procesar: {filename}\n")
-                        # agrego el prefijo "error_" a output_dir y continúo el proceso+
-                        final_path = os.path.join(output_subdir, f"error_{filename_wo_ext}")
-                        
-                                                    
-                    # proceso las áreas del primer escalado
-                    self._process_rect(AvatarSize.S_204x350, resized_image_1, final_path)
-                    self._process_rect(AvatarSize.S_204x175, resized_image_1, final_path)
-                    # proceso las áreas del segundo escalado
-                    self._process_rect(AvatarSize.S_136x234, resized_image_2, final_path)
-                        
-                    faceRect = self.face_detector.detect_face_center_rect_optimized(resized_image_2, (38, 38))
-                    if faceRect is not None:
-                        self._process_face(faceRect, resized_image_2, final_path)
-                        
-                    # guardo una copia de la imagen original con fondo removido
-                    original_copy_path = os.path.join(final_path, f"original.png")
-                    image_with_bg_removed.save(original_copy_path)
-                    
-                    # Calcular tiempo de procesamiento de esta imagen
-                    img_end_time = time.time()
-                    img_time = img_end_time - img_start_time
-                    
-                    print(f"✅ Procesado: {final_path} (⏱️ {img_time:.2f}s)")
-                
     def _remove_background(self, input_image_path: str, output_image_path: str) -> None:
         """Remueve el fondo usando bgremover directamente."""
         success = self.bg_remover.remove_background(input_image_path, output_image_path)
-        if not success:
+        if success is False:
             print(f"❌ Error removiendo fondo de {input_image_path}")
 
     def _resize_image(self, image: Image.Image, width: int, height: int) -> Image.Image:
@@ -173,9 +517,12 @@ class ImageProcessor:
 
     def _process_face(self, faceRect, image: Image.Image, output_dir: str) -> None:
         x, y, w, h = faceRect
-        face_image = image.crop((x, y, x + w, y + h))
+        with self.metrics.time('crop'):
+            face_image = image.crop((x, y, x + w, y + h))
         os.makedirs(output_dir, exist_ok=True)
-        face_image.save(os.path.join(output_dir, f"avatar_{w}x{h}.png"))
+        with self.metrics.time('encode'):
+            face_image.save(os.path.join(output_dir, f"avatar_{w}x{h}.png"))
+        face_image.close()
         
     def _process_rect(self, areaRect, image: Image.Image, output_dir: str) -> None:
         x, y, w, h = areaRect.value  # Accede al valor del enum antes de desempaquetar
@@ -184,8 +531,11 @@ class ImageProcessor:
 
     def _crop_and_save_areas(self, image: Image.Image, face_coords, output_dir: str) -> None:
         x, y, w, h = face_coords
-        face_image = image.crop((x, y, x + w, y + h))
-
         size = (face_coords[2], face_coords[3])
-        cropped = face_image.resize(size, Image.LANCZOS)
-        cropped.save(os.path.join(output_dir, f"avatar_{size[0]}x{size[1]}.png"))
\ No newline at end of file
+        with self.metrics.time('crop'):
+            face_image = image.crop((x, y, x + w, y + h))
+            cropped = face_image.resize(size, Image.LANCZOS)
+            face_image.close()
+        with self.metrics.time('encode'):
+            cropped.save(os.path.join(output_dir, f"avatar_{size[0]}x{size[1]}.png"))
+        cropped.close()
\ No newline at end of file
@@ -0,0 +1,116 @@
+"""
+Descubrimiento de imágenes en un solo recorrido y lectura anticipada.
+
+scan_images recorre el árbol con os.scandir (el tipo de cada entrada viene del
+propio listado; tamaño y mtime cuestan un stat por imagen en Linux) y devuelve
+la lista completa, que sirve tanto para el total de progreso como para
+alimentar el pipeline. Como el os.walk al que reemplaza, no entra en enlaces
+simbólicos a directorios: un enlace circular no repite imágenes.
+PrefetchingReader lee en hilos los bytes de los siguientes N archivos mientras
+la imagen actual está en el modelo, ocultando la latencia de almacenamiento en red.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from .tracing import span
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+class ImageEntry(NamedTuple):
+    """Imagen encontrada en el directorio de entrada."""
+    path: str
+    relative_dir: str   # Subdirectorio relativo a la raíz ('.' en la raíz)
+    size: int
+    mtime: float
+
+
+def scan_images(input_dir: str, extensions: Tuple[str, ...] = IMAGE_EXTENSIONS) -> List[ImageEntry]:
+    """
+    Recorre input_dir una sola vez y devuelve las imágenes ordenadas por ruta.
+
+    Args:
+        input_dir: Directorio raíz a recorrer
+        extensions: Extensiones aceptadas (en minúsculas)
+
+    Returns:
+        List[ImageEntry]: Imágenes con su ruta, subdirectorio relativo, tamaño y mtime
+    """
+    entries = []
+    pending = [input_dir]
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as iterator:
+                for entry in iterator:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.is_file(follow_symlinks=True) and entry.name.lower().endswith(extensions):
+                            stat = entry.stat()
+                            entries.append(ImageEntry(
+                                entry.path,
+                                os.path.relpath(directory, input_dir),
+                                stat.st_size,
+                                stat.st_mtime
+                            ))
+                    except OSError as e:
+                        print(f"⚠️ No se pudo leer {entry.path}: {e}")
+        except OSError as e:
+            print(f"⚠️ No se pudo recorrer {directory}: {e}")
+    entries.sort(key=lambda item: item.path)
+    return entries
+
+
+def _read_bytes(path: str) -> Optional[bytes]:
+    try:
+        with span('read', file=path), open(path, 'rb') as f:
+            return f.read()
+    except OSError as e:
+        print(f"⚠️ No se pudo leer {path}: {e}")
+        return None
+
+
+class PrefetchingReader:
+    """
+    Itera las imágenes en orden junto con sus bytes, leyendo por adelantado.
+
+    Mientras el consumidor procesa una imagen, los `prefetch` archivos siguientes
+    se leen en segundo plano; nunca se carga el directorio entero en memoria.
+    Si un archivo no se puede leer se devuelve con datos None y el consumidor
+    decide qué hacer (ImageProcessor vuelve a leer desde la ruta).
+    """
+
+    def __init__(self, entries: Iterable[ImageEntry], prefetch: int = 4, max_workers: Optional[int] = None):
+        """
+        Args:
+            entries: Imágenes a leer (normalmente el resultado de scan_images)
+            prefetch: Número de archivos leídos por adelantado
+            max_workers: Hilos de lectura (por defecto, igual a prefetch)
+        """
+        self.entries = entries
+        self.prefetch = max(1, prefetch)
+        self.max_workers = max_workers or self.prefetch
+        self.bytes_read = 0
+
+    def __iter__(self) -> Iterator[Tuple[ImageEntry, Optional[bytes]]]:
+        entries = iter(self.entries)
+        window = deque()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="prefetch") as executor:
+            for entry in entries:
+                window.append((entry, executor.submit(_read_bytes, entry.path)))
+                if len(window) >= self.prefetch:
+                    break
+            while window:
+                entry, future = window.popleft()
+                # Se encola la siguiente lectura antes de esperar la actual
+                next_entry = next(entries, None)
+                if next_entry is not None:
+                    window.append((next_entry, executor.submit(_read_bytes, next_entry.path)))
+                data = future.result()
+                if data is not None:
+                    self.bytes_read += len(data)
+                yield entry, data
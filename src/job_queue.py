@@ -0,0 +1,301 @@
+"""
+Cola de trabajos persistente en SQLite para repartir imágenes entre procesos y máquinas.
+
+Cada imagen es un trabajo con estado pending -> leased -> done (o dead tras
+agotar los reintentos). Un worker obtiene trabajos con un lease de duración
+limitada y lo renueva con heartbeats mientras procesa; si el worker muere, el
+lease caduca y otro worker recoge el trabajo. Todas las transiciones se hacen
+en transacciones BEGIN IMMEDIATE, así que dos workers nunca reciben el mismo trabajo.
+"""
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    image_path TEXT NOT NULL UNIQUE,
+    output_subdir TEXT NOT NULL,
+    log_dir TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    result_path TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires);
+"""
+
+JOB_STATUSES = ('pending', 'leased', 'done', 'dead')
+
+
+class Job(NamedTuple):
+    """Trabajo obtenido con lease."""
+    id: int
+    image_path: str
+    output_subdir: str
+    log_dir: str
+    attempts: int
+
+
+def default_worker_id() -> str:
+    """Identificador único del worker en el cluster: host y pid."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue:
+    """
+    Cola de trabajos en un archivo SQLite compartido.
+
+    Cada operación abre su propia conexión, por lo que la cola se puede usar
+    desde varios hilos y procesos (también tras un fork). Por defecto se usa el
+    journal de rollback, que funciona sobre montajes compartidos entre hosts;
+    el modo WAL es más rápido pero solo es seguro si todos los procesos están
+    en la misma máquina.
+    """
+
+    def __init__(self, db_path: str, lease_seconds: float = 300, max_attempts: int = 3,
+                 wal: bool = False, clock: Callable[[], float] = time.time):
+        """
+        Args:
+            db_path: Ruta del archivo SQLite (en el montaje compartido para varios hosts)
+            lease_seconds: Duración de un lease sin heartbeat
+            max_attempts: Intentos antes de mover un trabajo a dead-letter
+            wal: Usar journal_mode=WAL (solo con todos los workers en un mismo host)
+            clock: Reloj de pared (inyectable en pruebas); los hosts deben estar sincronizados
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.clock = clock
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            if wal:
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """Transacción con lock de escritura desde el inicio (evita carreras entre lectura y update)."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def enqueue(self, tasks: Iterable[Tuple[str, str, str]]) -> int:
+        """
+        Añade trabajos (image_path, output_subdir, log_dir); las imágenes ya encoladas se ignoran.
+
+        Returns:
+            int: Número de trabajos nuevos
+        """
+        now = self.clock()
+        rows = [(image_path, output_subdir, log_dir, now, now) for image_path, output_subdir, log_dir in tasks]
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs (image_path, output_subdir, log_dir, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)", rows
+            )
+            return conn.total_changes - before
+
+    def lease(self, worker_id: str, limit: int = 1) -> List[Job]:
+        """
+        Reserva hasta `limit` trabajos pendientes (o con lease caducado) para un worker.
+
+        Los trabajos con lease caducado que ya agotaron sus intentos pasan a dead-letter.
+        """
+        now = self.clock()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'dead', worker = NULL, updated_at = ?, "
+                "last_error = COALESCE(last_error, 'lease caducado') "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+            rows = conn.execute(
+                "SELECT id, image_path, output_subdir, log_dir, attempts FROM jobs "
+                "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+                "ORDER BY id LIMIT ?",
+                (now, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                [(worker_id, now + self.lease_seconds, now, row[0]) for row in rows]
+            )
+        return [Job(row[0], row[1], row[2], row[3], row[4] + 1) for row in rows]
+
+    def heartbeat(self, job_id: int, worker_id: str) -> bool:
+        """
+        Renueva el lease de un trabajo.
+
+        Returns:
+            bool: False si el worker ya no tiene el lease (caducó y otro lo recogió)
+        """
+        now = self.clock()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                (now + self.lease_seconds, now, job_id, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker_id: str, result_path: Optional[str] = None) -> bool:
+        """Marca un trabajo como terminado (solo si el worker conserva el lease)."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'done', worker = NULL, lease_expires = NULL, "
+                "result_path = ?, last_error = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                (result_path, self.clock(), job_id, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: int, worker_id: str, error: str) -> Optional[str]:
+        """
+        Registra un fallo: el trabajo vuelve a pending o pasa a dead si agotó los intentos.
+
+        Returns:
+            str: Nuevo estado ('pending' o 'dead'), o None si el worker ya no tenía el lease
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'dead' ELSE 'pending' END, "
+                "worker = NULL, lease_expires = NULL, last_error = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                (self.max_attempts, error, self.clock(), job_id, worker_id)
+            )
+            if cursor.rowcount != 1:
+                return None
+            return conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+    def retry_dead(self) -> int:
+        """Devuelve los trabajos de dead-letter a pending con los intentos a cero."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'pending', attempts = 0, updated_at = ? WHERE status = 'dead'",
+                (self.clock(),)
+            )
+            return cursor.rowcount
+
+    def dead_letters(self) -> List[dict]:
+        """Trabajos en dead-letter con su último error."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, image_path, attempts, last_error FROM jobs WHERE status = 'dead' ORDER BY id"
+            ).fetchall()
+        return [{'id': row[0], 'image_path': row[1], 'attempts': row[2], 'last_error': row[3]} for row in rows]
+
+    def get_stats(self) -> dict:
+        """Número de trabajos por estado."""
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        stats = {status: counts.get(status, 0) for status in JOB_STATUSES}
+        stats['total'] = sum(stats.values())
+        return stats
+
+
+class JobWorker:
+    """
+    Procesa trabajos de una JobQueue con un ImageProcessor, renovando el lease en segundo plano.
+    """
+
+    def __init__(self, queue: JobQueue, processor, worker_id: Optional[str] = None,
+                 heartbeat_interval: Optional[float] = None, task_method: str = 'process_image'):
+        """
+        Args:
+            queue: Cola de trabajos
+            processor: ImageProcessor (o cualquier objeto con el método task_method)
+            worker_id: Identificador del worker (por defecto host:pid)
+            heartbeat_interval: Segundos entre heartbeats (por defecto un tercio del lease)
+            task_method: Método del procesador que ejecuta cada trabajo
+        """
+        self.queue = queue
+        self.processor = processor
+        self.worker_id = worker_id or default_worker_id()
+        self.heartbeat_interval = heartbeat_interval or queue.lease_seconds / 3
+        self.process = getattr(processor, task_method)
+        self.completed = 0
+        self.failed = 0
+
+    def _heartbeat_loop(self, active: set, stop_event: threading.Event) -> None:
+        while not stop_event.wait(self.heartbeat_interval):
+            for job in list(active):
+                if not self.queue.heartbeat(job.id, self.worker_id):
+                    print(f"⚠️ {self.worker_id}: se perdió el lease de {job.image_path}")
+                    active.discard(job)
+
+    def run_batch(self, jobs: List[Job]) -> None:
+        """Procesa los trabajos de un lease renovando en segundo plano los que siguen pendientes."""
+        active = set(jobs)
+        stop_event = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat_loop, args=(active, stop_event), daemon=True)
+        heartbeat.start()
+        try:
+            for job in jobs:
+                self.run_job(job)
+                active.discard(job)
+        finally:
+            stop_event.set()
+            heartbeat.join()
+
+    def run_job(self, job: Job) -> bool:
+        """Procesa un trabajo y registra el resultado en la cola."""
+        try:
+            final_path = self.process(job.image_path, job.output_subdir, job.log_dir)
+            error = None if final_path is not None else "error removiendo el fondo"
+        except Exception as e:
+            final_path = None
+            error = f"{type(e).__name__}: {e}"
+
+        if error is None:
+            self.queue.complete(job.id, self.worker_id, final_path)
+            self.completed += 1
+            return True
+        status = self.queue.fail(job.id, self.worker_id, error)
+        self.failed += 1
+        if status == 'dead':
+            print(f"☠️ {job.image_path} movida a dead-letter tras {job.attempts} intentos: {error}")
+        return False
+
+    def run(self, follow: bool = False, idle_sleep: float = 5.0,
+            stop_event: Optional[threading.Event] = None, batch_size: int = 1) -> dict:
+        """
+        Procesa trabajos hasta vaciar la cola (o indefinidamente con follow=True).
+
+        Returns:
+            dict: Trabajos completados y fallidos por este worker
+        """
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            jobs = self.queue.lease(self.worker_id, batch_size)
+            if not jobs:
+                if not follow:
+                    break
+                stop_event.wait(idle_sleep)
+                continue
+            self.run_batch(jobs)
+        return {'worker': self.worker_id, 'completed': self.completed, 'failed': self.failed}
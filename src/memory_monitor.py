@@ -0,0 +1,187 @@
+"""
+Medición de memoria del proceso actual (RSS y memoria privada).
+
+Para ejecuciones largas, MemoryTracker toma una muestra cada N imágenes (RSS
+actual y pico, memoria privada y, opcionalmente, objetos vivos por tipo) e
+indica cuándo el proceso supera su techo de memoria para que el pool lo recicle.
+MemoryReport reúne las muestras de todos los procesos y señala los tipos de
+objeto cuyo número no deja de crecer entre muestras (candidatos a fuga).
+"""
+
+import gc
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+
+def current_rss_bytes() -> int:
+    """RSS actual del proceso en bytes (0 si no se puede medir)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    """Pico de RSS del proceso en bytes (0 si no se puede medir)."""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa en KB, macOS en bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def private_memory_bytes() -> int:
+    """
+    Memoria privada del proceso (no compartida con otros procesos) en bytes.
+
+    Tras un fork, las páginas de los modelos precargados en el padre siguen
+    compartidas y no cuentan aquí. Devuelve 0 si /proc/self/smaps_rollup no existe.
+    """
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            total_kb = 0
+            for line in f:
+                if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                    total_kb += int(line.split()[1])
+            return total_kb * 1024
+    except (OSError, ValueError):
+        return 0
+
+
+def format_bytes(value: int) -> str:
+    """Formatea un tamaño en bytes de forma legible."""
+    size = float(value)
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{int(size)} B"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def object_counts(limit: int = 200) -> Dict[str, int]:
+    """Objetos vivos seguidos por el GC, por tipo (los `limit` tipos más numerosos)."""
+    counts = Counter(f"{type(obj).__module__}.{type(obj).__qualname__}" for obj in gc.get_objects())
+    return dict(counts.most_common(limit))
+
+
+class MemoryTracker:
+    """Muestras periódicas de memoria de un proceso (cada worker usa su propia copia tras el fork)."""
+
+    def __init__(self, every: int = 100, max_rss_bytes: int = 0, track_objects: bool = False):
+        """
+        Args:
+            every: Tomar una muestra cada N imágenes
+            max_rss_bytes: Techo de RSS a partir del cual el proceso debe reciclarse (0 = sin techo)
+            track_objects: Contar los objetos vivos por tipo en cada muestra (recorre el heap)
+        """
+        self.every = max(1, every)
+        self.max_rss_bytes = max_rss_bytes
+        self.track_objects = track_objects
+        self.images = 0
+        self.samples: List[dict] = []
+
+    def image_done(self) -> Optional[dict]:
+        """Cuenta una imagen y devuelve la muestra si corresponde tomarla."""
+        self.images += 1
+        if self.images % self.every:
+            return None
+        return self.sample()
+
+    def sample(self) -> dict:
+        if self.track_objects:
+            # solo cuenta lo que sigue referenciado, no la basura de ciclos pendiente
+            gc.collect()
+        sample = {
+            'pid': os.getpid(),
+            'images': self.images,
+            'time': time.time(),
+            'rss_bytes': current_rss_bytes(),
+            'peak_rss_bytes': peak_rss_bytes(),
+            'private_bytes': private_memory_bytes()
+        }
+        if self.track_objects:
+            sample['objects'] = object_counts()
+        self.samples.append(sample)
+        return sample
+
+    def over_limit(self) -> bool:
+        """True si el proceso supera su techo de RSS."""
+        return bool(self.max_rss_bytes) and current_rss_bytes() > self.max_rss_bytes
+
+
+class MemoryReport:
+    """Muestras de memoria de todos los procesos de una ejecución y reciclados de workers."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[dict]] = {}
+        self.recycles: List[dict] = []
+
+    def add(self, process: str, sample: Optional[dict]) -> None:
+        """Añade la muestra de un proceso (se identifica por nombre y pid: un worker reciclado es otro proceso)."""
+        if sample:
+            self.samples.setdefault(f"{process} (pid {sample['pid']})", []).append(sample)
+
+    def recycled(self, worker: str, message: dict) -> None:
+        self.recycles.append({'worker': worker, 'pid': message['pid'], 'images': message['images'],
+                              'rss_bytes': message['rss_bytes'], 'time': time.time()})
+
+    def growing_objects(self, min_samples: int = 3, min_growth: int = 50) -> List[dict]:
+        """
+        Tipos cuyo número de objetos nunca baja entre muestras consecutivas de un proceso
+        y crece al menos min_growth desde la primera.
+        """
+        growing = []
+        for process, samples in self.samples.items():
+            counted = [sample['objects'] for sample in samples if 'objects' in sample]
+            if len(counted) < min_samples:
+                continue
+            for type_name in counted[-1]:
+                series = [counts.get(type_name, 0) for counts in counted]
+                growth = series[-1] - series[0]
+                if growth >= min_growth and all(b >= a for a, b in zip(series, series[1:])):
+                    growing.append({'process': process, 'type': type_name, 'first': series[0],
+                                    'last': series[-1], 'growth': growth})
+        return sorted(growing, key=lambda item: -item['growth'])
+
+    def summary(self) -> Dict[str, dict]:
+        """Por proceso: imágenes, RSS de la primera y última muestra y pico."""
+        return {
+            process: {
+                'images': samples[-1]['images'],
+                'first_rss_bytes': samples[0]['rss_bytes'],
+                'last_rss_bytes': samples[-1]['rss_bytes'],
+                'peak_rss_bytes': max(sample['peak_rss_bytes'] for sample in samples)
+            }
+            for process, samples in self.samples.items()
+        }
+
+    def to_dict(self) -> dict:
+        return {'processes': self.summary(), 'recycles': self.recycles,
+                'growing_objects': self.growing_objects(), 'samples': self.samples}
+
+    def write(self, path: str) -> None:
+        """Guarda el informe en JSON (escritura atómica)."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(temp_path, path)
+
+    def print_report(self) -> None:
+        if not self.samples and not self.recycles:
+            return
+        print("🧠 Memoria por proceso (primera → última muestra, pico):")
+        for process, stats in self.summary().items():
+            print(f"   {process}: {stats['images']} imágenes, RSS {format_bytes(stats['first_rss_bytes'])} → "
+                  f"{format_bytes(stats['last_rss_bytes'])}, pico {format_bytes(stats['peak_rss_bytes'])}")
+        if self.recycles:
+            print(f"♻️ Workers reciclados por superar el techo de memoria: {len(self.recycles)}")
+        for item in self.growing_objects()[:10]:
+            print(f"⚠️ Objetos en crecimiento en {item['process']}: {item['type']} "
+                  f"{item['first']} → {item['last']} (+{item['growth']})")
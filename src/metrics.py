@@ -0,0 +1,232 @@
+"""
+Métricas por etapa del pipeline: histogramas de tiempos y contadores de eventos.
+
+Cada ImageProcessor registra cuánto tarda cada etapa de cada imagen
+(segmentación, decodificación, escalado, detección en la zona superior y en la
+imagen completa, recorte y codificación) y cuenta fallos y búsquedas de cara
+con fallback. Los registros de varios workers se combinan con merge() y se
+exportan como JSON o en el formato de texto de Prometheus.
+"""
+
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence
+
+from .profiling import profile_stage
+from .tracing import span
+
+# Límites superiores de los buckets en segundos (el último bucket, +Inf, es implícito)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Etapas en orden del pipeline; crop y encode se miden por archivo generado, el resto por imagen
+STAGES = ('segmentation', 'decode', 'resize', 'detection_top', 'detection_full', 'crop', 'encode', 'total')
+
+
+class Histogram:
+    """Histograma acumulativo de duraciones con buckets fijos (compatible con Prometheus)."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Cuantil estimado por interpolación lineal dentro del bucket (como histogram_quantile)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - cumulative) / bucket_count)
+            cumulative += bucket_count
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'counts': list(self.counts)
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, buckets: Sequence[float] = DEFAULT_BUCKETS) -> 'Histogram':
+        histogram = cls(buckets)
+        histogram.counts = list(data['counts'])
+        histogram.count = data['count']
+        histogram.sum = data['sum']
+        histogram.max = data['max']
+        return histogram
+
+    def merge(self, other: 'Histogram') -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+
+class PipelineMetrics:
+    """
+    Registro de métricas de un proceso, seguro entre hilos.
+
+    Los workers envían al padre su snapshot con drain(), que además lo reinicia,
+    y el padre lo acumula con merge(); así cada observación se cuenta una vez.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str):
+        """
+        Mide el bloque y lo registra en el histograma de la etapa (también si lanza una excepción).
+        Con la traza activada, el bloque además queda como un span con el nombre de la etapa,
+        y con el perfilado por etapas, cProfile se activa dentro de las etapas seleccionadas.
+        """
+        start = time.perf_counter()
+        try:
+            with span(stage), profile_stage(stage):
+                yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def increment(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def snapshot(self) -> dict:
+        """Estado serializable (se puede enviar entre procesos y combinar con merge)."""
+        with self._lock:
+            return {
+                'histograms': {stage: h.to_dict() for stage, h in self.histograms.items()},
+                'counters': dict(self.counters)
+            }
+
+    def drain(self) -> dict:
+        """Devuelve el snapshot y reinicia el registro."""
+        with self._lock:
+            snapshot = {
+                'histograms': {stage: h.to_dict() for stage, h in self.histograms.items()},
+                'counters': dict(self.counters)
+            }
+            self.histograms = {}
+            self.counters = {}
+        return snapshot
+
+    def merge(self, snapshot: Optional[dict]) -> None:
+        """Acumula el snapshot de otro registro (por ejemplo, de un worker)."""
+        if not snapshot:
+            return
+        with self._lock:
+            for stage, data in snapshot['histograms'].items():
+                other = Histogram.from_dict(data, self.buckets)
+                if stage in self.histograms:
+                    self.histograms[stage].merge(other)
+                else:
+                    self.histograms[stage] = other
+            for counter, value in snapshot['counters'].items():
+                self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def to_dict(self) -> dict:
+        """Resumen por etapa (count, media, p50, p95, máximo en ms y buckets) y contadores."""
+        with self._lock:
+            histograms = dict(self.histograms)
+            counters = dict(self.counters)
+        stages = {}
+        for stage in sorted(histograms, key=_stage_order):
+            histogram = histograms[stage]
+            stages[stage] = {
+                'count': histogram.count,
+                'total_seconds': round(histogram.sum, 6),
+                'mean_ms': round(1000 * histogram.sum / histogram.count, 3) if histogram.count else 0.0,
+                'p50_ms': round(1000 * histogram.quantile(0.5), 3),
+                'p95_ms': round(1000 * histogram.quantile(0.95), 3),
+                'max_ms': round(1000 * histogram.max, 3),
+                'buckets': {_format_bound(bound): count
+                            for bound, count in zip(self.buckets + (float('inf'),), histogram.counts)}
+            }
+        return {'stages': stages, 'counters': dict(sorted(counters.items()))}
+
+    def to_prometheus(self, prefix: str = 'avatar_pipeline') -> str:
+        """Formato de exposición de texto de Prometheus (histograma por etapa y contador por evento)."""
+        with self._lock:
+            histograms = dict(self.histograms)
+            counters = dict(self.counters)
+        lines = [
+            f"# HELP {prefix}_stage_seconds Duración de cada etapa del pipeline por imagen.",
+            f"# TYPE {prefix}_stage_seconds histogram"
+        ]
+        for stage in sorted(histograms, key=_stage_order):
+            histogram = histograms[stage]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), histogram.counts):
+                cumulative += count
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{_format_bound(bound)}"}} '
+                             f'{cumulative}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum!r}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        lines.append(f"# HELP {prefix}_events_total Fallos y fallbacks del pipeline.")
+        lines.append(f"# TYPE {prefix}_events_total counter")
+        for counter, value in sorted(counters.items()):
+            lines.append(f'{prefix}_events_total{{event="{counter}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Guarda las métricas (Prometheus si la extensión es .prom, JSON en otro caso) de forma atómica."""
+        if path.endswith('.prom'):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.to_dict(), indent=2)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def print_report(self) -> None:
+        """Tabla de tiempos por etapa y contadores."""
+        summary = self.to_dict()
+        if not summary['stages'] and not summary['counters']:
+            return
+        print("⏱️ Tiempos por etapa (ms):")
+        print(f"   {'etapa':<16}{'n':>7}{'media':>10}{'p50':>10}{'p95':>10}{'máx':>10}{'total s':>10}")
+        for stage, data in summary['stages'].items():
+            print(f"   {stage:<16}{data['count']:>7}{data['mean_ms']:>10.1f}{data['p50_ms']:>10.1f}"
+                  f"{data['p95_ms']:>10.1f}{data['max_ms']:>10.1f}{data['total_seconds']:>10.2f}")
+        for counter, value in summary['counters'].items():
+            print(f"   🔢 {counter}: {value}")
+
+
+def _stage_order(stage: str):
+    return (STAGES.index(stage) if stage in STAGES else len(STAGES), stage)
+
+
+def _format_bound(bound: float) -> str:
+    return '+Inf' if bound == float('inf') else repr(bound)
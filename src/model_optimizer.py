@@ -0,0 +1,114 @@
+"""
+Generación y persistencia de variantes optimizadas de los modelos de segmentación.
+
+Variantes soportadas:
+- 'fp32': modelo original de rembg, sin cambios
+- 'int8': cuantización dinámica INT8 de los pesos (onnxruntime.quantization)
+- 'optimized': grafo optimizado por ONNX Runtime (fusión de nodos, constant folding)
+
+Las variantes se guardan junto al modelo original (directorio de rembg) y solo
+se regeneran si el modelo original es más reciente.
+"""
+
+import os
+import tempfile
+from typing import Optional
+
+MODEL_VARIANTS = ('fp32', 'int8', 'optimized')
+
+VARIANT_SUFFIXES = {
+    'int8': '.int8.onnx',
+    'optimized': '.opt.onnx'
+}
+
+
+def get_model_home() -> str:
+    """Directorio donde rembg guarda los modelos (U2NET_HOME o ~/.u2net)."""
+    return os.path.expanduser(os.environ.get('U2NET_HOME', os.path.join('~', '.u2net')))
+
+
+class ModelOptimizer:
+    """Crea y reutiliza las variantes optimizadas de un modelo ONNX de rembg."""
+
+    def __init__(self, model_home: Optional[str] = None):
+        self.model_home = model_home or get_model_home()
+
+    def source_model_path(self, model_name: str) -> str:
+        """
+        Ruta del modelo original. Si no está descargado, lo descarga con rembg.
+
+        Raises:
+            FileNotFoundError: Si el modelo no existe y no se pudo descargar
+        """
+        path = os.path.join(self.model_home, f"{model_name}.onnx")
+        if not os.path.exists(path):
+            try:
+                from rembg import new_session
+                new_session(model_name)
+            except ImportError:
+                pass
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No se encontró el modelo {model_name} en {self.model_home}")
+        return path
+
+    def variant_path(self, model_name: str, variant: str) -> str:
+        """Ruta donde se guarda (o guardaría) una variante del modelo."""
+        if variant not in MODEL_VARIANTS:
+            raise ValueError(f"Variante no válida: {variant}. Disponibles: {list(MODEL_VARIANTS)}")
+        if variant == 'fp32':
+            return os.path.join(self.model_home, f"{model_name}.onnx")
+        return os.path.join(self.model_home, f"{model_name}{VARIANT_SUFFIXES[variant]}")
+
+    def is_up_to_date(self, model_name: str, variant: str) -> bool:
+        """Indica si la variante persistida existe y es posterior al modelo original."""
+        path = self.variant_path(model_name, variant)
+        source = self.variant_path(model_name, 'fp32')
+        if not os.path.exists(path) or not os.path.exists(source):
+            return False
+        return os.path.getmtime(path) >= os.path.getmtime(source)
+
+    def ensure_variant(self, model_name: str, variant: str) -> str:
+        """
+        Devuelve la ruta de la variante, generándola solo si no existe o está desactualizada.
+
+        Raises:
+            ImportError: Si onnxruntime no está instalado
+        """
+        source = self.source_model_path(model_name)
+        if variant == 'fp32':
+            return source
+
+        target = self.variant_path(model_name, variant)
+        if self.is_up_to_date(model_name, variant):
+            return target
+
+        print(f"⚙️ Generando variante {variant} de {model_name}...")
+        # Se escribe en un archivo temporal para que otro proceso nunca lea un modelo a medio escribir
+        fd, tmp_path = tempfile.mkstemp(dir=self.model_home, suffix='.onnx.tmp')
+        os.close(fd)
+        try:
+            if variant == 'int8':
+                self._quantize_int8(source, tmp_path)
+            else:
+                self._optimize_graph(source, tmp_path)
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        print(f"✅ Variante guardada: {target}")
+        return target
+
+    @staticmethod
+    def _quantize_int8(source: str, target: str) -> None:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(source, target, weight_type=QuantType.QUInt8)
+
+    @staticmethod
+    def _optimize_graph(source: str, target: str) -> None:
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.optimized_model_filepath = target
+        # Crear la sesión es lo que escribe el grafo optimizado en disco
+        ort.InferenceSession(source, options, providers=['CPUExecutionProvider'])
@@ -0,0 +1,237 @@
+"""
+Perfilado de ejecuciones reales: cProfile por imagen o por etapa y snapshots de tracemalloc.
+
+Igual que la traza, el perfilador es global al proceso y está desactivado por
+defecto (profile_image() y profile_stage() devuelven un contexto vacío). Con
+configure() cada proceso (también los workers creados con fork) perfila una de
+cada sample_every imágenes, opcionalmente solo dentro de ciertas etapas, y toma
+un snapshot de tracemalloc cada tracemalloc_every imágenes. dump() guarda los
+archivos de cada proceso y summarize() combina los de todos en un resumen con
+las funciones más costosas y los sitios que más memoria asignan.
+"""
+
+import cProfile
+import glob
+import io
+import os
+import pstats
+import tracemalloc
+from contextlib import nullcontext
+from typing import Iterable, List, Optional
+
+_NULL_CONTEXT = nullcontext()
+
+SUMMARY_FILENAME = 'profile-summary.txt'
+# Marcos ignorados en los resúmenes de memoria (el propio tracemalloc y el import de módulos)
+_TRACEMALLOC_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+class _Sampled:
+    """Activa el perfil de cProfile mientras dura el bloque."""
+    __slots__ = ('profile',)
+
+    def __init__(self, profile: cProfile.Profile):
+        self.profile = profile
+
+    def __enter__(self):
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.disable()
+        return False
+
+
+class _ImageScope:
+    __slots__ = ('profiler', 'sampled')
+
+    def __init__(self, profiler: 'PipelineProfiler'):
+        self.profiler = profiler
+
+    def __enter__(self):
+        profiler = self.profiler
+        self.sampled = profiler.cprofile and profiler.images % profiler.sample_every == 0
+        profiler._current_sampled = self.sampled
+        if self.sampled:
+            profiler.sampled_images += 1
+            if not profiler.stages:
+                profiler._profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        profiler = self.profiler
+        if self.sampled and not profiler.stages:
+            profiler._profile.disable()
+        profiler._current_sampled = False
+        profiler.images += 1
+        if profiler.tracemalloc_every and profiler.images % profiler.tracemalloc_every == 0:
+            profiler.take_snapshot()
+        return False
+
+
+class PipelineProfiler:
+    """Perfilador del proceso actual."""
+
+    def __init__(self):
+        self.enabled = False
+        self.output_dir = None
+        self.cprofile = False
+        self.sample_every = 1
+        self.stages = frozenset()
+        self.tracemalloc_every = 0
+        self.top = 25
+        self._started_tracemalloc = False
+        self._reset()
+
+    def _reset(self) -> None:
+        self.images = 0
+        self.sampled_images = 0
+        self.snapshots: List[str] = []
+        self._profile = cProfile.Profile()
+        self._current_sampled = False
+
+    def configure(self, output_dir: str, cprofile: bool = True, sample_every: int = 1,
+                  stages: Optional[Iterable[str]] = None, tracemalloc_every: int = 0,
+                  tracemalloc_frames: int = 10, top: int = 25) -> None:
+        """
+        Args:
+            output_dir: Directorio de los .prof, snapshots y resúmenes
+            cprofile: Perfilar con cProfile
+            sample_every: Perfilar una de cada N imágenes
+            stages: Perfilar solo dentro de estas etapas (nombres de PipelineMetrics); None = toda la imagen
+            tracemalloc_every: Snapshot de tracemalloc cada N imágenes (0 = sin tracemalloc)
+            tracemalloc_frames: Marcos guardados por asignación
+            top: Entradas en los resúmenes
+        """
+        self.output_dir = output_dir
+        self.cprofile = cprofile
+        self.sample_every = max(1, sample_every)
+        self.stages = frozenset(stages or ())
+        self.tracemalloc_every = max(0, tracemalloc_every)
+        self.top = top
+        self._reset()
+        os.makedirs(output_dir, exist_ok=True)
+        if self.tracemalloc_every and not tracemalloc.is_tracing():
+            tracemalloc.start(tracemalloc_frames)
+            self._started_tracemalloc = True
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Desactiva el perfilador (y tracemalloc si lo inició configure)."""
+        self.enabled = False
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def profile_image(self):
+        """Contexto que envuelve el procesamiento de una imagen."""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _ImageScope(self)
+
+    def profile_stage(self, stage: str):
+        """Contexto de una etapa: solo perfila si la etapa está seleccionada y la imagen fue muestreada."""
+        if not self.enabled or not self._current_sampled or stage not in self.stages:
+            return _NULL_CONTEXT
+        return _Sampled(self._profile)
+
+    def take_snapshot(self) -> str:
+        """Guarda un snapshot de tracemalloc y devuelve su ruta."""
+        snapshot = tracemalloc.take_snapshot().filter_traces(_TRACEMALLOC_FILTERS)
+        path = os.path.join(self.output_dir, f"tracemalloc-{os.getpid()}-{self.images:06d}.snapshot")
+        snapshot.dump(path)
+        self.snapshots.append(path)
+        return path
+
+    def dump(self) -> List[str]:
+        """
+        Guarda el perfil de cProfile y el resumen de memoria del proceso.
+
+        Returns:
+            List[str]: Archivos escritos
+        """
+        if not self.enabled:
+            return []
+        written = []
+        pid = os.getpid()
+        if self.cprofile and self.sampled_images:
+            path = os.path.join(self.output_dir, f"cprofile-{pid}.prof")
+            self._profile.dump_stats(path)
+            written.append(path)
+        if self.snapshots:
+            path = os.path.join(self.output_dir, f"tracemalloc-{pid}.txt")
+            with open(path, 'w') as f:
+                f.write(allocation_summary(self.snapshots, self.top))
+            written.append(path)
+        return written
+
+    def _after_fork(self) -> None:
+        # cada worker perfila solo sus propias imágenes
+        self._reset()
+
+
+def allocation_summary(snapshot_paths: List[str], top: int = 25) -> str:
+    """Sitios con más memoria asignada en el último snapshot y los que más crecieron desde el primero."""
+    first = tracemalloc.Snapshot.load(snapshot_paths[0])
+    last = tracemalloc.Snapshot.load(snapshot_paths[-1]) if len(snapshot_paths) > 1 else first
+    lines = [f"Sitios con más memoria asignada ({os.path.basename(snapshot_paths[-1])}):"]
+    for stat in last.statistics('lineno')[:top]:
+        lines.append(f"  {stat.size / 1024:10.1f} KiB {stat.count:8d} bloques  {stat.traceback[0]}")
+    if len(snapshot_paths) > 1:
+        lines.append("")
+        lines.append(f"Mayor crecimiento entre {os.path.basename(snapshot_paths[0])} "
+                     f"y {os.path.basename(snapshot_paths[-1])}:")
+        for stat in last.compare_to(first, 'lineno')[:top]:
+            lines.append(f"  {stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+8d} bloques  {stat.traceback[0]}")
+    return "\n".join(lines) + "\n"
+
+
+def summarize(output_dir: str, top: int = 25, sort: str = 'cumulative') -> Optional[str]:
+    """
+    Combina los .prof de todos los procesos y escribe profile-summary.txt.
+
+    Returns:
+        str: Ruta del resumen, o None si no hay perfiles ni resúmenes de memoria
+    """
+    profiles = sorted(glob.glob(os.path.join(output_dir, 'cprofile-*.prof')))
+    memory = sorted(glob.glob(os.path.join(output_dir, 'tracemalloc-*.txt')))
+    if not profiles and not memory:
+        return None
+    buffer = io.StringIO()
+    if profiles:
+        stats = pstats.Stats(profiles[0], stream=buffer)
+        for path in profiles[1:]:
+            stats.add(path)
+        buffer.write(f"Funciones más costosas ({len(profiles)} procesos, orden: {sort}):\n")
+        stats.strip_dirs().sort_stats(sort).print_stats(top)
+    for path in memory:
+        buffer.write(f"\n== {os.path.basename(path)} ==\n")
+        with open(path) as f:
+            buffer.write(f.read())
+    summary_path = os.path.join(output_dir, SUMMARY_FILENAME)
+    with open(summary_path, 'w') as f:
+        f.write(buffer.getvalue())
+    return summary_path
+
+
+_PROFILER = PipelineProfiler()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_PROFILER._after_fork)
+
+
+def get_profiler() -> PipelineProfiler:
+    """Perfilador global del proceso."""
+    return _PROFILER
+
+
+def profile_image():
+    return _PROFILER.profile_image()
+
+
+def profile_stage(stage: str):
+    return _PROFILER.profile_stage(stage)
@@ -0,0 +1,208 @@
+"""
+Progreso de los lotes: imágenes procesadas, fallidas y omitidas, velocidad y ETA.
+
+El reporter vive en el proceso padre y se alimenta con el resultado de cada
+imagen: en modo de un proceso desde process_images_with_bgremover y con
+workers desde los mensajes que devuelve el pool, de modo que cuenta igual con
+cualquier número de procesos. Cada refresh_seconds redibuja una barra en la
+terminal (o imprime una línea si la salida no es una terminal) y reescribe de
+forma atómica un archivo JSON de estado que se puede consultar desde fuera.
+Un hilo temporizador refresca también mientras ninguna imagen termina, así el
+tiempo transcurrido y la velocidad del archivo de estado no se quedan congelados
+durante una imagen lenta.
+"""
+
+import collections
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Optional, TextIO
+
+from .metrics import PipelineMetrics
+
+STATUSES = ('processed', 'failed', 'skipped')
+
+
+def result_status(final_path: Optional[str], error: Optional[str] = None, deferred: bool = False) -> str:
+    """
+    Estado de una imagen a partir de su resultado: 'failed' si no hay carpeta de salida,
+    'skipped' si no se encontró la cara (carpeta error_*, sin recortes de cara) o se
+    difirió al carril lento por el presupuesto de tiempo, y 'processed' en otro caso.
+    """
+    if deferred:
+        return 'skipped'
+    if error or final_path is None:
+        return 'failed'
+    if os.path.basename(final_path).startswith('error_'):
+        return 'skipped'
+    return 'processed'
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    """Duración legible (h:mm:ss), o '--:--' si no se conoce."""
+    if seconds is None:
+        return '--:--'
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+class ProgressReporter:
+    """Progreso de un lote de `total` imágenes."""
+
+    def __init__(self, total: int, status_path: Optional[str] = None, refresh_seconds: float = 1.0,
+                 window_seconds: float = 60.0, metrics: Optional[PipelineMetrics] = None,
+                 stream: Optional[TextIO] = None, bar: Optional[bool] = None, log_seconds: float = 30.0,
+                 display: bool = True):
+        """
+        Args:
+            total: Imágenes del lote
+            status_path: Archivo JSON de estado (None = sin archivo)
+            refresh_seconds: Intervalo entre refrescos de la barra y del archivo (0 = solo al terminar cada imagen)
+            window_seconds: Ventana de la velocidad móvil
+            metrics: Registro del que se leen las medias por etapa (el del pool o del procesador)
+            stream: Salida de la barra (default: stderr)
+            bar: Barra redibujada en la misma línea; por defecto solo si stream es una terminal
+            log_seconds: Sin barra, intervalo entre líneas de progreso
+            display: Mostrar el progreso en stream (False = solo el archivo de estado)
+        """
+        self.total = total
+        self.status_path = status_path
+        self.refresh_seconds = refresh_seconds
+        self.window_seconds = window_seconds
+        self.metrics = metrics
+        self.stream = stream or sys.stderr
+        self.bar = bar if bar is not None else self.stream.isatty()
+        self.log_seconds = log_seconds
+        self.display = display
+        self.counts = dict.fromkeys(STATUSES, 0)
+        self.started_at = time.time()
+        self.finished = False
+        self.last_image = None
+        self._start = time.perf_counter()
+        self._completions = collections.deque()
+        self._last_refresh = float('-inf')
+        self._last_log = self._start
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._timer = None
+        if refresh_seconds > 0:
+            self._timer = threading.Thread(target=self._refresh_periodically, name='progress-refresh', daemon=True)
+            self._timer.start()
+
+    @property
+    def done(self) -> int:
+        return sum(self.counts.values())
+
+    def update(self, image_path: Optional[str] = None, status: str = 'processed') -> None:
+        """Registra una imagen terminada ('processed', 'failed' o 'skipped') y refresca si toca."""
+        if status not in self.counts:
+            raise ValueError(f"Estado desconocido: {status!r}")
+        with self._lock:
+            self.counts[status] += 1
+            self.last_image = image_path
+            self._completions.append(time.perf_counter())
+            self.refresh()
+
+    def rolling_rate(self, now: Optional[float] = None) -> float:
+        """Imágenes por segundo en la última ventana (desde el inicio si la ventana no se ha llenado)."""
+        now = time.perf_counter() if now is None else now
+        while self._completions and self._completions[0] < now - self.window_seconds:
+            self._completions.popleft()
+        span = min(self.window_seconds, now - self._start)
+        return len(self._completions) / span if span > 0 else 0.0
+
+    def snapshot(self) -> dict:
+        """Estado serializable (el contenido del archivo JSON de estado)."""
+        now = time.perf_counter()
+        elapsed = now - self._start
+        rate = self.rolling_rate(now)
+        remaining = max(0, self.total - self.done)
+        stages = {}
+        if self.metrics is not None:
+            stages = {stage: data['mean_ms'] for stage, data in self.metrics.to_dict()['stages'].items()}
+        return {
+            'total': self.total,
+            'done': self.done,
+            **self.counts,
+            'percent': round(100 * self.done / self.total, 2) if self.total else 100.0,
+            'elapsed_seconds': round(elapsed, 3),
+            'images_per_second': round(rate, 3),
+            'overall_images_per_second': round(self.done / elapsed, 3) if elapsed > 0 else 0.0,
+            'eta_seconds': round(remaining / rate, 1) if rate > 0 else (0.0 if not remaining else None),
+            'stage_mean_ms': stages,
+            'last_image': self.last_image,
+            'started_at': self.started_at,
+            'updated_at': time.time(),
+            'pid': os.getpid(),
+            'finished': self.finished
+        }
+
+    def refresh(self, force: bool = False) -> None:
+        """Redibuja la barra y reescribe el archivo de estado (como mucho cada refresh_seconds)."""
+        with self._lock:
+            self._refresh(force)
+
+    def _refresh(self, force: bool) -> None:
+        now = time.perf_counter()
+        if not force and now - self._last_refresh < self.refresh_seconds:
+            return
+        self._last_refresh = now
+        snapshot = self.snapshot()
+        if self.status_path:
+            self._write_status(snapshot)
+        if not self.display:
+            return
+        if self.bar:
+            self.stream.write("\r\033[K" + self.render(snapshot))
+            self.stream.flush()
+        elif force or now - self._last_log >= self.log_seconds:
+            self._last_log = now
+            self.stream.write(self.render(snapshot) + "\n")
+            self.stream.flush()
+
+    def render(self, snapshot: dict, width: int = 30) -> str:
+        """Línea de progreso: barra, contadores, velocidad, ETA y las etapas más lentas."""
+        filled = int(width * snapshot['percent'] / 100)
+        line = (f"[{'█' * filled}{'░' * (width - filled)}] {snapshot['done']}/{snapshot['total']} "
+                f"({snapshot['percent']:.1f}%) ✅ {snapshot['processed']} ❌ {snapshot['failed']} "
+                f"⏭️ {snapshot['skipped']} | {snapshot['images_per_second']:.2f} img/s | "
+                f"ETA {format_duration(snapshot['eta_seconds'])}")
+        slowest = sorted(((ms, stage) for stage, ms in snapshot['stage_mean_ms'].items() if stage != 'total'),
+                         reverse=True)[:3]
+        if slowest:
+            line += " | " + " ".join(f"{stage} {ms:.0f}ms" for ms, stage in slowest)
+        return line
+
+    def close(self) -> None:
+        """Detiene el temporizador y hace el último refresco con el estado final."""
+        self._stop.set()
+        if self._timer is not None:
+            self._timer.join()
+        self.finished = True
+        self.refresh(force=True)
+        if self.display and self.bar:
+            self.stream.write("\n")
+            self.stream.flush()
+
+    def _refresh_periodically(self) -> None:
+        while not self._stop.wait(self.refresh_seconds):
+            self.refresh()
+
+    def _write_status(self, snapshot: dict) -> None:
+        directory = os.path.dirname(os.path.abspath(self.status_path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(snapshot, f, indent=2)
+        os.replace(tmp_path, self.status_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,104 @@
+"""
+Cuarentena de las imágenes que rompen el procesamiento.
+
+Cuando una imagen tumba a su worker (crash nativo de OpenCV u ONNX Runtime),
+supera el tiempo máximo por imagen o lanza una excepción, se copia al
+directorio de cuarentena conservando su ruta relativa y se añade un registro
+a quarantine.jsonl con el motivo, el detalle y la huella de la entrada (tamaño
+y mtime). El original no se toca: las ejecuciones siguientes omiten las
+entradas en cuarentena mientras no cambien.
+"""
+
+import json
+import os
+import shutil
+import time
+from typing import List, Optional, Tuple
+
+from .image_scanner import ImageEntry
+
+QUARANTINE_LOG = 'quarantine.jsonl'
+REASONS = ('crash', 'timeout', 'error')
+
+
+class Quarantine:
+    """Directorio de cuarentena con su registro de errores en JSON Lines."""
+
+    def __init__(self, directory: str, input_dir: Optional[str] = None):
+        """
+        Args:
+            directory: Directorio de cuarentena
+            input_dir: Raíz de las imágenes de entrada (para conservar su ruta relativa)
+        """
+        self.directory = directory
+        self.input_dir = input_dir
+        self.log_path = os.path.join(directory, QUARANTINE_LOG)
+        self.records: List[dict] = []
+
+    def add(self, image_path: str, reason: str, detail: str, **extra) -> dict:
+        """
+        Copia la imagen a la cuarentena y registra el error.
+
+        Args:
+            image_path: Imagen que falló
+            reason: 'crash', 'timeout' o 'error'
+            detail: Descripción del fallo (código de salida, límite superado, excepción)
+            **extra: Campos adicionales del registro (worker, pid, traceback...)
+
+        Returns:
+            dict: Registro guardado
+        """
+        if reason not in REASONS:
+            raise ValueError(f"Motivo de cuarentena desconocido: {reason!r}")
+        record = {'image_path': image_path, 'reason': reason, 'detail': detail,
+                  'size': None, 'mtime': None, 'quarantine_path': None, **extra, 'time': time.time()}
+        try:
+            stat = os.stat(image_path)
+            record['size'], record['mtime'] = stat.st_size, stat.st_mtime
+            destination = os.path.join(self.directory, self._relative_path(image_path))
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            shutil.copy2(image_path, destination)
+            record['quarantine_path'] = destination
+        except OSError as e:
+            # el registro se guarda aunque la entrada ya no exista o no se pueda copiar
+            record['copy_error'] = f"{type(e).__name__}: {e}"
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.records.append(record)
+        print(f"🚫 En cuarentena: {image_path} ({reason}: {detail})")
+        return record
+
+    def load(self) -> List[dict]:
+        """Registros guardados en ejecuciones anteriores (las líneas corruptas se omiten)."""
+        if not os.path.exists(self.log_path):
+            return []
+        records = []
+        with open(self.log_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return records
+
+    def filter(self, entries: List[ImageEntry]) -> Tuple[List[ImageEntry], List[ImageEntry]]:
+        """
+        Separa las entradas en cuarentena (misma ruta, tamaño y mtime que al registrarlas).
+
+        Returns:
+            tuple: (entradas a procesar, entradas omitidas)
+        """
+        quarantined = {(record['image_path'], record.get('size'), record.get('mtime')) for record in self.load()}
+        kept, skipped = [], []
+        for entry in entries:
+            (skipped if (entry.path, entry.size, entry.mtime) in quarantined else kept).append(entry)
+        return kept, skipped
+
+    def _relative_path(self, image_path: str) -> str:
+        if self.input_dir:
+            relative = os.path.relpath(os.path.abspath(image_path), os.path.abspath(self.input_dir))
+            if not relative.startswith(os.pardir):
+                return relative
+        return os.path.basename(image_path)
@@ -0,0 +1,82 @@
+"""
+Limitador de tasa tipo token bucket.
+Se usa para ajustar las llamadas a APIs externas a la cuota del plan contratado.
+"""
+
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe.
+
+    Los tokens se reponen de forma continua a `rate` tokens por segundo
+    hasta un máximo de `capacity` (tamaño de ráfaga permitido).
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate: Tokens repuestos por segundo (debe ser > 0)
+            capacity: Máximo de tokens acumulables (default: max(1, rate))
+        """
+        if rate <= 0:
+            raise ValueError("La tasa del token bucket debe ser mayor que 0")
+
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests_per_minute: float, burst: Optional[float] = None) -> 'TokenBucket':
+        """Crea un bucket a partir de un límite expresado en peticiones por minuto."""
+        return cls(rate=requests_per_minute / 60.0, capacity=burst)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Consume tokens si hay disponibles, sin bloquear."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """
+        Consume tokens, bloqueando hasta que estén disponibles.
+
+        Args:
+            tokens: Cantidad de tokens a consumir
+            timeout: Tiempo máximo de espera en segundos (None = sin límite)
+
+        Returns:
+            bool: True si se consumieron los tokens, False si expiró el timeout
+        """
+        if tokens > self.capacity:
+            raise ValueError("No se pueden pedir más tokens que la capacidad del bucket")
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
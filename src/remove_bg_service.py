@@ -1,22 +1,161 @@
 from src.background_remover import BackgroundRemover
-import requests
+from src.rate_limiter import TokenBucket
+from src.response_cache import ResponseCache
+from typing import Iterable, List, Optional, Tuple
+import os
+import random
+import threading
+import time
+
+DEFAULT_API_URL = 'https://api.remove.bg/v1.0/removebg'
+
+# Códigos de estado que justifican reintentar la petición
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
 
 class RemoveBgService(BackgroundRemover):
-    def __init__(self, api_key: str):
+    """
+    Cliente de la API de remove.bg.
+
+    - Reutiliza conexiones con una única requests.Session (pool de conexiones)
+    - Limita la tasa de peticiones con un token bucket ajustado al plan de la API
+    - Reintenta errores 429/5xx con backoff exponencial y jitter
+    - Procesa lotes con concurrencia acotada (remove_background_many)
+    - Opcionalmente cachea las respuestas en disco por hash del contenido
+    """
+
+    def __init__(self,
+                 api_key: str,
+                 api_url: str = DEFAULT_API_URL,
+                 size: str = 'auto',
+                 max_workers: int = 4,
+                 requests_per_minute: Optional[float] = 500,
+                 burst: Optional[float] = None,
+                 max_retries: int = 3,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 30.0,
+                 timeout: float = 60.0,
+                 cache_dir: Optional[str] = None,
+                 cache_max_bytes: int = 1024 * 1024 * 1024):
+        """
+        Args:
+            api_key: API key de remove.bg
+            api_url: URL del endpoint (se puede apuntar a un servidor local para pruebas)
+            size: Tamaño de salida solicitado a la API ('auto', 'preview', 'full', ...)
+            max_workers: Máximo de peticiones simultáneas (y tamaño del pool de conexiones)
+            requests_per_minute: Límite de peticiones por minuto del plan (None = sin límite)
+            burst: Ráfaga máxima de peticiones permitida por el limitador
+            max_retries: Reintentos ante errores 429/5xx o de conexión
+            backoff_base: Espera base en segundos para el backoff exponencial
+            backoff_max: Espera máxima en segundos entre reintentos
+            timeout: Timeout de cada petición en segundos
+            cache_dir: Directorio de la caché de respuestas (None = sin caché)
+            cache_max_bytes: Tamaño máximo de la caché en bytes
+        """
         self.api_key = api_key
+        self.api_url = api_url
+        self.size = size
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self._rate_limiter = TokenBucket.per_minute(requests_per_minute, burst) if requests_per_minute else None
+        self._session = None
+        self._session_lock = threading.Lock()
+        self.cache = ResponseCache(cache_dir, cache_max_bytes) if cache_dir else None
+
+    def _get_session(self):
+        """Crea (una sola vez) la sesión HTTP compartida entre hilos."""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    # requests se importa aquí para no pagar su carga al importar el paquete
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers.update({'X-Api-Key': self.api_key})
+                    self._session = session
+        return self._session
+
+    def remove_background(self, input_path: str, output_path: str) -> bool:
+        with open(input_path, 'rb') as image_file:
+            image_bytes = image_file.read()
+
+        cache_key = None
+        content = None
+        if self.cache is not None:
+            cache_key = ResponseCache.make_key(image_bytes, {'api_url': self.api_url, 'size': self.size})
+            content = self.cache.get(cache_key)
+
+        if content is None:
+            content = self._post_with_retries(image_bytes, os.path.basename(input_path))
+            if content is None:
+                return False
+            if cache_key is not None:
+                self.cache.put(cache_key, content)
+
+        with open(output_path, 'wb') as out:
+            out.write(content)
+        return True
+
+    def remove_background_many(self, jobs: Iterable[Tuple[str, str]], max_workers: Optional[int] = None) -> List[bool]:
+        """Procesa un lote en paralelo usando hasta max_workers conexiones."""
+        return super().remove_background_many(jobs, max_workers or self.max_workers)
+
+    def _post_with_retries(self, image_bytes: bytes, filename: str) -> Optional[bytes]:
+        """Envía la imagen a la API. Devuelve el contenido de la respuesta o None si falla."""
+        import requests
+        session = self._get_session()
+
+        for attempt in range(self.max_retries + 1):
+            if self._rate_limiter is not None:
+                self._rate_limiter.acquire()
+
+            try:
+                response = session.post(
+                    self.api_url,
+                    files={'image_file': (filename, image_bytes)},
+                    data={'size': self.size},
+                    timeout=self.timeout
+                )
+            except requests.RequestException as e:
+                if attempt < self.max_retries:
+                    time.sleep(self._backoff_delay(attempt))
+                    continue
+                print("Error:", e)
+                return None
+
+            if response.status_code == requests.codes.ok:
+                return response.content
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                time.sleep(self._backoff_delay(attempt, response.headers.get('Retry-After')))
+                continue
 
-    def remove_background(self, input_path: str, output_path: str) -> None:
-        
-        response = requests.post(
-            'https://api.remove.bg/v1.0/removebg',
-            files={'image_file': open(input_path, 'rb')},
-            data={'size': 'auto'},
-            headers={'X-Api-Key': self.api_key}
-        )
-        
-        if response.status_code == requests.codes.ok:
-            with open(output_path, 'wb') as out:
-                out.write(response.content)
-        else:
             print("Error:", response.status_code, response.text)
-        
\ No newline at end of file
+            return None
+
+        return None
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Backoff exponencial con jitter completo; respeta Retry-After si la API lo envía."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after:
+            try:
+                delay = max(delay, min(self.backoff_max, float(retry_after)))
+            except ValueError:
+                pass
+        return delay
+
+    def get_cache_stats(self) -> Optional[dict]:
+        """Retorna los contadores de la caché o None si está deshabilitada."""
+        return self.cache.get_stats() if self.cache is not None else None
+
+    def close(self) -> None:
+        """Cierra las conexiones del pool."""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
@@ -0,0 +1,154 @@
+"""
+Caché local de respuestas direccionada por contenido.
+Evita pagar de nuevo a la API por imágenes que ya se procesaron.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+class ResponseCache:
+    """
+    Caché en disco con expulsión LRU acotada por tamaño.
+
+    Cada entrada se guarda como un archivo cuyo nombre es la clave
+    (SHA-256 de los bytes de entrada más los parámetros de la petición).
+    El orden LRU se reconstruye al arrancar a partir del mtime de los archivos,
+    que se actualiza en cada acierto.
+    """
+
+    ENTRY_SUFFIX = '.bin'
+
+    def __init__(self, cache_dir: str, max_bytes: int = 1024 * 1024 * 1024):
+        """
+        Args:
+            cache_dir: Directorio donde guardar las respuestas
+            max_bytes: Tamaño máximo total de la caché en bytes
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # clave -> tamaño en bytes
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(data: bytes, params: Optional[dict] = None) -> str:
+        """Calcula la clave de caché para unos bytes de entrada y parámetros de petición."""
+        digest = hashlib.sha256(data)
+        digest.update(json.dumps(params or {}, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + self.ENTRY_SUFFIX)
+
+    def _load_index(self) -> None:
+        """Reconstruye el índice LRU a partir de los archivos existentes."""
+        found = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_dir():
+                continue
+            for item in os.scandir(entry.path):
+                if item.is_file() and item.name.endswith(self.ENTRY_SUFFIX):
+                    stat = item.stat()
+                    found.append((stat.st_mtime, item.name[:-len(self.ENTRY_SUFFIX)], stat.st_size))
+
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Devuelve el contenido cacheado o None si no existe."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+
+        path = self._path_for(key)
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                size = self._entries.pop(key, None)
+                if size is not None:
+                    self._total_bytes -= size
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return content
+
+    def put(self, key: str, content: bytes) -> None:
+        """Guarda una respuesta, expulsando las entradas menos usadas si hace falta."""
+        if len(content) > self.max_bytes:
+            return
+
+        path = self._path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Escritura atómica: nunca queda una entrada a medio escribir
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous
+            self._entries[key] = len(content)
+            self._total_bytes += len(content)
+            self._evict()
+
+    def _evict(self) -> None:
+        """Expulsa entradas LRU hasta respetar max_bytes. Requiere el lock tomado."""
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path_for(key))
+            except FileNotFoundError:
+                pass
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get_stats(self) -> dict:
+        """Retorna contadores de aciertos, fallos y ocupación de la caché."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'total_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes
+            }
@@ -0,0 +1,198 @@
+"""
+Sesiones de segmentación de rembg (modelo original o variantes cuantizadas u
+optimizadas generadas por ModelOptimizer), opciones de ONNX Runtime y el
+posprocesado de la máscara (umbral, preservación de elementos y suavizado).
+
+Las sesiones se crean en este proyecto y no dentro de bgremover, para que
+todas reciban las mismas SessionOptions (hilos, nivel de optimización,
+arena de memoria y execution providers).
+"""
+
+import os
+from typing import Optional
+from PIL import Image, ImageFilter
+from .model_optimizer import ModelOptimizer
+
+# Opciones de sesión por defecto: mismas que usa ONNX Runtime si no se indica nada
+DEFAULT_SESSION_OPTIONS = {
+    'intra_op_num_threads': 0,        # 0 = decide ONNX Runtime, 'auto' = repartir núcleos entre workers
+    'inter_op_num_threads': 0,
+    'graph_optimization_level': 'all',  # 'disable', 'basic', 'extended', 'all'
+    'execution_mode': 'sequential',   # 'sequential' o 'parallel'
+    'enable_cpu_mem_arena': True,
+    'enable_mem_pattern': True,
+    'execution_providers': None       # p. ej. ['CPUExecutionProvider']; None = elección de rembg
+}
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    'disable': 'ORT_DISABLE_ALL',
+    'basic': 'ORT_ENABLE_BASIC',
+    'extended': 'ORT_ENABLE_EXTENDED',
+    'all': 'ORT_ENABLE_ALL'
+}
+
+
+def available_cpu_count() -> int:
+    """Núcleos disponibles para este proceso (respeta la afinidad de CPU)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def resolve_session_options(options: Optional[dict] = None, workers: int = 1) -> dict:
+    """
+    Completa las opciones con los valores por defecto y resuelve el modo 'auto'.
+
+    En modo 'auto' los núcleos disponibles se reparten entre los workers:
+    cada sesión usa cpu_count // workers hilos intra-op y 1 hilo inter-op,
+    así varios workers no sobresuscriben la CPU.
+    """
+    resolved = {**DEFAULT_SESSION_OPTIONS, **(options or {})}
+    workers = max(1, workers)
+
+    if resolved['intra_op_num_threads'] == 'auto':
+        resolved['intra_op_num_threads'] = max(1, available_cpu_count() // workers)
+    if resolved['inter_op_num_threads'] == 'auto':
+        resolved['inter_op_num_threads'] = 1
+
+    if resolved['graph_optimization_level'] not in GRAPH_OPTIMIZATION_LEVELS:
+        raise ValueError(f"Nivel de optimización no válido: {resolved['graph_optimization_level']}. "
+                         f"Disponibles: {list(GRAPH_OPTIMIZATION_LEVELS)}")
+    return resolved
+
+
+def build_session_options(options: dict):
+    """Crea un onnxruntime.SessionOptions a partir de opciones ya resueltas."""
+    import onnxruntime as ort
+
+    sess_opts = ort.SessionOptions()
+    sess_opts.intra_op_num_threads = int(options['intra_op_num_threads'])
+    sess_opts.inter_op_num_threads = int(options['inter_op_num_threads'])
+    sess_opts.graph_optimization_level = getattr(
+        ort.GraphOptimizationLevel, GRAPH_OPTIMIZATION_LEVELS[options['graph_optimization_level']])
+    sess_opts.execution_mode = (ort.ExecutionMode.ORT_PARALLEL if options['execution_mode'] == 'parallel'
+                                else ort.ExecutionMode.ORT_SEQUENTIAL)
+    sess_opts.enable_cpu_mem_arena = bool(options['enable_cpu_mem_arena'])
+    sess_opts.enable_mem_pattern = bool(options['enable_mem_pattern'])
+    return sess_opts
+
+
+def select_providers(requested: Optional[list]) -> Optional[list]:
+    """Filtra los execution providers pedidos a los disponibles; siempre deja CPU como respaldo."""
+    if not requested:
+        return None
+    import onnxruntime as ort
+
+    available = ort.get_available_providers()
+    providers = [p for p in requested if p in available]
+    for provider in requested:
+        if provider not in available:
+            print(f"⚠️ Execution provider no disponible, se ignora: {provider}")
+    if 'CPUExecutionProvider' not in providers:
+        providers.append('CPUExecutionProvider')
+    return providers
+
+
+def _session_class(name: str):
+    """Clase de sesión de rembg registrada con ese nombre."""
+    from rembg.sessions import sessions_class
+
+    for session_class in sessions_class:
+        if session_class.name() == name:
+            return session_class
+    # new_session usaría U2netSession en silencio: mejor fallar con un mensaje claro
+    raise ValueError(f"Esta versión de rembg no tiene la sesión '{name}'; actualiza rembg")
+
+
+def _custom_session_name(model_name: str) -> str:
+    """Sesión de rembg con el preprocesado adecuado para la familia del modelo."""
+    if model_name.startswith('isnet'):
+        return 'dis_custom'
+    return 'u2net_custom'
+
+
+def create_segmentation_session(model_name: str,
+                                variant: str = 'fp32',
+                                optimizer: Optional[ModelOptimizer] = None,
+                                session_options: Optional[dict] = None):
+    """
+    Crea una sesión de rembg para el modelo y la variante indicados.
+
+    Args:
+        model_name: Nombre del modelo de rembg ('isnet-general-use', 'u2net', ...)
+        variant: 'fp32', 'int8' u 'optimized'
+        optimizer: ModelOptimizer a usar (default: directorio de modelos de rembg)
+        session_options: Opciones de ONNX Runtime ya resueltas (ver resolve_session_options)
+
+    Raises:
+        ImportError: Si rembg no está instalado
+        ValueError: Si la versión de rembg no tiene la sesión necesaria
+    """
+    if variant == 'fp32':
+        name, kwargs = model_name, {}
+    else:
+        optimizer = optimizer or ModelOptimizer()
+        name, kwargs = _custom_session_name(model_name), {'model_path': optimizer.ensure_variant(model_name, variant)}
+
+    if session_options is None:
+        from rembg import new_session
+        return new_session(name, **kwargs)
+
+    # new_session crea sus propias SessionOptions: se instancia la clase de sesión directamente
+    providers = select_providers(session_options.get('execution_providers'))
+    return _session_class(name)(name, build_session_options(session_options), providers, **kwargs)
+
+
+def predict_mask(session, image: Image.Image) -> Image.Image:
+    """Ejecuta el modelo y devuelve la máscara (modo 'L') al tamaño de la imagen."""
+    return session.predict(image.convert('RGB'))[0]
+
+
+def refine_mask(mask: Image.Image,
+                min_alpha_threshold: int = 0,
+                preserve_elements: bool = False,
+                smooth_edges: bool = False) -> Image.Image:
+    """
+    Posprocesado de la máscara común a todos los modos (imagen completa y teselas).
+
+    Args:
+        mask: Máscara en modo 'L'
+        min_alpha_threshold: Valores de alfa por debajo de este umbral pasan a transparentes
+        preserve_elements: Si las transparencias parciales por encima del umbral pasan a
+            opacas, para conservar enteros los accesorios y props del personaje
+        smooth_edges: Si suavizar ligeramente el borde de la máscara
+    """
+    if preserve_elements:
+        # primero se binariza y después se suaviza: el borde no vuelve a quedar duro
+        mask = mask.point(lambda value: 0 if value < min_alpha_threshold else 255)
+        return mask.filter(ImageFilter.GaussianBlur(radius=1)) if smooth_edges else mask
+    if smooth_edges:
+        mask = mask.filter(ImageFilter.GaussianBlur(radius=1))
+    if min_alpha_threshold > 0:
+        mask = mask.point(lambda value: 0 if value < min_alpha_threshold else value)
+    return mask
+
+
+def apply_mask(image: Image.Image,
+               mask: Image.Image,
+               min_alpha_threshold: int = 0,
+               smooth_edges: bool = False,
+               preserve_elements: bool = False) -> Image.Image:
+    """
+    Posprocesa la máscara con refine_mask y la aplica como canal alfa.
+
+    Args:
+        image: Imagen original
+        mask: Máscara en modo 'L' del mismo tamaño
+        min_alpha_threshold: Valores de alfa por debajo de este umbral pasan a transparentes
+        smooth_edges: Si suavizar ligeramente el borde de la máscara
+        preserve_elements: Si las transparencias parciales por encima del umbral pasan a opacas
+
+    Trabaja sobre la imagen completa: crea una copia RGBA del tamaño de la imagen
+    y, con smooth_edges o min_alpha_threshold, copias adicionales de la máscara.
+    """
+    mask = refine_mask(mask, min_alpha_threshold, preserve_elements, smooth_edges)
+    result = image.convert('RGBA')
+    result.putalpha(mask)
+    return result
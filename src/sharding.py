@@ -0,0 +1,170 @@
+"""
+Reparto determinista de las imágenes de entrada entre nodos sin coordinador.
+
+Cada imagen pertenece al shard hash(ruta relativa) % N, así que varios hosts
+que ejecutan el mismo lote con --shard i/N se reparten el árbol sin estado
+compartido. Cada shard deja un manifiesto con sus entradas y salidas, y
+verify_shards comprueba que los resultados combinados forman un único árbol
+de recortes completo y sin solapamientos.
+"""
+
+import hashlib
+import json
+import os
+import socket
+import tempfile
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .image_scanner import ImageEntry, scan_images
+
+MANIFEST_DIR = '.shards'
+# Archivos que identifican una carpeta de salida (modo completo y modo bajo demanda)
+OUTPUT_MARKERS = ('original.png', 'master.json')
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """
+    Interpreta "i/N" (i empieza en 0).
+
+    Raises:
+        ValueError: Si el formato no es válido o i no está en [0, N)
+    """
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f"Shard no válido '{value}': se espera i/N, p. ej. 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard no válido '{value}': i debe estar entre 0 y N-1")
+    return index, count
+
+
+def relative_image_path(entry: ImageEntry) -> str:
+    """Ruta relativa de la imagen con '/' como separador (igual en todos los sistemas)."""
+    return os.path.normpath(os.path.join(entry.relative_dir, os.path.basename(entry.path))).replace(os.sep, '/')
+
+
+def shard_of(relative_path: str, num_shards: int) -> int:
+    """Shard de una ruta relativa: estable entre ejecuciones, procesos y máquinas."""
+    digest = hashlib.sha1(relative_path.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % num_shards
+
+
+def filter_shard(entries: Iterable[ImageEntry], shard_index: int, num_shards: int) -> List[ImageEntry]:
+    """Entradas que corresponden al shard indicado."""
+    return [entry for entry in entries if shard_of(relative_image_path(entry), num_shards) == shard_index]
+
+
+def manifest_path(output_dir: str, shard_index: int, num_shards: int) -> str:
+    return os.path.join(output_dir, MANIFEST_DIR, f"shard-{shard_index}-of-{num_shards}.json")
+
+
+def write_manifest(output_dir: str, shard_index: int, num_shards: int,
+                   entries: List[ImageEntry], results: Dict[str, Optional[str]], started_at: float) -> str:
+    """
+    Guarda el manifiesto de un shard: entradas procesadas y carpeta de salida de cada una.
+
+    Args:
+        output_dir: Directorio de recortes del shard
+        entries: Entradas asignadas al shard
+        results: image_path -> carpeta de salida (None si falló)
+        started_at: Instante de inicio del lote
+
+    Returns:
+        str: Ruta del manifiesto
+    """
+    outputs = {}
+    for entry in entries:
+        final_path = results.get(entry.path)
+        outputs[relative_image_path(entry)] = (
+            os.path.relpath(final_path, output_dir).replace(os.sep, '/') if final_path else None
+        )
+    manifest = {
+        'shard': shard_index,
+        'num_shards': num_shards,
+        'host': socket.gethostname(),
+        'started_at': started_at,
+        'finished_at': time.time(),
+        'outputs': outputs
+    }
+    path = manifest_path(output_dir, shard_index, num_shards)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _expected_outputs(relative_path: str) -> Tuple[str, str]:
+    directory, filename = os.path.split(relative_path)
+    name = os.path.splitext(filename)[0]
+    return (os.path.join(directory, name).replace(os.sep, '/'),
+            os.path.join(directory, f"error_{name}").replace(os.sep, '/'))
+
+
+def _output_folders(output_dir: str) -> List[str]:
+    folders = []
+    for root, dirs, files in os.walk(output_dir):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        if any(marker in files for marker in OUTPUT_MARKERS):
+            folders.append(os.path.relpath(root, output_dir).replace(os.sep, '/'))
+    return folders
+
+
+def verify_shards(input_dir: str, output_dir: str, num_shards: int) -> dict:
+    """
+    Comprueba que los N shards combinados cubren cada entrada exactamente una vez.
+
+    Returns:
+        dict: ok y las listas de problemas encontrados (vacías si todo es correcto)
+    """
+    inputs = {relative_image_path(entry) for entry in scan_images(input_dir)}
+    report = {
+        'num_shards': num_shards,
+        'inputs': len(inputs),
+        'missing_manifests': [],
+        'unassigned_inputs': [],
+        'duplicated_inputs': [],
+        'misassigned_inputs': [],
+        'failed_inputs': [],
+        'missing_outputs': [],
+        'shared_outputs': [],
+        'orphan_outputs': []
+    }
+
+    owners: Dict[str, List[int]] = {}
+    for shard_index in range(num_shards):
+        path = manifest_path(output_dir, shard_index, num_shards)
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            report['missing_manifests'].append(shard_index)
+            continue
+        for relative_path, output in manifest['outputs'].items():
+            owners.setdefault(relative_path, []).append(shard_index)
+            if shard_of(relative_path, num_shards) != shard_index:
+                report['misassigned_inputs'].append(relative_path)
+            if output is None:
+                report['failed_inputs'].append(relative_path)
+
+    report['unassigned_inputs'] = sorted(inputs - set(owners))
+    report['duplicated_inputs'] = sorted(path for path, shards in owners.items() if len(shards) > 1)
+
+    # Cada entrada debe tener exactamente una carpeta de salida y cada carpeta una sola entrada
+    folders = set(_output_folders(output_dir))
+    claimed: Dict[str, List[str]] = {}
+    for relative_path in sorted(inputs):
+        found = [folder for folder in _expected_outputs(relative_path) if folder in folders]
+        if not found and relative_path not in report['failed_inputs']:
+            report['missing_outputs'].append(relative_path)
+        for folder in found:
+            claimed.setdefault(folder, []).append(relative_path)
+    report['shared_outputs'] = sorted(folder for folder, paths in claimed.items() if len(paths) > 1)
+    report['orphan_outputs'] = sorted(folders - set(claimed))
+
+    report['ok'] = not any(
+        report[key] for key in report if key not in ('num_shards', 'inputs', 'failed_inputs')
+    )
+    return report
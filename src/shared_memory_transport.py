@@ -0,0 +1,141 @@
+"""
+Transporte de imágenes decodificadas entre procesos mediante memoria compartida.
+
+Un anillo de buffers preasignados (multiprocessing.shared_memory) guarda los
+píxeles; por las colas solo viajan descriptores pequeños (slot, forma, dtype).
+El consumidor lee el slot como un ndarray sin copiar y lo devuelve al anillo
+con release() cuando termina su etapa.
+"""
+
+import multiprocessing
+from multiprocessing import shared_memory
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+
+class FrameDescriptor(NamedTuple):
+    """Descripción de una imagen guardada en el anillo (lo único que se serializa)."""
+    slot: int                       # -1 si los píxeles viajan en línea (no cabían en un slot)
+    shape: Tuple[int, ...]
+    dtype: str
+    meta: dict                      # Datos pequeños de la tarea (rutas, tiempos...)
+    inline: Optional[np.ndarray] = None
+
+    @property
+    def nbytes(self) -> int:
+        return int(np.prod(self.shape)) * np.dtype(self.dtype).itemsize
+
+
+class SharedFrameRing:
+    """
+    Anillo de `slots` buffers de `slot_bytes` bytes en un único bloque de memoria compartida.
+
+    Los slots libres se gestionan con una cola de multiprocessing, así cualquier
+    proceso puede adquirirlos y liberarlos. Si una imagen no cabe en un slot se
+    envía en línea dentro del descriptor (con copia) y se contabiliza aparte.
+    """
+
+    def __init__(self, slots: int = 8, slot_bytes: int = 64 * 1024 * 1024, context=None):
+        """
+        Args:
+            slots: Número de buffers del anillo (imágenes en vuelo entre etapas)
+            slot_bytes: Tamaño de cada buffer en bytes
+            context: Contexto de multiprocessing para la cola de slots libres
+        """
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self._shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        self._owner = True
+        self._free = (context or multiprocessing).Queue()
+        for slot in range(slots):
+            self._free.put(slot)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def __getstate__(self):
+        # Con 'spawn' el anillo se reabre por nombre en el proceso hijo
+        return {'slots': self.slots, 'slot_bytes': self.slot_bytes, 'name': self._shm.name, 'free': self._free}
+
+    def __setstate__(self, state):
+        self.slots = state['slots']
+        self.slot_bytes = state['slot_bytes']
+        self._shm = shared_memory.SharedMemory(name=state['name'])
+        self._owner = False
+        self._free = state['free']
+
+    def _slot_array(self, slot: int, shape, dtype) -> np.ndarray:
+        return np.ndarray(shape, dtype=dtype, buffer=self._shm.buf, offset=slot * self.slot_bytes)
+
+    def acquire(self, shape, dtype='uint8', meta: Optional[dict] = None,
+                timeout: Optional[float] = None) -> Tuple[FrameDescriptor, np.ndarray]:
+        """
+        Reserva un slot libre (bloquea hasta que haya uno) y devuelve su descriptor
+        y un ndarray escribible sobre la memoria compartida.
+
+        Raises:
+            ValueError: Si la imagen no cabe en un slot
+            queue.Empty: Si expira el timeout sin slots libres
+        """
+        shape = tuple(int(d) for d in shape)
+        dtype = np.dtype(dtype)
+        if int(np.prod(shape)) * dtype.itemsize > self.slot_bytes:
+            raise ValueError(f"La imagen {shape} no cabe en un slot de {self.slot_bytes} bytes")
+        slot = self._free.get(timeout=timeout)
+        descriptor = FrameDescriptor(slot, shape, dtype.str, meta or {})
+        return descriptor, self._slot_array(slot, shape, dtype)
+
+    def write(self, array: np.ndarray, meta: Optional[dict] = None,
+              timeout: Optional[float] = None) -> FrameDescriptor:
+        """Copia un array al anillo (o lo adjunta en línea si no cabe) y devuelve su descriptor."""
+        if array.nbytes > self.slot_bytes:
+            return FrameDescriptor(-1, array.shape, array.dtype.str, meta or {}, np.ascontiguousarray(array))
+        descriptor, view = self.acquire(array.shape, array.dtype, meta, timeout)
+        np.copyto(view, array)
+        return descriptor
+
+    def write_image(self, image, meta: Optional[dict] = None,
+                    timeout: Optional[float] = None) -> FrameDescriptor:
+        """
+        Copia una imagen PIL RGBA al anillo con una sola copia: los píxeles se pegan
+        directamente en el slot (np.asarray + write copiarían dos veces).
+        """
+        from PIL import Image
+
+        if image.mode != 'RGBA':
+            raise ValueError(f"write_image espera una imagen RGBA, no {image.mode}")
+        shape = (image.size[1], image.size[0], 4)
+        if shape[0] * shape[1] * 4 > self.slot_bytes:
+            return FrameDescriptor(-1, shape, np.dtype('uint8').str, meta or {}, np.asarray(image))
+        descriptor, view = self.acquire(shape, 'uint8', meta, timeout)
+        target = Image.frombuffer('RGBA', image.size, view, 'raw', 'RGBA', 0, 1)
+        # frombuffer marca la imagen como de solo lectura para copiarla al escribir;
+        # aquí queremos escribir precisamente sobre el slot
+        target.readonly = 0
+        target.paste(image)
+        return descriptor
+
+    def view(self, descriptor: FrameDescriptor) -> np.ndarray:
+        """Devuelve los píxeles del descriptor sin copiarlos."""
+        if descriptor.slot < 0:
+            return descriptor.inline
+        return self._slot_array(descriptor.slot, descriptor.shape, np.dtype(descriptor.dtype))
+
+    def release(self, descriptor: FrameDescriptor) -> None:
+        """Devuelve el slot al anillo para que otra imagen lo reutilice."""
+        if descriptor.slot >= 0:
+            self._free.put(descriptor.slot)
+
+    def close(self) -> None:
+        """Cierra el mapeo en este proceso; el creador además libera el bloque."""
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,348 @@
+"""
+Pipeline en dos etapas con procesos separados unidos por memoria compartida.
+
+Los workers de segmentación remueven el fondo y escriben la imagen RGBA en un
+SharedFrameRing; los workers de renderizado la leen desde el mismo slot (sin
+copiar ni serializar los píxeles), generan los recortes y devuelven el slot.
+Igual que PreloadedWorkerPool, los modelos se cargan y se calientan en el padre
+antes del fork.
+"""
+
+import multiprocessing
+import os
+import queue
+import time
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from .memory_monitor import current_rss_bytes, private_memory_bytes, format_bytes
+from .metrics import PipelineMetrics
+from .profiling import get_profiler, profile_image
+from .tracing import get_tracer, span
+from .worker_pool import drain_metrics, _exit_description
+from .shared_memory_transport import SharedFrameRing
+
+# El anillo por defecto ocupa esta fracción del espacio libre de /dev/shm, hasta MAX_RING_BYTES
+SHM_RING_FRACTION = 0.5
+MAX_RING_BYTES = 1024 * 1024 * 1024
+# Tamaño del anillo cuando no hay /dev/shm que consultar (fuera de Linux)
+DEFAULT_RING_BYTES = 256 * 1024 * 1024
+# Si el anillo es pequeño se usan menos slots para que cada uno admita al menos
+# una imagen RGBA de 2048x2048; las que no caben en un slot viajan serializadas.
+MIN_SLOT_BYTES = 2048 * 2048 * 4
+
+
+def shm_available_bytes() -> Optional[int]:
+    """Espacio libre en /dev/shm (None si no existe, p. ej. fuera de Linux)."""
+    try:
+        stat = os.statvfs('/dev/shm')
+    except (AttributeError, OSError):
+        return None
+    return stat.f_bavail * stat.f_frsize
+
+
+def default_ring_bytes() -> int:
+    """Memoria del anillo por defecto según el espacio libre de /dev/shm."""
+    available = shm_available_bytes()
+    if available is None:
+        return DEFAULT_RING_BYTES
+    return min(int(available * SHM_RING_FRACTION), MAX_RING_BYTES)
+
+
+def _ready_message(stage: str, worker_id: int) -> dict:
+    return {
+        'type': 'ready',
+        'stage': stage,
+        'worker': worker_id,
+        'pid': os.getpid(),
+        'rss_bytes': current_rss_bytes(),
+        'private_bytes': private_memory_bytes()
+    }
+
+
+def _segment_main(worker_id: int, processor, ring: SharedFrameRing, tasks, frames, results) -> None:
+    """Etapa 1: remueve el fondo y publica la imagen en el anillo."""
+    tracer = get_tracer()
+    tracer.set_process_name(f"segment {worker_id}")
+    results.put(_ready_message('segment', worker_id))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        image_path, output_subdir, log_dir = task
+        task_start = time.perf_counter()
+        try:
+            with span('image', file=image_path), profile_image():
+                image = processor.segment_image(image_path)
+            if image is None:
+                error = "error removiendo el fondo"
+            else:
+                rgba = image if image.mode == 'RGBA' else image.convert('RGBA')
+                meta = {'task': task, 'segment_seconds': time.perf_counter() - task_start,
+                        'metrics': drain_metrics(processor), 'trace': tracer.drain()}
+                try:
+                    frames.put(ring.write_image(rgba, meta))
+                finally:
+                    rgba.close()
+                    image.close()
+                continue
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        results.put({
+            'type': 'done',
+            'worker': worker_id,
+            'image_path': image_path,
+            'final_path': None,
+            'seconds': time.perf_counter() - task_start,
+            'error': error,
+            'metrics': drain_metrics(processor),
+            'trace': tracer.drain()
+        })
+    get_profiler().dump()
+
+
+def _render_main(worker_id: int, processor, ring: SharedFrameRing, frames, results) -> None:
+    """Etapa 2: lee la imagen del anillo, genera los recortes y libera el slot."""
+    from PIL import Image
+
+    tracer = get_tracer()
+    tracer.set_process_name(f"render {worker_id}")
+    results.put(_ready_message('render', worker_id))
+
+    while True:
+        descriptor = frames.get()
+        if descriptor is None:
+            break
+        image_path, output_subdir, log_dir = descriptor.meta['task']
+        task_start = time.perf_counter()
+        try:
+            # Image.fromarray reutiliza el buffer del slot: los píxeles no se copian
+            image = Image.fromarray(ring.view(descriptor))
+            with span('image', file=image_path), profile_image():
+                final_path = processor.render_avatars(image, image_path, output_subdir, log_dir)
+            error = None
+        except Exception as e:
+            final_path = None
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            image = None
+            ring.release(descriptor)
+        results.put({
+            'type': 'done',
+            'worker': worker_id,
+            'image_path': image_path,
+            'final_path': final_path,
+            'seconds': descriptor.meta['segment_seconds'] + time.perf_counter() - task_start,
+            'error': error,
+            'transport': 'shm' if descriptor.slot >= 0 else 'inline',
+            'pixel_bytes': descriptor.nbytes,
+            'metrics': drain_metrics(processor),
+            'segment_metrics': descriptor.meta['metrics'],
+            'trace': (descriptor.meta['trace'] or []) + (tracer.drain() or [])
+        })
+    get_profiler().dump()
+
+
+class StagedPipeline:
+    """
+    Segmentación y renderizado en procesos distintos, conectados por un anillo de memoria compartida.
+
+    Por la cola entre etapas solo viajan descriptores (slot, forma, dtype y la tarea).
+    El número de slots limita las imágenes en vuelo: si el renderizado se retrasa,
+    la segmentación espera a que se libere un slot en lugar de acumular memoria.
+
+    Si un worker muere (crash nativo, OOM killer) sus imágenes y slots se pierden:
+    map() lo detecta y lanza RuntimeError en lugar de esperar para siempre.
+    """
+
+    def __init__(self, processor_factory: Callable[[], object], segment_workers: int = 2,
+                 render_workers: int = 1, ring_slots: int = None,
+                 slot_bytes: Optional[int] = None, warm_up: bool = True,
+                 ring_bytes: Optional[int] = None, poll_interval: float = 0.5):
+        """
+        Args:
+            processor_factory: Función que crea el ImageProcessor (se llama una vez, en el padre)
+            segment_workers: Procesos que remueven el fondo
+            render_workers: Procesos que redimensionan, detectan la cara y guardan los recortes
+            ring_slots: Slots del anillo (por defecto dos por worker, menos si el anillo
+                no da para slots de MIN_SLOT_BYTES)
+            slot_bytes: Tamaño de cada slot en bytes (por defecto ring_bytes / ring_slots)
+            warm_up: Si el padre ejecuta una inferencia de calentamiento antes del fork
+            ring_bytes: Memoria compartida total del anillo cuando no se indica slot_bytes
+                (por defecto la mitad del espacio libre de /dev/shm, hasta MAX_RING_BYTES)
+            poll_interval: Intervalo de comprobación de que los workers siguen vivos
+        """
+        self.processor_factory = processor_factory
+        self.segment_workers = max(1, segment_workers)
+        self.render_workers = max(1, render_workers)
+        ring_bytes = ring_bytes or default_ring_bytes()
+        if ring_slots is None and slot_bytes is None:
+            # se prefieren menos slots (la segmentación espera antes) a que las imágenes
+            # habituales no quepan y viajen serializadas
+            ring_slots = min(2 * (self.segment_workers + self.render_workers),
+                             max(2, ring_bytes // MIN_SLOT_BYTES))
+        self.ring_slots = ring_slots or 2 * (self.segment_workers + self.render_workers)
+        self.slot_bytes = slot_bytes or max(1, ring_bytes // self.ring_slots)
+        self.warm_up = warm_up
+        self.poll_interval = poll_interval
+        self.processor = None
+        self.ring = None
+        self.start_seconds = 0.0
+        self.worker_stats = {}
+        self.transport_stats = {'shm_frames': 0, 'inline_frames': 0, 'shm_bytes': 0, 'inline_bytes': 0}
+        # métricas por etapa combinadas de ambas etapas
+        self.metrics = PipelineMetrics()
+        self._context = None
+        self._segmenters = []
+        self._renderers = []
+        self._tasks = None
+        self._frames = None
+        self._results = None
+        self._failed = False
+
+    def start(self) -> 'StagedPipeline':
+        """Precarga los modelos, crea el anillo y los workers de ambas etapas."""
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("StagedPipeline requiere el método de inicio 'fork' (Linux/macOS)")
+
+        start = time.perf_counter()
+        # solo afecta a bibliotecas con OpenMP; los hilos de ONNX Runtime se fijan en la sesión
+        os.environ['OMP_NUM_THREADS'] = '1'
+        self.processor = self.processor_factory()
+        self.processor.face_detector.load_model()
+        if self.warm_up:
+            try:
+                self.processor.warm_up()
+            except Exception as e:
+                print(f"⚠️ Error en el calentamiento: {e}")
+
+        self._context = multiprocessing.get_context('fork')
+        self._fit_ring_to_shm()
+        self.ring = SharedFrameRing(self.ring_slots, self.slot_bytes, context=self._context)
+        self._tasks = self._context.Queue()
+        self._frames = self._context.Queue()
+        self._results = self._context.Queue()
+
+        for worker_id in range(self.segment_workers):
+            self._segmenters.append(self._start_process(
+                _segment_main, f"avatar-segment-{worker_id}",
+                (worker_id, self.processor, self.ring, self._tasks, self._frames, self._results)
+            ))
+        for worker_id in range(self.render_workers):
+            self._renderers.append(self._start_process(
+                _render_main, f"avatar-render-{worker_id}",
+                (worker_id, self.processor, self.ring, self._frames, self._results)
+            ))
+
+        while len(self.worker_stats) < self.segment_workers + self.render_workers:
+            message = self._next_result()
+            if message['type'] == 'ready':
+                self.worker_stats[(message['stage'], message['worker'])] = message
+
+        self.start_seconds = time.perf_counter() - start
+        return self
+
+    def _fit_ring_to_shm(self) -> None:
+        """
+        Reduce los slots si el anillo no cabe en /dev/shm: el bloque se reserva sin
+        ocupar páginas y, al escribir por encima del espacio libre, el proceso muere con SIGBUS.
+        """
+        available = shm_available_bytes()
+        if available is None or self.ring_slots * self.slot_bytes <= available // 2:
+            return
+        slot_bytes = max(1, available // 2 // self.ring_slots)
+        print(f"⚠️ /dev/shm tiene {format_bytes(available)} libres: slots de {format_bytes(self.slot_bytes)} "
+              f"reducidos a {format_bytes(slot_bytes)} (las imágenes mayores viajan serializadas)")
+        self.slot_bytes = slot_bytes
+
+    def _next_result(self) -> dict:
+        """
+        Siguiente mensaje de los workers. Si alguno ha muerto, sus imágenes y slots no
+        volverán nunca: se lanza RuntimeError en lugar de bloquear el lote.
+        """
+        while True:
+            try:
+                return self._results.get(timeout=self.poll_interval)
+            except queue.Empty:
+                pass
+            for process in self._segmenters + self._renderers:
+                if process.exitcode is not None:
+                    self._failed = True
+                    raise RuntimeError(f"El worker {process.name} (pid {process.pid}) terminó con "
+                                       f"{_exit_description(process.exitcode)}; se detiene el pipeline")
+
+    def _start_process(self, target, name: str, args: tuple):
+        process = self._context.Process(target=target, args=args, name=name, daemon=True)
+        process.start()
+        return process
+
+    def map(self, tasks: Iterable[Tuple[str, str, str]]) -> Iterator[dict]:
+        """
+        Envía las tareas (image_path, output_subdir, log_dir) a la etapa de segmentación.
+
+        Devuelve los resultados a medida que terminan (sin orden garantizado).
+        """
+        pending = 0
+        for task in tasks:
+            self._tasks.put(task)
+            pending += 1
+
+        while pending:
+            message = self._next_result()
+            if message['type'] == 'done':
+                pending -= 1
+                self.metrics.merge(message.pop('segment_metrics', None))
+                self.metrics.merge(message.pop('metrics', None))
+                get_tracer().add_events(message.pop('trace', None))
+                transport = message.get('transport')
+                if transport:
+                    self.transport_stats[f'{transport}_frames'] += 1
+                    self.transport_stats[f'{transport}_bytes'] += message['pixel_bytes']
+                    if transport == 'inline' and self.transport_stats['inline_frames'] == 1:
+                        print(f"⚠️ {os.path.basename(message['image_path'])} no cabe en un slot de "
+                              f"{format_bytes(self.slot_bytes)} y viaja serializada; aumenta /dev/shm "
+                              f"(--shm-size en Docker) o --ring-mb")
+                yield message
+
+    def close(self) -> None:
+        """Detiene primero la segmentación y después el renderizado, y libera el anillo."""
+        if self._failed:
+            # tras perder un worker los demás pueden esperar slots o tareas que no llegarán
+            for process in self._segmenters + self._renderers:
+                process.kill()
+        for _ in self._segmenters:
+            self._tasks.put(None)
+        for process in self._segmenters:
+            process.join()
+        for _ in self._renderers:
+            self._frames.put(None)
+        for process in self._renderers:
+            process.join()
+        self._segmenters.clear()
+        self._renderers.clear()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    def print_report(self) -> None:
+        """Muestra el arranque de las etapas y el volumen de píxeles transportado."""
+        print(f"🏊 Pipeline listo en {self.start_seconds:.2f}s: {self.segment_workers} segmentación, "
+              f"{self.render_workers} renderizado, anillo de {self.ring_slots} x {format_bytes(self.slot_bytes)}")
+        for (stage, worker_id), stats in sorted(self.worker_stats.items()):
+            print(f"   {stage} {worker_id} (pid {stats['pid']}): RSS {format_bytes(stats['rss_bytes'])}, "
+                  f"privada {format_bytes(stats['private_bytes'])}")
+
+    def print_transport_report(self) -> None:
+        """Muestra cuántos píxeles viajaron por memoria compartida y cuántos serializados."""
+        stats = self.transport_stats
+        print(f"🔀 Memoria compartida: {stats['shm_frames']} imágenes ({format_bytes(stats['shm_bytes'])}); "
+              f"serializadas: {stats['inline_frames']} ({format_bytes(stats['inline_bytes'])})")
+        if stats['inline_frames']:
+            print(f"⚠️ {stats['inline_frames']} imágenes no cabían en un slot de {format_bytes(self.slot_bytes)} "
+                  f"y se serializaron; aumenta /dev/shm (--shm-size en Docker) o --ring-mb")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
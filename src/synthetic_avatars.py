@@ -0,0 +1,109 @@
+"""
+Generador determinista de avatares sintéticos para benchmarks y pruebas.
+
+Cada AvatarSpec (tamaño, con o sin canal alfa, con o sin cara, semilla) produce
+siempre la misma imagen: una figura de cuerpo completo (torso, cabeza y pelo)
+sobre un fondo degradado con ruido, o sobre fondo transparente si tiene alfa.
+Las figuras "sin cara" se dibujan de espaldas (solo pelo en la cabeza).
+"""
+
+import os
+from typing import List, NamedTuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Múltiplos de 204x350 (el tamaño mayor de avatar) hasta fotos de cámara
+AVATAR_SIZES = ((204, 350), (408, 700), (816, 1400), (1632, 2800))
+
+
+class AvatarSpec(NamedTuple):
+    """Parámetros de un avatar sintético."""
+    name: str
+    width: int
+    height: int
+    alpha: bool
+    face: bool
+    seed: int
+
+
+def avatar_specs(count: int, seed: int = 0) -> List[AvatarSpec]:
+    """
+    Especificaciones de `count` avatares que recorren todas las combinaciones de
+    tamaño, alfa y cara antes de repetir ninguna.
+    """
+    combos = [(size, alpha, face) for face in (True, False) for alpha in (False, True) for size in AVATAR_SIZES]
+    specs = []
+    for index in range(count):
+        (width, height), alpha, face = combos[index % len(combos)]
+        name = f"{index:03d}_{width}x{height}_{'rgba' if alpha else 'rgb'}_{'face' if face else 'noface'}"
+        specs.append(AvatarSpec(name, width, height, alpha, face, seed * 100003 + index))
+    return specs
+
+
+def generate_avatar(spec: AvatarSpec) -> Image.Image:
+    """Dibuja el avatar de la especificación (RGB, o RGBA con fondo transparente)."""
+    rng = np.random.default_rng(spec.seed)
+    width, height = spec.width, spec.height
+
+    if spec.alpha:
+        canvas = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    else:
+        # degradado vertical entre dos colores claros con ruido de sensor
+        top, bottom = rng.integers(170, 250, size=(2, 3))
+        ramp = np.linspace(0, 1, height)[:, None, None]
+        background = top * (1 - ramp) + bottom * ramp + rng.normal(0, 4, (height, width, 3))
+        canvas = Image.fromarray(np.clip(background, 0, 255).astype(np.uint8)).convert('RGBA')
+
+    draw = ImageDraw.Draw(canvas)
+    skin = tuple(int(c) for c in rng.integers((150, 100, 80), (240, 190, 160))) + (255,)
+    hair = tuple(int(c) for c in rng.integers(10, 90, size=3)) + (255,)
+    clothes = tuple(int(c) for c in rng.integers(20, 200, size=3)) + (255,)
+    center_x = width * rng.uniform(0.45, 0.55)
+
+    # cabeza en el 40% superior, donde FaceDetector busca primero
+    head_w = width * 0.28
+    head_h = height * 0.14
+    head_top = height * rng.uniform(0.06, 0.1)
+    head = (center_x - head_w / 2, head_top, center_x + head_w / 2, head_top + head_h)
+    neck_bottom = head[3] + height * 0.03
+
+    # torso y piernas
+    draw.rectangle((center_x - width * 0.06, head[3] - 2, center_x + width * 0.06, neck_bottom), fill=skin)
+    draw.rounded_rectangle((center_x - width * 0.3, neck_bottom, center_x + width * 0.3, height * 0.62),
+                           radius=int(width * 0.08), fill=clothes)
+    legs = tuple(max(0, c - 40) for c in clothes[:3]) + (255,)
+    draw.rectangle((center_x - width * 0.2, height * 0.62, center_x - width * 0.03, height * 0.97), fill=legs)
+    draw.rectangle((center_x + width * 0.03, height * 0.62, center_x + width * 0.2, height * 0.97), fill=legs)
+
+    if spec.face:
+        draw.ellipse(head, fill=skin)
+        draw.chord((head[0], head[1] - head_h * 0.1, head[2], head[1] + head_h * 0.45), 180, 360, fill=hair)
+        eye_y = head[1] + head_h * 0.5
+        for side in (-1, 1):
+            eye_x = center_x + side * head_w * 0.2
+            draw.ellipse((eye_x - head_w * 0.07, eye_y - head_h * 0.05,
+                          eye_x + head_w * 0.07, eye_y + head_h * 0.05), fill=(40, 30, 30, 255))
+        draw.line((center_x - head_w * 0.15, head[1] + head_h * 0.78, center_x + head_w * 0.15,
+                   head[1] + head_h * 0.78), fill=(150, 60, 60, 255), width=max(1, int(head_h * 0.04)))
+    else:
+        draw.ellipse(head, fill=hair)
+
+    # textura de la ropa: ruido solo dentro de la figura (el fondo transparente queda limpio)
+    pixels = np.asarray(canvas).astype(np.int16)
+    figure = pixels[:, :, 3] > 0 if spec.alpha else np.ones((height, width), dtype=bool)
+    noise = rng.integers(-6, 7, size=(height, width, 1), dtype=np.int16)
+    pixels[:, :, :3] = np.where(figure[:, :, None], pixels[:, :, :3] + noise, pixels[:, :, :3])
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), 'RGBA')
+    return image if spec.alpha else image.convert('RGB')
+
+
+def write_dataset(directory: str, specs: List[AvatarSpec]) -> List[str]:
+    """Genera los avatares como PNG en `directory` y devuelve sus rutas en el mismo orden."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for spec in specs:
+        path = os.path.join(directory, f"{spec.name}.png")
+        generate_avatar(spec).save(path)
+        paths.append(path)
+    return paths
@@ -0,0 +1,138 @@
+"""
+Segmentación por teselas para imágenes muy grandes.
+
+La imagen se divide en teselas solapadas que se segmentan por separado y cuyas
+máscaras se mezclan con pesos en rampa en las zonas de solape, sin costuras.
+Las teselas se procesan por filas: la inferencia trabaja con una tesela a la
+vez (o `tile_workers`) y los acumuladores float32 ocupan una franja de
+`tile_size` filas, así el tensor de entrada del modelo y los acumuladores no
+dependen de la altura de la imagen.
+
+Límite: no es un procesamiento de memoria acotada de extremo a extremo. La
+imagen fuente ya decodificada y la máscara final (1 byte por píxel) ocupan
+O(ancho x alto), y aplicar la máscara crea además la copia RGBA completa
+(4 bytes por píxel). Lo que evita el teselado es escalar la imagen entera a la
+entrada del modelo y mantener acumuladores float32 de la imagen completa.
+"""
+
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+from PIL import Image
+
+from .segmentation_session import predict_mask
+
+
+def tile_origins(length: int, tile_size: int, overlap: int) -> List[int]:
+    """
+    Posiciones de inicio de las teselas a lo largo de un eje.
+
+    Las teselas se reparten de forma uniforme de modo que la primera empieza en 0,
+    la última termina en `length` y el solape entre vecinas es al menos `overlap`.
+    """
+    if length <= tile_size:
+        return [0]
+    stride = tile_size - overlap
+    count = math.ceil((length - overlap) / stride)
+    count = max(count, 2)
+    span = length - tile_size
+    return [round(i * span / (count - 1)) for i in range(count)]
+
+
+def ramp_weights(size: int, ramp_before: int, ramp_after: int) -> np.ndarray:
+    """Pesos 1D: rampa ascendente al inicio, 1 en el centro, rampa descendente al final."""
+    weights = np.ones(size, dtype=np.float32)
+    if ramp_before > 0:
+        weights[:ramp_before] = np.linspace(1.0 / (ramp_before + 1), 1.0, ramp_before, endpoint=False,
+                                            dtype=np.float32)
+    if ramp_after > 0:
+        weights[size - ramp_after:] = np.minimum(
+            weights[size - ramp_after:],
+            np.linspace(1.0, 1.0 / (ramp_after + 1), ramp_after, dtype=np.float32)
+        )
+    return weights
+
+
+class TiledSegmenter:
+    """Aplica una sesión de segmentación sobre teselas solapadas y une las máscaras."""
+
+    def __init__(self, session, tile_size: int = 1024, overlap: int = 128, tile_workers: int = 1):
+        """
+        Args:
+            session: Sesión de rembg (o cualquier objeto con predict(PIL.Image) -> [máscara])
+            tile_size: Lado de cada tesela en píxeles
+            overlap: Solape mínimo entre teselas vecinas en píxeles
+            tile_workers: Teselas de una misma fila que se segmentan en paralelo
+        """
+        if overlap * 2 > tile_size:
+            raise ValueError("El solape no puede superar la mitad del tamaño de tesela")
+        self.session = session
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.tile_workers = max(1, tile_workers)
+
+    def _segment_tile(self, image: Image.Image, box) -> np.ndarray:
+        tile = image.crop(box)
+        try:
+            return np.asarray(predict_mask(self.session, tile), dtype=np.float32)
+        finally:
+            tile.close()
+
+    def predict_mask(self, image: Image.Image) -> Image.Image:
+        """
+        Devuelve la máscara (modo 'L') de la imagen completa.
+
+        La imagen debe estar cargada (se recorta tesela a tesela) y la máscara
+        devuelta ocupa ancho x alto bytes; solo los acumuladores son por franja.
+        """
+        width, height = image.size
+        xs = tile_origins(width, self.tile_size, self.overlap)
+        ys = tile_origins(height, self.tile_size, self.overlap)
+        tile_w = min(self.tile_size, width)
+        tile_h = min(self.tile_size, height)
+
+        # Pesos horizontales de cada columna de teselas (rampa solo donde hay vecina)
+        x_weights = []
+        for i, x in enumerate(xs):
+            before = xs[i - 1] + tile_w - x if i > 0 else 0
+            after = x + tile_w - xs[i + 1] if i < len(xs) - 1 else 0
+            x_weights.append(ramp_weights(tile_w, before, after))
+
+        mask = np.zeros((height, width), dtype=np.uint8)
+        acc = np.zeros((tile_h, width), dtype=np.float32)
+        weight = np.zeros((tile_h, width), dtype=np.float32)
+
+        executor = ThreadPoolExecutor(max_workers=self.tile_workers) if self.tile_workers > 1 else None
+        try:
+            for row, y in enumerate(ys):
+                before = ys[row - 1] + tile_h - y if row > 0 else 0
+                after = y + tile_h - ys[row + 1] if row < len(ys) - 1 else 0
+                y_weights = ramp_weights(tile_h, before, after)
+
+                boxes = [(x, y, x + tile_w, y + tile_h) for x in xs]
+                if executor is not None:
+                    tiles = list(executor.map(lambda box: self._segment_tile(image, box), boxes))
+                else:
+                    tiles = [self._segment_tile(image, box) for box in boxes]
+
+                for col, (x, tile_mask) in enumerate(zip(xs, tiles)):
+                    tile_weight = np.outer(y_weights, x_weights[col])
+                    acc[:, x:x + tile_w] += tile_mask * tile_weight
+                    weight[:, x:x + tile_w] += tile_weight
+
+                # Las filas anteriores al inicio de la siguiente fila de teselas ya son definitivas
+                done = (ys[row + 1] - y) if row < len(ys) - 1 else tile_h
+                mask[y:y + done] = np.clip(acc[:done] / weight[:done] + 0.5, 0, 255).astype(np.uint8)
+
+                # Desplazar la franja: se conservan las filas aún compartidas con la siguiente fila
+                acc[:tile_h - done] = acc[done:]
+                acc[tile_h - done:] = 0
+                weight[:tile_h - done] = weight[done:]
+                weight[tile_h - done:] = 0
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        return Image.fromarray(mask)
@@ -0,0 +1,194 @@
+"""
+Presupuestos de tiempo por imagen y por lote con degradación controlada.
+
+Una inferencia de ONNX Runtime no se puede interrumpir dentro del proceso, así
+que el presupuesto se aplica en los puntos de decisión entre etapas:
+
+- Antes de segmentar se estima el coste de la imagen (segundos por megapíxel
+  observados en las anteriores). Si la estimación supera el presupuesto por
+  imagen se usa el removedor rápido (p. ej. el preset procesamiento_rapido) o,
+  si tampoco cabe, la imagen se difiere al carril lento.
+- Cerca del presupuesto del lote (fast_after) todas las imágenes pasan al
+  removedor rápido; agotado el presupuesto, las restantes se difieren.
+- Antes de la detección facial, si la imagen ya superó su presupuesto, no se
+  hace la búsqueda de cara en la imagen completa.
+
+El carril lento es una JobQueue aparte que se procesa después sin presupuestos
+(python job_worker.py --db <cola> work). Cada decisión queda registrada con su
+motivo; con workers, las decisiones viajan al padre con cada resultado.
+"""
+
+import io
+import json
+import os
+import time
+from collections import Counter
+from typing import List, Optional
+
+from PIL import Image
+
+from .job_queue import JobQueue
+
+DECISIONS = ('fast_preset', 'defer', 'skip_full_fallback', 'over_budget')
+
+
+def image_megapixels(image_path: str, image_bytes: Optional[bytes] = None) -> float:
+    """Megapíxeles de la imagen leyendo solo la cabecera."""
+    source = io.BytesIO(image_bytes) if image_bytes is not None else image_path
+    with Image.open(source) as image:
+        width, height = image.size
+    return width * height / 1_000_000
+
+
+class TimeBudget:
+    """Presupuestos de un proceso; cada worker usa su propia copia tras el fork."""
+
+    def __init__(self, image_seconds: Optional[float] = None, batch_seconds: Optional[float] = None,
+                 fast_remover=None, slow_lane: Optional[JobQueue] = None, fast_after: float = 0.8,
+                 smoothing: float = 0.2):
+        """
+        Args:
+            image_seconds: Presupuesto por imagen (None = sin límite)
+            batch_seconds: Presupuesto del lote, contado desde start_batch() (None = sin límite)
+            fast_remover: Removedor rápido para degradar la segmentación (None = no degradar)
+            slow_lane: Cola donde se difieren las imágenes (None = nunca diferir)
+            fast_after: Fracción del presupuesto del lote a partir de la que se usa el removedor rápido
+            smoothing: Peso de la última imagen en la estimación de segundos por megapíxel
+        """
+        self.image_seconds = image_seconds
+        self.batch_seconds = batch_seconds
+        self.fast_remover = fast_remover
+        self.slow_lane = slow_lane
+        self.fast_after = fast_after
+        self.smoothing = smoothing
+        self.decisions: List[dict] = []
+        self.deferred = set()
+        self._seconds_per_megapixel = {}
+        self._image_start = None
+        self.start_batch()
+
+    def start_batch(self) -> None:
+        """Empieza a contar el presupuesto del lote (los workers heredan el inicio del padre)."""
+        self._batch_start = time.monotonic()
+
+    def batch_elapsed(self) -> float:
+        return time.monotonic() - self._batch_start
+
+    def start_image(self) -> None:
+        self._image_start = time.monotonic()
+
+    def image_elapsed(self) -> Optional[float]:
+        return None if self._image_start is None else time.monotonic() - self._image_start
+
+    def predict(self, remover: str, megapixels: float) -> Optional[float]:
+        """Segundos estimados de segmentación con el removedor 'primary' o 'fast' (None sin historial)."""
+        rate = self._seconds_per_megapixel.get(remover)
+        return None if rate is None else rate * megapixels
+
+    def observe_segmentation(self, remover: str, megapixels: float, seconds: float) -> None:
+        """Actualiza la estimación de segundos por megapíxel del removedor."""
+        if megapixels <= 0:
+            return
+        rate = seconds / megapixels
+        previous = self._seconds_per_megapixel.get(remover)
+        self._seconds_per_megapixel[remover] = rate if previous is None else (
+            (1 - self.smoothing) * previous + self.smoothing * rate)
+
+    def plan_segmentation(self, image_path: str, megapixels: float) -> str:
+        """
+        Decide cómo segmentar la imagen.
+
+        Returns:
+            str: 'primary', 'fast' o 'defer'
+        """
+        if self.batch_seconds:
+            elapsed = self.batch_elapsed()
+            if elapsed >= self.batch_seconds and self.slow_lane is not None:
+                self.record(image_path, 'defer', f"presupuesto del lote agotado ({elapsed:.0f}s)")
+                return 'defer'
+            if elapsed >= self.batch_seconds * self.fast_after and self.fast_remover is not None:
+                self.record(image_path, 'fast_preset',
+                            f"lote al {100 * elapsed / self.batch_seconds:.0f}% de su presupuesto")
+                return 'fast'
+
+        if self.image_seconds:
+            predicted = self.predict('primary', megapixels)
+            if predicted is not None and predicted > self.image_seconds:
+                fast_predicted = self.predict('fast', megapixels)
+                if self.fast_remover is not None and (fast_predicted is None or fast_predicted <= self.image_seconds):
+                    self.record(image_path, 'fast_preset', f"segmentación estimada en {predicted:.1f}s "
+                                                           f"({megapixels:.1f} MP)")
+                    return 'fast'
+                if self.slow_lane is not None:
+                    self.record(image_path, 'defer', f"segmentación estimada en {predicted:.1f}s "
+                                                     f"({megapixels:.1f} MP) incluso con el removedor rápido")
+                    return 'defer'
+        return 'primary'
+
+    def defer(self, image_path: str, output_subdir: str, log_dir: str) -> None:
+        """Envía la imagen al carril lento."""
+        self.slow_lane.enqueue([(image_path, output_subdir, log_dir)])
+        self.deferred.add(image_path)
+
+    def allow_full_fallback(self) -> bool:
+        """False si la imagen actual ya superó su presupuesto (la búsqueda en la imagen completa se omite)."""
+        elapsed = self.image_elapsed()
+        return not (self.image_seconds and elapsed is not None and elapsed > self.image_seconds)
+
+    def finish_image(self, image_path: str) -> None:
+        """Registra las imágenes que terminaron fuera de presupuesto pese a la degradación."""
+        elapsed = self.image_elapsed()
+        if self.image_seconds and elapsed is not None and elapsed > self.image_seconds:
+            self.record(image_path, 'over_budget', f"{elapsed:.1f}s")
+        self._image_start = None
+
+    def record(self, image_path: str, decision: str, reason: str) -> None:
+        self.decisions.append({
+            'image_path': image_path,
+            'decision': decision,
+            'reason': reason,
+            'image_elapsed_seconds': round(self.image_elapsed() or 0.0, 3),
+            'batch_elapsed_seconds': round(self.batch_elapsed(), 3),
+            'pid': os.getpid(),
+            'time': time.time()
+        })
+
+    def drain(self) -> List[dict]:
+        """Decisiones registradas desde la última llamada (las que un worker envía al padre)."""
+        decisions, self.decisions = self.decisions, []
+        return decisions
+
+
+class BudgetLog:
+    """Decisiones de todos los procesos de una ejecución."""
+
+    def __init__(self):
+        self.decisions: List[dict] = []
+
+    def merge(self, decisions: Optional[List[dict]]) -> None:
+        if decisions:
+            self.decisions.extend(decisions)
+
+    def deferred(self, image_path: str) -> bool:
+        return any(d['image_path'] == image_path and d['decision'] == 'defer' for d in self.decisions)
+
+    def counts(self) -> dict:
+        return dict(Counter(d['decision'] for d in self.decisions))
+
+    def write(self, path: str) -> None:
+        """Guarda las decisiones en JSON Lines, una por línea."""
+        with open(path, 'w', encoding='utf-8') as f:
+            for decision in self.decisions:
+                f.write(json.dumps(decision, ensure_ascii=False) + "\n")
+
+    def print_report(self) -> None:
+        counts = self.counts()
+        if not counts:
+            return
+        labels = {'fast_preset': "con el removedor rápido", 'defer': "diferidas al carril lento",
+                  'skip_full_fallback': "sin búsqueda de cara en la imagen completa",
+                  'over_budget': "fuera de presupuesto"}
+        print("⏳ Presupuesto de tiempo:")
+        for decision in DECISIONS:
+            if decision in counts:
+                print(f"   {counts[decision]} imágenes {labels[decision]}")
@@ -0,0 +1,151 @@
+"""
+Trazas de una ejecución en el formato de eventos de Chrome (chrome://tracing, Perfetto).
+
+Cada imagen y cada etapa abren un span con span(name, **args); los spans
+anidados en el mismo hilo se muestran anidados en el visor. El trazador es
+global al proceso y está desactivado por defecto: span() devuelve entonces un
+contexto vacío compartido, así que el coste sin --trace es una llamada. Los
+workers creados con fork heredan el estado y envían sus eventos al padre con
+drain(), igual que las métricas.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from typing import List, Optional
+
+_NULL_SPAN = nullcontext()
+
+
+def _now_us() -> float:
+    # perf_counter usa CLOCK_MONOTONIC en Linux: la misma base en todos los procesos
+    return time.perf_counter() * 1e6
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer: 'Tracer', name: str, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        # los spans hijos heredan el archivo del span que los contiene
+        if stack and 'file' not in self.args and 'file' in stack[-1].args:
+            self.args['file'] = stack[-1].args['file']
+        stack.append(self)
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = _now_us()
+        self.tracer._stack().pop()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer._record({
+            'name': self.name,
+            'cat': 'pipeline',
+            'ph': 'X',
+            'ts': self.start,
+            'dur': end - self.start,
+            'pid': os.getpid(),
+            'tid': threading.get_native_id(),
+            'args': self.args
+        })
+        return False
+
+
+class Tracer:
+    """Acumula los spans del proceso actual."""
+
+    def __init__(self):
+        self.enabled = False
+        self._events: List[dict] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self, process_name: Optional[str] = None) -> None:
+        self.enabled = True
+        if process_name:
+            self.set_process_name(process_name)
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def span(self, name: str, **args):
+        """Contexto que registra un evento completo ('X') con la duración del bloque."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def set_process_name(self, name: str) -> None:
+        """Nombre del proceso en el visor (evento de metadatos)."""
+        if self.enabled:
+            self._record({'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'args': {'name': name}})
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, event: dict) -> None:
+        with self._lock:
+            self._events.append(event)
+
+    def drain(self) -> Optional[List[dict]]:
+        """Eventos registrados desde la última llamada (None si la traza está desactivada)."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            events, self._events = self._events, []
+        return events
+
+    def add_events(self, events: Optional[List[dict]]) -> None:
+        """Incorpora los eventos enviados por otro proceso."""
+        if events:
+            with self._lock:
+                self._events.extend(events)
+
+    def _after_fork(self) -> None:
+        # el hijo empieza sin los eventos del padre (si no, se enviarían duplicados)
+        self._lock = threading.Lock()
+        self._events = []
+        self._local = threading.local()
+
+    def write(self, path: str) -> int:
+        """
+        Guarda los eventos acumulados como JSON de Chrome trace (de forma atómica).
+
+        Returns:
+            int: Número de eventos escritos
+        """
+        with self._lock:
+            events = list(self._events)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        os.replace(tmp_path, path)
+        return len(events)
+
+
+_TRACER = Tracer()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_TRACER._after_fork)
+
+
+def get_tracer() -> Tracer:
+    """Trazador global del proceso."""
+    return _TRACER
+
+
+def span(name: str, **args):
+    """Abre un span en el trazador global (no hace nada si la traza está desactivada)."""
+    return _TRACER.span(name, **args)
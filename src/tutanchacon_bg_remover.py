@@ -19,13 +19,22 @@ class TutanchaconBgRemover(BackgroundRemover):
     - Corrección de transparencias parciales  
     - Calidad profesional con modelo ISNet
     - Configuración optimizada para avatares
+    - Variantes de modelo cuantizadas (INT8) u optimizadas para mayor velocidad
+    - Opciones de ONNX Runtime (hilos, providers) aplicadas a la sesión de segmentación
     """
     
     def __init__(self, 
                  model_name: str = 'isnet-general-use',
                  min_alpha_threshold: int = 20,
                  preserve_elements: bool = True,
-                 smooth_edges: bool = True):
+                 smooth_edges: bool = True,
+                 model_variant: str = 'fp32',
+                 session_options: Optional[dict] = None,
+                 workers: int = 1,
+                 tiled_min_pixels: Optional[int] = None,
+                 tile_size: int = 1024,
+                 tile_overlap: int = 128,
+                 tile_workers: int = 1):
         """
         Inicializa el removedor de fondos.
         
@@ -34,16 +43,63 @@ class TutanchaconBgRemover(BackgroundRemover):
             min_alpha_threshold: Umbral mínimo de transparencia para preservar elementos (0-255)
             preserve_elements: Si preservar elementos del personaje
             smooth_edges: Si aplicar suavizado de bordes
+            model_variant: 'fp32' (modelo original), 'int8' u 'optimized'. Las
+                variantes usan el modelo optimizado persistido por ModelOptimizer.
+            session_options: Opciones de ONNX Runtime (hilos intra/inter-op, nivel de
+                optimización del grafo, arena de memoria, execution providers).
+                Ver DEFAULT_SESSION_OPTIONS en segmentation_session. Se aplican a
+                la sesión de rembg de cualquier variante, también fp32.
+            workers: Número de procesos que comparten la máquina (--workers); se usa
+                para repartir los núcleos cuando intra_op_num_threads='auto'
+            tiled_min_pixels: A partir de cuántos píxeles (ancho x alto) se segmenta
+                por teselas solapadas (None = nunca)
+            tile_size: Lado de cada tesela en píxeles
+            tile_overlap: Solape entre teselas vecinas en píxeles
+            tile_workers: Teselas de una fila que se segmentan a la vez
         """
         self.model_name = model_name
         self.min_alpha_threshold = min_alpha_threshold
         self.preserve_elements = preserve_elements
         self.smooth_edges = smooth_edges
+        self.model_variant = model_variant
+        self.workers = workers
+        # segmentation_session importa PIL: se carga al crear la instancia, no al importar el módulo
+        from .segmentation_session import resolve_session_options
+        self.session_options = resolve_session_options(session_options, workers)
+        self.tiled_min_pixels = tiled_min_pixels
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.tile_workers = tile_workers
+        self._tiled_segmenter = None
         self._bg_remover = None
         self._initialize_bg_remover()
     
     def _initialize_bg_remover(self):
-        """Inicializa el removedor de fondos de bgremover."""
+        """
+        Inicializa la sesión de segmentación.
+
+        La sesión de rembg se crea aquí para cualquier variante, con las SessionOptions
+        resueltas, y el posprocesado de bgremover (umbral, preservación de elementos y
+        suavizado) se aplica con refine_mask. Los backends de bgremover crean su propia
+        sesión con los valores por defecto de ONNX Runtime: solo se usan si no se puede
+        importar rembg u onnxruntime directamente.
+        """
+        from .segmentation_session import create_segmentation_session
+        self._tiled_segmenter = None
+        
+        try:
+            self._bg_remover = create_segmentation_session(
+                self.model_name, self.model_variant, session_options=self.session_options
+            )
+            self._use_package = 'session'
+            print(f"✅ Inicializada sesión rembg con modelo {self.model_name} ({self.model_variant})")
+            return
+        except ImportError as e:
+            if self.model_variant != 'fp32':
+                raise
+            print(f"⚠️ No se pudo crear la sesión de rembg ({e}): se usa bgremover "
+                  f"con las opciones por defecto de ONNX Runtime")
+        
         try:
             # Intentar importar el paquete bgremover_package
             from bgremover_package import BackgroundRemover as BgRemoverPackage
@@ -100,7 +156,15 @@ class TutanchaconBgRemover(BackgroundRemover):
             os.makedirs(output_dir, exist_ok=True)
         
         try:
-            if self._use_package is True:
+            if self._needs_tiling(input_path):
+                # Imagen muy grande: segmentar por teselas solapadas
+                self._remove_with_tiles(input_path, output_path)
+                
+            elif self._use_package == 'session':
+                # Usar la sesión de rembg con las opciones de ONNX Runtime configuradas
+                self._remove_with_session(input_path, output_path)
+                
+            elif self._use_package is True:
                 # Usar bgremover_package (versión completa)
                 success = self._bg_remover.remove_background(
                     input_path=input_path,
@@ -142,6 +206,59 @@ class TutanchaconBgRemover(BackgroundRemover):
             print(f"❌ {error_msg}")
             raise Exception(error_msg)
     
+    def _remove_with_session(self, input_path: str, output_path: str) -> None:
+        """Segmenta con la sesión de rembg y guarda la imagen con canal alfa."""
+        from PIL import Image
+        from .segmentation_session import predict_mask, apply_mask
+        
+        with Image.open(input_path) as image:
+            image.load()
+            mask = predict_mask(self._bg_remover, image)
+            result = apply_mask(image, mask, self.min_alpha_threshold, self.smooth_edges, self.preserve_elements)
+        result.save(output_path)
+    
+    def _needs_tiling(self, input_path: str) -> bool:
+        """Indica si la imagen supera el umbral de píxeles del modo por teselas."""
+        if self.tiled_min_pixels is None:
+            return False
+        from PIL import Image
+        
+        # Image.open solo lee la cabecera; no decodifica los píxeles
+        with Image.open(input_path) as image:
+            width, height = image.size
+        return width * height > self.tiled_min_pixels
+    
+    def _remove_with_tiles(self, input_path: str, output_path: str) -> None:
+        """
+        Segmenta por teselas solapadas y guarda la imagen con canal alfa.
+
+        La máscara unida recibe el mismo posprocesado que el modo normal (umbral,
+        preservación de elementos y suavizado): el preset da el mismo resultado por
+        encima y por debajo de tiled_min_pixels.
+
+        El pico de memoria sigue siendo proporcional a ancho x alto: imagen
+        decodificada + máscara completa + resultado RGBA (unos 8 bytes por píxel
+        para una fuente RGB). Ver el límite en tiled_segmentation.
+        """
+        from PIL import Image
+        from .segmentation_session import create_segmentation_session, apply_mask
+        from .tiled_segmentation import TiledSegmenter
+        
+        if self._tiled_segmenter is None:
+            # Los backends de respaldo de bgremover no exponen la máscara: se usa una sesión de rembg propia
+            session = self._bg_remover if self._use_package == 'session' else create_segmentation_session(
+                self.model_name, 'fp32', session_options=self.session_options
+            )
+            self._tiled_segmenter = TiledSegmenter(session, self.tile_size, self.tile_overlap, self.tile_workers)
+        
+        with Image.open(input_path) as image:
+            image.load()
+            print(f"🧩 Segmentando por teselas: {image.size[0]}x{image.size[1]} "
+                  f"(más de {self.tiled_min_pixels} píxeles)")
+            mask = self._tiled_segmenter.predict_mask(image)
+            result = apply_mask(image, mask, self.min_alpha_threshold, self.smooth_edges, self.preserve_elements)
+        result.save(output_path)
+    
     def get_stats(self, image_path: str) -> Optional[dict]:
         """
         Obtiene estadísticas de una imagen si está disponible en bgremover.
@@ -175,19 +292,25 @@ class TutanchaconBgRemover(BackgroundRemover):
         else:
             raise ValueError("El umbral debe estar entre 0 y 255")
     
-    def set_model(self, model_name: str):
+    def set_model(self, model_name: str, model_variant: Optional[str] = None):
         """
         Cambia el modelo de IA para remover fondos.
         
         Args:
             model_name: Nombre del modelo ('isnet-general-use', 'u2net', etc.)
+            model_variant: Variante del modelo ('fp32', 'int8', 'optimized'); None = mantener
         """
         self.model_name = model_name
-        print(f"🔄 Cambiando modelo a: {model_name}")
+        if model_variant is not None:
+            self.model_variant = model_variant
+        print(f"🔄 Cambiando modelo a: {model_name} ({self.model_variant})")
         self._initialize_bg_remover()
     
     def __str__(self):
         """Representación string de la instancia."""
-        version = "package" if self._use_package is True else "standalone" if self._use_package is False else "script"
+        if self._use_package == 'session':
+            version = f"rembg-{self.model_variant}"
+        else:
+            version = "package" if self._use_package is True else "standalone" if self._use_package is False else "script"
         return (f"TutanchaconBgRemover(model={self.model_name}, "
                 f"threshold={self.min_alpha_threshold}, version={version})")
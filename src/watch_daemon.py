@@ -0,0 +1,120 @@
+"""
+Modo daemon: procesa de forma continua las imágenes que llegan al directorio de aprobadas.
+
+Al arrancar calienta los modelos y procesa las imágenes pendientes (sin recortes
+o con recortes más antiguos que la imagen: se compara con original.png o
+master.json, que se escriben al terminar cada carpeta); después procesa cada imagen nueva o
+modificada en cuanto FolderWatcher la considera completa.
+"""
+
+import os
+import threading
+import time
+from typing import List, Optional
+
+from .folder_watcher import FolderWatcher
+from .image_scanner import ImageEntry, scan_images
+from .sharding import OUTPUT_MARKERS
+
+
+class WatchDaemon:
+    """
+    Bucle de ingestión continua sobre un ImageProcessor con los modelos residentes.
+    """
+
+    def __init__(self, processor, input_dir: str, output_dir: str,
+                 watcher: Optional[FolderWatcher] = None, debounce_seconds: float = 2.0,
+                 poll_interval: float = 1.0, use_inotify: bool = True, on_demand: bool = False):
+        """
+        Args:
+            processor: ImageProcessor (o cualquier objeto con process_image y warm_up)
+            input_dir: Directorio vigilado (APPROVED_IMAGES_DIR)
+            output_dir: Directorio de recortes (CROPPED_IMAGES_DIR)
+            watcher: Vigilante ya creado (por defecto uno nuevo sobre input_dir)
+            debounce_seconds: Tiempo sin cambios antes de procesar una imagen
+            poll_interval: Intervalo del sondeo cuando no hay inotify
+            use_inotify: Si se intenta usar inotify
+            on_demand: Guardar solo el master de cada imagen (processor.create_master)
+        """
+        self.processor = processor
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.watcher = watcher or FolderWatcher(input_dir, debounce_seconds, poll_interval, use_inotify)
+        self._process_image = processor.create_master if on_demand else processor.process_image
+        self.processed = 0
+        self.failed = 0
+
+    def _output_subdir(self, image_path: str) -> str:
+        relative_dir = os.path.relpath(os.path.dirname(image_path), self.input_dir)
+        return os.path.join(self.output_dir, relative_dir)
+
+    def _is_up_to_date(self, entry: ImageEntry) -> bool:
+        # el mtime de la carpeta cambia con cualquier archivo que se cree o borre dentro
+        # (p. ej. un tamaño bajo demanda); original.png y master.json solo al procesar la imagen
+        output_subdir = os.path.join(self.output_dir, entry.relative_dir)
+        name = os.path.splitext(os.path.basename(entry.path))[0]
+        for folder in (name, f"error_{name}"):
+            for marker in OUTPUT_MARKERS:
+                try:
+                    if os.path.getmtime(os.path.join(output_subdir, folder, marker)) >= entry.mtime:
+                        return True
+                except OSError:
+                    continue
+        return False
+
+    def pending_on_startup(self) -> List[ImageEntry]:
+        """Imágenes sin recortes o con recortes anteriores a la última modificación."""
+        return [entry for entry in scan_images(self.input_dir) if not self._is_up_to_date(entry)]
+
+    def process(self, image_path: str) -> Optional[str]:
+        """Procesa una imagen y actualiza los contadores."""
+        start = time.perf_counter()
+        try:
+            final_path = self._process_image(image_path, self._output_subdir(image_path), self.output_dir)
+        except Exception as e:
+            print(f"❌ Error procesando {image_path}: {type(e).__name__}: {e}")
+            final_path = None
+        if final_path is None:
+            self.failed += 1
+        else:
+            self.processed += 1
+            print(f"📤 Publicado {final_path} en {time.perf_counter() - start:.2f}s")
+        return final_path
+
+    def run(self, stop_event: Optional[threading.Event] = None, warm_up: bool = True,
+            catch_up: bool = True, poll_timeout: float = 1.0) -> None:
+        """
+        Ejecuta el bucle hasta que se activa stop_event (o Ctrl+C).
+
+        Args:
+            stop_event: Evento para detener el daemon desde otro hilo
+            warm_up: Si se ejecuta una inferencia de calentamiento antes de empezar
+            catch_up: Si se procesan primero las imágenes pendientes del directorio
+            poll_timeout: Espera máxima de cada consulta al vigilante
+        """
+        stop_event = stop_event or threading.Event()
+        if warm_up:
+            self.processor.warm_up()
+
+        print(f"👀 Vigilando {self.input_dir} ({self.watcher.backend_name}, "
+              f"debounce {self.watcher.debounce_seconds}s)")
+        try:
+            if catch_up:
+                pending = self.pending_on_startup()
+                if pending:
+                    print(f"📊 Imágenes pendientes al arrancar: {len(pending)}")
+                for entry in pending:
+                    if stop_event.is_set():
+                        break
+                    self.process(entry.path)
+
+            while not stop_event.is_set():
+                for image_path in self.watcher.poll(poll_timeout):
+                    if stop_event.is_set():
+                        break
+                    self.process(image_path)
+        except KeyboardInterrupt:
+            print("\n🛑 Daemon detenido")
+        finally:
+            self.watcher.close()
+            print(f"📈 Daemon: {self.processed} procesadas, {self.failed} con error")
@@ -0,0 +1,408 @@
+"""
+Pool de procesos con modelos precargados en el proceso padre.
+
+El padre crea el ImageProcessor (modelo ISNet de bgremover y red res10 de
+detección facial) antes de crear los workers con fork, de modo que los pesos
+se comparten copy-on-write en lugar de cargarse una vez por worker. La
+inferencia de calentamiento también se ejecuta en el padre, antes del fork: las
+inicializaciones perezosas (sesión de segmentación, buffers) se heredan ya hechas
+y los workers, también los que reemplazan a uno perdido, aceptan trabajo al nacer.
+
+Con un MemoryTracker con techo de RSS, el worker que lo supera termina tras
+entregar su imagen y el padre crea otro con fork: el nuevo parte de los modelos
+precargados del padre y no hereda la memoria acumulada por el anterior.
+
+Cada worker recibe las tareas y devuelve los resultados por un pipe propio, con
+una sola imagen en curso: el padre sabe qué imagen procesa cada uno, detecta
+si muere o supera el tiempo máximo por imagen y lo reemplaza sin detener el lote.
+
+Si el procesador tiene presupuesto de tiempo, cada resultado lleva las
+decisiones de degradación de su imagen y si se difirió al carril lento.
+"""
+
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import time
+import traceback
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from .memory_monitor import MemoryReport, MemoryTracker, current_rss_bytes, private_memory_bytes, format_bytes
+from .metrics import PipelineMetrics
+from .profiling import get_profiler
+from .quarantine import Quarantine
+from .time_budget import BudgetLog
+from .tracing import get_tracer
+
+
+def drain_metrics(processor):
+    """Métricas acumuladas por el procesador desde el último envío (None si no las registra)."""
+    metrics = getattr(processor, 'metrics', None)
+    return metrics.drain() if metrics is not None else None
+
+
+def drain_budget(processor):
+    """Decisiones de presupuesto registradas por el procesador desde el último envío."""
+    time_budget = getattr(processor, 'time_budget', None)
+    return time_budget.drain() if time_budget is not None else []
+
+
+def _worker_main(worker_id: int, processor, conn,
+                 task_method: str = 'process_image', memory: Optional[MemoryTracker] = None) -> None:
+    """
+    Bucle de un worker: procesamiento de tareas hasta recibir None, o hasta
+    superar el techo de memoria de `memory` (el padre lo reemplaza).
+
+    Las tareas llegan y los resultados se devuelven por `conn`, un pipe propio del
+    worker: si muere a mitad de una imagen no deja bloqueado un canal compartido.
+    """
+    process = getattr(processor, task_method)
+    tracer = get_tracer()
+    tracer.set_process_name(f"worker {worker_id}")
+    conn.send({
+        'type': 'ready',
+        'worker': worker_id,
+        'pid': os.getpid(),
+        'rss_bytes': current_rss_bytes(),
+        'private_bytes': private_memory_bytes()
+    })
+
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        image_path, output_subdir, log_dir = task
+        task_start = time.perf_counter()
+        error_traceback = None
+        try:
+            final_path = process(image_path, output_subdir, log_dir)
+            error = None
+        except Exception as e:
+            final_path = None
+            error = f"{type(e).__name__}: {e}"
+            error_traceback = traceback.format_exc()
+        budget = drain_budget(processor)
+        deferred = any(decision['decision'] == 'defer' for decision in budget)
+        if final_path is None and error is None and not deferred:
+            error = "error removiendo el fondo"
+        memory_sample = memory.image_done() if memory is not None else None
+        recycle = None
+        if memory is not None and memory.over_limit():
+            recycle = {'pid': os.getpid(), 'images': memory.images, 'rss_bytes': current_rss_bytes()}
+        conn.send({
+            'type': 'done',
+            'worker': worker_id,
+            'image_path': image_path,
+            'final_path': final_path,
+            'seconds': time.perf_counter() - task_start,
+            'error': error,
+            'traceback': error_traceback,
+            'deferred': deferred,
+            'budget': budget,
+            'metrics': drain_metrics(processor),
+            'trace': tracer.drain(),
+            'memory': memory_sample,
+            'recycle': recycle
+        })
+        if recycle is not None:
+            break
+    get_profiler().dump()
+
+
+def _exit_description(exitcode: int) -> str:
+    if exitcode < 0:
+        try:
+            return f"señal {signal.Signals(-exitcode).name}"
+        except ValueError:
+            return f"señal {-exitcode}"
+    return f"código {exitcode}"
+
+
+class PreloadedWorkerPool:
+    """
+    Pool de workers creados con fork a partir de un padre con los modelos ya cargados.
+
+    Los hilos no sobreviven al fork: una sesión de ONNX Runtime creada en el padre
+    debe usar intra_op_num_threads=1 e inter_op_num_threads=1 para no esperar en el
+    hijo a un pool de hilos que ya no existe: así lo crea
+    BackgroundRemoverConfig.create_remover(forked=True), también para fp32.
+    OMP_NUM_THREADS=1 solo limita las bibliotecas con OpenMP; el pool de hilos
+    de ONNX Runtime no lo lee. El paralelismo lo aportan los workers.
+
+    Cada worker tiene una sola imagen en curso. Si muere (crash nativo, OOM killer)
+    o supera image_timeout, el padre lo mata, devuelve la imagen con error, la pone
+    en cuarentena y crea otro worker con fork, que parte de los modelos precargados.
+    Un worker que muere estando libre se reemplaza antes de enviarle otra tarea.
+    """
+
+    def __init__(self, processor_factory: Callable[[], object], workers: int = 2, warm_up: bool = True,
+                 task_method: str = 'process_image', memory: Optional[MemoryTracker] = None,
+                 image_timeout: Optional[float] = None, quarantine: Optional[Quarantine] = None,
+                 poll_interval: float = 0.5):
+        """
+        Args:
+            processor_factory: Función que crea el ImageProcessor (se llama una vez, en el padre)
+            workers: Número de procesos worker
+            warm_up: Si el padre ejecuta una inferencia de calentamiento antes del fork
+            task_method: Método del procesador que ejecuta cada tarea ('create_master' en modo bajo demanda)
+            memory: Muestreo de memoria de cada worker y techo de RSS para reciclarlo
+            image_timeout: Segundos máximos por imagen antes de matar a su worker (None = sin límite)
+            quarantine: Cuarentena de las imágenes que tumban al worker, agotan el tiempo o lanzan una excepción
+            poll_interval: Intervalo de comprobación de los tiempos máximos
+        """
+        self.processor_factory = processor_factory
+        self.workers = max(1, workers)
+        self.warm_up = warm_up
+        self.task_method = task_method
+        self.memory = memory
+        self.image_timeout = image_timeout
+        self.quarantine = quarantine
+        self.poll_interval = poll_interval
+        # muestras de memoria y reciclados de todos los workers
+        self.memory_report = MemoryReport()
+        # decisiones de presupuesto de tiempo de todos los workers
+        self.budget_log = BudgetLog()
+        # workers perdidos por crash o tiempo máximo, con la imagen que procesaban
+        self.failures = []
+        self.processor = None
+        self.preload_seconds = 0.0
+        self.warmup_seconds = 0.0
+        self.start_seconds = 0.0
+        self.worker_stats = {}
+        # métricas por etapa combinadas de todos los workers
+        self.metrics = PipelineMetrics()
+        self._context = None
+        self._processes = {}
+        self._connections = {}
+        # worker -> (tarea en curso, inicio)
+        self._in_flight = {}
+
+    def start(self) -> 'PreloadedWorkerPool':
+        """Precarga los modelos en el padre, crea los workers y espera a que estén listos."""
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("PreloadedWorkerPool requiere el método de inicio 'fork' (Linux/macOS)")
+
+        start = time.perf_counter()
+        # solo afecta a bibliotecas con OpenMP; los hilos de ONNX Runtime se fijan en la sesión
+        os.environ['OMP_NUM_THREADS'] = '1'
+        self.processor = self.processor_factory()
+        self.processor.face_detector.load_model()
+        self.preload_seconds = time.perf_counter() - start
+        if self.warm_up:
+            warm_up_start = time.perf_counter()
+            try:
+                self.processor.warm_up()
+            except Exception as e:
+                print(f"⚠️ Error en el calentamiento: {e}")
+            self.warmup_seconds = time.perf_counter() - warm_up_start
+
+        self._context = multiprocessing.get_context('fork')
+        for worker_id in range(self.workers):
+            self._spawn(worker_id)
+
+        for worker_id, conn in self._connections.items():
+            message = conn.recv()
+            self.worker_stats[worker_id] = message
+
+        self.start_seconds = time.perf_counter() - start
+        return self
+
+    def _spawn(self, worker_id: int) -> None:
+        # Con fork los argumentos no se serializan: el worker hereda el procesador del padre
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(worker_id, self.processor, child_conn, self.task_method, self.memory),
+            name=f"avatar-worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        self._processes[worker_id] = process
+        self._connections[worker_id] = parent_conn
+
+    def map(self, tasks: Iterable[Tuple[str, str, str]]) -> Iterator[dict]:
+        """
+        Reparte las tareas (image_path, output_subdir, log_dir) entre los workers.
+
+        Devuelve los resultados a medida que terminan (sin orden garantizado). La imagen
+        de un worker que muere o supera image_timeout se devuelve con error.
+        """
+        tasks = iter(tasks)
+        idle = sorted(self._processes, reverse=True)
+        while True:
+            while idle:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                self._send(idle.pop(), task)
+            if not self._in_flight:
+                return
+
+            # los mensajes pendientes se leen antes de dar por muerto a un worker
+            waitables = [self._connections[worker_id] for worker_id in self._in_flight]
+            waitables += [self._processes[worker_id].sentinel for worker_id in self._in_flight]
+            ready = multiprocessing.connection.wait(waitables, timeout=self.poll_interval)
+            for worker_id in list(self._in_flight):
+                conn = self._connections[worker_id]
+                if conn not in ready or not conn.poll():
+                    continue
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    continue
+                if message['type'] == 'ready':
+                    self.worker_stats[worker_id] = message
+                    continue
+                del self._in_flight[worker_id]
+                self._merge(message)
+                yield message
+                idle.append(worker_id)
+
+            for message in self._check_workers():
+                yield message
+                idle.append(message['worker'])
+
+    def _send(self, worker_id: int, task: Tuple[str, str, str]) -> None:
+        """Envía una tarea a un worker libre; si murió sin imagen en curso, lo reemplaza antes."""
+        process = self._processes[worker_id]
+        if not process.is_alive():
+            self._replace_idle(worker_id, f"terminó con {_exit_description(process.exitcode)}")
+        try:
+            self._connections[worker_id].send(task)
+        except OSError as e:
+            # murió entre la comprobación y el envío
+            self._replace_idle(worker_id, f"no acepta tareas ({type(e).__name__})")
+            self._connections[worker_id].send(task)
+        self._in_flight[worker_id] = (task, time.monotonic())
+
+    def _replace_idle(self, worker_id: int, detail: str) -> None:
+        """Reemplaza un worker muerto que no procesaba ninguna imagen (no hay nada que poner en cuarentena)."""
+        process = self._processes[worker_id]
+        process.kill()
+        process.join()
+        self._connections.pop(worker_id).close()
+        print(f"💥 Worker {worker_id} (pid {process.pid}) {detail} sin imagen en curso; se reemplaza")
+        self.metrics.increment('worker_crashes')
+        self._spawn(worker_id)
+
+    def _pending_result(self, worker_id: int) -> Optional[dict]:
+        """Resultado ya enviado por el worker y aún sin leer (None si no lo hay)."""
+        conn = self._connections[worker_id]
+        try:
+            while conn.poll():
+                message = conn.recv()
+                if message['type'] == 'ready':
+                    self.worker_stats[worker_id] = message
+                    continue
+                return message
+        except (EOFError, OSError):
+            pass
+        return None
+
+    def _merge(self, message: dict) -> None:
+        """Combina lo que el worker envía con cada imagen y atiende reciclados y excepciones."""
+        worker_id = message['worker']
+        self.metrics.merge(message.pop('metrics', None))
+        get_tracer().add_events(message.pop('trace', None))
+        self.memory_report.add(f"worker {worker_id}", message.pop('memory', None))
+        self.budget_log.merge(message.pop('budget', None))
+        recycle = message.pop('recycle', None)
+        if recycle is not None:
+            self._recycle(worker_id, recycle)
+        error_traceback = message.pop('traceback', None)
+        if error_traceback is not None and self.quarantine is not None:
+            message['quarantine'] = self.quarantine.add(
+                message['image_path'], 'error', message['error'], worker=worker_id, traceback=error_traceback)
+
+    def _check_workers(self) -> List[dict]:
+        """
+        Reemplaza los workers con una imagen en curso que murieron o superaron image_timeout.
+
+        Antes de darlos por perdidos se lee su pipe: un resultado que llegó justo
+        al vencer el plazo (o antes de terminar el proceso) se entrega normalmente.
+        """
+        messages = []
+        now = time.monotonic()
+        for worker_id, (task, started) in list(self._in_flight.items()):
+            process = self._processes[worker_id]
+            if process.exitcode is not None:
+                reason, detail = 'crash', f"el worker terminó con {_exit_description(process.exitcode)}"
+            elif self.image_timeout and now - started > self.image_timeout:
+                reason, detail = 'timeout', f"más de {self.image_timeout:g}s procesando la imagen"
+            else:
+                continue
+            message = self._pending_result(worker_id)
+            del self._in_flight[worker_id]
+            if message is not None:
+                self._merge(message)
+                messages.append(message)
+                continue
+            process.kill()
+            process.join()
+            self._connections.pop(worker_id).close()
+            messages.append(self._failed(worker_id, process.pid, task[0], reason, detail, now - started))
+            self._spawn(worker_id)
+        return messages
+
+    def _failed(self, worker_id: int, pid: int, image_path: str, reason: str, detail: str,
+                seconds: float) -> dict:
+        """Resultado de la imagen de un worker perdido (con su registro de cuarentena)."""
+        print(f"💥 Worker {worker_id} (pid {pid}): {image_path}: {detail}; se reemplaza")
+        self.metrics.increment('worker_crashes' if reason == 'crash' else 'worker_timeouts')
+        failure = {'worker': worker_id, 'pid': pid, 'image_path': image_path, 'reason': reason,
+                   'detail': detail, 'seconds': round(seconds, 3), 'time': time.time()}
+        self.failures.append(failure)
+        message = {
+            'type': 'done',
+            'worker': worker_id,
+            'image_path': image_path,
+            'final_path': None,
+            'seconds': seconds,
+            'error': f"{'WorkerCrash' if reason == 'crash' else 'ImageTimeout'}: {detail}",
+            'deferred': False
+        }
+        if self.quarantine is not None:
+            message['quarantine'] = self.quarantine.add(image_path, reason, detail, worker=worker_id, pid=pid,
+                                                        seconds=failure['seconds'])
+        return message
+
+    def _recycle(self, worker_id: int, recycle: dict) -> None:
+        """Reemplaza un worker que superó el techo de memoria (ya entregó su última imagen)."""
+        self._processes.pop(worker_id).join()
+        self._connections.pop(worker_id).close()
+        self.memory_report.recycled(f"worker {worker_id}", recycle)
+        print(f"♻️ Worker {worker_id} (pid {recycle['pid']}) reciclado tras {recycle['images']} imágenes: "
+              f"RSS {format_bytes(recycle['rss_bytes'])} > {format_bytes(self.memory.max_rss_bytes)}")
+        self._spawn(worker_id)
+
+    def close(self) -> None:
+        """Detiene los workers cuando terminan sus tareas pendientes."""
+        for conn in self._connections.values():
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process in self._processes.values():
+            process.join()
+        for conn in self._connections.values():
+            conn.close()
+        self._processes.clear()
+        self._connections.clear()
+        self._in_flight.clear()
+
+    def print_report(self) -> None:
+        """Muestra el tiempo de arranque del pool y la memoria de cada worker."""
+        print(f"🏊 Pool de {self.workers} workers listo en {self.start_seconds:.2f}s "
+              f"(precarga de modelos: {self.preload_seconds:.2f}s, calentamiento: {self.warmup_seconds:.2f}s)")
+        print(f"   Padre: RSS {format_bytes(current_rss_bytes())}")
+        for worker_id, stats in sorted(self.worker_stats.items()):
+            print(f"   Worker {worker_id} (pid {stats['pid']}): RSS {format_bytes(stats['rss_bytes'])}, "
+                  f"privada {format_bytes(stats['private_bytes'])}")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
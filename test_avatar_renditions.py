@@ -0,0 +1,180 @@
+"""
+Pruebas del modo bajo demanda: master recortado, renderizado de tamaños y cachés LRU.
+"""
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+from PIL import Image
+
+from src.avatar_renditions import (AvatarRenderer, MemoryCache, render_rendition,
+                                   save_master, trim_to_content)
+from src.avatar_service import AvatarService
+from src.avatar_size import AvatarSize
+from testing_helpers import make_processor
+
+
+def _gradient(size=(300, 500)):
+    x = np.linspace(0, 255, size[0], dtype=np.uint8)
+    y = np.linspace(0, 255, size[1], dtype=np.uint8)
+    pixels = np.stack([np.tile(x, (size[1], 1)), np.tile(y[:, None], (1, size[0])),
+                       np.full((size[1], size[0]), 90, np.uint8)], axis=2)
+    return Image.fromarray(pixels)
+
+
+def test_trim_to_content():
+    image = Image.new('RGBA', (100, 80), (0, 0, 0, 0))
+    image.paste((255, 0, 0, 255), (20, 10, 60, 70))
+    assert trim_to_content(image).size == (40, 60)
+    empty = Image.new('RGBA', (10, 10), (0, 0, 0, 0))
+    assert trim_to_content(empty).size == (10, 10)
+
+
+def test_render_rendition_sizes_and_clamping():
+    master = _gradient()
+    for size in AvatarSize:
+        rendition = render_rendition(master, (0.5, 0.2), size)
+        assert rendition.size == (size.value[2], size.value[3])
+    # Una cara en la esquina no saca el recorte de la imagen
+    corner = render_rendition(master, (0.0, 0.0), AvatarSize.S_86x86)
+    scaled = master.resize((204, 350), Image.LANCZOS)
+    assert np.array_equal(np.asarray(corner), np.asarray(scaled.crop((0, 0, 86, 86))))
+    assert render_rendition(master, None, AvatarSize.S_38x38) is None
+    assert render_rendition(master, None, AvatarSize.S_204x175).size == (204, 175)
+
+
+def test_master_renditions_match_full_processing():
+    processor = make_processor()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, 'ana.png')
+        _gradient().save(source)
+        full_path = processor.process_image(source, os.path.join(temp_dir, 'full'), temp_dir)
+        master_path = processor.create_master(source, os.path.join(temp_dir, 'masters'), temp_dir)
+        assert sorted(os.listdir(master_path)) == ['master.json', 'master.png']
+
+        renderer = AvatarRenderer(os.path.join(temp_dir, 'masters'))
+        for size in (AvatarSize.S_204x350, AvatarSize.S_204x175, AvatarSize.S_136x234, AvatarSize.S_86x86):
+            with Image.open(io.BytesIO(renderer.render('ana', size))) as rendered, \
+                    Image.open(os.path.join(full_path, f"avatar_{size.value[2]}x{size.value[3]}.png")) as expected:
+                assert np.array_equal(np.asarray(rendered), np.asarray(expected)), size
+    shutil.rmtree('temp_bg_removal', ignore_errors=True)
+
+
+def test_trimmed_master_keeps_the_full_mode_geometry():
+    # figura de 300x600 en una imagen de 600x1000: el master se recorta a la figura,
+    # pero los tamaños deben salir con las mismas proporciones que en el modo completo
+    source_image = Image.new('RGBA', (600, 1000), (0, 0, 0, 0))
+    source_image.paste(_gradient((300, 600)), (120, 250))
+    processor = make_processor()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, 'ana.png')
+        source_image.save(source)
+        full_path = processor.process_image(source, os.path.join(temp_dir, 'full'), temp_dir)
+        master_path = processor.create_master(source, os.path.join(temp_dir, 'masters'), temp_dir)
+        with Image.open(os.path.join(master_path, 'master.png')) as master:
+            assert master.size == (300, 600)
+        with Image.open(os.path.join(full_path, 'avatar_204x350.png')) as expected:
+            # en el modo completo la figura ocupa solo parte del recorte
+            assert 0.2 < (np.asarray(expected)[..., 3] > 0).mean() < 0.5
+
+        renderer = AvatarRenderer(os.path.join(temp_dir, 'masters'))
+        for size in AvatarSize:
+            with Image.open(io.BytesIO(renderer.render('ana', size))) as rendered, \
+                    Image.open(os.path.join(full_path, f"avatar_{size.value[2]}x{size.value[3]}.png")) as expected:
+                rendered_pixels = np.asarray(rendered).astype(int)
+                expected_pixels = np.asarray(expected).astype(int)
+                assert np.array_equal(rendered_pixels[..., 3], expected_pixels[..., 3]), size
+                visible = expected_pixels[..., 3] > 0
+                assert np.abs(rendered_pixels - expected_pixels)[visible].max(initial=0) <= 1, size
+    shutil.rmtree('temp_bg_removal', ignore_errors=True)
+
+
+def test_memory_cache_evicts_by_bytes():
+    cache = MemoryCache(max_bytes=10)
+    cache.put('a', b'12345')
+    cache.put('b', b'12345')
+    assert cache.get('a') == b'12345'
+    cache.put('c', b'123')
+    # 'b' era la menos usada
+    assert cache.get('b') is None and cache.get('a') is not None
+    cache.put('huge', b'x' * 11)
+    assert cache.get('huge') is None
+    assert cache.get_stats()['evictions'] == 1
+
+
+def test_renderer_uses_memory_then_disk_and_invalidates_on_new_master():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        masters = os.path.join(temp_dir, 'masters')
+        disk_cache = os.path.join(temp_dir, 'cache')
+        save_master(os.path.join(masters, 'team', 'ana'), _gradient().convert('RGBA'), (0.5, 0.2))
+
+        renderer = AvatarRenderer(masters, disk_cache_dir=disk_cache)
+        first = renderer.render('team/ana', AvatarSize.S_86x86)
+        assert renderer.render('team/ana', AvatarSize.S_86x86) == first
+        assert renderer.renders == 1 and renderer.memory_cache.hits == 1
+
+        # Un proceso nuevo reutiliza la caché en disco sin renderizar
+        restarted = AvatarRenderer(masters, disk_cache_dir=disk_cache)
+        assert restarted.render('team/ana', AvatarSize.S_86x86) == first
+        assert restarted.renders == 0
+
+        time.sleep(0.01)
+        save_master(os.path.join(masters, 'team', 'ana'), _gradient().convert('RGBA'), (0.1, 0.1))
+        assert restarted.render('team/ana', AvatarSize.S_86x86) != first
+        assert restarted.renders == 1
+
+        assert renderer.render('../cache', AvatarSize.S_86x86) is None
+        assert renderer.render('team/nobody', AvatarSize.S_86x86) is None
+
+
+def test_service_serves_renditions():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        save_master(os.path.join(temp_dir, 'team', 'ana'), _gradient().convert('RGBA'), None)
+        renderer = AvatarRenderer(temp_dir)
+        with AvatarService(make_processor(), port=0, renderer=renderer) as service:
+            host, port = service.server_address[:2]
+            base = f"http://{host}:{port}/avatars/team/ana"
+            with urllib.request.urlopen(f"{base}/136x234.png", timeout=10) as response:
+                assert response.headers['Content-Type'] == 'image/png'
+                with Image.open(io.BytesIO(response.read())) as image:
+                    assert image.size == (136, 234)
+            for missing in ('86x86.png', '99x99.png', '136x234.jpg'):
+                try:
+                    urllib.request.urlopen(f"{base}/{missing}", timeout=10)
+                    raise AssertionError(f"se esperaba 404 para {missing}")
+                except urllib.error.HTTPError as e:
+                    assert e.code == 404
+            assert service.metrics()['renditions']['renders'] == 1
+
+
+def main():
+    tests = [
+        test_trim_to_content,
+        test_render_rendition_sizes_and_clamping,
+        test_master_renditions_match_full_processing,
+        test_trimmed_master_keeps_the_full_mode_geometry,
+        test_memory_cache_evicts_by_bytes,
+        test_renderer_uses_memory_then_disk_and_invalidates_on_new_master,
+        test_service_serves_renditions,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Renderizado bajo demanda: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
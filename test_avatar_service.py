@@ -0,0 +1,235 @@
+"""
+Pruebas del servicio HTTP de avatares, del micro-batching y de la detección facial por lotes.
+Se usa el ImageProcessor real con un removedor de fondo falso y una red res10 simulada.
+"""
+
+import email
+import email.policy
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+import zipfile
+
+from PIL import Image
+
+from src.avatar_service import AvatarService, MicroBatcher
+from testing_helpers import FakeBgRemover, FakeNet, make_processor
+
+AVATAR_FILES = ['avatar_136x234.png', 'avatar_204x175.png', 'avatar_204x350.png',
+                'avatar_38x38.png', 'avatar_86x86.png', 'original.png']
+
+
+def _make_processor():
+    # la red solo detecta la cara en las imágenes no negras
+    return make_processor(FakeNet(box=(0.4, 0.2, 0.6, 0.5), bright_only=True), FakeBgRemover(fail_on='broken'))
+
+
+def _png_bytes(color, size=(300, 500)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _post(url, data, headers=None):
+    request = urllib.request.Request(url, data=data, headers=headers or {}, method='POST')
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.status, dict(response.headers), response.read()
+
+
+def test_face_detector_batch_matches_single_detection():
+    detector = _make_processor().face_detector
+    images = [Image.new('RGB', (204, 350), color) for color in ((200, 180, 160), (0, 0, 0), (150, 150, 150))]
+    single = [detector.detect_face_center_rect(image, (86, 86)) for image in images]
+    detector._net.batch_sizes.clear()
+    batch = detector.detect_face_center_rects_batch(images, (86, 86))
+    assert batch == single
+    assert batch[1] is None and batch[0] is not None
+    assert detector._net.batch_sizes == [3]
+
+    detector._net.batch_sizes.clear()
+    detector.detect_face_center_rects_optimized_batch(images, (86, 86))
+    # Solo la imagen sin rostro pasa a la búsqueda en la imagen completa
+    assert detector._net.batch_sizes == [3, 1]
+
+
+def test_micro_batcher_groups_concurrent_items():
+    batches = []
+
+    def process(items):
+        batches.append(len(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(process, max_batch_size=4, max_wait_ms=100)
+    futures = [batcher.submit(value) for value in range(6)]
+    assert [future.result(timeout=5) for future in futures] == [0, 2, 4, 6, 8, 10]
+    batcher.close()
+    assert batches == [4, 2]
+    assert batcher.average_batch_size == 3.0
+
+
+def test_micro_batcher_propagates_errors():
+    def process(items):
+        raise RuntimeError("modelo no disponible")
+
+    batcher = MicroBatcher(process, max_wait_ms=1)
+    future = batcher.submit('x')
+    try:
+        future.result(timeout=5)
+        raise AssertionError("se esperaba RuntimeError")
+    except RuntimeError:
+        pass
+    batcher.close()
+
+
+def test_service_returns_zip_with_avatar_set():
+    with AvatarService(_make_processor(), port=0, max_wait_ms=1) as service:
+        host, port = service.server_address[:2]
+        status, headers, body = _post(f"http://{host}:{port}/avatars?filename=ana.png",
+                                      _png_bytes((200, 180, 160)), {'Content-Type': 'image/png'})
+    assert status == 200
+    assert headers['Content-Type'] == 'application/zip'
+    assert headers['X-Face-Detected'] == 'true'
+    with zipfile.ZipFile(io.BytesIO(body)) as archive:
+        assert sorted(archive.namelist()) == AVATAR_FILES
+        with Image.open(io.BytesIO(archive.read('avatar_86x86.png'))) as avatar:
+            assert avatar.size == (86, 86)
+
+
+def test_service_accepts_multipart_and_answers_multipart():
+    boundary = 'frontera'
+    upload = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"dark.jpg\"\r\n"
+        "Content-Type: image/png\r\n\r\n"
+    ).encode() + _png_bytes((0, 0, 0)) + f"\r\n--{boundary}--\r\n".encode()
+    with AvatarService(_make_processor(), port=0, max_wait_ms=1) as service:
+        host, port = service.server_address[:2]
+        status, headers, body = _post(f"http://{host}:{port}/avatars?format=multipart", upload,
+                                      {'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    assert status == 200
+    # Sin rostro: no hay recortes de cara pero sí los de cuerpo
+    assert headers['X-Face-Detected'] == 'false'
+    message = email.message_from_bytes(
+        f"Content-Type: {headers['Content-Type']}\r\n\r\n".encode() + body, policy=email.policy.HTTP
+    )
+    names = sorted(part.get_filename() for part in message.iter_parts())
+    assert names == ['avatar_136x234.png', 'avatar_204x175.png', 'avatar_204x350.png', 'original.png']
+
+
+def test_concurrent_requests_are_batched_and_measured():
+    processor = _make_processor()
+    with AvatarService(processor, port=0, max_batch_size=8, max_wait_ms=200) as service:
+        host, port = service.server_address[:2]
+        statuses = []
+
+        def upload(index):
+            status, _, _ = _post(f"http://{host}:{port}/avatars?filename=img{index}.png",
+                                 _png_bytes((200, 180, 160)))
+            statuses.append(status)
+
+        threads = [threading.Thread(target=upload, args=(index,)) for index in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics", timeout=10) as response:
+            metrics = json.loads(response.read())
+    assert statuses == [200] * 6
+    assert metrics['requests']['count'] == 6
+    assert metrics['batches'] < 6 and metrics['average_batch_size'] > 1
+    assert 0 < metrics['requests']['p50_ms'] <= metrics['requests']['p99_ms']
+    # Una pasada de detección por tamaño de recorte y lote, no dos por imagen
+    assert max(processor.face_detector._net.batch_sizes) > 1
+
+
+def test_failed_segmentation_returns_422():
+    with AvatarService(_make_processor(), port=0, max_wait_ms=1) as service:
+        host, port = service.server_address[:2]
+        try:
+            _post(f"http://{host}:{port}/avatars?filename=broken.png", _png_bytes((200, 180, 160)))
+            raise AssertionError("se esperaba HTTP 422")
+        except urllib.error.HTTPError as e:
+            assert e.code == 422
+            assert 'fondo' in json.loads(e.read())['error']
+        assert service.metrics()['errors'] == 1
+
+
+def test_batch_closes_segmented_images_even_when_rendering_fails():
+    processor = _make_processor()
+    segmented = []
+    segment_image = processor.segment_image
+
+    def recording_segment_image(image_path):
+        image = segment_image(image_path)
+        segmented.append(image)
+        return image
+
+    def failing_render(items):
+        raise RuntimeError("fallo de renderizado")
+
+    processor.segment_image = recording_segment_image
+    processor.render_avatars_batch = failing_render
+    with AvatarService(processor, port=0) as service, tempfile.TemporaryDirectory() as temp_dir:
+        jobs = []
+        for index in range(3):
+            image_path = os.path.join(temp_dir, f"img{index}.png")
+            with open(image_path, 'wb') as f:
+                f.write(_png_bytes((200, 180, 160), (40, 60)))
+            jobs.append({'image_path': image_path, 'output_subdir': temp_dir, 'log_dir': temp_dir})
+        try:
+            service._process_batch(jobs)
+            raise AssertionError("se esperaba RuntimeError")
+        except RuntimeError as e:
+            assert 'renderizado' in str(e)
+    assert len(segmented) == 3
+    for image in segmented:
+        try:
+            image.getpixel((0, 0))
+            raise AssertionError("imagen segmentada sin cerrar")
+        except ValueError:
+            pass
+
+
+def test_error_count_is_thread_safe():
+    with AvatarService(_make_processor(), port=0) as service:
+        threads = [threading.Thread(target=lambda: [service.record_error() for _ in range(2000)])
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert service.metrics()['errors'] == 16000
+
+
+def main():
+    tests = [
+        test_face_detector_batch_matches_single_detection,
+        test_micro_batcher_groups_concurrent_items,
+        test_micro_batcher_propagates_errors,
+        test_service_returns_zip_with_avatar_set,
+        test_service_accepts_multipart_and_answers_multipart,
+        test_concurrent_requests_are_batched_and_measured,
+        test_failed_segmentation_returns_422,
+        test_batch_closes_segmented_images_even_when_rendering_fails,
+        test_error_count_is_thread_safe,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    shutil.rmtree('temp_bg_removal', ignore_errors=True)
+    print(f"\n📊 Servicio de avatares: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,115 @@
+"""
+Pruebas del benchmark: generador determinista de avatares, removedor sustituto y resultados por etapa.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from src.benchmark import StandInRemover, run_benchmark
+from src.face_detector import FaceDetector
+from src.synthetic_avatars import AVATAR_SIZES, avatar_specs, generate_avatar, write_dataset
+from testing_helpers import fake_face_detector
+
+
+def _uninstalled_backend():
+    raise ImportError("sin modelo")
+
+
+def test_generator_is_deterministic_and_covers_variants():
+    specs = avatar_specs(16, seed=7)
+    assert {(spec.width, spec.height) for spec in specs} == set(AVATAR_SIZES)
+    assert {(spec.alpha, spec.face) for spec in specs} == {(False, False), (False, True), (True, False), (True, True)}
+    assert len({spec.name for spec in specs}) == 16
+
+    again = avatar_specs(16, seed=7)[3]
+    assert np.array_equal(np.asarray(generate_avatar(specs[3])), np.asarray(generate_avatar(again)))
+    other = avatar_specs(16, seed=8)[3]
+    assert not np.array_equal(np.asarray(generate_avatar(specs[3])), np.asarray(generate_avatar(other)))
+
+    for spec in specs[:8]:
+        image = generate_avatar(spec)
+        assert image.size == (spec.width, spec.height)
+        assert image.mode == ('RGBA' if spec.alpha else 'RGB')
+
+
+def test_stand_in_remover_cuts_out_the_figure():
+    spec = next(spec for spec in avatar_specs(8) if not spec.alpha)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = write_dataset(temp_dir, [spec])[0]
+        output_path = os.path.join(temp_dir, 'out.png')
+        assert StandInRemover().remove_background(path, output_path)
+        with Image.open(output_path) as image:
+            alpha = np.asarray(image.convert('RGBA'))[:, :, 3]
+    assert alpha[0, 0] == 0 and alpha[-1, -1] == 0
+    # el torso, en el centro de la imagen, queda opaco
+    assert alpha[int(spec.height * 0.45), spec.width // 2] == 255
+
+
+def test_run_benchmark_reports_every_stage():
+    specs = avatar_specs(4, seed=1)
+    backends = {'stand-in': StandInRemover, 'roto': _uninstalled_backend}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = write_dataset(os.path.join(temp_dir, 'dataset'), specs)
+        try:
+            results = run_benchmark(specs, paths, temp_dir, repeat=2, face_detector=fake_face_detector(),
+                                    backends=backends, seed=1)
+        finally:
+            shutil.rmtree('temp_bg_removal', ignore_errors=True)
+
+    stages = results['stages']
+    assert set(stages) == {'decode', 'resize_proportional', 'resize_avatar', 'face_detection',
+                           'crop_encode', 'remover:stand-in', 'remover:roto', 'pipeline'}
+    assert stages['remover:roto'] == {'skipped': 'ImportError: sin modelo'}
+    for name, result in stages.items():
+        if name != 'remover:roto':
+            assert result['samples'] == 8, name
+            assert result['min_ms'] <= result['median_ms'] <= result['max_ms'], name
+            assert set(result['by_size_median_ms']) == {'204x350', '408x700', '816x1400', '1632x2800'}
+    assert stages['face_detection']['faces_found'] == 4
+    assert results['dataset']['seed'] == 1 and len(results['dataset']['images']) == 4
+    assert results['config']['backends'] == ['stand-in', 'roto']
+    json.dumps(results)
+
+
+def test_missing_detector_model_skips_detection_stages():
+    specs = avatar_specs(1)
+    missing = FaceDetector(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml',
+                           model_path='/nonexistent/res10.caffemodel')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = write_dataset(temp_dir, specs)
+        results = run_benchmark(specs, paths, temp_dir, repeat=1, stages=('decode', 'face_detection', 'pipeline'),
+                                face_detector=missing, backends={})
+    stages = results['stages']
+    assert stages['decode']['samples'] == 1
+    assert stages['face_detection']['skipped'].startswith('modelo res10 no disponible')
+    assert 'skipped' in stages['pipeline']
+
+
+def main():
+    tests = [
+        test_generator_is_deterministic_and_covers_variants,
+        test_stand_in_remover_cuts_out_the_figure,
+        test_run_benchmark_reports_every_stage,
+        test_missing_detector_model_skips_detection_stages,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Benchmark: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
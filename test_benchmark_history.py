@@ -0,0 +1,136 @@
+"""
+Pruebas del historial de benchmarks: almacenamiento, línea base comparable, umbrales estadísticos y presupuestos.
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+import benchmark_compare
+from src.benchmark_history import (append_history, check_budgets, compare, load_history, make_record,
+                                   select_baseline)
+
+ENVIRONMENT = {'python': '3.12.0', 'machine': 'x86_64', 'cpu_count': 8, 'numpy': '2.0', 'pillow': '11', 'opencv': '4.10'}
+
+
+def _stage(median, stdev=1.0, samples=20):
+    return {'samples': samples, 'mean_ms': median, 'median_ms': median, 'p95_ms': median * 1.2,
+            'min_ms': median * 0.9, 'max_ms': median * 1.3, 'stdev_ms': stdev,
+            'images_per_second': 1000 / median}
+
+
+def _record(pipeline_ms, commit='abc123', repeat=3, recorded_at=None, environment=ENVIRONMENT):
+    results = {
+        'schema': 1, 'environment': environment,
+        'config': {'repeat': repeat, 'stages': ['decode', 'pipeline'], 'backends': []},
+        'dataset': {'seed': 0, 'images': [{'name': '000_204x350_rgb_face'}]},
+        'stages': {'decode': _stage(10.0), 'pipeline': _stage(pipeline_ms)}
+    }
+    record = make_record(results, commit={'commit': commit, 'dirty': False})
+    if recorded_at is not None:
+        record['recorded_at'] = recorded_at
+    return record
+
+
+def test_history_round_trip_skips_corrupt_lines():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'history', 'bench.jsonl')
+        append_history(path, _record(100.0, commit='aaa'))
+        with open(path, 'a') as f:
+            f.write('{"cortado": \n')
+        append_history(path, _record(101.0, commit='bbb'))
+        history = load_history(path)
+    assert [record['commit'] for record in history] == ['aaa', 'bbb']
+    assert history[0]['fingerprint'] == history[1]['fingerprint']
+    assert history[0]['results']['stages']['pipeline']['median_ms'] == 100.0
+    assert load_history(os.path.join(temp_dir, 'no_existe.jsonl')) == []
+
+
+def test_baseline_only_uses_comparable_runs():
+    other_machine = dict(ENVIRONMENT, cpu_count=64)
+    history = [
+        _record(100.0, commit='aaa', recorded_at=1),
+        _record(100.0, commit='bbb', recorded_at=2, repeat=5),
+        _record(100.0, commit='ccc', recorded_at=3, environment=other_machine),
+        _record(100.0, commit='ddd', recorded_at=4),
+        _record(100.0, commit='eee', recorded_at=5),
+    ]
+    candidate = history[-1]
+    assert [record['commit'] for record in select_baseline(history, candidate)] == ['aaa', 'ddd']
+    assert [record['commit'] for record in select_baseline(history, candidate, window=1)] == ['ddd']
+    assert [record['commit'] for record in select_baseline(history, candidate, commit='aa')] == ['aaa']
+
+
+def test_regressions_need_relative_and_significant_change():
+    stable = [_record(value, recorded_at=index) for index, value in enumerate((99.0, 100.0, 101.0, 100.5, 99.5))]
+    slow = compare(stable, _record(130.0, recorded_at=10))
+    assert slow['stages']['pipeline']['median_ms']['status'] == 'regression'
+    assert slow['stages']['pipeline']['images_per_second']['status'] == 'regression'
+    assert slow['stages']['decode']['median_ms']['status'] == 'ok'
+    assert {(item['stage'], item['metric']) for item in slow['regressions']} >= {('pipeline', 'median_ms')}
+
+    assert compare(stable, _record(104.0, recorded_at=10))['regressions'] == []
+    fast = compare(stable, _record(70.0, recorded_at=10))
+    assert fast['stages']['pipeline']['median_ms']['status'] == 'improvement'
+
+    # con una línea base muy ruidosa el mismo 30% no es significativo
+    noisy = [_record(value, recorded_at=index) for index, value in enumerate((60.0, 140.0, 100.0, 75.0, 130.0))]
+    assert compare(noisy, _record(130.0, recorded_at=10))['regressions'] == []
+
+
+def test_budgets_and_new_stages():
+    candidate = _record(130.0)
+    stages = candidate['results']['stages']
+    violations = check_budgets(stages, {'pipeline': {'p95_ms': 150, 'images_per_second': 10},
+                                        'decode': {'median_ms': 50}, 'face_detection': {'median_ms': 20}})
+    assert sorted((item['stage'], item['metric']) for item in violations) == [
+        ('face_detection', 'median_ms'), ('pipeline', 'images_per_second'), ('pipeline', 'p95_ms')
+    ]
+    report = compare([], candidate)
+    assert report['stages']['pipeline'] == {'status': 'new'} and report['regressions'] == []
+
+
+def test_compare_command_exit_codes():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'bench.jsonl')
+        for index, value in enumerate((99.0, 100.0, 101.0, 130.0)):
+            append_history(path, _record(value, recorded_at=index))
+
+        def run(*argv):
+            with contextlib.redirect_stdout(io.StringIO()) as output:
+                code = benchmark_compare.main(['--history', path] + list(argv))
+            return code, output.getvalue()
+
+        code, output = run()
+        assert code == 0 and '🔴 regression' in output
+        assert run('--fail-on-regression')[0] == 1
+        assert run('--budget', 'pipeline.median_ms=120')[0] == 1
+        assert run('--budget', 'pipeline.median_ms=200', '--threshold', '50', '--fail-on-regression')[0] == 0
+        code, output = run('--list')
+        assert code == 0 and output.count('abc123') == 4
+
+
+def main():
+    tests = [
+        test_history_round_trip_skips_corrupt_lines,
+        test_baseline_only_uses_comparable_runs,
+        test_regressions_need_relative_and_significant_change,
+        test_budgets_and_new_stages,
+        test_compare_command_exit_codes,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Historial de benchmarks: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,133 @@
+"""
+Pruebas del descubrimiento de imágenes con os.scandir y de la lectura anticipada.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from src import image_scanner
+from src.image_scanner import PrefetchingReader, scan_images
+
+
+def _make_tree(root):
+    files = {
+        'a.png': b'a' * 10,
+        'b.JPG': b'b' * 20,
+        'notes.txt': b'x',
+        os.path.join('sub', 'c.jpeg'): b'c' * 30,
+        os.path.join('sub', 'deep', 'd.png'): b'd' * 40,
+    }
+    for relative, data in files.items():
+        path = os.path.join(root, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+    return files
+
+
+def test_scan_finds_images_with_metadata():
+    with tempfile.TemporaryDirectory() as root:
+        _make_tree(root)
+        entries = scan_images(root)
+        names = [os.path.basename(entry.path) for entry in entries]
+        assert sorted(names) == ['a.png', 'b.JPG', 'c.jpeg', 'd.png']
+        by_name = {os.path.basename(entry.path): entry for entry in entries}
+        assert by_name['a.png'].relative_dir == '.'
+        assert by_name['d.png'].relative_dir == os.path.join('sub', 'deep')
+        assert by_name['c.jpeg'].size == 30
+        assert abs(by_name['b.JPG'].mtime - os.path.getmtime(by_name['b.JPG'].path)) < 1e-6
+
+
+def test_scan_missing_directory_returns_empty():
+    assert scan_images('/nonexistent/approved') == []
+
+
+def test_scan_does_not_follow_directory_symlinks():
+    with tempfile.TemporaryDirectory() as root:
+        _make_tree(root)
+        # enlace circular loop/a/back -> .. como el que os.walk(followlinks=False) ya ignoraba
+        os.makedirs(os.path.join(root, 'loop', 'a'))
+        os.symlink('..', os.path.join(root, 'loop', 'a', 'back'))
+        with open(os.path.join(root, 'loop', 'a', 'e.png'), 'wb') as f:
+            f.write(b'e')
+        paths = [entry.path for entry in scan_images(root)]
+    assert len(paths) == len(set(paths)) == 5
+    assert sum(os.path.basename(path) == 'e.png' for path in paths) == 1
+
+
+def test_prefetching_reader_preserves_order_and_bytes():
+    with tempfile.TemporaryDirectory() as root:
+        files = _make_tree(root)
+        entries = scan_images(root)
+        reader = PrefetchingReader(entries, prefetch=2)
+        results = list(reader)
+        assert [entry for entry, _ in results] == entries
+        for entry, data in results:
+            assert data == files[os.path.relpath(entry.path, root)]
+        assert reader.bytes_read == 100
+
+
+def test_prefetching_reader_reads_ahead_of_consumer():
+    with tempfile.TemporaryDirectory() as root:
+        for index in range(8):
+            with open(os.path.join(root, f'img_{index}.png'), 'wb') as f:
+                f.write(b'x' * index)
+        entries = scan_images(root)
+        reads = []
+        lock = threading.Lock()
+        original = image_scanner._read_bytes
+
+        def tracking_read(path):
+            with lock:
+                reads.append(path)
+            return original(path)
+
+        image_scanner._read_bytes = tracking_read
+        try:
+            iterator = iter(PrefetchingReader(entries, prefetch=3))
+            next(iterator)
+            time.sleep(0.1)
+            # Con la primera imagen en proceso ya se han pedido las siguientes, pero no todas
+            assert len(reads) == 4
+            list(iterator)
+            assert len(reads) == 8
+        finally:
+            image_scanner._read_bytes = original
+
+
+def test_unreadable_file_yields_none():
+    with tempfile.TemporaryDirectory() as root:
+        _make_tree(root)
+        entries = scan_images(root)
+        os.remove(entries[0].path)
+        results = list(PrefetchingReader(entries, prefetch=2))
+        assert results[0][1] is None
+        assert all(data is not None for _, data in results[1:])
+
+
+def main():
+    tests = [
+        test_scan_finds_images_with_metadata,
+        test_scan_missing_directory_returns_empty,
+        test_scan_does_not_follow_directory_symlinks,
+        test_prefetching_reader_preserves_order_and_bytes,
+        test_prefetching_reader_reads_ahead_of_consumer,
+        test_unreadable_file_yields_none,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Escáner de imágenes: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
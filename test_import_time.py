@@ -0,0 +1,82 @@
+"""
+Presupuesto de tiempo de importación.
+Importar el paquete src, el factory y la configuración no debe cargar las
+dependencias pesadas (cv2, numpy, PIL, requests, matplotlib, bgremover).
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent
+
+# Presupuesto holgado: en una máquina normal la importación tarda unas decenas de ms
+IMPORT_BUDGET_SECONDS = 0.5
+
+HEAVY_MODULES = ('cv2', 'numpy', 'PIL', 'requests', 'matplotlib', 'onnxruntime', 'rembg', 'bgremover_package')
+
+LIGHT_IMPORT_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import src
+from src import BackgroundRemoverFactory, create_best_available_remover, AvatarSize
+from bg_remover_config import BackgroundRemoverConfig
+BackgroundRemoverConfig.get_tutanchacon_config()
+elapsed = time.perf_counter() - start
+print(json.dumps({'elapsed': elapsed, 'loaded': [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def _run_fresh_interpreter(code: str) -> dict:
+    """Ejecuta el código en un intérprete nuevo para medir una importación en frío."""
+    output = subprocess.run(
+        [sys.executable, '-c', code],
+        cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_light_imports_skip_heavy_dependencies():
+    result = _run_fresh_interpreter(LIGHT_IMPORT_CODE)
+    assert result['loaded'] == [], f"Dependencias pesadas cargadas al importar: {result['loaded']}"
+
+
+def test_light_imports_within_budget():
+    # Mejor de tres para no depender de ruido puntual de la máquina
+    elapsed = min(_run_fresh_interpreter(LIGHT_IMPORT_CODE)['elapsed'] for _ in range(3))
+    assert elapsed < IMPORT_BUDGET_SECONDS, f"Importación en {elapsed:.3f}s (presupuesto {IMPORT_BUDGET_SECONDS}s)"
+
+
+def test_lazy_attributes_resolve():
+    sys.path.insert(0, str(PROJECT_DIR))
+    import src
+    assert src.AvatarSize.S_38x38.value == (0, 0, 38, 38)
+    assert 'BackgroundRemoverFactory' in dir(src)
+    try:
+        src.DoesNotExist
+        raise AssertionError("se esperaba AttributeError")
+    except AttributeError:
+        pass
+
+
+def main():
+    tests = [
+        test_light_imports_skip_heavy_dependencies,
+        test_light_imports_within_budget,
+        test_lazy_attributes_resolve,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Tiempo de importación: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
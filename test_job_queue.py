@@ -0,0 +1,171 @@
+"""
+Pruebas de la cola de trabajos en SQLite: leases, heartbeats, reintentos y dead-letter.
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from src.job_queue import JobQueue, JobWorker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeProcessor:
+    """Anota cada imagen procesada en un archivo; falla con las que contienen "broken"."""
+
+    def __init__(self, log_path, delay=0.0):
+        self.log_path = log_path
+        self.delay = delay
+
+    def process_image(self, image_path, output_subdir, log_dir):
+        time.sleep(self.delay)
+        if 'broken' in image_path:
+            raise ValueError("imagen corrupta")
+        with open(self.log_path, 'a') as f:
+            f.write(f"{image_path}\n")
+        return os.path.join(output_subdir, os.path.basename(image_path))
+
+
+def _tasks(names):
+    return [(f"/approved/{name}", "/cropped", "/cropped") for name in names]
+
+
+def _worker_process(db_path, log_path, worker_id):
+    queue = JobQueue(db_path, lease_seconds=30)
+    JobWorker(queue, FakeProcessor(log_path, delay=0.005), worker_id=worker_id).run()
+
+
+def test_enqueue_ignores_duplicates():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        queue = JobQueue(os.path.join(temp_dir, 'jobs.sqlite3'))
+        assert queue.enqueue(_tasks(['a.png', 'b.png'])) == 2
+        assert queue.enqueue(_tasks(['b.png', 'c.png'])) == 1
+        assert queue.get_stats() == {'pending': 3, 'leased': 0, 'done': 0, 'dead': 0, 'total': 3}
+
+
+def test_leases_are_exclusive_and_expire():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        clock = FakeClock()
+        queue = JobQueue(os.path.join(temp_dir, 'jobs.sqlite3'), lease_seconds=10, clock=clock)
+        queue.enqueue(_tasks(['a.png', 'b.png', 'c.png']))
+        first = queue.lease('w1', limit=2)
+        second = queue.lease('w2', limit=2)
+        assert [job.image_path for job in first] == ['/approved/a.png', '/approved/b.png']
+        assert [job.image_path for job in second] == ['/approved/c.png']
+        assert queue.lease('w3') == []
+
+        # w1 renueva a.png; b.png caduca y la recoge otro worker
+        clock.now += 8
+        assert queue.heartbeat(first[0].id, 'w1')
+        clock.now += 5
+        reclaimed = queue.lease('w3', limit=5)
+        assert [job.image_path for job in reclaimed] == ['/approved/b.png', '/approved/c.png']
+        assert reclaimed[0].attempts == 2
+        # El worker original ya no puede completar ni renovar b.png
+        assert not queue.complete(first[1].id, 'w1')
+        assert not queue.heartbeat(first[1].id, 'w1')
+        assert queue.complete(first[0].id, 'w1', '/cropped/a')
+
+
+def test_failures_retry_then_dead_letter():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        clock = FakeClock()
+        queue = JobQueue(os.path.join(temp_dir, 'jobs.sqlite3'), lease_seconds=10, max_attempts=2, clock=clock)
+        queue.enqueue(_tasks(['broken.png', 'lost.png']))
+        job = queue.lease('w1')[0]
+        assert queue.fail(job.id, 'w1', "ValueError: imagen corrupta") == 'pending'
+        jobs = queue.lease('w1', limit=2)
+        assert [j.attempts for j in jobs] == [2, 1]
+        assert queue.fail(jobs[0].id, 'w1', "ValueError: imagen corrupta") == 'dead'
+
+        # lost.png: el worker muere dos veces sin heartbeat
+        clock.now += 11
+        assert queue.lease('w2')[0].attempts == 2
+        clock.now += 11
+        assert queue.lease('w3') == []
+        dead = queue.dead_letters()
+        assert [(d['image_path'], d['last_error']) for d in dead] == [
+            ('/approved/broken.png', "ValueError: imagen corrupta"),
+            ('/approved/lost.png', 'lease caducado')
+        ]
+        assert queue.retry_dead() == 2
+        assert queue.get_stats()['pending'] == 2
+
+
+def test_worker_heartbeats_keep_long_jobs_leased():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        queue = JobQueue(os.path.join(temp_dir, 'jobs.sqlite3'), lease_seconds=0.3)
+        queue.enqueue(_tasks(['slow.png', 'broken.png']))
+        log_path = os.path.join(temp_dir, 'processed.log')
+        worker = JobWorker(queue, FakeProcessor(log_path, delay=0.6), worker_id='w1', heartbeat_interval=0.05)
+
+        stolen = []
+
+        def thief():
+            time.sleep(0.4)
+            stolen.extend(queue.lease('thief'))
+
+        thread = threading.Thread(target=thief)
+        thread.start()
+        result = worker.run(batch_size=2)
+        thread.join()
+        # Aunque el lease dura 0.3 s, los heartbeats impiden que otro worker lo recoja
+        assert stolen == []
+        # broken.png se reintenta hasta agotar los intentos y acaba en dead-letter
+        assert result == {'worker': 'w1', 'completed': 1, 'failed': 3}
+        assert queue.get_stats()['done'] == 1 and queue.get_stats()['dead'] == 1
+
+
+def test_processes_share_queue_without_duplicates():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, 'jobs.sqlite3')
+        log_path = os.path.join(temp_dir, 'processed.log')
+        names = [f"img_{index:03d}.png" for index in range(60)]
+        JobQueue(db_path).enqueue(_tasks(names))
+
+        context = multiprocessing.get_context('spawn')
+        processes = [context.Process(target=_worker_process, args=(db_path, log_path, f"w{index}"))
+                     for index in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+
+        with open(log_path) as f:
+            processed = f.read().split()
+        assert sorted(processed) == [f"/approved/{name}" for name in names]
+        assert JobQueue(db_path).get_stats()['done'] == 60
+
+
+def main():
+    tests = [
+        test_enqueue_ignores_duplicates,
+        test_leases_are_exclusive_and_expire,
+        test_failures_retry_then_dead_letter,
+        test_worker_heartbeats_keep_long_jobs_leased,
+        test_processes_share_queue_without_duplicates,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Cola de trabajos: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
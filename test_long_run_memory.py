@@ -0,0 +1,134 @@
+"""
+Pruebas del modo de ejecuciones largas: muestras de memoria, objetos en crecimiento y reciclado de workers.
+"""
+
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+from PIL import Image
+
+from src.memory_monitor import MemoryReport, MemoryTracker, current_rss_bytes
+from src.worker_pool import PreloadedWorkerPool
+from testing_helpers import fake_face_detector, make_processor
+
+
+class Leak:
+    pass
+
+
+class LeakingProcessor:
+    """Retiene 32 MB por imagen, como un procesador con una fuga."""
+
+    def __init__(self):
+        self.face_detector = fake_face_detector()
+        self.retained = []
+
+    def process_image(self, image_path, output_subdir, log_dir):
+        self.retained.append(b'x' * (32 * 1024 * 1024))
+        return image_path
+
+
+def _forked_rss_bytes():
+    """RSS con el que arranca un proceso creado con fork (menor que el del padre)."""
+    context = multiprocessing.get_context('fork')
+    parent_conn, child_conn = context.Pipe()
+    process = context.Process(target=lambda conn: conn.send(current_rss_bytes()), args=(child_conn,))
+    process.start()
+    rss_bytes = parent_conn.recv()
+    process.join()
+    return rss_bytes
+
+
+def _save_images(directory, count):
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"img_{index}.png")
+        Image.new('RGB', (300, 500), (120, 80, 60)).save(path)
+        paths.append(path)
+    return paths
+
+
+def test_tracker_samples_every_n_images():
+    tracker = MemoryTracker(every=3, track_objects=True)
+    samples = [tracker.image_done() for _ in range(7)]
+    assert [sample is not None for sample in samples] == [False, False, True, False, False, True, False]
+    sample = samples[2]
+    assert sample['images'] == 3 and sample['pid'] == os.getpid()
+    assert sample['rss_bytes'] > 0 and sample['peak_rss_bytes'] >= sample['rss_bytes'] // 2
+    assert sample['objects']['builtins.dict'] > 0
+    assert not tracker.over_limit()
+    assert MemoryTracker(max_rss_bytes=1).over_limit()
+
+
+def test_report_flags_only_steadily_growing_types():
+    tracker = MemoryTracker(every=1, track_objects=True)
+    retained = []
+    report = MemoryReport()
+    for _ in range(4):
+        retained.extend(Leak() for _ in range(200))
+        report.add('main', tracker.image_done())
+    growing = {item['type']: item for item in report.growing_objects()}
+    leak = growing[f"{__name__}.Leak"]
+    assert leak['growth'] == 600 and leak['process'] == f"main (pid {os.getpid()})"
+
+    retained.clear()
+    report.add('main', tracker.image_done())
+    assert f"{__name__}.Leak" not in {item['type'] for item in report.growing_objects()}
+    assert report.summary()[f"main (pid {os.getpid()})"]['images'] == 5
+
+
+def test_processor_releases_images_between_iterations():
+    processor = make_processor()
+    tracker = MemoryTracker(every=5, track_objects=True)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = _save_images(temp_dir, 25)
+        try:
+            for path in paths:
+                processor.process_image(path, os.path.join(temp_dir, 'out'), temp_dir)
+                tracker.image_done()
+        finally:
+            shutil.rmtree('temp_bg_removal', ignore_errors=True)
+    report = MemoryReport()
+    for sample in tracker.samples:
+        report.add('main', sample)
+    growing = {item['type'] for item in report.growing_objects(min_growth=5)}
+    assert not {name for name in growing if name.startswith('PIL.')}, growing
+
+
+def test_pool_recycles_workers_over_the_rss_ceiling():
+    # el techo se mide desde el RSS de un worker recién creado, no desde el del padre
+    memory = MemoryTracker(every=1, max_rss_bytes=_forked_rss_bytes() + 80 * 1024 * 1024)
+    tasks = [(f"img_{index}.png", 'out', 'log') for index in range(8)]
+    with PreloadedWorkerPool(LeakingProcessor, workers=1, warm_up=False, memory=memory) as pool:
+        results = list(pool.map(tasks))
+    assert sorted(result['final_path'] for result in results) == sorted(task[0] for task in tasks)
+    assert len(pool.memory_report.recycles) >= 2
+    assert all(recycle['images'] <= 3 for recycle in pool.memory_report.recycles)
+    # cada worker reciclado aparece como otro proceso en el informe
+    assert len(pool.memory_report.summary()) == len(pool.memory_report.recycles) + 1
+
+
+def main():
+    tests = [
+        test_tracker_samples_every_n_images,
+        test_report_flags_only_steadily_growing_types,
+        test_processor_releases_images_between_iterations,
+        test_pool_recycles_workers_over_the_rss_ceiling,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Ejecuciones largas: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,176 @@
+"""
+Pruebas de las métricas por etapa: histogramas, exportación y agregación entre workers.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import urllib.request
+
+import numpy as np
+from PIL import Image
+
+from src.avatar_service import AvatarService
+from src.metrics import Histogram, PipelineMetrics
+from src.worker_pool import PreloadedWorkerPool
+from testing_helpers import FakeBgRemover, make_processor
+
+
+class FallbackNet:
+    """Simula la red res10: no encuentra la cara en la zona superior, sí en la imagen completa."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def setInput(self, blob):
+        self._batch = blob.shape[0]
+
+    def forward(self):
+        self.calls += 1
+        confidence = 0.9 if self.calls % 2 == 0 else 0.0
+        rows = [[index, 1, confidence, 0.3, 0.2, 0.5, 0.45] for index in range(self._batch)]
+        return np.array(rows, dtype=np.float32).reshape(1, 1, -1, 7)
+
+
+def _make_processor():
+    return make_processor(FallbackNet(), FakeBgRemover(fail_on='broken'))
+
+
+def _save_images(directory, names):
+    paths = []
+    for name in names:
+        path = os.path.join(directory, name)
+        Image.new('RGB', (300, 500), (120, 80, 60)).save(path)
+        paths.append(path)
+    return paths
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram(buckets=(0.1, 0.2, 0.4))
+    for seconds in (0.05, 0.15, 0.15, 0.3, 1.0):
+        histogram.observe(seconds)
+    assert histogram.counts == [1, 2, 1, 1]
+    assert histogram.count == 5 and abs(histogram.sum - 1.65) < 1e-9
+    assert 0.1 <= histogram.quantile(0.5) <= 0.2
+    assert histogram.quantile(1.0) == 1.0
+
+    other = Histogram.from_dict(histogram.to_dict(), buckets=(0.1, 0.2, 0.4))
+    histogram.merge(other)
+    assert histogram.counts == [2, 4, 2, 2] and histogram.count == 10
+
+
+def test_drain_and_merge_count_each_observation_once():
+    worker = PipelineMetrics()
+    parent = PipelineMetrics()
+    with worker.time('resize'):
+        pass
+    worker.increment('no_face')
+    parent.merge(worker.drain())
+    worker.observe('resize', 0.5)
+    parent.merge(worker.drain())
+    parent.merge(worker.drain())
+    summary = parent.to_dict()
+    assert summary['stages']['resize']['count'] == 2
+    assert summary['counters'] == {'no_face': 1}
+    assert worker.to_dict() == {'stages': {}, 'counters': {}}
+
+
+def test_prometheus_and_json_export():
+    metrics = PipelineMetrics(buckets=(0.1, 1.0))
+    metrics.observe('segmentation', 0.5)
+    metrics.observe('segmentation', 2.0)
+    metrics.increment('face_full_fallbacks', 3)
+    text = metrics.to_prometheus()
+    assert '# TYPE avatar_pipeline_stage_seconds histogram' in text
+    assert 'avatar_pipeline_stage_seconds_bucket{stage="segmentation",le="0.1"} 0' in text
+    assert 'avatar_pipeline_stage_seconds_bucket{stage="segmentation",le="1.0"} 1' in text
+    assert 'avatar_pipeline_stage_seconds_bucket{stage="segmentation",le="+Inf"} 2' in text
+    assert 'avatar_pipeline_stage_seconds_count{stage="segmentation"} 2' in text
+    assert 'avatar_pipeline_events_total{event="face_full_fallbacks"} 3' in text
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        metrics.write(os.path.join(temp_dir, 'metrics.json'))
+        metrics.write(os.path.join(temp_dir, 'metrics.prom'))
+        with open(os.path.join(temp_dir, 'metrics.json')) as f:
+            data = json.load(f)
+        assert data['stages']['segmentation']['buckets'] == {'0.1': 0, '1.0': 1, '+Inf': 1}
+        with open(os.path.join(temp_dir, 'metrics.prom')) as f:
+            assert f.read() == text
+
+
+def test_processor_records_stages_and_fallbacks():
+    processor = _make_processor()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        good, broken = _save_images(temp_dir, ['ana.png', 'broken.png'])
+        assert processor.process_image(good, os.path.join(temp_dir, 'out'), temp_dir)
+        assert processor.process_image(broken, os.path.join(temp_dir, 'out'), temp_dir) is None
+    shutil.rmtree('temp_bg_removal', ignore_errors=True)
+
+    summary = processor.metrics.to_dict()
+    assert list(summary['stages']) == ['segmentation', 'decode', 'resize', 'detection_top',
+                                       'detection_full', 'crop', 'encode', 'total']
+    assert summary['stages']['segmentation']['count'] == 2
+    assert summary['stages']['total']['count'] == 1
+    # dos recortes de cara (86 y 38): ambos con fallback a la imagen completa
+    assert summary['stages']['detection_top']['count'] == 2
+    assert summary['stages']['detection_full']['count'] == 2
+    # 5 recortes y original.png
+    assert summary['stages']['encode']['count'] == 6
+    assert summary['counters'] == {'face_full_fallbacks': 2, 'face_full_hits': 2,
+                                   'face_not_found': 0, 'segmentation_failures': 1}
+
+
+def test_pool_aggregates_worker_metrics():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = _save_images(temp_dir, [f"img_{index}.png" for index in range(4)])
+        tasks = [(path, os.path.join(temp_dir, 'out'), temp_dir) for path in paths]
+        with PreloadedWorkerPool(_make_processor, workers=2, warm_up=False) as pool:
+            results = list(pool.map(tasks))
+    shutil.rmtree('temp_bg_removal', ignore_errors=True)
+    assert all(result['error'] is None for result in results)
+    summary = pool.metrics.to_dict()
+    assert summary['stages']['total']['count'] == 4
+    assert summary['stages']['detection_top']['count'] == 8
+    assert summary['counters']['face_full_fallbacks'] == 8
+
+
+def test_service_exposes_prometheus_metrics():
+    processor = _make_processor()
+    processor.metrics.observe('segmentation', 0.2)
+    with AvatarService(processor, port=0) as service:
+        host, port = service.server_address[:2]
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics?format=prometheus", timeout=10) as response:
+            assert response.headers['Content-Type'].startswith('text/plain')
+            text = response.read().decode()
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics", timeout=10) as response:
+            data = json.loads(response.read())
+    assert 'avatar_service_requests_total 0' in text
+    assert 'avatar_pipeline_stage_seconds_count{stage="segmentation"} 1' in text
+    assert data['pipeline']['stages']['segmentation']['count'] == 1
+
+
+def main():
+    tests = [
+        test_histogram_buckets_and_quantiles,
+        test_drain_and_merge_count_each_observation_once,
+        test_prometheus_and_json_export,
+        test_processor_records_stages_and_fallbacks,
+        test_pool_aggregates_worker_metrics,
+        test_service_exposes_prometheus_metrics,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Métricas por etapa: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
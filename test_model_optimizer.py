@@ -0,0 +1,172 @@
+"""
+Pruebas de las variantes de modelo: rutas, regeneración, IoU del informe y presets con variante.
+No necesitan un modelo real: la generación y la sesión de rembg se sustituyen por dobles.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+import model_report
+from bg_remover_config import BackgroundRemoverConfig
+from src import segmentation_session
+from src.model_optimizer import ModelOptimizer
+from src.tutanchacon_bg_remover import TutanchaconBgRemover
+
+
+class CountingOptimizer(ModelOptimizer):
+    """Genera las variantes copiando el modelo original y cuenta las generaciones."""
+
+    def __init__(self, model_home, fail=False):
+        super().__init__(model_home)
+        self.generated = 0
+        self.fail = fail
+
+    def _quantize_int8(self, source, target):
+        if self.fail:
+            raise RuntimeError("cuantización fallida")
+        self.generated += 1
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            dst.write(src.read())
+
+    _optimize_graph = _quantize_int8
+
+
+class FakeSession:
+    """Sesión simulada: la mitad izquierda de la imagen es primer plano."""
+
+    def predict(self, image):
+        mask = np.zeros((image.size[1], image.size[0]), dtype=np.uint8)
+        mask[:, :image.size[0] // 2] = 255
+        return [Image.fromarray(mask)]
+
+
+def _write_model(model_home, name='u2net'):
+    path = os.path.join(model_home, f"{name}.onnx")
+    with open(path, 'wb') as f:
+        f.write(b'onnx')
+    return path
+
+
+def test_variant_paths():
+    optimizer = ModelOptimizer('/models')
+    assert optimizer.variant_path('u2net', 'fp32') == os.path.join('/models', 'u2net.onnx')
+    assert optimizer.variant_path('u2net', 'int8') == os.path.join('/models', 'u2net.int8.onnx')
+    assert optimizer.variant_path('u2net', 'optimized') == os.path.join('/models', 'u2net.opt.onnx')
+    try:
+        optimizer.variant_path('u2net', 'fp16')
+        assert False, "variante no válida aceptada"
+    except ValueError:
+        pass
+
+
+def test_ensure_variant_regenerates_only_when_stale():
+    with tempfile.TemporaryDirectory() as model_home:
+        source = _write_model(model_home)
+        optimizer = CountingOptimizer(model_home)
+        assert not optimizer.is_up_to_date('u2net', 'int8')
+        assert optimizer.ensure_variant('u2net', 'fp32') == source
+
+        target = optimizer.ensure_variant('u2net', 'int8')
+        assert os.path.exists(target) and optimizer.generated == 1
+        assert optimizer.is_up_to_date('u2net', 'int8')
+        optimizer.ensure_variant('u2net', 'int8')
+        assert optimizer.generated == 1
+
+        # un modelo original más reciente invalida la variante
+        later = time.time() + 10
+        os.utime(source, (later, later))
+        assert not optimizer.is_up_to_date('u2net', 'int8')
+        optimizer.ensure_variant('u2net', 'int8')
+        assert optimizer.generated == 2
+
+
+def test_failed_generation_leaves_no_partial_model():
+    with tempfile.TemporaryDirectory() as model_home:
+        _write_model(model_home)
+        try:
+            CountingOptimizer(model_home, fail=True).ensure_variant('u2net', 'int8')
+            assert False, "la generación fallida no lanzó"
+        except RuntimeError:
+            pass
+        assert sorted(os.listdir(model_home)) == ['u2net.onnx']
+
+
+def test_mask_iou():
+    a = Image.fromarray(np.array([[255, 255, 0, 0]], dtype=np.uint8))
+    b = Image.fromarray(np.array([[255, 0, 0, 0]], dtype=np.uint8))
+    empty = Image.fromarray(np.zeros((1, 4), dtype=np.uint8))
+    assert model_report.mask_iou(a, a) == 1.0
+    assert model_report.mask_iou(a, b) == 0.5
+    assert model_report.mask_iou(empty, empty) == 1.0
+
+
+def test_report_without_reference_has_no_iou():
+    original = model_report.create_segmentation_session
+    model_report.create_segmentation_session = lambda model_name, variant: FakeSession()
+    try:
+        samples = [('a.png', Image.new('RGB', (8, 4)))]
+        reference = model_report.evaluate_variant('u2net', 'fp32', samples, {})
+        assert reference['mean_iou'] == 1.0
+        without = model_report.evaluate_variant('u2net', 'int8', samples, {})
+        assert without['mean_iou'] is None and without['min_iou'] is None
+        model_report.print_report([without])
+        with_reference = model_report.evaluate_variant('u2net', 'int8', samples, reference['masks'])
+        assert with_reference['mean_iou'] == 1.0
+    finally:
+        model_report.create_segmentation_session = original
+
+
+def test_preset_variant_reaches_the_remover():
+    previous = BackgroundRemoverConfig.ACTIVE_PRESET
+    original = segmentation_session.create_segmentation_session
+    created = []
+    segmentation_session.create_segmentation_session = (
+        lambda model_name, variant, session_options=None: created.append((model_name, variant)) or FakeSession())
+    try:
+        BackgroundRemoverConfig.ACTIVE_PRESET = 'procesamiento_rapido_int8'
+        config = BackgroundRemoverConfig.get_tutanchacon_config()
+        assert config['model_variant'] == 'int8'
+        remover = TutanchaconBgRemover(**{**config, 'tiled_min_pixels': None})
+        assert created == [('u2net', 'int8')] and 'rembg-int8' in str(remover)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_path = os.path.join(temp_dir, 'in.png')
+            output_path = os.path.join(temp_dir, 'out.png')
+            Image.new('RGB', (8, 4), (200, 100, 50)).save(input_path)
+            assert remover.remove_background(input_path, output_path) is None
+            with Image.open(output_path) as result:
+                alpha = np.asarray(result.getchannel('A'))
+        assert result.mode == 'RGBA' and alpha[:, :4].min() == 255 and alpha[:, 4:].max() == 0
+    finally:
+        BackgroundRemoverConfig.ACTIVE_PRESET = previous
+        segmentation_session.create_segmentation_session = original
+
+
+def main():
+    tests = [
+        test_variant_paths,
+        test_ensure_variant_regenerates_only_when_stale,
+        test_failed_generation_leaves_no_partial_model,
+        test_mask_iou,
+        test_report_without_reference_has_no_iou,
+        test_preset_variant_reaches_the_remover,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Variantes de modelo: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
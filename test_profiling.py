@@ -0,0 +1,129 @@
+"""
+Pruebas del perfilado: muestreo de cProfile por imagen o por etapa, tracemalloc y resumen combinado.
+"""
+
+import glob
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+
+from PIL import Image
+
+from src.profiling import PipelineProfiler, get_profiler, summarize
+from src.worker_pool import PreloadedWorkerPool
+from testing_helpers import make_processor
+
+
+def _save_images(directory, count):
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"img_{index}.png")
+        Image.new('RGB', (300, 500), (120, 80, 60)).save(path)
+        paths.append(path)
+    return paths
+
+
+def _function_names(prof_path):
+    return {function for (_, _, function) in pstats.Stats(prof_path).stats}
+
+
+def test_disabled_profiler_is_a_no_op():
+    profiler = PipelineProfiler()
+    assert profiler.profile_image() is profiler.profile_stage('encode')
+    with profiler.profile_image():
+        pass
+    assert profiler.images == 0 and profiler.dump() == []
+
+
+def test_image_sampling_and_tracemalloc_snapshots():
+    profiler = get_profiler()
+    processor = make_processor()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        profile_dir = os.path.join(temp_dir, 'profile')
+        paths = _save_images(temp_dir, 4)
+        profiler.configure(profile_dir, sample_every=2, tracemalloc_every=2, top=5)
+        try:
+            for path in paths:
+                processor.process_image(path, os.path.join(temp_dir, 'out'), temp_dir)
+            written = profiler.dump()
+        finally:
+            profiler.disable()
+            shutil.rmtree('temp_bg_removal', ignore_errors=True)
+
+        assert profiler.images == 4 and profiler.sampled_images == 2
+        assert len(glob.glob(os.path.join(profile_dir, 'tracemalloc-*.snapshot'))) == 2
+        assert sorted(os.path.basename(path) for path in written) == [
+            f"cprofile-{os.getpid()}.prof", f"tracemalloc-{os.getpid()}.txt"
+        ]
+        assert {'segment_image', 'render_avatars', '_save_avatars'} <= _function_names(written[0])
+
+        summary = summarize(profile_dir, top=5)
+        with open(summary) as f:
+            text = f.read()
+        assert 'Funciones más costosas (1 procesos' in text
+        assert 'Sitios con más memoria asignada' in text and 'Mayor crecimiento' in text
+
+
+def test_stage_sampling_profiles_only_selected_stages():
+    profiler = get_profiler()
+    processor = make_processor()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        profile_dir = os.path.join(temp_dir, 'profile')
+        path = _save_images(temp_dir, 1)[0]
+        profiler.configure(profile_dir, stages=['encode'])
+        try:
+            processor.process_image(path, os.path.join(temp_dir, 'out'), temp_dir)
+            prof_path = profiler.dump()[0]
+        finally:
+            profiler.disable()
+            shutil.rmtree('temp_bg_removal', ignore_errors=True)
+        functions = _function_names(prof_path)
+        assert 'save' in functions
+        assert 'remove_background' not in functions and 'render_avatars' not in functions
+
+
+def test_workers_dump_profiles_and_summary_combines_them():
+    profiler = get_profiler()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        profile_dir = os.path.join(temp_dir, 'profile')
+        paths = _save_images(temp_dir, 4)
+        tasks = [(path, os.path.join(temp_dir, 'out'), temp_dir) for path in paths]
+        profiler.configure(profile_dir)
+        try:
+            with PreloadedWorkerPool(make_processor, workers=2, warm_up=False) as pool:
+                list(pool.map(tasks))
+            # el padre no procesó imágenes: no escribe perfil propio
+            assert profiler.dump() == []
+        finally:
+            profiler.disable()
+            shutil.rmtree('temp_bg_removal', ignore_errors=True)
+
+        profiles = glob.glob(os.path.join(profile_dir, 'cprofile-*.prof'))
+        assert len(profiles) == 2
+        with open(summarize(profile_dir)) as f:
+            assert 'Funciones más costosas (2 procesos' in f.read()
+
+
+def main():
+    tests = [
+        test_disabled_profiler_is_a_no_op,
+        test_image_sampling_and_tracemalloc_snapshots,
+        test_stage_sampling_profiles_only_selected_stages,
+        test_workers_dump_profiles_and_summary_combines_them,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Perfilado: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,155 @@
+"""
+Pruebas del progreso de los lotes: contadores, velocidad móvil, ETA, barra y archivo de estado.
+"""
+
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+from src.image_scanner import scan_images
+from src.progress import ProgressReporter, format_duration, result_status
+from src.worker_pool import PreloadedWorkerPool
+from testing_helpers import make_processor
+
+
+def _save_images(directory, count):
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"img_{index}.png")
+        Image.new('RGB', (300, 500), (120, 80, 60)).save(path)
+        paths.append(path)
+    return paths
+
+
+def test_result_status_and_duration_format():
+    assert result_status('out/ana') == 'processed'
+    assert result_status('out/error_ana') == 'skipped'
+    assert result_status(None) == 'failed'
+    assert result_status('out/ana', error="Timeout") == 'failed'
+    assert format_duration(None) == '--:--'
+    assert format_duration(75) == '01:15' and format_duration(3725) == '1:02:05'
+
+
+def test_counts_rate_eta_and_status_file():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        status_path = os.path.join(temp_dir, 'status', 'progress.json')
+        stream = io.StringIO()
+        progress = ProgressReporter(10, status_path=status_path, refresh_seconds=0, stream=stream)
+        assert progress.bar is False
+        for status in ('processed', 'processed', 'failed', 'skipped'):
+            progress.update('img.png', status)
+            time.sleep(0.01)
+        snapshot = progress.snapshot()
+        assert (snapshot['done'], snapshot['processed'], snapshot['failed'], snapshot['skipped']) == (4, 2, 1, 1)
+        assert snapshot['percent'] == 40.0 and snapshot['images_per_second'] > 0
+        assert snapshot['eta_seconds'] > 0 and snapshot['last_image'] == 'img.png'
+        with open(status_path) as f:
+            assert json.load(f)['done'] == 4
+
+        progress.close()
+        with open(status_path) as f:
+            final = json.load(f)
+        assert final['finished'] is True
+        # sin terminal: una sola línea final (el intervalo de líneas periódicas es de 30s)
+        assert stream.getvalue().count('\n') == 1 and '4/10 (40.0%)' in stream.getvalue()
+
+    try:
+        progress.update(status='unknown')
+        assert False, "estado desconocido aceptado"
+    except ValueError:
+        pass
+
+
+def test_rolling_rate_uses_only_the_window():
+    progress = ProgressReporter(100, window_seconds=0.05, stream=io.StringIO(), display=False)
+    for _ in range(5):
+        progress.update()
+    assert progress.rolling_rate() > 0
+    time.sleep(0.1)
+    snapshot = progress.snapshot()
+    assert snapshot['images_per_second'] == 0 and snapshot['eta_seconds'] is None
+    assert snapshot['overall_images_per_second'] > 0
+
+
+def test_status_file_is_refreshed_while_no_image_finishes():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        status_path = os.path.join(temp_dir, 'progress.json')
+        progress = ProgressReporter(10, status_path=status_path, refresh_seconds=0.05, display=False)
+        progress.update('img.png')
+        with open(status_path) as f:
+            first = json.load(f)
+        # sin más imágenes terminadas, el temporizador sigue reescribiendo el archivo
+        time.sleep(0.3)
+        with open(status_path) as f:
+            later = json.load(f)
+        assert later['done'] == 1 and later['elapsed_seconds'] > first['elapsed_seconds']
+        assert later['updated_at'] > first['updated_at']
+
+        progress.close()
+        assert not progress._timer.is_alive()
+        with open(status_path) as f:
+            final = json.load(f)
+        time.sleep(0.15)
+        with open(status_path) as f:
+            assert json.load(f) == final and final['finished'] is True
+
+
+def test_single_process_and_pool_report_every_image():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, 'in')
+        os.makedirs(input_dir)
+        paths = _save_images(input_dir, 4)
+        status_path = os.path.join(temp_dir, 'progress.json')
+        try:
+            processor = make_processor()
+            progress = ProgressReporter(4, status_path=status_path, refresh_seconds=0,
+                                        metrics=processor.metrics, display=False)
+            processor.process_images_with_bgremover(input_dir, os.path.join(temp_dir, 'out'),
+                                                    entries=scan_images(input_dir), progress=progress)
+            progress.close()
+            with open(status_path) as f:
+                single = json.load(f)
+
+            tasks = [(path, os.path.join(temp_dir, 'out2'), temp_dir) for path in paths]
+            with PreloadedWorkerPool(make_processor, workers=2, warm_up=False) as pool:
+                progress = ProgressReporter(4, refresh_seconds=0, metrics=pool.metrics, display=False)
+                for result in pool.map(tasks):
+                    progress.update(result['image_path'], result_status(result['final_path'], result['error']))
+                pooled = progress.snapshot()
+        finally:
+            shutil.rmtree('temp_bg_removal', ignore_errors=True)
+
+    assert single['done'] == 4 and single['processed'] == 4 and single['finished']
+    assert {'segmentation', 'resize', 'encode'} <= set(single['stage_mean_ms'])
+    assert pooled['done'] == 4 and pooled['percent'] == 100.0 and pooled['eta_seconds'] == 0.0
+    assert 'segmentation' in pooled['stage_mean_ms']
+
+
+def main():
+    tests = [
+        test_result_status_and_duration_format,
+        test_counts_rate_eta_and_status_file,
+        test_rolling_rate_uses_only_the_window,
+        test_status_file_is_refreshed_while_no_image_finishes,
+        test_single_process_and_pool_report_every_image,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Progreso: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
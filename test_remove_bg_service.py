@@ -0,0 +1,249 @@
+"""
+Pruebas de RemoveBgService contra un servidor HTTP local que simula la API de remove.bg.
+No consume créditos de la API real.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Agregar el directorio actual al path
+sys.path.append(str(Path(__file__).parent))
+
+from src.remove_bg_service import RemoveBgService
+from src.rate_limiter import TokenBucket
+from src.response_cache import ResponseCache
+
+FAKE_PNG = b'\x89PNG\r\n\x1a\nfake-result'
+
+
+class StubRemoveBgServer:
+    """Servidor local que imita el endpoint de remove.bg."""
+
+    def __init__(self, failures_before_success: int = 0, failure_status: int = 429, delay: float = 0.0):
+        self.failures_before_success = failures_before_success
+        self.failure_status = failure_status
+        self.delay = delay
+        self.requests = 0
+        self.connections = set()
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self.rfile.read(length)
+                with stub._lock:
+                    stub.requests += 1
+                    stub.connections.add(self.client_address)
+                    stub.active += 1
+                    stub.max_active = max(stub.max_active, stub.active)
+                    should_fail = stub.requests <= stub.failures_before_success
+                try:
+                    if stub.delay:
+                        time.sleep(stub.delay)
+                    if self.headers.get('X-Api-Key') != 'test_key':
+                        self._reply(403, b'forbidden')
+                    elif should_fail:
+                        self._reply(stub.failure_status, b'retry later', {'Retry-After': '0'})
+                    else:
+                        self._reply(200, FAKE_PNG)
+                finally:
+                    with stub._lock:
+                        stub.active -= 1
+
+            def _reply(self, status, body, headers=None):
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1.0/removebg"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _make_inputs(directory: str, count: int):
+    jobs = []
+    for i in range(count):
+        input_path = os.path.join(directory, f"in_{i}.png")
+        with open(input_path, 'wb') as f:
+            f.write(b'input-%d' % i)
+        jobs.append((input_path, os.path.join(directory, f"out_{i}.png")))
+    return jobs
+
+
+def test_reuses_connections():
+    """Varias imágenes secuenciales deben viajar por la misma conexión."""
+    with StubRemoveBgServer() as server, tempfile.TemporaryDirectory() as tmp:
+        service = RemoveBgService('test_key', api_url=server.url, requests_per_minute=None)
+        for input_path, output_path in _make_inputs(tmp, 5):
+            assert service.remove_background(input_path, output_path)
+            with open(output_path, 'rb') as f:
+                assert f.read() == FAKE_PNG
+        service.close()
+        assert server.requests == 5
+        assert len(server.connections) == 1
+
+
+def test_retries_on_429_and_5xx():
+    """Los errores 429/5xx se reintentan hasta agotar max_retries."""
+    for status in (429, 503):
+        with StubRemoveBgServer(failures_before_success=2, failure_status=status) as server, \
+                tempfile.TemporaryDirectory() as tmp:
+            service = RemoveBgService('test_key', api_url=server.url, requests_per_minute=None,
+                                      max_retries=3, backoff_base=0.01)
+            input_path, output_path = _make_inputs(tmp, 1)[0]
+            assert service.remove_background(input_path, output_path)
+            assert server.requests == 3
+            service.close()
+
+    with StubRemoveBgServer(failures_before_success=10) as server, tempfile.TemporaryDirectory() as tmp:
+        service = RemoveBgService('test_key', api_url=server.url, requests_per_minute=None,
+                                  max_retries=2, backoff_base=0.01)
+        input_path, output_path = _make_inputs(tmp, 1)[0]
+        assert not service.remove_background(input_path, output_path)
+        assert not os.path.exists(output_path)
+        assert server.requests == 3
+        service.close()
+
+
+def test_client_errors_are_not_retried():
+    with StubRemoveBgServer() as server, tempfile.TemporaryDirectory() as tmp:
+        service = RemoveBgService('wrong_key', api_url=server.url, requests_per_minute=None)
+        input_path, output_path = _make_inputs(tmp, 1)[0]
+        assert not service.remove_background(input_path, output_path)
+        assert server.requests == 1
+        service.close()
+
+
+def test_bounded_concurrency():
+    """remove_background_many no supera max_workers peticiones simultáneas."""
+    with StubRemoveBgServer(delay=0.05) as server, tempfile.TemporaryDirectory() as tmp:
+        service = RemoveBgService('test_key', api_url=server.url, requests_per_minute=None, max_workers=3)
+        results = service.remove_background_many(_make_inputs(tmp, 12))
+        service.close()
+        assert results == [True] * 12
+        assert 1 < server.max_active <= 3
+        assert len(server.connections) <= 3
+
+
+def test_rate_limit():
+    """El token bucket limita la tasa a la cuota configurada."""
+    with StubRemoveBgServer() as server, tempfile.TemporaryDirectory() as tmp:
+        # 1200 peticiones/minuto = 20/s, con ráfaga de 1
+        service = RemoveBgService('test_key', api_url=server.url, requests_per_minute=1200, burst=1)
+        start = time.monotonic()
+        service.remove_background_many(_make_inputs(tmp, 6))
+        elapsed = time.monotonic() - start
+        service.close()
+        assert elapsed >= 0.2
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=100, capacity=2)
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert bucket.acquire(timeout=0.5)
+
+    slow = TokenBucket(rate=0.1, capacity=1)
+    assert slow.try_acquire()
+    assert not slow.acquire(timeout=0.05)
+
+
+def test_cache_avoids_repeat_requests():
+    """Una segunda pasada sobre las mismas imágenes no llama a la API."""
+    with StubRemoveBgServer() as server, tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, 'cache')
+        jobs = _make_inputs(tmp, 4)
+
+        service = RemoveBgService('test_key', api_url=server.url, requests_per_minute=None, cache_dir=cache_dir)
+        assert service.remove_background_many(jobs) == [True] * 4
+        assert server.requests == 4
+        service.close()
+
+        # Una instancia nueva reutiliza la caché persistida en disco
+        service = RemoveBgService('test_key', api_url=server.url, requests_per_minute=None, cache_dir=cache_dir)
+        for _, output_path in jobs:
+            os.remove(output_path)
+        assert service.remove_background_many(jobs) == [True] * 4
+        assert server.requests == 4
+        with open(jobs[0][1], 'rb') as f:
+            assert f.read() == FAKE_PNG
+        stats = service.get_cache_stats()
+        assert stats['hits'] == 4 and stats['misses'] == 0
+        service.close()
+
+
+def test_cache_key_includes_params():
+    assert ResponseCache.make_key(b'abc', {'size': 'auto'}) != ResponseCache.make_key(b'abc', {'size': 'full'})
+    assert ResponseCache.make_key(b'abc', {'a': 1, 'b': 2}) == ResponseCache.make_key(b'abc', {'b': 2, 'a': 1})
+
+
+def test_cache_lru_eviction():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResponseCache(tmp, max_bytes=30)
+        cache.put('a' * 64, b'x' * 10)
+        cache.put('b' * 64, b'x' * 10)
+        cache.put('c' * 64, b'x' * 10)
+        assert cache.get('a' * 64) is not None  # 'a' pasa a ser la más reciente
+        cache.put('d' * 64, b'x' * 10)
+        assert 'b' * 64 not in cache
+        assert 'a' * 64 in cache and 'd' * 64 in cache
+        stats = cache.get_stats()
+        assert stats['evictions'] == 1
+        assert stats['total_bytes'] <= 30
+
+        reloaded = ResponseCache(tmp, max_bytes=30)
+        assert len(reloaded) == 3
+
+
+def main():
+    tests = [
+        test_reuses_connections,
+        test_retries_on_429_and_5xx,
+        test_client_errors_are_not_retried,
+        test_bounded_concurrency,
+        test_rate_limit,
+        test_token_bucket,
+        test_cache_avoids_repeat_requests,
+        test_cache_key_includes_params,
+        test_cache_lru_eviction,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 RemoveBgService: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
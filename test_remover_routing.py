@@ -0,0 +1,318 @@
+"""
+Pruebas del enrutado entre removedores de fondo (HybridBackgroundRemover y
+FallbackBackgroundRemover). Usa removedores simulados con latencia controlada;
+no requiere modelos ni API.
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Agregar el directorio actual al path
+sys.path.append(str(Path(__file__).parent))
+
+from PIL import Image
+
+from bg_remover_config import BackgroundRemoverConfig
+from src.background_remover import BackgroundRemover
+from src.background_remover_factory import BackgroundRemoverFactory
+from src.hybrid_background_remover import HybridBackgroundRemover
+from src.fallback_background_remover import FallbackBackgroundRemover, BackgroundRemovalError
+from src.circuit_breaker import CircuitBreaker
+from src.image_scanner import scan_images
+from testing_helpers import make_processor
+
+
+class FakeRemover(BackgroundRemover):
+    """Removedor simulado que tarda `latency` segundos y registra sus llamadas."""
+
+    def __init__(self, latency: float = 0.0, fail: bool = False, write_output: bool = False):
+        self.latency = latency
+        self.fail = fail
+        self.write_output = write_output
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def remove_background(self, input_path: str, output_path: str) -> bool:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        if self.fail:
+            raise Exception(f"fallo simulado en {input_path}")
+        if self.write_output:
+            with open(output_path, 'wb') as f:
+                f.write(b'ok')
+        return True
+
+
+class ImageCopyRemover(FakeRemover):
+    """Removedor simulado que escribe la imagen de entrada como RGBA."""
+
+    def remove_background(self, input_path: str, output_path: str) -> bool:
+        super().remove_background(input_path, output_path)
+        with Image.open(input_path) as image:
+            image.convert('RGBA').save(output_path, format='PNG')
+        return True
+
+
+def _jobs(count: int):
+    return [(f"in_{i}.png", f"out_{i}.png") for i in range(count)]
+
+
+def test_idle_local_is_preferred():
+    local, api = FakeRemover(0.01), FakeRemover(0.01)
+    hybrid = HybridBackgroundRemover(local, api, local_concurrency=1)
+    for input_path, output_path in _jobs(5):
+        assert hybrid.remove_background(input_path, output_path)
+    assert local.calls == 5 and api.calls == 0
+    assert hybrid.get_metrics()['decisions'] == {'local': 5, 'api': 0}
+
+
+def test_burst_spills_to_api():
+    local, api = FakeRemover(0.05), FakeRemover(0.05)
+    hybrid = HybridBackgroundRemover(local, api, local_concurrency=1, api_concurrency=4,
+                                     initial_local_latency=0.05, initial_api_latency=0.05)
+    results = hybrid.remove_background_many(_jobs(20))
+    assert all(results)
+    assert local.calls > 0 and api.calls > 0
+    metrics = hybrid.get_metrics()
+    assert metrics['decisions']['local'] + metrics['decisions']['api'] == 20
+    assert metrics['backends']['api']['completed'] == api.calls
+    assert metrics['backends']['local']['throughput'] > 0
+
+
+def test_credit_budget_is_respected():
+    local, api = FakeRemover(0.05), FakeRemover(0.01)
+    hybrid = HybridBackgroundRemover(local, api, local_concurrency=1, api_concurrency=4,
+                                     api_credit_budget=3)
+    assert all(hybrid.remove_background_many(_jobs(15), max_workers=6))
+    assert api.calls == 3
+    assert hybrid.get_metrics()['api_credits_remaining'] == 0
+
+
+def test_failed_api_calls_refund_credits():
+    local, api = FakeRemover(0.05), FakeRemover(0.0, fail=True)
+    hybrid = HybridBackgroundRemover(local, api, local_concurrency=1, api_credit_budget=2)
+    results = hybrid.remove_background_many(_jobs(6), max_workers=3)
+    assert not all(results)
+    metrics = hybrid.get_metrics()
+    assert metrics['api_credits_used'] == 0
+    assert metrics['backends']['api']['failed'] == api.calls
+
+
+def test_local_only_without_api():
+    local = FakeRemover(0.01)
+    hybrid = HybridBackgroundRemover(local, None, local_concurrency=1)
+    assert all(hybrid.remove_background_many(_jobs(4), max_workers=4))
+    assert local.calls == 4
+
+
+def test_circuit_breaker_states():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.05)
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()  # solo una prueba a la vez
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_fallback_skips_broken_backend():
+    broken, backup = FakeRemover(fail=True), FakeRemover(write_output=True)
+    chain = FallbackBackgroundRemover([('local', broken), ('api', backup)],
+                                      failure_threshold=2, recovery_timeout=60)
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(6):
+            output_path = os.path.join(tmp, f"out_{i}.png")
+            assert chain.remove_background(f"in_{i}.png", output_path)
+            assert os.path.exists(output_path)
+        # Tras abrir el circuito, el backend roto ya no se llama
+        assert broken.calls == 2
+        assert backup.calls == 6
+        assert chain.get_metrics()['local']['breaker']['state'] == CircuitBreaker.OPEN
+        assert not [f for f in os.listdir(tmp) if '.tmp' in f]
+    chain.close()
+
+
+def test_fallback_timeout_bounds_latency():
+    slow, backup = FakeRemover(latency=1.0, write_output=True), FakeRemover(write_output=True)
+    chain = FallbackBackgroundRemover([('local', slow), ('api', backup)],
+                                      call_timeout=0.05, failure_threshold=1, recovery_timeout=60)
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.monotonic()
+        for i in range(5):
+            assert chain.remove_background(f"in_{i}.png", os.path.join(tmp, f"out_{i}.png"))
+        assert time.monotonic() - start < 0.5
+        assert slow.calls == 1
+        assert chain.get_metrics()['local']['timeout'] == 1
+    chain.close()
+
+
+def test_fallback_raises_when_all_fail():
+    chain = FallbackBackgroundRemover([('local', FakeRemover(fail=True)), ('api', FakeRemover(fail=True))])
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            chain.remove_background("in.png", os.path.join(tmp, "out.png"))
+            raise AssertionError("se esperaba BackgroundRemovalError")
+        except BackgroundRemovalError as e:
+            assert [name for name, _ in e.errors] == ['local', 'api']
+    chain.close()
+
+
+def _with_fake_factory(removers, function):
+    """Sustituye la creación de cada tipo del factory por el removedor simulado indicado."""
+    created = []
+
+    def create_remover(remover_type='tutanchacon', api_key=None, **kwargs):
+        created.append((remover_type, api_key, kwargs))
+        return removers[remover_type]
+
+    original = BackgroundRemoverFactory.create_remover
+    BackgroundRemoverFactory.create_remover = staticmethod(create_remover)
+    try:
+        return function(), created
+    finally:
+        BackgroundRemoverFactory.create_remover = original
+
+
+def test_configured_fallback_chain_skips_open_circuit():
+    broken, backup = FakeRemover(fail=True), FakeRemover(write_output=True)
+    chain, created = _with_fake_factory(
+        {'tutanchacon': broken, 'api': backup},
+        lambda: BackgroundRemoverConfig.create_remover(workers=3, forked=True, api_key='key', fallback=True))
+    assert isinstance(chain, FallbackBackgroundRemover)
+    assert [name for name, _ in chain.removers] == BackgroundRemoverConfig.FALLBACK_CHAIN
+    local_kwargs = created[0][2]
+    assert created[0][0] == 'tutanchacon' and local_kwargs['workers'] == 3
+    assert local_kwargs['session_options']['intra_op_num_threads'] == 1
+    assert created[1][:2] == ('api', 'key')
+    # sin la opción, el removedor es el local directamente
+    single, _ = _with_fake_factory({'tutanchacon': broken}, lambda: BackgroundRemoverConfig.create_remover())
+    assert single is broken
+
+    threshold = BackgroundRemoverConfig.FALLBACK_FAILURE_THRESHOLD
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(threshold + 3):
+            assert chain.remove_background(f"in_{i}.png", os.path.join(tmp, f"out_{i}.png"))
+    # con el circuito abierto el backend local ya no se llama
+    assert broken.calls == threshold and backup.calls == threshold + 3
+    assert chain.get_metrics()['tutanchacon']['breaker']['state'] == CircuitBreaker.OPEN
+    chain.close()
+
+
+def test_remover_type_selects_the_backend():
+    removers = {'tutanchacon': FakeRemover(), 'api': FakeRemover(), 'hybrid': FakeRemover()}
+    original = BackgroundRemoverConfig.REMOVER_TYPE
+    try:
+        BackgroundRemoverConfig.REMOVER_TYPE = 'hybrid'
+        remover, created = _with_fake_factory(removers, lambda: BackgroundRemoverConfig.create_remover(
+            workers=2, api_key='key'))
+        assert remover is removers['hybrid']
+        remover_type, api_key, kwargs = created[0]
+        assert (remover_type, api_key) == ('hybrid', 'key') and kwargs['workers'] == 2
+        assert kwargs['local_concurrency'] == BackgroundRemoverConfig.HYBRID_LOCAL_CONCURRENCY
+        assert kwargs['api_config'] == BackgroundRemoverConfig.get_api_config()
+
+        BackgroundRemoverConfig.REMOVER_TYPE = 'api'
+        remover, created = _with_fake_factory(removers, lambda: BackgroundRemoverConfig.create_remover(api_key='key'))
+        assert remover is removers['api'] and created[0][2] == BackgroundRemoverConfig.get_api_config()
+        # el tipo explícito manda sobre REMOVER_TYPE
+        remover, _ = _with_fake_factory(removers, lambda: BackgroundRemoverConfig.create_remover(
+            remover_type='tutanchacon'))
+        assert remover is removers['tutanchacon']
+    finally:
+        BackgroundRemoverConfig.REMOVER_TYPE = original
+
+
+def test_batch_segments_concurrently_and_spills_to_api():
+    local, api = ImageCopyRemover(0.1), ImageCopyRemover(0.1)
+    hybrid = HybridBackgroundRemover(local, api, local_concurrency=1, api_concurrency=2,
+                                     initial_local_latency=0.1, initial_api_latency=0.1)
+    processor = make_processor(bg_remover=hybrid)
+    assert processor.segment_concurrency() == 3
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = os.path.join(tmp, 'in')
+        for index in range(9):
+            # mismo nombre en carpetas distintas: los temporales de segmentación no deben chocar
+            folder = os.path.join(input_dir, f"team_{index % 3}")
+            os.makedirs(folder, exist_ok=True)
+            Image.new('RGB', (120, 200), (index * 20, 60, 90)).save(os.path.join(folder, f"ana_{index // 3}.png"))
+        results = processor.process_images_with_bgremover(input_dir, os.path.join(tmp, 'out'),
+                                                          entries=scan_images(input_dir))
+        assert len(results) == 9 and all(results.values())
+        for image_path, final_path in results.items():
+            with Image.open(os.path.join(final_path, 'original.png')) as original, Image.open(image_path) as source:
+                assert original.getpixel((0, 0))[:3] == source.getpixel((0, 0))
+    assert local.calls + api.calls == 9 and api.calls > 0
+    assert hybrid.get_metrics()['decisions']['api'] == api.calls
+
+
+def _remove_in_child(chain, output_path, results):
+    results.put(chain.remove_background("in.png", output_path))
+
+
+def test_fallback_chain_works_after_fork():
+    chain = FallbackBackgroundRemover([('local', FakeRemover(write_output=True))])
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    with tempfile.TemporaryDirectory() as tmp:
+        # la llamada en el padre arranca los hilos del executor antes del fork
+        assert chain.remove_background("in.png", os.path.join(tmp, "parent.png"))
+        process = context.Process(target=_remove_in_child, args=(chain, os.path.join(tmp, "child.png"), results))
+        process.start()
+        try:
+            assert results.get(timeout=10) is True
+        finally:
+            process.join(5)
+            if process.is_alive():
+                process.kill()
+        assert os.path.exists(os.path.join(tmp, "child.png"))
+    chain.close()
+
+
+def main():
+    tests = [
+        test_idle_local_is_preferred,
+        test_burst_spills_to_api,
+        test_credit_budget_is_respected,
+        test_failed_api_calls_refund_credits,
+        test_local_only_without_api,
+        test_circuit_breaker_states,
+        test_fallback_skips_broken_backend,
+        test_fallback_timeout_bounds_latency,
+        test_fallback_raises_when_all_fail,
+        test_configured_fallback_chain_skips_open_circuit,
+        test_fallback_chain_works_after_fork,
+        test_remover_type_selects_the_backend,
+        test_batch_segments_concurrently_and_spills_to_api,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Enrutado de removedores: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
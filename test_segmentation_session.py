@@ -0,0 +1,192 @@
+"""
+Pruebas de las opciones de ONNX Runtime: reparto 'auto' de hilos entre workers,
+validación del nivel de optimización, selección de execution providers, sesiones
+creadas con esas opciones y posprocesado de la máscara.
+No necesitan onnxruntime ni rembg: se sustituyen por módulos simulados.
+"""
+
+import os
+import sys
+import tempfile
+import types
+
+import numpy as np
+from PIL import Image
+
+from src import segmentation_session
+from src.segmentation_session import (DEFAULT_SESSION_OPTIONS, create_segmentation_session, refine_mask,
+                                      resolve_session_options, select_providers)
+from src.tutanchacon_bg_remover import TutanchaconBgRemover
+
+
+class FakeSessionOptions:
+    pass
+
+
+class FakeRembgSession:
+    """Sesión de rembg simulada: guarda sus argumentos y devuelve una máscara con alfa parcial."""
+    created = []
+
+    def __init__(self, model_name, sess_opts, providers=None, *args, **kwargs):
+        self.sess_opts = sess_opts
+        self.providers = providers
+        FakeRembgSession.created.append(self)
+
+    @classmethod
+    def name(cls):
+        return 'isnet-general-use'
+
+    def predict(self, image):
+        mask = np.zeros((image.size[1], image.size[0]), dtype=np.uint8)
+        mask[:, :image.size[0] // 2] = 120
+        return [Image.fromarray(mask)]
+
+
+def _fake_modules(providers=('CPUExecutionProvider',)):
+    fake_ort = types.ModuleType('onnxruntime')
+    fake_ort.get_available_providers = lambda: list(providers)
+    fake_ort.SessionOptions = FakeSessionOptions
+    fake_ort.GraphOptimizationLevel = types.SimpleNamespace(
+        ORT_DISABLE_ALL=0, ORT_ENABLE_BASIC=1, ORT_ENABLE_EXTENDED=2, ORT_ENABLE_ALL=99)
+    fake_ort.ExecutionMode = types.SimpleNamespace(ORT_SEQUENTIAL=0, ORT_PARALLEL=1)
+    fake_rembg = types.ModuleType('rembg')
+    fake_sessions = types.ModuleType('rembg.sessions')
+    fake_sessions.sessions_class = [FakeRembgSession]
+    fake_rembg.sessions = fake_sessions
+    return {'onnxruntime': fake_ort, 'rembg': fake_rembg, 'rembg.sessions': fake_sessions}
+
+
+def _with_modules(modules, function):
+    originals = {name: sys.modules.get(name) for name in modules}
+    sys.modules.update(modules)
+    try:
+        return function()
+    finally:
+        for name, original in originals.items():
+            if original is None:
+                del sys.modules[name]
+            else:
+                sys.modules[name] = original
+
+
+def _with_cpu_count(count, function):
+    original = segmentation_session.available_cpu_count
+    segmentation_session.available_cpu_count = lambda: count
+    try:
+        return function()
+    finally:
+        segmentation_session.available_cpu_count = original
+
+
+def _with_available_providers(providers, function):
+    return _with_modules({'onnxruntime': _fake_modules(providers)['onnxruntime']}, function)
+
+
+def test_defaults_are_filled_in():
+    resolved = resolve_session_options({'enable_mem_pattern': False})
+    assert resolved == {**DEFAULT_SESSION_OPTIONS, 'enable_mem_pattern': False}
+    assert resolve_session_options(None) == DEFAULT_SESSION_OPTIONS
+
+
+def test_auto_threads_are_split_between_workers():
+    auto = {'intra_op_num_threads': 'auto', 'inter_op_num_threads': 'auto'}
+    resolved = _with_cpu_count(8, lambda: resolve_session_options(auto, workers=1))
+    assert resolved['intra_op_num_threads'] == 8 and resolved['inter_op_num_threads'] == 1
+    assert _with_cpu_count(8, lambda: resolve_session_options(auto, workers=3))['intra_op_num_threads'] == 2
+    # nunca menos de un hilo, aunque haya más workers que núcleos
+    assert _with_cpu_count(2, lambda: resolve_session_options(auto, workers=4))['intra_op_num_threads'] == 1
+    assert _with_cpu_count(4, lambda: resolve_session_options(auto, workers=0))['intra_op_num_threads'] == 4
+    # los valores explícitos no se tocan
+    fixed = _with_cpu_count(8, lambda: resolve_session_options({'intra_op_num_threads': 3}, workers=4))
+    assert fixed['intra_op_num_threads'] == 3
+
+
+def test_invalid_optimization_level_is_rejected():
+    try:
+        resolve_session_options({'graph_optimization_level': 'maximum'})
+        assert False, "nivel de optimización no válido aceptado"
+    except ValueError as e:
+        assert 'maximum' in str(e)
+
+
+def test_select_providers_filters_unavailable_and_keeps_cpu():
+    assert select_providers(None) is None and select_providers([]) is None
+    available = ['DnnlExecutionProvider', 'CPUExecutionProvider']
+    providers = _with_available_providers(
+        available, lambda: select_providers(['OpenVINOExecutionProvider', 'DnnlExecutionProvider']))
+    assert providers == ['DnnlExecutionProvider', 'CPUExecutionProvider']
+    providers = _with_available_providers(
+        available, lambda: select_providers(['CPUExecutionProvider', 'DnnlExecutionProvider']))
+    assert providers == ['CPUExecutionProvider', 'DnnlExecutionProvider']
+    providers = _with_available_providers(['CPUExecutionProvider'], lambda: select_providers(['CUDAExecutionProvider']))
+    assert providers == ['CPUExecutionProvider']
+
+
+def test_fp32_session_receives_the_resolved_options():
+    FakeRembgSession.created.clear()
+    options = _with_cpu_count(8, lambda: resolve_session_options(
+        {'intra_op_num_threads': 'auto', 'inter_op_num_threads': 'auto',
+         'execution_providers': ['CPUExecutionProvider']}, workers=4))
+    session = _with_modules(_fake_modules(), lambda: create_segmentation_session(
+        'isnet-general-use', 'fp32', session_options=options))
+    assert isinstance(session, FakeRembgSession) and isinstance(session.sess_opts, FakeSessionOptions)
+    assert session.sess_opts.intra_op_num_threads == 2 and session.sess_opts.inter_op_num_threads == 1
+    assert session.sess_opts.graph_optimization_level == 99
+    assert session.providers == ['CPUExecutionProvider']
+    try:
+        _with_modules(_fake_modules(), lambda: create_segmentation_session('u2net', 'fp32', session_options=options))
+        assert False, "sesión desconocida aceptada"
+    except ValueError as e:
+        assert 'u2net' in str(e)
+
+
+def test_default_remover_uses_its_own_session_with_bgremover_post_processing():
+    FakeRembgSession.created.clear()
+    remover = _with_cpu_count(8, lambda: _with_modules(_fake_modules(), lambda: TutanchaconBgRemover(
+        min_alpha_threshold=20, preserve_elements=True, smooth_edges=False,
+        session_options={'intra_op_num_threads': 'auto'}, workers=2)))
+    assert 'rembg-fp32' in str(remover) and len(FakeRembgSession.created) == 1
+    assert FakeRembgSession.created[0].sess_opts.intra_op_num_threads == 4
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_path = os.path.join(temp_dir, 'in.png')
+        output_path = os.path.join(temp_dir, 'out.png')
+        Image.new('RGB', (8, 4), (200, 100, 50)).save(input_path)
+        remover.remove_background(input_path, output_path)
+        with Image.open(output_path) as result:
+            alpha = np.asarray(result.getchannel('A'))
+    # preserve_elements: el alfa parcial (120) por encima del umbral pasa a opaco
+    assert alpha[:, :4].min() == 255 and alpha[:, 4:].max() == 0
+
+
+def test_refine_mask():
+    mask = Image.fromarray(np.array([[0, 10, 30, 120, 255]], dtype=np.uint8))
+    assert np.asarray(refine_mask(mask)).tolist() == [[0, 10, 30, 120, 255]]
+    assert np.asarray(refine_mask(mask, 20)).tolist() == [[0, 0, 30, 120, 255]]
+    assert np.asarray(refine_mask(mask, 20, preserve_elements=True)).tolist() == [[0, 0, 255, 255, 255]]
+
+
+def main():
+    tests = [
+        test_defaults_are_filled_in,
+        test_auto_threads_are_split_between_workers,
+        test_invalid_optimization_level_is_rejected,
+        test_select_providers_filters_unavailable_and_keeps_cpu,
+        test_fp32_session_receives_the_resolved_options,
+        test_default_remover_uses_its_own_session_with_bgremover_post_processing,
+        test_refine_mask,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Opciones de ONNX Runtime: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
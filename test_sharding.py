@@ -0,0 +1,160 @@
+"""
+Pruebas del reparto por hash entre nodos: asignación estable, manifiestos y verificación.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from src.image_scanner import scan_images
+from src.sharding import (filter_shard, manifest_path, parse_shard, relative_image_path,
+                          shard_of, verify_shards, write_manifest)
+
+
+class FakeProcessor:
+    """Crea la carpeta de salida como process_image; falla con las imágenes "broken"."""
+
+    def process_images_with_bgremover(self, input_dir, output_dir, entries):
+        results = {}
+        for entry in entries:
+            name = os.path.splitext(os.path.basename(entry.path))[0]
+            if 'broken' in name:
+                results[entry.path] = None
+                continue
+            final_path = os.path.join(output_dir, entry.relative_dir, name)
+            os.makedirs(final_path, exist_ok=True)
+            open(os.path.join(final_path, 'original.png'), 'wb').close()
+            results[entry.path] = final_path
+        return results
+
+
+def _make_tree(root, count=40):
+    for index in range(count):
+        directory = os.path.join(root, f"team_{index % 3}")
+        os.makedirs(directory, exist_ok=True)
+        open(os.path.join(directory, f"person_{index:03d}.png"), 'wb').close()
+
+
+def _run_shards(input_dir, output_dir, num_shards, shards=None):
+    entries = scan_images(input_dir)
+    for shard_index in (range(num_shards) if shards is None else shards):
+        shard_entries = filter_shard(entries, shard_index, num_shards)
+        results = FakeProcessor().process_images_with_bgremover(input_dir, output_dir, shard_entries)
+        write_manifest(output_dir, shard_index, num_shards, shard_entries, results, 0.0)
+
+
+def test_parse_shard():
+    assert parse_shard('0/1') == (0, 1)
+    assert parse_shard('3/4') == (3, 4)
+    for value in ('4/4', '-1/4', '1/0', '1', 'a/b', '1/2/3'):
+        try:
+            parse_shard(value)
+            raise AssertionError(f"se esperaba ValueError para {value}")
+        except ValueError:
+            pass
+
+
+def test_assignment_is_stable_and_partitions_tree():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        _make_tree(temp_dir)
+        entries = scan_images(temp_dir)
+        shards = [filter_shard(entries, index, 4) for index in range(4)]
+        assigned = sorted(entry.path for shard in shards for entry in shard)
+        assert assigned == sorted(entry.path for entry in entries)
+        assert all(shard for shard in shards)
+        assert relative_image_path(entries[0]) == 'team_0/person_000.png'
+
+    # El hash no depende de PYTHONHASHSEED ni del proceso
+    code = "from src.sharding import shard_of; print(shard_of('team_0/person_000.png', 7))"
+    outputs = {
+        subprocess.run([sys.executable, '-c', code], env=dict(os.environ, PYTHONHASHSEED=seed),
+                       capture_output=True, text=True, check=True).stdout.strip()
+        for seed in ('1', '2')
+    }
+    assert outputs == {str(shard_of('team_0/person_000.png', 7))}
+
+
+def test_verify_accepts_complete_run():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, 'approved')
+        output_dir = os.path.join(temp_dir, 'cropped')
+        _make_tree(input_dir)
+        open(os.path.join(input_dir, 'team_0', 'broken.png'), 'wb').close()
+        _run_shards(input_dir, output_dir, 3)
+
+        report = verify_shards(input_dir, output_dir, 3)
+        assert report['ok'], report
+        assert report['inputs'] == 41
+        assert report['failed_inputs'] == ['team_0/broken.png']
+        with open(manifest_path(output_dir, 0, 3)) as f:
+            manifest = json.load(f)
+        assert manifest['shard'] == 0 and manifest['num_shards'] == 3
+
+
+def test_verify_detects_missing_and_overlapping_shards():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, 'approved')
+        output_dir = os.path.join(temp_dir, 'cropped')
+        _make_tree(input_dir)
+        _run_shards(input_dir, output_dir, 3, shards=[0, 1])
+
+        report = verify_shards(input_dir, output_dir, 3)
+        assert not report['ok']
+        assert report['missing_manifests'] == [2]
+        assert report['unassigned_inputs'] and report['unassigned_inputs'] == report['missing_outputs']
+
+        # Un nodo ejecutado con otro N procesa imágenes que no le tocan
+        _run_shards(input_dir, output_dir, 3, shards=[2])
+        entries = scan_images(input_dir)
+        wrong = [entry for entry in entries if shard_of(relative_image_path(entry), 3) != 1][:2]
+        write_manifest(output_dir, 1, 3, filter_shard(entries, 1, 3) + wrong,
+                       {entry.path: None for entry in wrong}, 0.0)
+        os.makedirs(os.path.join(output_dir, 'team_9', 'ghost'))
+        open(os.path.join(output_dir, 'team_9', 'ghost', 'original.png'), 'wb').close()
+
+        report = verify_shards(input_dir, output_dir, 3)
+        expected = sorted(relative_image_path(entry) for entry in wrong)
+        assert sorted(report['duplicated_inputs']) == expected
+        assert sorted(report['misassigned_inputs']) == expected
+        assert report['orphan_outputs'] == ['team_9/ghost']
+        assert not report['ok']
+
+
+def test_shared_outputs_are_reported():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, 'approved')
+        output_dir = os.path.join(temp_dir, 'cropped')
+        os.makedirs(input_dir)
+        # ana.png y ana.jpg generan la misma carpeta de salida
+        for filename in ('ana.png', 'ana.jpg'):
+            open(os.path.join(input_dir, filename), 'wb').close()
+        _run_shards(input_dir, output_dir, 2)
+        report = verify_shards(input_dir, output_dir, 2)
+        assert report['shared_outputs'] == ['ana']
+        assert not report['ok']
+
+
+def main():
+    tests = [
+        test_parse_shard,
+        test_assignment_is_stable_and_partitions_tree,
+        test_verify_accepts_complete_run,
+        test_verify_detects_missing_and_overlapping_shards,
+        test_shared_outputs_are_reported,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Reparto en shards: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
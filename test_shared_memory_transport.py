@@ -0,0 +1,254 @@
+"""
+Pruebas del transporte por memoria compartida y del pipeline en dos etapas.
+Usan un procesador falso (sin bgremover ni modelos) para ejercitar el anillo entre procesos.
+"""
+
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+import numpy as np
+from PIL import Image
+
+from src import staged_pipeline
+from src.shared_memory_transport import SharedFrameRing
+from src.staged_pipeline import DEFAULT_RING_BYTES, MAX_RING_BYTES, MIN_SLOT_BYTES, StagedPipeline
+
+
+class FakeFaceDetector:
+    def load_model(self):
+        return None
+
+
+class FakeProcessor:
+    """Segmenta leyendo la imagen de disco y renderiza guardando un resumen de píxeles."""
+
+    def __init__(self):
+        self.face_detector = FakeFaceDetector()
+
+    def warm_up(self):
+        pass
+
+    def segment_image(self, image_path):
+        if 'broken' in image_path:
+            return None
+        with Image.open(image_path) as image:
+            return image.convert('RGBA')
+
+    def render_avatars(self, image, image_path, output_subdir, log_dir):
+        final_path = os.path.join(output_subdir, os.path.splitext(os.path.basename(image_path))[0])
+        os.makedirs(final_path, exist_ok=True)
+        image.save(os.path.join(final_path, 'original.png'))
+        return final_path
+
+
+class CrashingRenderProcessor(FakeProcessor):
+    """El renderizado muere con SIGKILL (como el OOM killer) al recibir la imagen 'crash'."""
+
+    def render_avatars(self, image, image_path, output_subdir, log_dir):
+        if 'crash' in image_path:
+            os.kill(os.getpid(), signal.SIGKILL)
+        return super().render_avatars(image, image_path, output_subdir, log_dir)
+
+
+def _child_reads_slot(ring, descriptor, results):
+    results.put(int(ring.view(descriptor).sum()))
+    ring.release(descriptor)
+
+
+def test_write_and_view_roundtrip():
+    with SharedFrameRing(slots=2, slot_bytes=64 * 64 * 4) as ring:
+        pixels = np.random.randint(0, 255, (64, 48, 4), dtype=np.uint8)
+        descriptor = ring.write(pixels, {'task': 'a'})
+        view = ring.view(descriptor)
+        assert descriptor.slot >= 0 and descriptor.inline is None
+        assert np.array_equal(view, pixels)
+        # La vista apunta a la memoria compartida, no a una copia
+        assert not view.flags['OWNDATA']
+        del view
+        ring.release(descriptor)
+
+
+def test_slots_are_reused_and_exhaustion_blocks():
+    with SharedFrameRing(slots=2, slot_bytes=16) as ring:
+        first = ring.write(np.zeros(16, dtype=np.uint8))
+        second = ring.write(np.ones(16, dtype=np.uint8))
+        assert {first.slot, second.slot} == {0, 1}
+        try:
+            ring.write(np.ones(16, dtype=np.uint8), timeout=0.05)
+            raise AssertionError("se esperaba queue.Empty con el anillo lleno")
+        except queue.Empty:
+            pass
+        ring.release(first)
+        third = ring.write(np.full(16, 7, dtype=np.uint8), timeout=1)
+        assert third.slot == first.slot
+
+
+def test_oversized_frame_travels_inline():
+    with SharedFrameRing(slots=1, slot_bytes=8) as ring:
+        pixels = np.arange(32, dtype=np.uint8)
+        descriptor = ring.write(pixels)
+        assert descriptor.slot == -1
+        assert np.array_equal(ring.view(descriptor), pixels)
+        # No consume el único slot
+        ring.release(descriptor)
+        assert ring.write(np.zeros(8, dtype=np.uint8), timeout=0.5).slot == 0
+
+
+def test_spawned_process_attaches_by_name():
+    context = multiprocessing.get_context('spawn')
+    with SharedFrameRing(slots=1, slot_bytes=100 * 4, context=context) as ring:
+        descriptor = ring.write(np.full((10, 10, 4), 3, dtype=np.uint8))
+        results = context.Queue()
+        process = context.Process(target=_child_reads_slot, args=(ring, descriptor, results))
+        process.start()
+        assert results.get(timeout=30) == 3 * 400
+        process.join()
+        # El hijo devolvió el slot al anillo
+        assert ring.write(np.zeros(4, dtype=np.uint8), timeout=1).slot == 0
+
+
+def test_staged_pipeline_moves_pixels_through_shared_memory():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tasks = []
+        for index in range(6):
+            path = os.path.join(temp_dir, f'img_{index}.png')
+            Image.new('RGB', (40 + index, 30), (index * 30, 10, 20)).save(path)
+            tasks.append((path, os.path.join(temp_dir, 'out'), temp_dir))
+        tasks.append((os.path.join(temp_dir, 'broken.png'), os.path.join(temp_dir, 'out'), temp_dir))
+
+        pipeline = StagedPipeline(FakeProcessor, segment_workers=2, render_workers=2,
+                                  ring_slots=2, slot_bytes=64 * 64 * 4, warm_up=False)
+        with pipeline:
+            results = list(pipeline.map(tasks))
+
+        errors = [r for r in results if r['error']]
+        assert len(results) == 7 and len(errors) == 1
+        assert 'broken' in errors[0]['image_path']
+        assert pipeline.transport_stats['shm_frames'] == 6
+        assert pipeline.transport_stats['inline_frames'] == 0
+        for result in results:
+            if not result['error']:
+                with Image.open(os.path.join(result['final_path'], 'original.png')) as saved:
+                    index = int(os.path.basename(result['final_path']).split('_')[1])
+                    assert saved.size == (40 + index, 30)
+                    assert saved.getpixel((0, 0)) == (index * 30, 10, 20, 255)
+
+
+def _with_shm_available(available, function):
+    original = staged_pipeline.shm_available_bytes
+    staged_pipeline.shm_available_bytes = lambda: available
+    try:
+        return function()
+    finally:
+        staged_pipeline.shm_available_bytes = original
+
+
+def test_default_ring_follows_free_shm():
+    # /dev/shm grande: dos slots por worker y el anillo limitado a MAX_RING_BYTES
+    pipeline = _with_shm_available(8 * 1024 ** 3, lambda: StagedPipeline(FakeProcessor, segment_workers=2))
+    assert pipeline.ring_slots == 6 and pipeline.ring_slots * pipeline.slot_bytes <= MAX_RING_BYTES
+    assert pipeline.slot_bytes >= 4000 * 4000 * 4
+    # /dev/shm de 64 MiB de Docker: menos slots, pero caben imágenes de 2048x2048
+    pipeline = _with_shm_available(64 * 1024 * 1024, lambda: StagedPipeline(FakeProcessor, segment_workers=2))
+    assert pipeline.ring_slots == 2 and pipeline.slot_bytes == MIN_SLOT_BYTES
+    # sin /dev/shm
+    pipeline = _with_shm_available(None, lambda: StagedPipeline(FakeProcessor, segment_workers=2))
+    assert pipeline.ring_slots * pipeline.slot_bytes <= DEFAULT_RING_BYTES
+    # los tamaños explícitos se respetan
+    assert StagedPipeline(FakeProcessor, ring_slots=4, slot_bytes=1024).slot_bytes == 1024
+    pipeline = StagedPipeline(FakeProcessor, ring_slots=5, ring_bytes=5 * 1024)
+    assert pipeline.ring_slots == 5 and pipeline.slot_bytes == 1024
+
+    _with_shm_available(8 * 1024 * 1024, pipeline._fit_ring_to_shm)
+    pipeline = StagedPipeline(FakeProcessor, ring_slots=4, slot_bytes=16 * 1024 * 1024)
+    _with_shm_available(8 * 1024 * 1024, pipeline._fit_ring_to_shm)
+    assert pipeline.ring_slots * pipeline.slot_bytes <= 4 * 1024 * 1024
+
+
+def test_write_image_pastes_straight_into_the_slot():
+    image = Image.new('RGBA', (30, 20), (10, 20, 30, 40))
+    image.paste((200, 100, 50, 255), (5, 5, 15, 10))
+    with SharedFrameRing(slots=1, slot_bytes=30 * 20 * 4) as ring:
+        descriptor = ring.write_image(image, {'task': 1})
+        assert descriptor.slot == 0 and descriptor.shape == (20, 30, 4) and descriptor.meta == {'task': 1}
+        assert np.array_equal(ring.view(descriptor), np.asarray(image))
+        ring.release(descriptor)
+    with SharedFrameRing(slots=1, slot_bytes=16) as ring:
+        descriptor = ring.write_image(image)
+        assert descriptor.slot == -1 and np.array_equal(ring.view(descriptor), np.asarray(image))
+
+
+def test_inline_fallback_is_reported_as_a_warning():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tasks = []
+        for name, size in (('small.png', (8, 8)), ('big.png', (40, 40)), ('bigger.png', (50, 50))):
+            path = os.path.join(temp_dir, name)
+            Image.new('RGB', size, (1, 2, 3)).save(path)
+            tasks.append((path, os.path.join(temp_dir, 'out'), temp_dir))
+
+        pipeline = StagedPipeline(FakeProcessor, segment_workers=1, render_workers=1,
+                                  ring_slots=2, slot_bytes=16 * 16 * 4, warm_up=False)
+        output = StringIO()
+        with redirect_stdout(output), pipeline:
+            results = list(pipeline.map(tasks))
+            pipeline.print_transport_report()
+
+    assert not [r for r in results if r['error']]
+    assert pipeline.transport_stats['shm_frames'] == 1 and pipeline.transport_stats['inline_frames'] == 2
+    assert 'viaja serializada' in output.getvalue() and '2 imágenes no cabían' in output.getvalue()
+
+
+def test_dead_worker_stops_the_pipeline_instead_of_hanging():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tasks = []
+        for name in ('a.png', 'crash.png', 'b.png', 'c.png'):
+            path = os.path.join(temp_dir, name)
+            Image.new('RGB', (20, 20)).save(path)
+            tasks.append((path, os.path.join(temp_dir, 'out'), temp_dir))
+
+        start = time.monotonic()
+        pipeline = StagedPipeline(CrashingRenderProcessor, segment_workers=1, render_workers=1,
+                                  ring_slots=2, slot_bytes=64 * 64 * 4, warm_up=False, poll_interval=0.1)
+        try:
+            with pipeline:
+                list(pipeline.map(tasks))
+            raise AssertionError("se esperaba RuntimeError al morir el worker de renderizado")
+        except RuntimeError as e:
+            assert 'avatar-render-0' in str(e) and 'SIGKILL' in str(e)
+        assert time.monotonic() - start < 10
+        assert pipeline.ring is None
+
+
+def main():
+    tests = [
+        test_write_and_view_roundtrip,
+        test_slots_are_reused_and_exhaustion_blocks,
+        test_oversized_frame_travels_inline,
+        test_spawned_process_attaches_by_name,
+        test_staged_pipeline_moves_pixels_through_shared_memory,
+        test_default_ring_follows_free_shm,
+        test_write_image_pastes_straight_into_the_slot,
+        test_inline_fallback_is_reported_as_a_warning,
+        test_dead_worker_stops_the_pipeline_instead_of_hanging,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Memoria compartida: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
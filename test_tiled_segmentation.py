@@ -0,0 +1,132 @@
+"""
+Pruebas de la segmentación por teselas (TiledSegmenter).
+Usa una sesión simulada cuya máscara depende solo de cada píxel, de modo que
+el resultado por teselas debe coincidir con el de la imagen completa.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Agregar el directorio actual al path
+sys.path.append(str(Path(__file__).parent))
+
+from src import segmentation_session
+from src.tiled_segmentation import TiledSegmenter, tile_origins, ramp_weights
+from src.tutanchacon_bg_remover import TutanchaconBgRemover
+
+
+class PixelwiseSession:
+    """Sesión simulada: la máscara es el canal rojo de la imagen."""
+
+    def __init__(self):
+        self.max_tile_pixels = 0
+        self.calls = 0
+
+    def predict(self, image):
+        self.calls += 1
+        self.max_tile_pixels = max(self.max_tile_pixels, image.size[0] * image.size[1])
+        return [image.getchannel('R')]
+
+
+def _gradient_image(width: int, height: int) -> Image.Image:
+    xs = np.linspace(0, 255, width, dtype=np.float32)
+    ys = np.linspace(0, 255, height, dtype=np.float32)
+    red = ((xs[None, :] + ys[:, None]) / 2).astype(np.uint8)
+    rgb = np.stack([red, np.zeros_like(red), np.zeros_like(red)], axis=-1)
+    return Image.fromarray(rgb)
+
+
+def test_tile_origins_cover_axis():
+    for length in (100, 256, 257, 1000, 4097):
+        origins = tile_origins(length, 256, 32)
+        assert origins[0] == 0
+        assert origins[-1] + min(256, length) == length
+        for a, b in zip(origins, origins[1:]):
+            assert 256 - (b - a) >= 32  # solape mínimo respetado
+
+
+def test_ramp_weights_are_positive():
+    weights = ramp_weights(64, 16, 16)
+    assert weights.min() > 0
+    assert weights[32] == 1.0
+
+
+def test_tiled_mask_matches_full_image():
+    image = _gradient_image(1000, 700)
+    session = PixelwiseSession()
+    tiled = TiledSegmenter(session, tile_size=256, overlap=48).predict_mask(image)
+
+    expected = np.asarray(image.getchannel('R'), dtype=np.int16)
+    result = np.asarray(tiled, dtype=np.int16)
+    assert tiled.size == image.size
+    assert np.abs(result - expected).max() <= 1
+    assert session.max_tile_pixels <= 256 * 256
+    assert session.calls == len(tile_origins(1000, 256, 48)) * len(tile_origins(700, 256, 48))
+
+
+def test_parallel_tiles_match_sequential():
+    image = _gradient_image(600, 600)
+    sequential = TiledSegmenter(PixelwiseSession(), tile_size=200, overlap=40).predict_mask(image)
+    parallel = TiledSegmenter(PixelwiseSession(), tile_size=200, overlap=40, tile_workers=4).predict_mask(image)
+    assert np.array_equal(np.asarray(sequential), np.asarray(parallel))
+
+
+def test_small_image_is_single_tile():
+    session = PixelwiseSession()
+    TiledSegmenter(session, tile_size=512, overlap=64).predict_mask(_gradient_image(300, 200))
+    assert session.calls == 1
+
+
+def test_tiled_mode_keeps_the_preset_post_processing():
+    original = segmentation_session.create_segmentation_session
+    segmentation_session.create_segmentation_session = lambda *args, **kwargs: PixelwiseSession()
+    try:
+        preset = {'min_alpha_threshold': 60, 'preserve_elements': True, 'smooth_edges': False}
+        tiled = TutanchaconBgRemover(**preset, tiled_min_pixels=100, tile_size=64, tile_overlap=16)
+        whole = TutanchaconBgRemover(**preset, tiled_min_pixels=None)
+    finally:
+        segmentation_session.create_segmentation_session = original
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_path = os.path.join(temp_dir, 'in.png')
+        _gradient_image(150, 100).save(input_path)
+        alphas = []
+        for index, remover in enumerate((tiled, whole)):
+            output_path = os.path.join(temp_dir, f'out_{index}.png')
+            remover.remove_background(input_path, output_path)
+            with Image.open(output_path) as result:
+                alphas.append(np.asarray(result.getchannel('A')).astype(int))
+    assert tiled._tiled_segmenter is not None and whole._tiled_segmenter is None
+    # preserve_elements binariza en ambos modos; solo puede variar el redondeo justo en el umbral
+    assert set(np.unique(alphas[0])) <= {0, 255}
+    assert np.mean(alphas[0] != alphas[1]) < 0.01
+
+
+def main():
+    tests = [
+        test_tile_origins_cover_axis,
+        test_ramp_weights_are_positive,
+        test_tiled_mask_matches_full_image,
+        test_parallel_tiles_match_sequential,
+        test_small_image_is_single_tile,
+        test_tiled_mode_keeps_the_preset_post_processing,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Segmentación por teselas: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,171 @@
+"""
+Pruebas de los presupuestos de tiempo: preset rápido, carril lento y búsqueda de cara omitida.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from src.job_queue import JobQueue
+from src.progress import result_status
+from src.time_budget import BudgetLog, TimeBudget, image_megapixels
+from src.worker_pool import PreloadedWorkerPool
+from testing_helpers import FakeBgRemover, FakeNet, make_processor
+
+
+class NoFaceNet(FakeNet):
+    def forward(self):
+        return np.zeros((1, 1, 0, 7), dtype=np.float32)
+
+
+class NoneReturningRemover(FakeBgRemover):
+    """Como TutanchaconBgRemover: devuelve None al terminar y lanza una excepción si falla."""
+
+    def remove_background(self, input_path, output_path):
+        super().remove_background(input_path, output_path)
+
+
+class FailingRemover(FakeBgRemover):
+    def remove_background(self, input_path, output_path):
+        super().remove_background(input_path, output_path)
+        return False
+
+
+def _temp_files():
+    return os.listdir('temp_bg_removal') if os.path.isdir('temp_bg_removal') else []
+
+
+def _save_images(directory, count):
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"img_{index}.png")
+        Image.new('RGB', (500, 1000), (120, 80, 60)).save(path)
+        paths.append(path)
+    return paths
+
+
+def test_plan_uses_estimates_and_batch_budget():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        slow_lane = JobQueue(os.path.join(temp_dir, 'slow.sqlite3'))
+        budget = TimeBudget(image_seconds=2.0, fast_remover=FakeBgRemover(), slow_lane=slow_lane)
+        # sin historial no hay estimación: se usa el removedor principal
+        assert budget.plan_segmentation('a.png', 4.0) == 'primary'
+        budget.observe_segmentation('primary', 1.0, 1.0)
+        assert budget.plan_segmentation('a.png', 1.5) == 'primary'
+        assert budget.plan_segmentation('b.png', 4.0) == 'fast'
+        budget.observe_segmentation('fast', 1.0, 0.8)
+        assert budget.plan_segmentation('c.png', 8.0) == 'defer'
+        assert [d['decision'] for d in budget.drain()] == ['fast_preset', 'defer']
+        assert budget.drain() == []
+
+        batch = TimeBudget(batch_seconds=10.0, fast_remover=FakeBgRemover(), slow_lane=slow_lane)
+        batch._batch_start = time.monotonic() - 8.5
+        assert batch.plan_segmentation('d.png', 1.0) == 'fast'
+        batch._batch_start = time.monotonic() - 10.5
+        assert batch.plan_segmentation('e.png', 1.0) == 'defer'
+        # sin carril lento ni removedor rápido no hay a dónde degradar
+        assert TimeBudget(image_seconds=0.1).plan_segmentation('f.png', 100.0) == 'primary'
+
+        path = os.path.join(temp_dir, 'img.png')
+        Image.new('RGB', (1000, 500)).save(path)
+        assert image_megapixels(path) == 0.5
+
+
+def test_over_budget_image_is_segmented_with_fast_preset():
+    fast = NoneReturningRemover()
+    budget = TimeBudget(image_seconds=5.0, fast_remover=fast)
+    budget.observe_segmentation('primary', 1.0, 20.0)
+    processor = make_processor(time_budget=budget)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = _save_images(temp_dir, 1)[0]
+        try:
+            final_path = processor.process_image(path, os.path.join(temp_dir, 'out'), temp_dir)
+            assert _temp_files() == []
+        finally:
+            shutil.rmtree('temp_bg_removal', ignore_errors=True)
+        assert os.path.exists(os.path.join(final_path, 'original.png'))
+    assert fast.calls == 1 and processor.bg_remover.calls == 0
+    decisions = budget.drain()
+    assert [d['decision'] for d in decisions] == ['fast_preset'] and decisions[0]['image_path'] == path
+    assert budget.predict('fast', 1.0) is not None
+    assert processor.metrics.to_dict()['counters']['budget_fast_preset'] == 1
+
+
+def test_failed_segmentation_removes_its_temp_file():
+    budget = TimeBudget(image_seconds=5.0, fast_remover=FailingRemover())
+    budget.observe_segmentation('primary', 1.0, 20.0)
+    processor = make_processor(time_budget=budget)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = _save_images(temp_dir, 1)[0]
+        try:
+            assert processor.process_image(path, os.path.join(temp_dir, 'out'), temp_dir) is None
+            assert _temp_files() == []
+        finally:
+            shutil.rmtree('temp_bg_removal', ignore_errors=True)
+    assert processor.metrics.to_dict()['counters']['segmentation_failures'] == 1
+
+
+def test_full_image_face_search_is_skipped_after_the_deadline():
+    budget = TimeBudget(image_seconds=1e-6)
+    processor = make_processor(NoFaceNet(), time_budget=budget)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = _save_images(temp_dir, 1)[0]
+        try:
+            final_path = processor.process_image(path, os.path.join(temp_dir, 'out'), temp_dir)
+        finally:
+            shutil.rmtree('temp_bg_removal', ignore_errors=True)
+    assert os.path.basename(final_path) == 'error_img_0'
+    counters = processor.metrics.to_dict()['counters']
+    assert counters['face_full_skipped'] == 2 and 'face_full_fallbacks' not in counters
+    assert [d['decision'] for d in budget.drain()] == ['skip_full_fallback', 'over_budget']
+
+
+def test_pool_defers_to_slow_lane_after_batch_budget():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = _save_images(temp_dir, 4)
+        slow_lane = JobQueue(os.path.join(temp_dir, 'slow.sqlite3'))
+        budget = TimeBudget(batch_seconds=1e-6, slow_lane=slow_lane)
+        tasks = [(path, os.path.join(temp_dir, 'out'), temp_dir) for path in paths]
+        with PreloadedWorkerPool(lambda: make_processor(time_budget=budget), workers=2, warm_up=False) as pool:
+            results = list(pool.map(tasks))
+        assert all(r['deferred'] and r['final_path'] is None and r['error'] is None for r in results)
+        assert {result_status(r['final_path'], r['error'], r['deferred']) for r in results} == {'skipped'}
+        assert slow_lane.get_stats()['pending'] == 4
+        assert pool.budget_log.counts() == {'defer': 4}
+        assert pool.budget_log.deferred(paths[0])
+
+        log_path = os.path.join(temp_dir, 'budget.jsonl')
+        pool.budget_log.write(log_path)
+        with open(log_path) as f:
+            assert len([json.loads(line) for line in f]) == 4
+    assert BudgetLog().counts() == {}
+
+
+def main():
+    tests = [
+        test_plan_uses_estimates_and_batch_budget,
+        test_over_budget_image_is_segmented_with_fast_preset,
+        test_failed_segmentation_removes_its_temp_file,
+        test_full_image_face_search_is_skipped_after_the_deadline,
+        test_pool_defers_to_slow_lane_after_batch_budget,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Presupuestos de tiempo: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
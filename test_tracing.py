@@ -0,0 +1,132 @@
+"""
+Pruebas de la traza en formato Chrome: spans anidados, coste sin traza y eventos de los workers.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+from src.tracing import Tracer, get_tracer, span
+from src.worker_pool import PreloadedWorkerPool
+from testing_helpers import make_processor
+
+
+def _save_images(directory, count):
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"img_{index}.png")
+        Image.new('RGB', (300, 500), (120, 80, 60)).save(path)
+        paths.append(path)
+    return paths
+
+
+def _traced(function):
+    """Ejecuta function con la traza global activada y devuelve sus eventos."""
+    tracer = get_tracer()
+    tracer.drain()
+    tracer.enable(process_name='test')
+    try:
+        function()
+        return tracer.drain()
+    finally:
+        tracer.disable()
+        shutil.rmtree('temp_bg_removal', ignore_errors=True)
+
+
+def test_disabled_tracer_records_nothing_and_is_cheap():
+    tracer = Tracer()
+    assert tracer.span('a') is tracer.span('b')
+    start = time.perf_counter()
+    for _ in range(100000):
+        with tracer.span('stage', file='x.png'):
+            pass
+    assert time.perf_counter() - start < 1.0
+    assert tracer.drain() is None
+
+
+def test_nested_spans_inherit_file_and_record_errors():
+    tracer = Tracer()
+    tracer.enable()
+    with tracer.span('image', file='ana.png'):
+        with tracer.span('resize'):
+            pass
+        try:
+            with tracer.span('encode'):
+                raise OSError("disco lleno")
+        except OSError:
+            pass
+    events = {event['name']: event for event in tracer.drain()}
+    image, resize = events['image'], events['resize']
+    assert image['ph'] == 'X' and image['pid'] == os.getpid()
+    assert resize['args'] == {'file': 'ana.png'}
+    assert events['encode']['args'] == {'file': 'ana.png', 'error': 'OSError'}
+    assert image['ts'] <= resize['ts'] and resize['ts'] + resize['dur'] <= image['ts'] + image['dur']
+    assert resize['tid'] == image['tid']
+
+
+def test_processor_emits_image_and_stage_spans():
+    processor = make_processor()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = _save_images(temp_dir, 1)[0]
+        with open(path, 'rb') as f:
+            image_bytes = f.read()
+        events = _traced(lambda: processor.process_image(path, os.path.join(temp_dir, 'out'), temp_dir,
+                                                         image_bytes=image_bytes))
+    names = [event['name'] for event in events if event['ph'] == 'X']
+    for name in ('image', 'spill', 'segmentation', 'decode', 'resize', 'detection_top', 'crop', 'encode'):
+        assert name in names, name
+    assert all(event['args']['file'] == path for event in events if event['ph'] == 'X')
+
+
+def test_pool_collects_worker_spans():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = _save_images(temp_dir, 4)
+        tasks = [(path, os.path.join(temp_dir, 'out'), temp_dir) for path in paths]
+
+        def run():
+            with span('batch'), PreloadedWorkerPool(make_processor, workers=2, warm_up=False) as pool:
+                list(pool.map(tasks))
+
+        events = _traced(run)
+        tracer = Tracer()
+        tracer.add_events(events)
+        trace_path = os.path.join(temp_dir, 'trace.json')
+        assert tracer.write(trace_path) == len(events)
+        with open(trace_path) as f:
+            trace = json.load(f)
+
+    images = [event for event in trace['traceEvents'] if event['name'] == 'image']
+    assert sorted(event['args']['file'] for event in images) == sorted(paths)
+    assert os.getpid() not in {event['pid'] for event in images}
+    names = {event['args']['name'] for event in trace['traceEvents'] if event['ph'] == 'M'}
+    assert {'test', 'worker 0', 'worker 1'} <= names
+    # el span del lote del padre no se duplica en los hijos
+    assert [event['pid'] for event in trace['traceEvents'] if event['name'] == 'batch'] == [os.getpid()]
+
+
+def main():
+    tests = [
+        test_disabled_tracer_records_nothing_and_is_cheap,
+        test_nested_spans_inherit_file_and_record_errors,
+        test_processor_emits_image_and_stage_spans,
+        test_pool_collects_worker_spans,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Traza Chrome: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
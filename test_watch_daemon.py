@@ -0,0 +1,185 @@
+"""
+Pruebas del vigilante de directorios (inotify y sondeo) y del daemon de ingestión.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from src.folder_watcher import FolderWatcher, InotifyBackend, PollingBackend
+from src.watch_daemon import WatchDaemon
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeProcessor:
+    """Crea la carpeta de recortes (solo con original.png) sin cargar modelos."""
+
+    def __init__(self):
+        self.processed = []
+        self.warmed = False
+
+    def warm_up(self):
+        self.warmed = True
+
+    def process_image(self, image_path, output_subdir, log_dir):
+        self.processed.append(image_path)
+        final_path = os.path.join(output_subdir, os.path.splitext(os.path.basename(image_path))[0])
+        _write(os.path.join(final_path, 'original.png'))
+        return final_path
+
+
+def _write(path, data=b'x' * 10):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'ab') as f:
+        f.write(data)
+
+
+def _poll_until(watcher, expected_count, seconds=5.0):
+    found = []
+    deadline = time.time() + seconds
+    while len(found) < expected_count and time.time() < deadline:
+        found.extend(watcher.poll(0.1))
+    return found
+
+
+def test_debounce_waits_for_stable_size():
+    with tempfile.TemporaryDirectory() as root:
+        clock = FakeClock()
+        watcher = FolderWatcher(root, debounce_seconds=2.0, use_inotify=False, poll_interval=0, clock=clock)
+        path = os.path.join(root, 'a.png')
+        _write(path)
+        assert watcher.poll(0) == []
+        clock.now = 1.0
+        # Escritura parcial: el archivo sigue creciendo
+        _write(path)
+        assert watcher.poll(0) == []
+        clock.now = 2.5
+        assert watcher.poll(0) == []
+        clock.now = 3.1
+        assert watcher.poll(0) == [path]
+        assert watcher.pending_count == 0
+        watcher.close()
+
+
+def test_polling_backend_ignores_existing_and_non_images():
+    with tempfile.TemporaryDirectory() as root:
+        _write(os.path.join(root, 'old.png'))
+        backend = PollingBackend(root, interval=0)
+        _write(os.path.join(root, 'notes.txt'))
+        _write(os.path.join(root, 'sub', 'new.jpg'))
+        assert backend.read(0) == [os.path.join(root, 'sub', 'new.jpg')]
+        assert backend.read(0) == []
+
+
+def test_inotify_detects_files_and_new_subdirectories():
+    if not sys.platform.startswith('linux'):
+        return
+    with tempfile.TemporaryDirectory() as root:
+        watcher = FolderWatcher(root, debounce_seconds=0.05)
+        assert isinstance(watcher.backend, InotifyBackend)
+        _write(os.path.join(root, 'a.png'))
+        # Un directorio nuevo con una imagen dentro (mkdir + escritura inmediata)
+        _write(os.path.join(root, 'batch', 'b.jpeg'))
+        found = _poll_until(watcher, 2)
+        assert sorted(found) == [os.path.join(root, 'a.png'), os.path.join(root, 'batch', 'b.jpeg')]
+        _write(os.path.join(root, 'batch', 'c.png'))
+        assert _poll_until(watcher, 1) == [os.path.join(root, 'batch', 'c.png')]
+        watcher.close()
+
+
+def test_daemon_catches_up_only_stale_images():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, 'approved')
+        output_dir = os.path.join(temp_dir, 'cropped')
+        _write(os.path.join(input_dir, 'done.png'))
+        _write(os.path.join(input_dir, 'sub', 'new.png'))
+        _write(os.path.join(output_dir, '.', 'done', 'original.png'))
+        daemon = WatchDaemon(FakeProcessor(), input_dir, output_dir, use_inotify=False)
+        pending = [entry.path for entry in daemon.pending_on_startup()]
+        assert pending == [os.path.join(input_dir, 'sub', 'new.png')]
+        daemon.watcher.close()
+
+
+def test_daemon_compares_with_the_output_markers_not_the_folder():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, 'approved')
+        output_dir = os.path.join(temp_dir, 'cropped')
+        for name in ('full', 'master', 'error', 'stale', 'empty'):
+            _write(os.path.join(input_dir, f"{name}.png"))
+        _write(os.path.join(output_dir, 'full', 'original.png'))
+        _write(os.path.join(output_dir, 'master', 'master.json'))
+        _write(os.path.join(output_dir, 'error_error', 'original.png'))
+        # original.png anterior a la imagen, aunque la carpeta se haya tocado después
+        _write(os.path.join(output_dir, 'stale', 'original.png'))
+        image_mtime = os.path.getmtime(os.path.join(input_dir, 'stale.png'))
+        os.utime(os.path.join(output_dir, 'stale', 'original.png'), (image_mtime - 60, image_mtime - 60))
+        _write(os.path.join(output_dir, 'stale', '64x64.png'))
+        os.utime(os.path.join(output_dir, 'stale'), (image_mtime + 60, image_mtime + 60))
+        # carpeta sin marcador (proceso interrumpido): sigue pendiente
+        os.makedirs(os.path.join(output_dir, 'empty'))
+        daemon = WatchDaemon(FakeProcessor(), input_dir, output_dir, use_inotify=False)
+        pending = sorted(os.path.basename(entry.path) for entry in daemon.pending_on_startup())
+        assert pending == ['empty.png', 'stale.png']
+        daemon.watcher.close()
+
+
+def test_daemon_processes_arrivals_until_stopped():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, 'approved')
+        output_dir = os.path.join(temp_dir, 'cropped')
+        os.makedirs(input_dir)
+        _write(os.path.join(input_dir, 'backlog.png'))
+        processor = FakeProcessor()
+        daemon = WatchDaemon(processor, input_dir, output_dir, debounce_seconds=0.05, poll_interval=0.05)
+        stop_event = threading.Event()
+        thread = threading.Thread(target=daemon.run, kwargs={'stop_event': stop_event, 'poll_timeout': 0.05})
+        thread.start()
+        try:
+            _write(os.path.join(input_dir, 'team', 'arrival.png'))
+            deadline = time.time() + 5
+            while len(processor.processed) < 2 and time.time() < deadline:
+                time.sleep(0.02)
+        finally:
+            stop_event.set()
+            thread.join(5)
+        assert processor.warmed
+        assert processor.processed == [
+            os.path.join(input_dir, 'backlog.png'),
+            os.path.join(input_dir, 'team', 'arrival.png')
+        ]
+        assert os.path.isdir(os.path.join(output_dir, 'team', 'arrival'))
+        assert daemon.processed == 2 and daemon.failed == 0
+
+
+def main():
+    tests = [
+        test_debounce_waits_for_stable_size,
+        test_polling_backend_ignores_existing_and_non_images,
+        test_inotify_detects_files_and_new_subdirectories,
+        test_daemon_catches_up_only_stale_images,
+        test_daemon_compares_with_the_output_markers_not_the_folder,
+        test_daemon_processes_arrivals_until_stopped,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Modo daemon: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,300 @@
+"""
+Pruebas del aislamiento de workers: crashes nativos, tiempo máximo por imagen y cuarentena.
+"""
+
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+
+import types
+
+import numpy as np
+from PIL import Image
+
+from bg_remover_config import BackgroundRemoverConfig
+from src.image_scanner import scan_images
+from src.quarantine import Quarantine
+from src.worker_pool import PreloadedWorkerPool
+from testing_helpers import fake_face_detector, make_processor
+
+
+class FragileProcessor:
+    """Muere con SIGSEGV, se cuelga o lanza una excepción según el nombre de la imagen."""
+
+    def __init__(self):
+        self.face_detector = fake_face_detector()
+
+    def process_image(self, image_path, output_subdir, log_dir):
+        name = os.path.basename(image_path)
+        if name.startswith('crash'):
+            os.kill(os.getpid(), signal.SIGSEGV)
+        if name.startswith('hang'):
+            time.sleep(60)
+        if name.startswith('boom'):
+            raise ValueError("PNG truncado")
+        return os.path.join(output_subdir, os.path.splitext(name)[0])
+
+
+class WarmUpRecordingProcessor(FragileProcessor):
+    """Anota en qué proceso se calentó y devuelve ese pid como resultado de cada imagen."""
+
+    def __init__(self):
+        super().__init__()
+        self.warm_up_pids = []
+
+    def warm_up(self):
+        self.warm_up_pids.append(os.getpid())
+
+    def process_image(self, image_path, output_subdir, log_dir):
+        super().process_image(image_path, output_subdir, log_dir)
+        return f"{os.getpid()}:{','.join(map(str, self.warm_up_pids))}"
+
+
+class OnnxSegmentationProcessor:
+    """Procesador mínimo sobre un removedor real: calentamiento y tareas con la sesión de ONNX Runtime."""
+
+    def __init__(self, bg_remover):
+        self.face_detector = fake_face_detector()
+        self.bg_remover = bg_remover
+
+    def warm_up(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.process_image(_touch_images(temp_dir, ['warmup.png'])[0], temp_dir, temp_dir)
+
+    def process_image(self, image_path, output_subdir, log_dir):
+        output_path = os.path.join(output_subdir, os.path.basename(image_path))
+        self.bg_remover.remove_background(image_path, output_path)
+        return output_path
+
+
+def _onnx_rembg_modules(model_path):
+    """Módulo rembg mínimo cuya sesión fp32 es una InferenceSession real sobre model_path."""
+    import onnxruntime as ort
+
+    class OnnxSession:
+        def __init__(self, model_name, sess_opts, providers=None, *args, **kwargs):
+            self.inner_session = ort.InferenceSession(model_path, sess_opts, providers=providers)
+
+        @classmethod
+        def name(cls):
+            return 'isnet-general-use'
+
+        def predict(self, image):
+            pixels = np.asarray(image.resize((64, 64)), dtype=np.float32).transpose(2, 0, 1)[None] / 255
+            mask = self.inner_session.run(None, {'x': pixels})[0][0, 0]
+            return [Image.fromarray((mask * 255).astype(np.uint8)).resize(image.size)]
+
+    rembg = types.ModuleType('rembg')
+    rembg.sessions = types.ModuleType('rembg.sessions')
+    rembg.sessions.sessions_class = [OnnxSession]
+    return {'rembg': rembg, 'rembg.sessions': rembg.sessions}
+
+
+def _write_onnx_model(path):
+    """Modelo de segmentación diminuto (conv + sigmoid) de entrada 1x3x64x64."""
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    weights = numpy_helper.from_array(np.full((1, 3, 3, 3), 0.1, dtype=np.float32), 'w')
+    graph = helper.make_graph(
+        [helper.make_node('Conv', ['x', 'w'], ['h'], pads=[1, 1, 1, 1]), helper.make_node('Sigmoid', ['h'], ['y'])],
+        'segmentation',
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, [1, 3, 64, 64])],
+        [helper.make_tensor_value_info('y', TensorProto.FLOAT, [1, 1, 64, 64])],
+        [weights]
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+
+def _touch_images(directory, names):
+    paths = []
+    for name in names:
+        path = os.path.join(directory, name)
+        Image.new('RGB', (30, 50)).save(path)
+        paths.append(path)
+    return paths
+
+
+def test_crashed_worker_is_replaced_and_its_image_quarantined():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = _touch_images(temp_dir, ['a.png', 'crash.png', 'b.png', 'boom.png', 'c.png'])
+        quarantine = Quarantine(os.path.join(temp_dir, 'quarantine'), temp_dir)
+        tasks = [(path, os.path.join(temp_dir, 'out'), temp_dir) for path in paths]
+        with PreloadedWorkerPool(FragileProcessor, workers=1, warm_up=False, quarantine=quarantine) as pool:
+            first_pid = pool.worker_stats[0]['pid']
+            results = {os.path.basename(r['image_path']): r for r in pool.map(tasks)}
+            assert pool.worker_stats[0]['pid'] != first_pid
+
+        assert len(results) == 5
+        assert all(results[name]['error'] is None for name in ('a.png', 'b.png', 'c.png'))
+        assert results['crash.png']['error'].startswith('WorkerCrash') and 'SIGSEGV' in results['crash.png']['error']
+        assert results['boom.png']['error'] == "ValueError: PNG truncado"
+        assert [failure['reason'] for failure in pool.failures] == ['crash']
+        assert pool.metrics.to_dict()['counters'] == {'worker_crashes': 1}
+
+        with open(quarantine.log_path) as f:
+            records = {os.path.basename(r['image_path']): r for r in map(json.loads, f)}
+        assert records['crash.png']['reason'] == 'crash' and records['crash.png']['worker'] == 0
+        assert os.path.exists(os.path.join(temp_dir, 'quarantine', 'crash.png'))
+        assert records['boom.png']['reason'] == 'error' and 'ValueError' in records['boom.png']['traceback']
+
+
+def test_timeout_kills_only_the_stuck_worker():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = _touch_images(temp_dir, ['hang.png'] + [f"img_{index}.png" for index in range(6)])
+        quarantine = Quarantine(os.path.join(temp_dir, 'quarantine'), temp_dir)
+        tasks = [(path, os.path.join(temp_dir, 'out'), temp_dir) for path in paths]
+        start = time.monotonic()
+        with PreloadedWorkerPool(FragileProcessor, workers=2, warm_up=False, image_timeout=1.0,
+                                 quarantine=quarantine, poll_interval=0.1) as pool:
+            results = list(pool.map(tasks))
+        assert time.monotonic() - start < 10
+    failed = [r for r in results if r['error']]
+    assert len(results) == 7 and len(failed) == 1
+    assert failed[0]['error'].startswith('ImageTimeout') and failed[0]['quarantine']['reason'] == 'timeout'
+    assert pool.failures[0]['seconds'] >= 1.0
+
+
+def test_idle_dead_worker_is_replaced_before_sending():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = _touch_images(temp_dir, ['a.png', 'b.png', 'c.png'])
+        quarantine = Quarantine(os.path.join(temp_dir, 'quarantine'), temp_dir)
+        tasks = [(path, os.path.join(temp_dir, 'out'), temp_dir) for path in paths]
+        with PreloadedWorkerPool(FragileProcessor, workers=1, warm_up=False, quarantine=quarantine) as pool:
+            first_pid = pool.worker_stats[0]['pid']
+            # el OOM killer mata al worker mientras espera tareas
+            os.kill(first_pid, signal.SIGKILL)
+            pool._processes[0].join()
+            results = list(pool.map(tasks))
+            assert pool.worker_stats[0]['pid'] != first_pid
+    assert len(results) == 3 and all(result['error'] is None for result in results)
+    assert not pool.failures and not os.path.exists(quarantine.log_path)
+
+
+def test_result_arriving_at_the_deadline_is_not_quarantined():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path, = _touch_images(temp_dir, ['late.png'])
+        quarantine = Quarantine(os.path.join(temp_dir, 'quarantine'), temp_dir)
+        task = (path, os.path.join(temp_dir, 'out'), temp_dir)
+        with PreloadedWorkerPool(FragileProcessor, workers=1, warm_up=False, image_timeout=1.0,
+                                 quarantine=quarantine) as pool:
+            pid = pool.worker_stats[0]['pid']
+            # el resultado ya está en el pipe cuando el supervisor ve vencido el plazo
+            pool._send(0, task)
+            pool._in_flight[0] = (task, time.monotonic() - 5)
+            assert pool._connections[0].poll(5)
+            messages = pool._check_workers()
+            assert pool._processes[0].pid == pid and pool._processes[0].is_alive()
+    assert len(messages) == 1 and messages[0]['error'] is None and messages[0]['image_path'] == path
+    assert not pool.failures and not os.path.exists(quarantine.log_path)
+
+
+def test_warm_up_runs_once_in_the_parent_before_fork():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = _touch_images(temp_dir, ['a.png', 'crash.png', 'b.png', 'c.png'])
+        tasks = [(path, os.path.join(temp_dir, 'out'), temp_dir) for path in paths]
+        with PreloadedWorkerPool(WarmUpRecordingProcessor, workers=2, warm_up=True) as pool:
+            results = [r for r in pool.map(tasks) if r['error'] is None]
+        assert pool.processor.warm_up_pids == [os.getpid()]
+        assert len(results) == 3
+        for result in results:
+            worker_pid, warm_up_pids = result['final_path'].split(':')
+            # los workers (también el que reemplaza al que murió) heredan el calentamiento sin repetirlo
+            assert int(worker_pid) != os.getpid() and warm_up_pids == str(os.getpid())
+
+
+def test_pool_forks_after_a_real_onnx_warm_up():
+    try:
+        import onnx  # noqa: F401
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        print("⏭️ onnx/onnxruntime no instalados: se omite la prueba con una sesión real")
+        return
+    with tempfile.TemporaryDirectory() as temp_dir:
+        model_path = os.path.join(temp_dir, 'model.onnx')
+        _write_onnx_model(model_path)
+        modules = _onnx_rembg_modules(model_path)
+        originals = {name: sys.modules.get(name) for name in modules}
+        sys.modules.update(modules)
+        try:
+            # la configuración por defecto (preset fp32) tal como la crea resize_images con --workers 2
+            remover = BackgroundRemoverConfig.create_remover(workers=2, forked=True)
+        finally:
+            for name, original in originals.items():
+                if original is None:
+                    del sys.modules[name]
+                else:
+                    sys.modules[name] = original
+        session_options = remover._bg_remover.inner_session.get_session_options()
+        assert session_options.intra_op_num_threads == 1 and session_options.inter_op_num_threads == 1
+
+        paths = _touch_images(temp_dir, [f"img_{index}.png" for index in range(4)])
+        tasks = [(path, os.path.join(temp_dir, 'out'), temp_dir) for path in paths]
+        os.makedirs(os.path.join(temp_dir, 'out'))
+        # la sesión se calienta en el padre y los hijos la usan tras el fork; un cuelgue sería un timeout
+        with PreloadedWorkerPool(lambda: OnnxSegmentationProcessor(remover), workers=2, warm_up=True,
+                                 image_timeout=30, poll_interval=0.1) as pool:
+            results = list(pool.map(tasks))
+        assert len(results) == 4 and all(result['error'] is None for result in results)
+        for result in results:
+            with Image.open(result['final_path']) as image:
+                assert image.mode == 'RGBA' and image.size == (30, 50)
+
+
+def test_single_process_batch_survives_corrupt_image_and_skips_it_next_run():
+    processor = make_processor()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, 'in')
+        os.makedirs(os.path.join(input_dir, 'team'))
+        Image.new('RGB', (300, 500)).save(os.path.join(input_dir, 'a.png'))
+        corrupt = os.path.join(input_dir, 'team', 'broken.png')
+        with open(corrupt, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n' + b'\x00' * 16)
+        quarantine = Quarantine(os.path.join(temp_dir, 'quarantine'), input_dir)
+        try:
+            results = processor.process_images_with_bgremover(input_dir, os.path.join(temp_dir, 'out'),
+                                                              quarantine=quarantine)
+        finally:
+            shutil.rmtree('temp_bg_removal', ignore_errors=True)
+        assert results[corrupt] is None and results[os.path.join(input_dir, 'a.png')] is not None
+        assert processor.metrics.to_dict()['counters']['image_errors'] == 1
+        assert os.path.exists(os.path.join(temp_dir, 'quarantine', 'team', 'broken.png'))
+
+        kept, skipped = Quarantine(quarantine.directory, input_dir).filter(scan_images(input_dir))
+        assert [entry.path for entry in skipped] == [corrupt] and len(kept) == 1
+        # una entrada corregida (otro mtime) vuelve a procesarse
+        os.utime(corrupt, (time.time() + 10, time.time() + 10))
+        kept, skipped = quarantine.filter(scan_images(input_dir))
+        assert not skipped and len(kept) == 2
+
+
+def main():
+    tests = [
+        test_crashed_worker_is_replaced_and_its_image_quarantined,
+        test_timeout_kills_only_the_stuck_worker,
+        test_idle_dead_worker_is_replaced_before_sending,
+        test_result_arriving_at_the_deadline_is_not_quarantined,
+        test_warm_up_runs_once_in_the_parent_before_fork,
+        test_pool_forks_after_a_real_onnx_warm_up,
+        test_single_process_batch_survives_corrupt_image_and_skips_it_next_run,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n📊 Aislamiento de workers: {passed}/{len(tests)} pruebas exitosas")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
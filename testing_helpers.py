@@ -0,0 +1,66 @@
+"""
+Dobles compartidos por las pruebas del pipeline: una red res10 simulada, un
+removedor de fondo que solo copia la imagen y un ImageProcessor construido con
+ambos. Así las pruebas usan el ImageProcessor real sin modelos ni rembg.
+"""
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from src.face_detector import FaceDetector
+from src.image_processor import ImageProcessor
+
+
+class FakeNet:
+    """
+    Simula la red res10: devuelve la misma cara (coordenadas relativas) en cada imagen del lote.
+
+    Con bright_only solo detecta la cara en las imágenes no negras, y batch_sizes
+    registra el tamaño de cada lote recibido.
+    """
+
+    def __init__(self, box=(0.3, 0.2, 0.5, 0.45), bright_only=False):
+        self.box = box
+        self.bright_only = bright_only
+        self.batch_sizes = []
+        self._blob = None
+
+    def setInput(self, blob):
+        self._blob = blob
+        self.batch_sizes.append(blob.shape[0])
+
+    def forward(self):
+        rows = [[index, 1, 0.9, *self.box] for index in range(self._blob.shape[0])
+                if not self.bright_only or self._blob[index].mean() > 0]
+        rows.append([-1, 0, 0.0, 0, 0, 0, 0])
+        return np.array(rows, dtype=np.float32).reshape(1, 1, -1, 7)
+
+
+class FakeBgRemover:
+    """Copia la imagen como RGBA; con fail_on devuelve False para las rutas que lo contienen."""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.calls = 0
+
+    def remove_background(self, input_path, output_path):
+        self.calls += 1
+        if self.fail_on and self.fail_on in input_path:
+            return False
+        with Image.open(input_path) as image:
+            image.convert('RGBA').save(output_path, format='PNG')
+        return True
+
+
+def fake_face_detector(net=None) -> FaceDetector:
+    """FaceDetector real con la red res10 sustituida por net (default: FakeNet)."""
+    face_detector = FaceDetector(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    face_detector._net = net or FakeNet()
+    return face_detector
+
+
+def make_processor(net=None, bg_remover=None, time_budget=None) -> ImageProcessor:
+    """ImageProcessor real con la red y el removedor simulados."""
+    return ImageProcessor(None, fake_face_detector(net), bg_remover=bg_remover or FakeBgRemover(),
+                          time_budget=time_budget)